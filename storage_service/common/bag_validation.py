@@ -0,0 +1,356 @@
+"""Validation of bags stored in archives, without extracting them.
+
+The members of the archive are decoded once, in order, and each one is hashed
+by a pool of threads while the following ones are read. Only the manifests and
+the tag files are kept in memory. The results are reported as
+``bagit.Bag.validate`` reports them, see ``validate_archive``.
+
+Tar archives, compressed or not, and ZIP archives are read with the standard
+library, 7z archives are decoded sequentially by ``7z`` to its standard output.
+"""
+
+from __future__ import absolute_import
+
+# stdlib, alphabetical
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import re
+import subprocess
+import tarfile
+import zipfile
+
+# Third party dependencies, alphabetical
+import bagit
+from django.utils.six.moves import queue
+from django.utils.translation import ugettext as _
+
+# This project, alphabetical
+from . import utils
+
+LOGGER = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# Chunks of a member read ahead of the thread hashing it
+QUEUE_SIZE = 8
+# Hashed when the manifests can't be listed without decoding the whole archive
+CANDIDATE_ALGORITHMS = ("md5", "sha1", "sha256", "sha512")
+MANIFEST_RE = re.compile(r"^(tag)?manifest-(\w+)\.txt$")
+TAG_FILES = ("bagit.txt", "bag-info.txt")
+SEVENZIP_MAGIC = b"7z\xbc\xaf\x27\x1c"
+PAYLOAD_DIR = "data/"
+
+
+class UnsupportedArchive(Exception):
+    """The archive can't be validated without being extracted."""
+
+
+def _archive_type(path):
+    with open(path, "rb") as f:
+        if f.read(len(SEVENZIP_MAGIC)) == SEVENZIP_MAGIC:
+            return "7z"
+    if zipfile.is_zipfile(path):
+        return "zip"
+    if tarfile.is_tarfile(path):
+        return "tar"
+    raise UnsupportedArchive(
+        _("%(path)s is not a tar, ZIP or 7z archive") % {"path": path}
+    )
+
+
+def _list_7z(path):
+    """Return the path, size and type of the members of a 7z archive, in
+    the order ``7z`` extracts them."""
+    output = subprocess.check_output(["7z", "l", "-slt", path]).decode("utf8")
+    # The entries follow the description of the archive, one block each
+    __, __, listing = output.partition("\n----------\n")
+    members = []
+    for block in listing.split("\n\n"):
+        fields = dict(
+            line.split(" = ", 1) for line in block.splitlines() if " = " in line
+        )
+        if "Path" not in fields:
+            continue
+        is_dir = fields.get("Folder") == "+" or fields.get("Attributes", "").startswith(
+            "D"
+        )
+        members.append((fields["Path"], int(fields.get("Size") or 0), is_dir))
+    return members
+
+
+def _read_exactly(stream, size):
+    remaining = size
+    while remaining:
+        chunk = stream.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise EOFError(_("Unexpected end of the decompressed stream"))
+        remaining -= len(chunk)
+        yield chunk
+
+
+def _7z_members(path, listing):
+    # The files are written to stdout one after the other, in the order of the
+    # listing, so the stream is split by their sizes
+    process = subprocess.Popen(
+        ["7z", "x", "-so", path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        for name, size, is_dir in listing:
+            if not is_dir:
+                yield name, _read_exactly(process.stdout, size)
+        if process.stdout.read(1):
+            raise EOFError(_("7z extracted more data than listed"))
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, "7z x -so")
+
+
+def _zip_members(path):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.filename.endswith("/"):
+                continue
+            with archive.open(info) as member:
+                yield info.filename, utils.read_in_chunks(member, CHUNK_SIZE)
+
+
+def _tar_members(path):
+    # Stream mode, the archive is decompressed once and never seeked
+    with tarfile.open(path, "r|*") as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            member = archive.extractfile(info)
+            yield info.name, utils.read_in_chunks(member, CHUNK_SIZE)
+
+
+def _open_archive(path):
+    """Return the names of the members of the archive at ``path``, or None if
+    they can't be listed cheaply, and an iterator of their names and chunks.
+    """
+    archive_type = _archive_type(path)
+    if archive_type == "7z":
+        listing = _list_7z(path)
+        names = [name for name, __, is_dir in listing if not is_dir]
+        return names, _7z_members(path, listing)
+    if archive_type == "zip":
+        with zipfile.ZipFile(path) as archive:
+            names = [name for name in archive.namelist() if not name.endswith("/")]
+        return names, _zip_members(path)
+    return None, _tar_members(path)
+
+
+def _bag_path(name, base_dirs):
+    """Return the path of member ``name`` relative to the bag, which must be
+    the only directory at the root of the archive."""
+    name = name.lstrip("/")
+    while name.startswith("./"):
+        name = name[2:]
+    base_dir, __, path = name.partition("/")
+    base_dirs.add(base_dir)
+    if not path or len(base_dirs) > 1:
+        raise UnsupportedArchive(_("The archive does not contain a single bag"))
+    return path
+
+
+def _is_tag_file(path):
+    return path in TAG_FILES or MANIFEST_RE.match(path) is not None
+
+
+def _hash_chunks(chunks, algorithms):
+    """Hash the chunks put in the queue ``chunks`` until None is.
+
+    Returns the number of bytes hashed and the hex digests by algorithm.
+    """
+    hashers = [hashlib.new(algorithm) for algorithm in algorithms]
+    size = 0
+    while True:
+        chunk = chunks.get()
+        if chunk is None:
+            break
+        size += len(chunk)
+        for hasher in hashers:
+            hasher.update(chunk)
+    return size, {
+        algorithm: hasher.hexdigest() for algorithm, hasher in zip(algorithms, hashers)
+    }
+
+
+def _hash_archive(path, processes):
+    """Hash every file of the bag in the archive at ``path``.
+
+    Returns the size and digests of the files and the contents of the tag
+    files, by path relative to the bag.
+    """
+    names, members = _open_archive(path)
+    if names is None:
+        algorithms = CANDIDATE_ALGORITHMS
+    else:
+        base_dirs = set()
+        manifests = [MANIFEST_RE.match(_bag_path(name, base_dirs)) for name in names]
+        algorithms = sorted(
+            {match.group(2) for match in manifests if match is not None}
+        )
+        if not algorithms:
+            raise UnsupportedArchive(_("The archive does not contain manifests"))
+    base_dirs = set()
+    futures = {}
+    tag_files = {}
+    with ThreadPoolExecutor(max_workers=max(1, processes)) as executor:
+        for name, chunks in members:
+            path = _bag_path(name, base_dirs)
+            buffered = [] if _is_tag_file(path) else None
+            pending = queue.Queue(maxsize=QUEUE_SIZE)
+            futures[path] = executor.submit(_hash_chunks, pending, algorithms)
+            try:
+                for chunk in chunks:
+                    pending.put(chunk)
+                    if buffered is not None:
+                        buffered.append(chunk)
+            finally:
+                # Always release the thread hashing this member
+                pending.put(None)
+            if buffered is not None:
+                tag_files[path] = b"".join(buffered)
+    files = {path: future.result() for path, future in futures.items()}
+    return algorithms, files, tag_files
+
+
+def _decode_filename(path):
+    # See bagit._decode_filename
+    path = re.sub(r"%0D", "\r", path, flags=re.IGNORECASE)
+    path = re.sub(r"%0A", "\n", path, flags=re.IGNORECASE)
+    return path.replace("%25", "%")
+
+
+def _parse_manifest(content):
+    entries = {}
+    for line in content.decode("utf-8-sig").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        checksum, path = line.split(None, 1)
+        path = _decode_filename(path)
+        if path.startswith("./"):
+            path = path[2:]
+        entries[path] = checksum.lower()
+    return entries
+
+
+def _parse_bag_info(content):
+    info = {}
+    for line in content.decode("utf-8-sig").splitlines():
+        key, sep, value = line.partition(":")
+        if sep and not line[:1].isspace():
+            info[key.strip()] = value.strip()
+    return info
+
+
+def _check_payload_oxum(bag_info, files):
+    oxum = bag_info.get("Payload-Oxum")
+    if not oxum:
+        return
+    try:
+        byte_count, file_count = (int(value) for value in oxum.split(".", 1))
+    except ValueError:
+        raise bagit.BagValidationError(
+            _("Malformed Payload-Oxum value: %(oxum)s") % {"oxum": oxum}
+        )
+    payload = [
+        size for path, (size, __) in files.items() if path.startswith(PAYLOAD_DIR)
+    ]
+    if (file_count, byte_count) != (len(payload), sum(payload)):
+        raise bagit.BagValidationError(
+            _(
+                "Payload-Oxum validation failed. Expected %(oxum_file_count)d files"
+                " and %(oxum_byte_count)d bytes but found %(found_file_count)d"
+                " files and %(found_byte_count)d bytes"
+            )
+            % {
+                "oxum_file_count": file_count,
+                "oxum_byte_count": byte_count,
+                "found_file_count": len(payload),
+                "found_byte_count": sum(payload),
+            }
+        )
+
+
+def _check_bag(algorithms, files, tag_files):
+    if "bagit.txt" not in tag_files:
+        raise UnsupportedArchive(_("The archive does not contain bagit.txt"))
+    manifests = {}
+    tag_manifests = {}
+    for path, content in tag_files.items():
+        match = MANIFEST_RE.match(path)
+        if match is None:
+            continue
+        if match.group(2) not in algorithms:
+            raise UnsupportedArchive(
+                _("The %(algorithm)s checksums were not computed")
+                % {"algorithm": match.group(2)}
+            )
+        if match.group(1):
+            tag_manifests[match.group(2)] = _parse_manifest(content)
+        else:
+            manifests[match.group(2)] = _parse_manifest(content)
+    if not manifests:
+        raise UnsupportedArchive(_("The archive does not contain manifests"))
+
+    if "bag-info.txt" in tag_files:
+        _check_payload_oxum(_parse_bag_info(tag_files["bag-info.txt"]), files)
+
+    # Completeness
+    payload_entries = set()
+    for entries in manifests.values():
+        payload_entries.update(entries)
+    tag_entries = set()
+    for entries in tag_manifests.values():
+        tag_entries.update(entries)
+    details = [
+        bagit.FileMissing(path)
+        for path in sorted((payload_entries | tag_entries) - set(files))
+    ]
+    details.extend(
+        bagit.UnexpectedFile(path)
+        for path in sorted(files)
+        if path.startswith(PAYLOAD_DIR) and path not in payload_entries
+    )
+    if details:
+        raise bagit.BagValidationError(_("Bag validation failed"), details)
+
+    # Checksums
+    for algorithm, entries in list(manifests.items()) + list(tag_manifests.items()):
+        for path, expected in sorted(entries.items()):
+            found = files[path][1][algorithm]
+            if found != expected:
+                details.append(bagit.ChecksumMismatch(path, algorithm, expected, found))
+    if details:
+        raise bagit.BagValidationError(_("Bag validation failed"), details)
+
+
+def validate_archive(path, processes=1):
+    """Validate the bag in the archive at ``path`` without extracting it.
+
+    :param processes: number of threads hashing the files.
+    :returns: True if the bag is valid or None if it can't be validated this
+        way, e.g. the archive format is not supported, it contains more than
+        the bag or the bag has manifests of algorithms not computed.
+    :raises bagit.BagValidationError: if the bag is not valid, with the same
+        message and details as ``bagit.Bag.validate``.
+    """
+    try:
+        algorithms, files, tag_files = _hash_archive(path, processes)
+        _check_bag(algorithms, files, tag_files)
+    except (
+        UnsupportedArchive,
+        EnvironmentError,
+        EOFError,
+        subprocess.CalledProcessError,
+        tarfile.TarError,
+        zipfile.BadZipfile,
+    ) as err:
+        LOGGER.info("Unable to validate %s without extracting it: %s", path, err)
+        return None
+    return True
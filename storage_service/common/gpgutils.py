@@ -12,7 +12,9 @@ from __future__ import absolute_import
 
 # stdlib, alphabetical
 import logging
+import os
 from pathlib import Path
+import threading
 
 # Third party dependencies, alphabetical
 import gnupg
@@ -39,6 +41,11 @@ ENCR_WORKS = "yes"
 ENCR_FAILS = "no"
 
 
+# Files and directories of the GnuPG home whose changes invalidate the cached
+# key listings, for GnuPG v1 and v2 keyrings
+KEYRING_FILES = ("pubring.gpg", "secring.gpg", "pubring.kbx", "private-keys-v1.d")
+
+
 class GPGBinaryPathError(Exception):
     """Raised when the GnuPG binary could not be found in the system path."""
 
@@ -51,6 +58,9 @@ class GPG(object):
 
     def __init__(self):
         self._gpg = None
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._processes = None
 
     def __call__(self):
         if not self._gpg:
@@ -61,6 +71,51 @@ class GPG(object):
             )
         return self._gpg
 
+    def list_keys(self, secret=False):
+        """Return the keys of the keyring like ``gnupg.GPG.list_keys``.
+
+        The listings are cached until the keyring files change, on disk or
+        through ``invalidate``, so that listing keys does not run GnuPG each
+        time. They must not be modified.
+        """
+        signature = self._keyring_signature()
+        with self._lock:
+            cached = self._keys.get(secret)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        keys = self().list_keys(secret)
+        with self._lock:
+            self._keys[secret] = (signature, keys)
+        return keys
+
+    def invalidate(self):
+        """Forget the cached key listings, after keys are created, imported
+        or deleted."""
+        with self._lock:
+            self._keys.clear()
+
+    def _keyring_signature(self):
+        gnupghome = self().gnupghome
+        signature = []
+        for name in KEYRING_FILES:
+            try:
+                stat = os.stat(os.path.join(gnupghome, name))
+            except OSError:
+                continue
+            signature.append((name, stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        return tuple(signature)
+
+    @property
+    def processes(self):
+        """Semaphore limiting the number of GnuPG processes encrypting or
+        decrypting files at the same time to ``settings.GNUPG_PROCESSES``."""
+        with self._lock:
+            if self._processes is None:
+                self._processes = threading.BoundedSemaphore(
+                    max(1, settings.GNUPG_PROCESSES)
+                )
+            return self._processes
+
     def _get_gnupg_home_path(self):
         """Find and return the home path for GnuPG to store its config."""
         gnupg_home_path = settings.GNUPG_HOME_PATH
@@ -94,7 +149,7 @@ def get_gpg_key(fingerprint):
     """Return the GPG key with fingerprint ``fingerprint`` or None if there is
     no such key in the SS's GPG keyring.
     """
-    key_map = gpg().list_keys(True).key_map  # ``True`` means return private keys
+    key_map = gpg.list_keys(True).key_map  # ``True`` means return private keys
     return key_map.get(fingerprint)
 
 
@@ -102,11 +157,11 @@ def get_gpg_key_list():
     """Return a list of all GPG keys as dicts. If the Storage Service default
     key does not exist, we create it here before returning the list.
     """
-    keys = gpg().list_keys(True)
+    keys = gpg.list_keys(True)
     default_key = get_default_gpg_key(keys)
     if not default_key:
         generate_default_gpg_key()
-        keys = gpg().list_keys(True)
+        keys = gpg.list_keys(True)
     return keys
 
 
@@ -138,6 +193,7 @@ def generate_default_gpg_key():
     )
     LOGGER.info("Creating default AM SS key with name %s", DFLT_KEY_REAL_NAME)
     gpg().gen_key(input_data)
+    gpg.invalidate()
     LOGGER.info("Finished creating default AM SS key with name %s", DFLT_KEY_REAL_NAME)
 
 
@@ -150,7 +206,9 @@ def generate_gpg_key(name_real, name_email):
         name_email=name_email,
         passphrase=DFLT_KEY_PASSPHRASE,
     )
-    return gpg().gen_key(input_data)
+    key = gpg().gen_key(input_data)
+    gpg.invalidate()
+    return key
 
 
 def import_gpg_key(ascii_armor):
@@ -159,6 +217,7 @@ def import_gpg_key(ascii_armor):
     indicating why and delete any key created in the process.
     """
     import_result = gpg().import_keys(ascii_armor)
+    gpg.invalidate()
     if import_result.count == 1:
         fingerprint = import_result.fingerprints[0]
         it_works = encryption_works(fingerprint)
@@ -213,6 +272,7 @@ def export_gpg_key(fingerprint):
 def delete_gpg_key(fingerprint):
     """Delete the GPG key with fingerprint ``fingerprint``.  """
     result = gpg().delete_keys(fingerprint, True)
+    gpg.invalidate()
     try:
         assert str(result) == "ok"
         return True
@@ -224,7 +284,7 @@ def gpg_decrypt_file(path, decr_path):
     """Use GPG to decrypt the file at ``path`` and save the decrypted file to
     ``decr_path``.
     """
-    with open(path, "rb") as stream:
+    with gpg.processes, open(path, "rb") as stream:
         return gpg().decrypt_file(stream, output=decr_path)
 
 
@@ -235,7 +295,7 @@ def gpg_encrypt_file(path, recipient_fingerprint):
     result <gnupg.Crypt> object are returned.
     """
     encr_path = path + ".gpg"
-    with open(path, "rb") as stream:
+    with gpg.processes, open(path, "rb") as stream:
         result = gpg().encrypt_file(
             stream,
             [recipient_fingerprint],
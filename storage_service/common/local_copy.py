@@ -0,0 +1,397 @@
+"""Copies between locally accessible filesystems, without rsync.
+
+``copy`` copies files and directories the way the storage service used to run
+``rsync -t -O -r --chmod=Fug+rw,o-rwx,Dug+rwx,o-rwx source destination``: the
+paths are interpreted the same way, modification times are preserved, the
+permissions are set as the files are written and unchanged files are skipped.
+
+The data of each file is copied by the kernel, cloning it (reflink) where the
+filesystem supports it, and the files are copied by a pool of threads. A file
+whose copy was interrupted is resumed from where it stopped by the next copy
+of the same version of the file, like ``rsync --partial`` does. The partial
+copies that can't be resumed anymore are removed once the copy succeeds.
+"""
+
+from __future__ import absolute_import
+
+# stdlib, alphabetical
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import errno
+import fcntl
+import logging
+import os
+import re
+import shutil
+import stat
+import tempfile
+
+# Core Django, alphabetical
+from django.conf import settings
+from django.utils.translation import ugettext as _
+
+# Third party dependencies, alphabetical
+import scandir
+
+LOGGER = logging.getLogger(__name__)
+
+# ioctl cloning a whole file, see ioctl_ficlone(2)
+FICLONE = 0x40049409
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# Files submitted to the pool ahead of those being copied, per thread, so that
+# the copies of large trees don't hold a pending future per file
+PENDING_FILES_PER_THREAD = 4
+# Files from which size a copy interrupted is resumed, the partial copies of
+# smaller files are removed
+RESUMABLE_SIZE = 64 * 1024 * 1024
+# Name of the partial copies, see _partial_path
+PARTIAL_RE = re.compile(r"^\.(?P<basename>.+)\.\d+-\d+\.partial$")
+# Errors meaning the kernel can't copy between these files, in which case the
+# data is read and written instead
+UNSUPPORTED_COPY_ERRNOS = (
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.ETXTBSY,
+    errno.EBADF,
+)
+
+
+class CopyError(Exception):
+    """Some files could not be copied."""
+
+
+def is_remote_path(path):
+    """Return True if rsync would treat ``path`` as remote, i.e. it starts
+    with ``[user@]host:``, ``host::`` or ``rsync://``."""
+    return ":" in path.split("/", 1)[0]
+
+
+def _file_mode(mode):
+    # --chmod=Fug+rw,o-rwx
+    return (stat.S_IMODE(mode) | 0o660) & ~0o007
+
+
+def _directory_mode(mode):
+    # --chmod=Dug+rwx,o-rwx
+    return (stat.S_IMODE(mode) | 0o770) & ~0o007
+
+
+def _copy_data(source_fd, destination_fd, size, offset=0):
+    if not offset:
+        try:
+            fcntl.ioctl(destination_fd, FICLONE, source_fd)
+            return
+        except (IOError, OSError):
+            pass
+    os.lseek(source_fd, offset, os.SEEK_SET)
+    os.lseek(destination_fd, offset, os.SEEK_SET)
+    copied = offset
+    try:
+        while copied < size:
+            count = min(COPY_CHUNK_SIZE, size - copied)
+            if hasattr(os, "copy_file_range"):
+                sent = os.copy_file_range(source_fd, destination_fd, count)
+            else:
+                sent = os.sendfile(destination_fd, source_fd, copied, count)
+            if not sent:
+                break
+            copied += sent
+        return
+    except OSError as err:
+        if err.errno not in UNSUPPORTED_COPY_ERRNOS or copied > offset:
+            raise
+    with os.fdopen(os.dup(source_fd), "rb") as source, os.fdopen(
+        os.dup(destination_fd), "wb"
+    ) as destination:
+        source.seek(offset)
+        destination.seek(offset)
+        shutil.copyfileobj(source, destination, COPY_CHUNK_SIZE)
+
+
+def _partial_path(destination, source_stat):
+    # Named after the version of the source, which it is a partial copy of
+    directory, basename = os.path.split(destination)
+    return os.path.join(
+        directory,
+        ".{}.{}-{}.partial".format(
+            basename, source_stat.st_size, source_stat.st_mtime_ns
+        ),
+    )
+
+
+def _open_partial(destination, source_stat):
+    """Open the file the source is copied to before being renamed to
+    ``destination`` and return its path, file descriptor and whether it is
+    kept to be resumed if the copy fails.
+
+    That is the partial copy of the source, locked against other copies of it,
+    if it is at least ``RESUMABLE_SIZE`` bytes and a temporary file otherwise.
+    """
+    if source_stat.st_size >= RESUMABLE_SIZE:
+        path = _partial_path(destination, source_stat)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError):
+            # Being written by another copy
+            os.close(fd)
+        else:
+            # The partial copies of other versions of the source can't be
+            # resumed anymore
+            directory, basename = os.path.split(destination)
+            remove_partials(directory, basename, keep=path)
+            return path, fd, True
+    directory, basename = os.path.split(destination)
+    fd, path = tempfile.mkstemp(prefix="." + basename + ".", dir=directory)
+    return path, fd, False
+
+
+def remove_partials(directory, basename=None, keep=None):
+    """Remove the partial copies left in ``directory`` by copies that failed,
+    those of the file ``basename`` if given, except ``keep`` and those being
+    written."""
+    try:
+        entries = list(scandir.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        match = PARTIAL_RE.match(entry.name)
+        if (
+            match is None
+            or entry.path == keep
+            or (basename is not None and match.group("basename") != basename)
+        ):
+            continue
+        try:
+            fd = os.open(entry.path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            LOGGER.debug("Removing partial copy %s", entry.path)
+            os.remove(entry.path)
+        except (IOError, OSError):
+            pass
+        finally:
+            os.close(fd)
+
+
+def _resume_offset(source_fd, partial_fd, size):
+    """Return the offset to resume the partial copy ``partial_fd`` from, 0
+    unless its last bytes match the source: the data written just before a
+    crash may not have reached the disk."""
+    offset = os.fstat(partial_fd).st_size
+    if not offset or offset > size:
+        return 0
+    count = min(offset, COPY_CHUNK_SIZE)
+    if os.pread(partial_fd, count, offset - count) != os.pread(
+        source_fd, count, offset - count
+    ):
+        return 0
+    return offset
+
+
+def _is_unchanged(source_stat, destination):
+    # rsync's quick check: same size and modification time
+    try:
+        destination_stat = os.stat(destination)
+    except OSError:
+        return False
+    return stat.S_ISREG(destination_stat.st_mode) and (
+        destination_stat.st_size == source_stat.st_size
+        and int(destination_stat.st_mtime) == int(source_stat.st_mtime)
+    )
+
+
+def copy_file(source, destination, fsync=False):
+    """Copy the file ``source`` to the path ``destination``, through a
+    partial file renamed once complete. Returns False if the copy was
+    skipped because ``destination`` is unchanged.
+
+    If the copy fails the partial file is kept, for the next copy of the same
+    version of ``source`` to resume it."""
+    source_stat = os.stat(source)
+    if _is_unchanged(source_stat, destination):
+        return False
+    temp_path, fd, resumable = _open_partial(destination, source_stat)
+    try:
+        with open(source, "rb") as source_file, os.fdopen(fd, "wb") as temp_file:
+            offset = _resume_offset(
+                source_file.fileno(), temp_file.fileno(), source_stat.st_size
+            )
+            if offset:
+                LOGGER.debug("Resuming the copy of %s at byte %d", source, offset)
+            else:
+                temp_file.truncate(0)
+            _copy_data(
+                source_file.fileno(),
+                temp_file.fileno(),
+                source_stat.st_size,
+                offset,
+            )
+            temp_file.flush()
+            os.fchmod(temp_file.fileno(), _file_mode(source_stat.st_mode))
+            if fsync:
+                os.fsync(temp_file.fileno())
+        os.utime(temp_path, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        os.rename(temp_path, destination)
+    except BaseException:
+        if not resumable:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        raise
+    return True
+
+
+def _make_directory(path, mode):
+    try:
+        os.mkdir(path, _directory_mode(mode))
+    except OSError as err:
+        if err.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+        return
+    # mkdir applies the umask
+    os.chmod(path, _directory_mode(mode))
+
+
+def _iter_tree(source, destination):
+    """Generate the directories, in top-down order, and the files of the
+    ``source`` tree, with their path under ``destination``."""
+    for dirpath, dirnames, filenames in scandir.walk(source):
+        target = os.path.join(destination, os.path.relpath(dirpath, source))
+        for name in list(dirnames):
+            if os.path.islink(os.path.join(dirpath, name)):
+                LOGGER.warning(
+                    "Skipping non-regular file %s", os.path.join(dirpath, name)
+                )
+                dirnames.remove(name)
+        yield dirpath, os.path.normpath(target), True
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.islink(path) or not os.path.isfile(path):
+                LOGGER.warning("Skipping non-regular file %s", path)
+                continue
+            yield path, os.path.join(target, name), False
+
+
+def copy(source, destination, threads=None, fsync=None, on_file=None):
+    """Copy ``source`` to ``destination`` like ``rsync -r`` does.
+
+    If ``source`` is a directory ending with a slash its content is copied to
+    the directory ``destination``, created if needed, otherwise ``source``
+    itself is copied into it. A file is copied into ``destination`` if it is
+    a directory or ends with a slash, or to ``destination`` otherwise.
+
+    :param threads: number of files copied concurrently, defaults to
+        ``settings.LOCAL_COPY_THREADS``.
+    :param fsync: flush every file copied to disk before renaming it and the
+        directories written to once done, defaults to
+        ``settings.LOCAL_COPY_FSYNC``.
+    :param on_file: called with the size of every file copied or skipped as
+        unchanged and whether it was copied, from the calling thread.
+    :raises CopyError: if any file could not be copied, after trying them all.
+    """
+    if threads is None:
+        threads = settings.LOCAL_COPY_THREADS
+    if fsync is None:
+        fsync = settings.LOCAL_COPY_FSYNC
+
+    try:
+        if os.path.isfile(source):
+            if destination.endswith("/"):
+                _make_directory(destination, 0o755)
+            if os.path.isdir(destination):
+                destination = os.path.join(destination, os.path.basename(source))
+            copied = copy_file(source, destination, fsync=fsync)
+            directory, basename = os.path.split(destination)
+            remove_partials(directory, basename)
+            if on_file is not None:
+                on_file(os.path.getsize(destination), copied)
+            return
+        if not os.path.isdir(source):
+            raise CopyError(
+                _("%(path)s is neither a file nor a directory, may not exist")
+                % {"path": source}
+            )
+        if os.path.basename(source) not in ("", "."):
+            _make_directory(destination, os.stat(source).st_mode)
+            destination = os.path.join(destination, os.path.basename(source))
+    except (IOError, OSError) as err:
+        raise CopyError(
+            _("Unable to copy %(path)s: %(error)s") % {"path": source, "error": err}
+        )
+
+    errors = []
+    directories = []
+    written_directories = set()
+    threads = max(1, threads)
+
+    def collect(futures):
+        for future in futures:
+            path, target = pending.pop(future)
+            try:
+                copied = future.result()
+                if copied and fsync:
+                    written_directories.add(os.path.dirname(target))
+                if on_file is not None:
+                    on_file(os.path.getsize(target), copied)
+            except (IOError, OSError) as err:
+                errors.append((path, err))
+
+    pending = {}
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for path, target, is_dir in _iter_tree(source, destination):
+            if is_dir:
+                try:
+                    _make_directory(target, os.stat(path).st_mode)
+                    directories.append(target)
+                except OSError as err:
+                    errors.append((path, err))
+                continue
+            if len(pending) >= threads * PENDING_FILES_PER_THREAD:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            pending[executor.submit(copy_file, path, target, fsync)] = (path, target)
+        collect(wait(pending).done)
+    if not errors:
+        # Those of the files that changed or were removed since a failed copy
+        for directory in directories:
+            remove_partials(directory)
+    if fsync:
+        for directory in written_directories:
+            _fsync_directory(directory)
+    if errors:
+        for path, err in errors:
+            LOGGER.warning("Unable to copy %s: %s", path, err)
+        raise CopyError(
+            _("Unable to copy %(count)d files, e.g. %(path)s: %(error)s")
+            % {"count": len(errors), "path": errors[0][0], "error": errors[0][1]}
+        )
+
+
+def _fsync_directory(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def add_permissions(path, mode):
+    """Add the permission bits ``mode`` to ``path`` and, if it is a directory,
+    to everything under it, like ``chmod --recursive``. Failures are ignored,
+    as they are by ``chmod``."""
+    paths = [path]
+    if os.path.isdir(path) and not os.path.islink(path):
+        for dirpath, dirnames, filenames in scandir.walk(path):
+            paths.extend(os.path.join(dirpath, name) for name in dirnames + filenames)
+    for entry in paths:
+        try:
+            entry_stat = os.lstat(entry)
+            if not stat.S_ISLNK(entry_stat.st_mode):
+                os.chmod(entry, stat.S_IMODE(entry_stat.st_mode) | mode)
+        except OSError as err:
+            LOGGER.debug("Unable to change the permissions of %s: %s", entry, err)
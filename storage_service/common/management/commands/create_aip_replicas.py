@@ -9,36 +9,40 @@ If an AIP Store location is not specified with the --location argument,
 the task will create replicas for all AIPs in the default AIP Storage
 location.
 
+The replicas are created by --processes worker processes, the largest AIPs
+first unless --smallest-first. At most --per-space replicas are written to a
+Space at the same time and, with --bytes-per-second, at that rate on average.
+With --progress-file the replicas created are recorded in that file and not
+created again when the command is run again with it. With --dry-run the
+replicas that would be created are counted and their duration estimated.
+
 Execution example:
-./manage.py create_aip_replicas --location <UUID>
+./manage.py create_aip_replicas --location <UUID> --processes 4 --progress-file replicas.txt
 """
 from __future__ import absolute_import, print_function
+import datetime
 import logging
 
+from django.conf import settings
 from django.core.management.base import CommandError
+from django.template.defaultfilters import filesizeformat
 
 from administration.models import Settings
 from common.management.commands import StorageServiceCommand
-from locations.models.package import Package
+from locations import replication
 
 # Suppress the logging from models/package.py.
 logging.config.dictConfig({"version": 1, "disable_existing_loggers": True})
 
 
-class ReplicaDeleteException(Exception):
-    pass
-
-
-def get_replica_count(aip_uuid):
-    """Return number of replicas for given AIP
-
-    :param aip_uuid: AIP UUID
-
-    :returns: Number of replicas (int)
-    """
-    return Package.objects.filter(
-        replicated_package=aip_uuid, status=Package.UPLOADED
-    ).count()
+def read_progress(progress_file):
+    """Return the AIP and replicator location UUIDs of the replications
+    recorded in ``progress_file``."""
+    try:
+        with open(progress_file) as f:
+            return {tuple(line.split()) for line in f if line.strip()}
+    except (IOError, OSError):
+        return set()
 
 
 class Command(StorageServiceCommand):
@@ -69,12 +73,43 @@ class Command(StorageServiceCommand):
             help="UUID for Replicator location to create replicas"
             " Defaults to all configured Replicators for AIP Store.",
         )
+        parser.add_argument(
+            "--processes",
+            help="Number of worker processes, 0 to replicate in this process.",
+            type=int,
+            default=settings.REPLICATION_PROCESSES,
+        )
+        parser.add_argument(
+            "--per-space",
+            help="Number of replicas written to a Space at the same time.",
+            type=int,
+            default=settings.REPLICATION_SPACE_CONCURRENCY,
+        )
+        parser.add_argument(
+            "--bytes-per-second",
+            help="Bytes written per second allowed in each Space, 0 is unlimited.",
+            type=int,
+            default=settings.REPLICATION_SPACE_BYTES_PER_SECOND,
+        )
+        parser.add_argument(
+            "--smallest-first",
+            action="store_true",
+            help="Replicate the smallest AIPs first instead of the largest.",
+        )
+        parser.add_argument(
+            "--progress-file",
+            help="File recording the replicas created, skipped when running"
+            " the command again with the same file.",
+            default=None,
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the number and size of the replicas to create"
+            " and estimate how long it would take.",
+        )
 
     def handle(self, *args, **options):
-        delete_existing_replicas = False
-        if options["delete"]:
-            delete_existing_replicas = True
-
         # Determine AIP storage location for which we'll be creating
         # replicas. Use default AIP Store if user did not supply a UUID.
         aip_store_uuid = options["aip_store_location"]
@@ -85,96 +120,92 @@ class Command(StorageServiceCommand):
             except Settings.DoesNotExist:
                 raise CommandError("No AIP Store location specified or set as default.")
 
-        aip_uuid = options["aip_uuid"]
-        replicator_uuid = options["replicator_location"]
-
-        aips = Package.objects.filter(
-            current_location=aip_store_uuid,
-            package_type=Package.AIP,
-            replicated_package=None,
-            status=Package.UPLOADED,
-        ).all()
-        if aip_uuid:
-            aips = aips.filter(uuid=aip_uuid)
-        if not aips:
+        jobs = replication.get_replication_jobs(
+            aip_store_uuid,
+            aip_uuid=options["aip_uuid"],
+            replicator_uuid=options["replicator_location"],
+            largest_first=not options["smallest_first"],
+        )
+        if not jobs:
             raise CommandError(
                 "No AIPs to replicate in location {}".format(aip_store_uuid)
             )
-
-        aips_count = len(aips)
-        success_count = 0
-        deleted_count = 0
-
-        self.info("AIPs to replicate: {}".format(aips_count))
-
-        for aip in aips:
-            if delete_existing_replicas:
-                self.info("Deleting existing replicas of AIP {}".format(aip.uuid))
-                aip_deleted_replicas_count = self._delete_replicas(
-                    aip.uuid, replicator_uuid
+        aips_count = len({job.aip_uuid for job in jobs})
+        progress_file = options["progress_file"]
+        if progress_file:
+            done = read_progress(progress_file)
+            jobs = [
+                job for job in jobs if (job.aip_uuid, job.replicator_uuid) not in done
+            ]
+
+        self.info(
+            "AIPs to replicate: {}, replicas to create: {} ({})".format(
+                aips_count, len(jobs), filesizeformat(sum(job.size for job in jobs))
+            )
+        )
+        if options["dry_run"]:
+            duration = replication.estimate_duration(
+                jobs,
+                processes=options["processes"],
+                per_space=options["per_space"],
+                bytes_per_second=options["bytes_per_second"],
+            )
+            self.info(
+                "Estimated duration: {}, assuming each replica is written at"
+                " {}/s".format(
+                    datetime.timedelta(seconds=int(duration)),
+                    filesizeformat(replication.ESTIMATED_BYTES_PER_SECOND),
                 )
-                deleted_count += aip_deleted_replicas_count
-
-            replicas_initial_count = get_replica_count(aip.uuid)
-
-            self.info("Creating new replicas for AIP {}".format(aip.uuid))
-            aip.create_replicas(replicator_uuid=replicator_uuid, delete_replicas=False)
-
-            # Validate that new replicas were created.
-            replicas_count = get_replica_count(aip.uuid)
-            if not replicas_count > replicas_initial_count:
-                self.error("Replicas not created for AIP {}".format(aip.uuid))
-                continue
-
-            self.info("AIP {} successfully replicated".format(aip.uuid))
-            success_count += 1
+            )
+            return
+
+        self.deleted_count = 0
+        self.replicated_aips = set()
+        self.progress = open(progress_file, "a") if progress_file else None
+        try:
+            scheduler = replication.ReplicationScheduler(
+                processes=options["processes"],
+                per_space=options["per_space"],
+                bytes_per_second=options["bytes_per_second"],
+                delete=options["delete"],
+                on_result=self.report,
+            )
+            scheduler.run(jobs)
+        finally:
+            if self.progress is not None:
+                self.progress.close()
 
         self.success(
             "Replica creation complete. {} existing replicas deleted. "
             "New replicas created for {} of {} AIPs in location.".format(
-                deleted_count, success_count, aips_count
+                self.deleted_count, len(self.replicated_aips), aips_count
             )
         )
 
-    def _delete_replicas(self, aip_uuid, replicator_uuid):
-        """Delete all existing replicas of an AIP
-
-        :param aip_uuid: UUID of AIP whose replicas we are deleting.
-        :param replicator_uuid: UUID of Replicator in which to delete AIP
-            replicas.
-
-        :returns: Number of replicas deleted (int)
-        """
-        deleted_count = 0
-        existing_replicas = Package.objects.filter(
-            replicated_package=aip_uuid, status=Package.UPLOADED
-        ).all()
-        if replicator_uuid:
-            existing_replicas = existing_replicas.filter(
-                current_location__uuid=replicator_uuid
+    def report(self, job, result, error):
+        if error is not None:
+            self.error(
+                "Replicas not created for AIP {} in {}: {}".format(
+                    job.aip_uuid, job.replicator_uuid, error
+                )
             )
-        for replica in existing_replicas:
-            try:
-                self._delete_replica(replica)
-                deleted_count += 1
-            except ReplicaDeleteException as err:
-                self.error(
-                    "Unable to delete existing replica {} of AIP {}: {}".format(
-                        replica.uuid, aip_uuid, err
-                    )
+            return
+        self.deleted_count += result.deleted
+        for delete_error in result.delete_errors:
+            self.error(delete_error)
+        if not result.created:
+            self.error(
+                "Replicas not created for AIP {} in {}".format(
+                    job.aip_uuid, job.replicator_uuid
                 )
-        return deleted_count
-
-    def _delete_replica(self, replica):
-        """Delete replica from filesystem and update Package status
-
-        If filesystem deletion is successful, the replica's status will be
-        set to Package.DELETED by `replica.delete_from_storage()`.
-
-        :param replica: Package object of replicated AIP to delete.
-        """
-        fs_deletion = replica.delete_from_storage()
-        fs_deletion_success = fs_deletion[0]
-        if not fs_deletion_success:
-            error_msg = fs_deletion[1]
-            raise ReplicaDeleteException(error_msg)
+            )
+            return
+        self.info(
+            "AIP {} successfully replicated to {}".format(
+                job.aip_uuid, job.replicator_uuid
+            )
+        )
+        self.replicated_aips.add(job.aip_uuid)
+        if self.progress is not None:
+            self.progress.write("{} {}\n".format(job.aip_uuid, job.replicator_uuid))
+            self.progress.flush()
@@ -30,6 +30,16 @@ uncompressed---is expected to be an uncompressed AIP. That's what the
 indicates which compression algorithm to use for the final, compressed AIP. The
 final AIP in this case will be compressed and will have a pointer file.
 
+To import many AIPs, list them in a file, one path per line, and pass it with
+``--manifest``, or match them with a glob pattern passed with ``--glob``. The
+AIPs are then validated, compressed and stored by ``--processes`` worker
+processes per stage, the stages of different AIPs running at the same time.
+The progress of every AIP is recorded in the ``AIPImport`` table, running the
+same command again resumes the imports not completed and ``--retry-failed``
+retries those that failed. For instance::
+
+    $ make manage-ss ARG='import_aip --glob "/mnt/legacy/*.7z" --decompress-source --compression-algorithm="7z with bzip" --processes 4'
+
 To get help::
 
     $ make manage-ss ARG='import_aip -h'
@@ -48,7 +58,9 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from __future__ import absolute_import
+from collections import deque
 import glob
+import json
 import logging
 import os
 from pwd import getpwnam
@@ -57,11 +69,14 @@ import shutil
 import subprocess
 import tarfile
 import tempfile
+import time
 
 import bagit
 import scandir
 from django.core.management.base import BaseCommand
 from django.db.utils import IntegrityError
+from django.template.defaultfilters import filesizeformat
+from django.utils.six.moves import queue
 
 from administration.models import Settings
 from common import premis, utils
@@ -80,6 +95,8 @@ ANSI_OKGREEN = "\033[92m"
 ANSI_WARNING = "\033[93m"
 ANSI_FAIL = "\033[91m"
 ANSI_ENDC = "\033[0m"
+# Seconds between two reports of the throughput of a bulk import
+REPORT_INTERVAL = 60
 
 
 class Command(BaseCommand):
@@ -87,7 +104,38 @@ class Command(BaseCommand):
     help = "Import an AIP into the Storage Service"
 
     def add_arguments(self, parser):
-        parser.add_argument("aip_path", help="Full path to the AIP to be imported")
+        parser.add_argument(
+            "aip_path",
+            help="Full path to the AIP to be imported",
+            nargs="?",
+            default=None,
+        )
+        parser.add_argument(
+            "--manifest",
+            help="Path of a file listing the full paths of the AIPs to be"
+            " imported, one per line.",
+            default=None,
+        )
+        parser.add_argument(
+            "--glob",
+            help="Glob pattern matching the full paths of the AIPs to be imported.",
+            default=None,
+        )
+        parser.add_argument(
+            "--processes",
+            help="Number of worker processes for each stage of the import of"
+            " the AIPs of --manifest or --glob, 0 to import them in this"
+            " process. Default: 1",
+            type=int,
+            default=1,
+        )
+        parser.add_argument(
+            "--retry-failed",
+            help="Retry the imports of the AIPs of --manifest or --glob that"
+            " failed before.",
+            action="store_true",
+            default=False,
+        )
         parser.add_argument(
             "--aip-storage-location",
             help="UUID of the AIP Storage Location where the imported AIP"
@@ -140,6 +188,26 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
+        if options["manifest"] or options["glob"]:
+            try:
+                bulk_import(
+                    read_sources(options["manifest"], options["glob"]),
+                    options["aip_storage_location"],
+                    options["decompress_source"],
+                    options["compression_algorithm"],
+                    options["pipeline"],
+                    options["unix_owner"],
+                    options["force"],
+                    options["tmp_dir"],
+                    options["processes"],
+                    options["retry_failed"],
+                )
+            except ImportAIPException as err:
+                print(fail(err))
+            return
+        if not options["aip_path"]:
+            print(fail("Pass the path of an AIP, --manifest or --glob."))
+            return
         print(header("Attempting to import the AIP at {}.".format(options["aip_path"])))
         try:
             import_aip(
@@ -214,25 +282,25 @@ def _decompress(aip_path, temp_dir):
 def _decompress_tar_gz(aip_path, temp_dir):
     with tarfile.open(aip_path) as tar:
         aip_root_dir = os.path.commonprefix(tar.getnames())
+
         def is_within_directory(directory, target):
-            
+
             abs_directory = os.path.abspath(directory)
             abs_target = os.path.abspath(target)
-        
+
             prefix = os.path.commonprefix([abs_directory, abs_target])
-            
+
             return prefix == abs_directory
-        
+
         def safe_extract(tar, path=".", members=None, *, numeric_owner=False):
-        
+
             for member in tar.getmembers():
                 member_path = os.path.join(path, member.name)
                 if not is_within_directory(path, member_path):
                     raise Exception("Attempted Path Traversal in Tar File")
-        
-            tar.extractall(path, members, numeric_owner=numeric_owner) 
-            
-        
+
+            tar.extractall(path, members, numeric_owner=numeric_owner)
+
         safe_extract(tar, path=temp_dir)
     return os.path.join(temp_dir, aip_root_dir)
 
@@ -403,6 +471,21 @@ def compress(aip_model_inst, compression_algorithm):
     """
     if not compression_algorithm:
         return
+    details = compress_package(aip_model_inst, compression_algorithm)
+    compression_agents = [premis.SS_AGENT]
+    compression_event = premis.create_premis_aip_compression_event(
+        details["event_detail"],
+        details["event_outcome_detail_note"],
+        agents=compression_agents,
+    )
+    return aip_model_inst, compression_event, compression_agents
+
+
+def compress_package(aip_model_inst, compression_algorithm):
+    """Compress the AIP in place of the uncompressed one, update the Package
+    model's ``current_path`` and ``size`` attributes and return the details
+    of the compression returned by its ``compress_package`` method.
+    """
     (
         compressed_aip_path,
         compressed_aip_parent_path,
@@ -419,13 +502,7 @@ def compress(aip_model_inst, compression_algorithm):
     aip_model_inst.current_path = new_current_path
     shutil.rmtree(compressed_aip_parent_path)
     aip_model_inst.size = utils.recalculate_size(new_full_path)
-    compression_agents = [premis.SS_AGENT]
-    compression_event = premis.create_premis_aip_compression_event(
-        details["event_detail"],
-        details["event_outcome_detail_note"],
-        agents=compression_agents,
-    )
-    return aip_model_inst, compression_event, compression_agents
+    return details
 
 
 def import_aip(
@@ -488,3 +565,415 @@ def import_aip(
         )
     )
     print(okgreen("Successfully imported AIP {}.".format(aip_uuid)))
+
+
+def read_sources(manifest=None, pattern=None):
+    """Return the paths of the AIPs listed in the file ``manifest``, one per
+    line, and of those matched by the glob ``pattern``, without duplicates.
+    Blank lines and lines starting with "#" are ignored.
+    """
+    sources = []
+    if manifest:
+        try:
+            with open(manifest) as f:
+                sources.extend(
+                    line.strip()
+                    for line in f
+                    if line.strip() and not line.startswith("#")
+                )
+        except (IOError, OSError) as err:
+            raise ImportAIPException(
+                "Unable to read the manifest {}: {}".format(manifest, err)
+            )
+    if pattern:
+        sources.extend(sorted(glob.glob(pattern)))
+    unique_sources = []
+    unique_sources_set = set()
+    for source in sources:
+        source = os.path.abspath(source)
+        if source not in unique_sources_set:
+            unique_sources_set.add(source)
+            unique_sources.append(source)
+    return unique_sources
+
+
+def get_checkpoints(sources, retry_failed=False):
+    """Return the ids and stages of the imports of ``sources`` to run, in
+    order, recording those never started in the ``AIPImport`` table.
+
+    The imports that failed are skipped, unless ``retry_failed``. They are
+    retried from their last stage, or from the start if the AIP validated
+    is gone.
+    """
+    known = set(models.AIPImport.objects.values_list("source_path", flat=True))
+    models.AIPImport.objects.bulk_create(
+        [
+            models.AIPImport(source_path=source)
+            for source in sources
+            if source not in known
+        ],
+        batch_size=500,
+    )
+    wanted = set(sources)
+    checkpoints = []
+    imports = models.AIPImport.objects.exclude(stage=models.AIPImport.STORED)
+    if not retry_failed:
+        imports = imports.filter(error__isnull=True)
+    for checkpoint in imports.order_by("pk").iterator():
+        if checkpoint.source_path not in wanted:
+            continue
+        if checkpoint.error is not None:
+            checkpoint.error = None
+            if checkpoint.stage == models.AIPImport.VALIDATED and not (
+                os.path.exists(checkpoint.work_path)
+            ):
+                checkpoint.stage = models.AIPImport.PENDING
+            checkpoint.save()
+        checkpoints.append((checkpoint.pk, checkpoint.stage))
+    return checkpoints
+
+
+def _same_filesystem(path, other_path):
+    return os.stat(path).st_dev == os.stat(other_path).st_dev
+
+
+def _link_tree(source, destination):
+    """Hard link the files of the directory ``source`` into ``destination``."""
+    for root, dirs, files in scandir.walk(source):
+        target = os.path.join(destination, os.path.relpath(root, source))
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        for file_ in files:
+            os.link(os.path.join(root, file_), os.path.join(target, file_))
+
+
+def _bulk_temp_dir(checkpoint, options):
+    return os.path.join(
+        options["tmp_dir"] or tempfile.gettempdir(),
+        "import-aip-{}".format(checkpoint.pk),
+    )
+
+
+def _validate_stage(checkpoint, options):
+    """Decompress the AIP if told to do so and validate it."""
+    confirm_aip_exists(checkpoint.source_path)
+    temp_dir = _bulk_temp_dir(checkpoint, options)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    aip_path = decompress(
+        checkpoint.source_path, options["decompress_source"], temp_dir
+    )
+    validate(aip_path)
+    aip_uuid = get_aip_uuid(get_aip_mets_path(aip_path))
+    if not options["force"] and models.Package.objects.filter(uuid=aip_uuid).exists():
+        raise ImportAIPException(
+            "An AIP with UUID {} already exists in this Storage Service".format(
+                aip_uuid
+            )
+        )
+    checkpoint.aip_uuid = aip_uuid
+    checkpoint.work_path = aip_path
+    return utils.recalculate_size(aip_path)
+
+
+def _compress_stage(checkpoint, options):
+    """Put the AIP in the local AIP storage location and compress it if told
+    to do so.
+
+    The copy is avoided when the AIP and the location share a filesystem: a
+    decompressed AIP is moved and the files of an AIP compressed next are hard
+    linked, the links being deleted once it is compressed.
+    """
+    local_as_location = models.Location.objects.get(uuid=options["local_location"])
+    aip_path = checkpoint.work_path
+    current_path = os.path.basename(os.path.normpath(aip_path))
+    dest = os.path.join(local_as_location.full_path, current_path)
+    if os.path.isdir(dest):
+        # Left by an attempt that failed
+        shutil.rmtree(dest)
+    same_filesystem = _same_filesystem(aip_path, local_as_location.full_path)
+    is_temporary = aip_path.startswith(
+        os.path.join(_bulk_temp_dir(checkpoint, options), "")
+    )
+    if same_filesystem and is_temporary:
+        os.rename(aip_path, dest)
+        fix_ownership(dest, options["unix_owner"])
+    elif same_filesystem and options["compression_algorithm"]:
+        _link_tree(aip_path, dest)
+    else:
+        copy_rsync(aip_path, dest)
+        fix_ownership(dest, options["unix_owner"])
+    aip_model_inst = models.Package(
+        uuid=checkpoint.aip_uuid,
+        package_type="AIP",
+        current_location=local_as_location,
+        current_path=current_path,
+        size=utils.recalculate_size(dest),
+    )
+    if options["compression_algorithm"]:
+        details = compress_package(aip_model_inst, options["compression_algorithm"])
+        checkpoint.compression_details = json.dumps(
+            {
+                "event_detail": details["event_detail"],
+                "event_outcome_detail_note": details["event_outcome_detail_note"],
+            }
+        )
+    checkpoint.work_path = aip_model_inst.current_path
+    return aip_model_inst.size
+
+
+def _store_stage(checkpoint, options):
+    """Create the AIP's Package and store it in its final location."""
+    local_as_location = models.Location.objects.get(uuid=options["local_location"])
+    aip_model_inst = models.Package(
+        uuid=checkpoint.aip_uuid,
+        package_type="AIP",
+        status="UPLOADED",
+        size=utils.recalculate_size(
+            os.path.join(local_as_location.full_path, checkpoint.work_path)
+        ),
+        origin_pipeline=models.Pipeline.objects.get(uuid=options["pipeline"]),
+        current_location=models.Location.objects.get(uuid=options["final_location"]),
+        current_path=checkpoint.work_path,
+    )
+    premis_events = premis_agents = None
+    if checkpoint.compression_details:
+        details = json.loads(checkpoint.compression_details)
+        premis_agents = [premis.SS_AGENT]
+        premis_events = [
+            premis.create_premis_aip_compression_event(
+                details["event_detail"],
+                details["event_outcome_detail_note"],
+                agents=premis_agents,
+            )
+        ]
+    save_aip_model_instance(aip_model_inst)
+    aip_model_inst.store_aip(
+        origin_location=local_as_location,
+        origin_path=aip_model_inst.current_path,
+        premis_events=premis_events,
+        premis_agents=premis_agents,
+    )
+    shutil.rmtree(_bulk_temp_dir(checkpoint, options), ignore_errors=True)
+    return aip_model_inst.size
+
+
+# The stages of a bulk import, by the stage of the AIPs they start from
+BULK_STAGES = (
+    ("validate", models.AIPImport.PENDING, _validate_stage),
+    ("compress", models.AIPImport.VALIDATED, _compress_stage),
+    ("store", models.AIPImport.COMPRESSED, _store_stage),
+)
+BULK_STAGE_RESULTS = (
+    models.AIPImport.VALIDATED,
+    models.AIPImport.COMPRESSED,
+    models.AIPImport.STORED,
+)
+
+
+def _run_stage(index, checkpoint_id, options):
+    """Run the stage ``index`` of ``BULK_STAGES`` of an import, in a worker
+    process, and record its completion.
+
+    Returns the size of the AIP and the duration of the stage.
+    """
+    start = time.time()
+    checkpoint = models.AIPImport.objects.get(pk=checkpoint_id)
+    size = BULK_STAGES[index][2](checkpoint, options)
+    checkpoint.stage = BULK_STAGE_RESULTS[index]
+    checkpoint.save()
+    return size, time.time() - start
+
+
+class StageThroughput(object):
+    """Number of AIPs, bytes and time spent by a stage of a bulk import."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.size = 0
+        self.busy = 0.0
+        self.started = None
+
+    def start(self, now):
+        if self.started is None:
+            self.started = now
+
+    def add(self, size, seconds):
+        self.count += 1
+        self.size += size or 0
+        self.busy += seconds
+
+    def report(self, now):
+        elapsed = max(now - (self.started or now), 1e-6)
+        return (
+            "{}: {} AIPs, {} in {:.0f}s, {:.1f} AIPs/min, {}/s,"
+            " {:.0f}s per AIP".format(
+                self.name,
+                self.count,
+                filesizeformat(self.size),
+                elapsed,
+                self.count * 60 / elapsed,
+                filesizeformat(self.size / elapsed),
+                self.busy / self.count if self.count else 0,
+            )
+        )
+
+
+class BulkImport(object):
+    """Imports AIPs through the stages of ``BULK_STAGES``.
+
+    Each stage has its own pool of ``processes`` worker processes, the
+    stages of different AIPs running at the same time. At most ``processes``
+    AIPs wait between two stages, so that the AIPs decompressed or copied
+    ahead of the following stage don't fill the disks. With 0 processes the
+    stages run in the current process, one at a time.
+
+    :param options: the options of the import passed to the stages.
+    :param on_result: called with the id of the ``AIPImport``, the name of
+        the stage and the exception that made it fail or None.
+    """
+
+    def __init__(self, options, processes=1, on_result=None):
+        self.options = options
+        self.processes = processes
+        self.on_result = on_result
+        self.throughput = [StageThroughput(name) for name, __, __ in BULK_STAGES]
+        self._pools = []
+        self._results = queue.Queue()
+
+    def run(self, checkpoints):
+        """Import the AIPs of ``checkpoints``, the ids and stages of their
+        ``AIPImport``. Returns the numbers of AIPs stored and failed."""
+        stage_indexes = {
+            stage: index for index, (__, stage, __) in enumerate(BULK_STAGES)
+        }
+        waiting = [deque() for __ in BULK_STAGES]
+        for checkpoint_id, stage in checkpoints:
+            waiting[stage_indexes[stage]].append(checkpoint_id)
+        running = [0] * len(BULK_STAGES)
+        slots = max(1, self.processes)
+        stored = failed = 0
+        last_report = time.time()
+        if self.processes:
+            self._pools = [utils.ProcessPool(self.processes) for __ in BULK_STAGES]
+        try:
+            while any(waiting) or any(running):
+                # Later stages first, to make room for the AIPs ahead of them
+                for index in reversed(range(len(BULK_STAGES))):
+                    while waiting[index] and running[index] < slots:
+                        if index + 1 < len(BULK_STAGES) and (
+                            running[index] + len(waiting[index + 1]) >= slots
+                        ):
+                            break
+                        self._start(index, waiting[index].popleft())
+                        running[index] += 1
+                index, checkpoint_id, result, error = self._results.get()
+                running[index] -= 1
+                if error is None:
+                    self.throughput[index].add(*result)
+                    if index + 1 < len(BULK_STAGES):
+                        waiting[index + 1].append(checkpoint_id)
+                    else:
+                        stored += 1
+                else:
+                    failed += 1
+                    models.AIPImport.objects.filter(pk=checkpoint_id).update(
+                        error=str(error) or repr(error)
+                    )
+                if self.on_result is not None:
+                    self.on_result(checkpoint_id, BULK_STAGES[index][0], error)
+                if time.time() - last_report >= REPORT_INTERVAL:
+                    last_report = time.time()
+                    self.report()
+        finally:
+            for pool in self._pools:
+                # All the stages started have been recorded
+                pool.terminate()
+            self._pools = []
+        return stored, failed
+
+    def _start(self, index, checkpoint_id):
+        self.throughput[index].start(time.time())
+        args = (index, checkpoint_id, self.options)
+        if not self._pools:
+            try:
+                result = _run_stage(*args)
+            except Exception as err:
+                self._results.put((index, checkpoint_id, None, err))
+            else:
+                self._results.put((index, checkpoint_id, result, None))
+            return
+        self._pools[index].apply_async(
+            _run_stage,
+            args,
+            callback=lambda result: self._results.put(
+                (index, checkpoint_id, result, None)
+            ),
+            error_callback=lambda err: self._results.put(
+                (index, checkpoint_id, None, err)
+            ),
+        )
+
+    def report(self):
+        now = time.time()
+        for throughput in self.throughput:
+            print(header(throughput.report(now)))
+
+
+def bulk_import(
+    sources,
+    aip_storage_location_uuid,
+    decompress_source,
+    compression_algorithm,
+    adoptive_pipeline_uuid,
+    unix_owner,
+    force,
+    tmp_dir,
+    processes=1,
+    retry_failed=False,
+):
+    """Import the AIPs at the paths ``sources``, see ``BulkImport``. The
+    imports completed before are skipped."""
+    checkpoints = get_checkpoints(sources, retry_failed)
+    print(
+        header(
+            "Importing {} AIPs, {} already imported or failed.".format(
+                len(checkpoints), len(sources) - len(checkpoints)
+            )
+        )
+    )
+    if not checkpoints:
+        return
+    local_as_location, final_as_location = get_aip_storage_locations(
+        aip_storage_location_uuid
+    )
+    options = {
+        "local_location": local_as_location.uuid,
+        "final_location": final_as_location.uuid,
+        "pipeline": get_pipeline(adoptive_pipeline_uuid).uuid,
+        "decompress_source": decompress_source,
+        "compression_algorithm": compression_algorithm,
+        "unix_owner": unix_owner,
+        "force": force,
+        "tmp_dir": tmp_dir,
+    }
+
+    def report(checkpoint_id, stage, error):
+        source_path = models.AIPImport.objects.get(pk=checkpoint_id).source_path
+        if error is not None:
+            print(fail("{}: {} failed: {}".format(source_path, stage, error)))
+        elif stage == BULK_STAGES[-1][0]:
+            print(okgreen("{}: imported.".format(source_path)))
+
+    importer = BulkImport(options, processes=processes, on_result=report)
+    stored, failed = importer.run(checkpoints)
+    importer.report()
+    print(okgreen("Successfully imported {} AIPs.".format(stored)))
+    if failed:
+        print(
+            warning(
+                "Unable to import {} AIPs, run again with --retry-failed to"
+                " retry them.".format(failed)
+            )
+        )
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Record the format of the stored packages whose format is unknown
+
+The format of the packages (compressed or not, compression algorithm, base
+directory, number of files and payload checksum algorithm) is recorded when
+they are stored. This command records it for the packages stored before, by
+fetching a local copy of each of them, once.
+
+Execution example:
+./manage.py record_package_format --space <space UUID> --limit 100
+"""
+from __future__ import absolute_import, print_function
+
+from common.management.commands import StorageServiceCommand
+from locations.models import Package
+
+FORMAT_FIELDS = [
+    "compressed",
+    "compression_algorithm",
+    "base_directory",
+    "member_count",
+    "payload_checksum_algorithm",
+]
+
+
+class Command(StorageServiceCommand):
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Entry point to add custom arguments"""
+        parser.add_argument(
+            "--space",
+            help="UUID of the space whose packages are recorded. Defaults to all.",
+            default=None,
+        )
+        parser.add_argument(
+            "--limit",
+            help="Maximum number of packages recorded.",
+            type=int,
+            default=None,
+        )
+
+    def handle(self, *args, **options):
+        packages = Package.objects.filter(
+            compressed__isnull=True,
+            package_type__in=(Package.AIP, Package.AIC),
+            status=Package.UPLOADED,
+        ).order_by("pk")
+        if options["space"]:
+            packages = packages.filter(current_location__space__uuid=options["space"])
+        if options["limit"]:
+            packages = packages[: options["limit"]]
+        recorded = failed = 0
+        for package in packages.iterator():
+            try:
+                package.record_format(package.fetch_local_path())
+                package.save(update_fields=FORMAT_FIELDS)
+            except Exception as err:
+                failed += 1
+                self.error(
+                    "{}: unable to record the format: {}".format(package.uuid, err)
+                )
+                continue
+            finally:
+                package.clear_local_tempdirs()
+            recorded += 1
+            self.info(
+                "{}: {}".format(
+                    package.uuid,
+                    "compressed ({})".format(package.compression_algorithm)
+                    if package.compressed
+                    else "uncompressed",
+                )
+            )
+        self.success("Recorded the format of {} packages".format(recorded))
+        if failed:
+            self.warning("Unable to record the format of {} packages".format(failed))
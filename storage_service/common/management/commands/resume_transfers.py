@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Restart the interrupted transfers of packages
+
+The packages stored, replicated or moved record the progress of their
+transfer in a checkpoint, removed once it completes. A running transfer
+updates its checkpoint at least every minute, so a checkpoint that was not
+updated for --older-than seconds belongs to a transfer that was interrupted,
+e.g. by a restart of the storage service: this command restarts it, skipping
+the files it recorded as written and resuming its partial uploads. The
+transfers that failed are also restarted with --retry-failed. With --dry-run
+the transfers that would be restarted are only listed.
+
+Execution example:
+./manage.py resume_transfers --older-than 3600 --retry-failed
+"""
+from __future__ import absolute_import, print_function
+import datetime
+import logging
+
+from django.conf import settings
+from django.db.models import Q
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from common.management.commands import StorageServiceCommand
+from locations import models
+
+# Suppress the logging from models/package.py.
+logging.config.dictConfig({"version": 1, "disable_existing_loggers": True})
+
+
+def get_interrupted_checkpoints(older_than, retry_failed=False, package_uuid=None):
+    """Return the checkpoints of the transfers interrupted, not updated for
+    ``older_than`` seconds by their heartbeat, and of those that failed if
+    ``retry_failed``. Restarting a transfer still running fails, see
+    ``TransferCheckpoint.begin``."""
+    interrupted = Q(
+        updated_time__lte=timezone.now() - datetime.timedelta(seconds=older_than),
+        error=None,
+    )
+    if retry_failed:
+        interrupted |= Q(error__isnull=False)
+    checkpoints = models.TransferCheckpoint.objects.filter(interrupted)
+    if package_uuid:
+        checkpoints = checkpoints.filter(package=package_uuid)
+    return list(checkpoints.select_related("package").order_by("pk"))
+
+
+class Command(StorageServiceCommand):
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Entry point to add custom arguments"""
+        parser.add_argument(
+            "--older-than",
+            help="Seconds after which a transfer whose checkpoint was not"
+            " updated is considered interrupted.",
+            type=int,
+            default=settings.TRANSFER_CHECKPOINT_TIMEOUT,
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also restart the transfers that failed.",
+        )
+        parser.add_argument(
+            "--package-uuid",
+            help="UUID of the package whose transfer to restart",
+            default=None,
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the transfers that would be restarted.",
+        )
+
+    def handle(self, *args, **options):
+        checkpoints = get_interrupted_checkpoints(
+            options["older_than"],
+            retry_failed=options["retry_failed"],
+            package_uuid=options["package_uuid"],
+        )
+        self.info("Interrupted transfers: {}".format(len(checkpoints)))
+        resumed = 0
+        for checkpoint in checkpoints:
+            description = "{} ({} attempts, {} written)".format(
+                checkpoint,
+                checkpoint.attempts,
+                filesizeformat(checkpoint.bytes_completed),
+            )
+            if not checkpoint.is_resumable:
+                self.warning("Unable to restart {}".format(description))
+                continue
+            self.info("Restarting {}".format(description))
+            if options["dry_run"]:
+                continue
+            try:
+                checkpoint.resume()
+            except Exception as err:
+                self.error(
+                    "Transfer of package {} failed again: {}".format(
+                        checkpoint.package_id, err
+                    )
+                )
+                continue
+            finally:
+                checkpoint.package.clear_local_tempdirs()
+            resumed += 1
+
+        if not options["dry_run"]:
+            self.success(
+                "{} of {} interrupted transfers completed.".format(
+                    resumed, len(checkpoints)
+                )
+            )
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""Check the fixity of the stored AIPs and AICs
+
+Packages never checked are checked first, then those with the oldest fixity
+check. Packages checked less than --min-age days ago are skipped. The checks
+run in --processes worker processes, and the checks of each space are paced to
+read at most --bytes-per-second bytes and --iops operations per second on
+average. Failed checks are emailed to the administrators in digests.
+
+With --loop the command keeps running as a worker, looking for packages due
+for a check every --sleep seconds once all of them have been checked.
+
+Execution example:
+./manage.py run_fixity_checks --processes 4 --bytes-per-second 52428800 --loop
+"""
+from __future__ import absolute_import, print_function
+
+import datetime
+import json
+import time
+
+from django.conf import settings
+
+from common.management.commands import StorageServiceCommand
+from locations import fixity
+
+
+class Command(StorageServiceCommand):
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Entry point to add custom arguments"""
+        parser.add_argument(
+            "--space",
+            help="UUID of the space whose packages are checked. Defaults to all.",
+            default=None,
+        )
+        parser.add_argument(
+            "--limit",
+            help="Maximum number of packages checked per run.",
+            type=int,
+            default=None,
+        )
+        parser.add_argument(
+            "--min-age",
+            help="Skip packages checked less than these many days ago.",
+            type=float,
+            default=settings.FIXITY_MIN_AGE_DAYS,
+        )
+        parser.add_argument(
+            "--processes",
+            help="Number of worker processes, 0 to check in this process.",
+            type=int,
+            default=settings.FIXITY_PROCESSES,
+        )
+        parser.add_argument(
+            "--bytes-per-second",
+            help="Bytes read per second allowed in each space, 0 is unlimited.",
+            type=int,
+            default=settings.FIXITY_SPACE_BYTES_PER_SECOND,
+        )
+        parser.add_argument(
+            "--iops",
+            help="Operations per second allowed in each space, 0 is unlimited.",
+            type=int,
+            default=settings.FIXITY_SPACE_IOPS,
+        )
+        parser.add_argument(
+            "--force-local",
+            help="Check locally instead of using the space's own fixity checks.",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--loop",
+            help="Keep running, looking for packages due for a check.",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--sleep",
+            help="Seconds to wait when no package is due, with --loop.",
+            type=float,
+            default=300,
+        )
+
+    def handle(self, *args, **options):
+        scheduler = fixity.FixityScheduler(
+            processes=options["processes"],
+            bytes_per_second=options["bytes_per_second"],
+            iops=options["iops"],
+            force_local=options["force_local"],
+            on_result=self.report,
+        )
+        min_age = datetime.timedelta(days=options["min_age"])
+        while True:
+            packages = fixity.get_packages_due(
+                min_age=min_age, space_uuid=options["space"]
+            )
+            if options["limit"]:
+                packages = packages[: options["limit"]]
+            checked = scheduler.run(list(packages))
+            self.success("Checked the fixity of {} packages".format(checked))
+            if not options["loop"]:
+                break
+            if not checked:
+                time.sleep(options["sleep"])
+
+    def report(self, package, success, report):
+        if success:
+            self.info("{}: fixity check succeeded".format(package.uuid))
+        elif success is False:
+            self.error(
+                "{}: fixity check failed: {}".format(
+                    package.uuid, json.loads(report)["message"]
+                )
+            )
+        else:
+            self.warning(
+                "{}: fixity check not run: {}".format(
+                    package.uuid, json.loads(report)["message"]
+                )
+            )
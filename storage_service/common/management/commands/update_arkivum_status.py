@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Update the status of the packages pending replication in Arkivum
+
+Polls Arkivum once for every package still pending in the Arkivum spaces,
+marking the replicated ones as uploaded and caching the answers so the API can
+report the locality of the packages without contacting Arkivum. Meant to be
+run periodically, e.g. from cron.
+
+Execution example:
+./manage.py update_arkivum_status --space <UUID>
+"""
+from __future__ import absolute_import, print_function
+
+from django.core.management.base import CommandError
+
+from common.management.commands import StorageServiceCommand
+from locations.models import Arkivum
+
+
+class Command(StorageServiceCommand):
+
+    help = __doc__
+
+    def add_arguments(self, parser):
+        """Entry point to add custom arguments"""
+        parser.add_argument(
+            "--space",
+            help="UUID of the Arkivum space to poll. Defaults to all of them.",
+            default=None,
+        )
+
+    def handle(self, *args, **options):
+        spaces = Arkivum.objects.all()
+        if options["space"]:
+            spaces = spaces.filter(space__uuid=options["space"])
+            if not spaces.exists():
+                raise CommandError(
+                    "Arkivum space {} does not exist".format(options["space"])
+                )
+
+        for arkivum in spaces:
+            self.info("Polling Arkivum space {}".format(arkivum.space.uuid))
+            results = arkivum.update_pending_packages_status()
+            for package_uuid, (status, message) in results.items():
+                if status is None:
+                    self.error("{}: {}".format(package_uuid, message))
+                else:
+                    self.info("{}: {} ({})".format(package_uuid, status, message))
+            self.success(
+                "Polled {} pending packages in space {}".format(
+                    len(results), arkivum.space.uuid
+                )
+            )
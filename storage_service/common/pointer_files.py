@@ -0,0 +1,180 @@
+"""Cache of parsed pointer files.
+
+A pointer file is parsed once per process for each version of it, told apart
+by its modification time, size and inode, and the facts most callers need are
+read from the parsed tree once: the compression of the package, its transform
+files, its checksum and its LOCKSS chunks. The accessors answer from the cache
+without building ``metsrw`` objects.
+
+The cached trees are shared between the threads of the process and must not be
+changed; ``parse`` returns a copy that can be.
+"""
+
+from __future__ import absolute_import
+
+# stdlib, alphabetical
+from collections import namedtuple, OrderedDict
+import copy
+import logging
+import os
+import threading
+
+# Third party dependencies, alphabetical
+from lxml import etree
+
+# This project, alphabetical
+from . import utils
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of pointer files kept parsed
+CACHE_SIZE = 256
+
+Fixity = namedtuple("Fixity", ["algorithm", "checksum", "size"])
+ChunkRange = namedtuple("ChunkRange", ["offset", "size", "checksum_type", "checksum"])
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+
+
+class PointerFile(object):
+    """A parsed pointer file and the facts derived from it, read from the
+    tree the first time they are asked for."""
+
+    def __init__(self, path, tree):
+        self.path = path
+        self.tree = tree
+        self._facts = {}
+
+    def _fact(self, name, read):
+        # Reading the same fact twice concurrently is harmless
+        if name not in self._facts:
+            self._facts[name] = read()
+        return self._facts[name]
+
+    def _findtext(self, path):
+        text = self.tree.findtext(path, namespaces=utils.NSMAP)
+        if text is None:
+            # The pointer file may use the PREMIS3 namespace
+            text = self.tree.findtext(
+                path.replace("premis:", "premis3:"), namespaces=utils.NSMAP
+            )
+        return text
+
+    @property
+    def compression(self):
+        """One of the constants in ``utils.COMPRESSION_ALGORITHMS``, see
+        ``utils.get_compression``."""
+        return self._fact(
+            "compression", lambda: utils.get_compression_from_tree(self.tree)
+        )
+
+    @property
+    def transforms(self):
+        """The transform files of the package, in order, as dicts with the
+        keys used by ``metsrw.FSEntry.transform_files``."""
+
+        def read():
+            transforms = [
+                {
+                    "type": element.get("TRANSFORMTYPE"),
+                    "algorithm": element.get("TRANSFORMALGORITHM"),
+                    "order": element.get("TRANSFORMORDER"),
+                    "key": element.get("TRANSFORMKEY"),
+                }
+                for element in self.tree.iterfind(
+                    ".//mets:transformFile", namespaces=utils.NSMAP
+                )
+            ]
+            return sorted(transforms, key=lambda t: int(t["order"] or 0))
+
+        return self._fact("transforms", read)
+
+    @property
+    def fixity(self):
+        """The ``Fixity`` of the package, with None for what is missing."""
+
+        def read():
+            size = self._findtext(".//premis:objectCharacteristics/premis:size")
+            return Fixity(
+                algorithm=self._findtext(
+                    ".//premis:fixity/premis:messageDigestAlgorithm"
+                ),
+                checksum=self._findtext(".//premis:fixity/premis:messageDigest"),
+                size=int(size) if size else None,
+            )
+
+        return self._fact("fixity", read)
+
+    @property
+    def lockss_chunks(self):
+        """The ``ChunkRange`` of each LOCKSS chunk described as a byte range
+        of the package, by chunk number."""
+
+        def read():
+            files = {
+                element.get("ID"): element
+                for element in self.tree.iterfind(
+                    ".//mets:fileGrp[@USE='LOCKSS chunk']/mets:file",
+                    namespaces=utils.NSMAP,
+                )
+            }
+            chunks = {}
+            for div in self.tree.iterfind(
+                ".//mets:div[@TYPE='LOCKSS chunk']", namespaces=utils.NSMAP
+            ):
+                fptr = div.find("mets:fptr", namespaces=utils.NSMAP)
+                if fptr is None:
+                    continue
+                area = fptr.find("mets:area[@BETYPE='BYTE']", namespaces=utils.NSMAP)
+                file_e = files.get(fptr.get("FILEID"))
+                if area is None or file_e is None:
+                    continue
+                begin = int(area.get("BEGIN"))
+                chunks[int(div.get("ORDER"))] = ChunkRange(
+                    offset=begin,
+                    size=int(area.get("END")) - begin + 1,
+                    checksum_type=file_e.get("CHECKSUMTYPE"),
+                    checksum=file_e.get("CHECKSUM"),
+                )
+            return chunks
+
+        return self._fact("lockss_chunks", read)
+
+
+def get(path):
+    """Return the ``PointerFile`` at ``path``, parsed if it changed since it
+    was last parsed.
+
+    :raises EnvironmentError: if it can't be read.
+    :raises etree.XMLSyntaxError: if it is not well-formed.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(path)
+            return cached[1]
+    LOGGER.debug("Parsing pointer file %s", path)
+    parser = etree.XMLParser(remove_blank_text=True)
+    pointer_file = PointerFile(path, etree.parse(path, parser=parser))
+    with _lock:
+        _cache[path] = (version, pointer_file)
+        _cache.move_to_end(path)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return pointer_file
+
+
+def parse(path):
+    """Return a copy of the tree of the pointer file at ``path``, that the
+    caller can change."""
+    return copy.deepcopy(get(path).tree)
+
+
+def clear():
+    """Forget every pointer file parsed."""
+    with _lock:
+        _cache.clear()
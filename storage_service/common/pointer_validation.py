@@ -0,0 +1,157 @@
+"""Validation of METS pointer files.
+
+Pointer files are validated as ``metsrw.validate`` validates them, against the
+METS XML schema, extended with the schemas they reference, and Archivematica's
+pointer file Schematron. Here the validators are compiled once per process and
+shared by its threads.
+
+The METS schema is the one shipped with metsrw. The schemas it and the pointer
+files import by URL are read from their local copies when there are any, and
+downloaded otherwise. The local copies are listed by URL in the XML catalog of
+``SCHEMAS_DIR``, which ships the XLink schema and gets the PREMIS schemas when
+the Docker image is built. Other copies can be put in
+``settings.POINTER_FILE_SCHEMAS_DIR``, with the file name of their URL or
+listed in a ``catalog.xml`` of their own.
+"""
+
+from __future__ import absolute_import
+
+# stdlib, alphabetical
+import logging
+import os
+import threading
+
+# Core Django, alphabetical
+from django.conf import settings
+from django.utils.six.moves.urllib.parse import urlparse
+
+# Third party dependencies, alphabetical
+from lxml import etree, isoschematron
+import metsrw
+
+LOGGER = logging.getLogger(__name__)
+
+XSD_NAMESPACE = "http://www.w3.org/2001/XMLSchema"
+CATALOG_NAMESPACE = "urn:oasis:names:tc:entity:xmlns:xml:catalog"
+
+SCHEMAS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+
+# Validation stores its results on the validators, so they are used by one
+# thread at a time. They are compiled outside of the lock, a validator
+# compiled twice by concurrent threads being used by both.
+_lock = threading.Lock()
+_xmlschemas = {}
+_schematron = None
+# Paths of the schemas listed by the catalog of each directory, by URL
+_catalogs = {}
+
+
+def _metsrw_resource(path):
+    if os.path.isfile(path):
+        return path
+    return os.path.join(os.path.dirname(os.path.abspath(metsrw.__file__)), path)
+
+
+def _catalog(directory):
+    """Return the paths of the schemas listed by the ``catalog.xml`` of
+    ``directory``, by URL."""
+    try:
+        return _catalogs[directory]
+    except KeyError:
+        pass
+    catalog = {}
+    path = os.path.join(directory, "catalog.xml")
+    if os.path.isfile(path):
+        for entry in etree.parse(path).iterfind("{%s}uri" % CATALOG_NAMESPACE):
+            catalog[entry.get("name")] = os.path.join(directory, entry.get("uri"))
+    _catalogs[directory] = catalog
+    return catalog
+
+
+def local_copy(url):
+    """Return the path of the local copy of the schema at ``url``, or None.
+
+    ``settings.POINTER_FILE_SCHEMAS_DIR`` is searched first, then
+    ``SCHEMAS_DIR``.
+    """
+    for directory in (settings.POINTER_FILE_SCHEMAS_DIR, SCHEMAS_DIR):
+        if not directory:
+            continue
+        path = _catalog(directory).get(url)
+        if path is None:
+            path = os.path.join(directory, os.path.basename(urlparse(url).path))
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+class LocalSchemaResolver(etree.Resolver):
+    """Resolves the schemas imported by URL to their local copies."""
+
+    def resolve(self, url, pubid, context):
+        path = local_copy(url)
+        if path is None:
+            return None
+        LOGGER.debug("Using %s for %s", path, url)
+        return self.resolve_filename(path, context)
+
+
+def _schema_imports(mets_doc):
+    """Return the namespaces and locations of the schemas referenced by the
+    ``xsi:schemaLocation`` attributes of ``mets_doc``, except METS."""
+    imports = set()
+    for schema_location in mets_doc.xpath(
+        "//*/@xsi:schemaLocation", namespaces=metsrw.NAMESPACES
+    ):
+        pairs = schema_location.strip().split()
+        for namespace, location in zip(pairs[::2], pairs[1::2]):
+            if namespace != metsrw.NAMESPACES["mets"]:
+                imports.add((namespace, location))
+    return tuple(sorted(imports))
+
+
+def _compile_xmlschema(imports):
+    parser = etree.XMLParser()
+    parser.resolvers.add(LocalSchemaResolver())
+    xmlschema = etree.parse(_metsrw_resource(metsrw.METS_XSD_PATH), parser)
+    for namespace, location in imports:
+        xs_import = etree.Element("{%s}import" % XSD_NAMESPACE)
+        xs_import.attrib["namespace"] = namespace
+        xs_import.attrib["schemaLocation"] = local_copy(location) or location
+        xmlschema.getroot().insert(0, xs_import)
+    return etree.XMLSchema(xmlschema)
+
+
+def _compile_schematron():
+    parser = etree.XMLParser(remove_blank_text=True)
+    sct_doc = etree.parse(_metsrw_resource(metsrw.AM_PNTR_SCT_PATH), parser=parser)
+    return isoschematron.Schematron(sct_doc, store_report=True)
+
+
+def validate(mets_doc):
+    """Validate the pointer file ``mets_doc``, an lxml element.
+
+    :returns: the validity and the report, as ``metsrw.validate``.
+    :raises etree.XMLSchemaParseError: if a schema could not be loaded. It is
+        tried again on the next call.
+    """
+    global _schematron
+    imports = _schema_imports(mets_doc)
+    xmlschema = _xmlschemas.get(imports)
+    if xmlschema is None:
+        xmlschema = _xmlschemas.setdefault(imports, _compile_xmlschema(imports))
+    if _schematron is None:
+        _schematron = _compile_schematron()
+    with _lock:
+        is_xsd_valid = xmlschema.validate(mets_doc)
+        xsd_error_log = xmlschema.error_log
+        is_sct_valid = _schematron.validate(mets_doc)
+        sct_report = _schematron.validation_report
+    report = {
+        "is_xsd_valid": is_xsd_valid,
+        "is_sct_valid": is_sct_valid,
+        "xsd_error_log": xsd_error_log,
+        "sct_report": sct_report,
+    }
+    report["report"] = metsrw.report_string(report)
+    return is_xsd_valid and is_sct_valid, report
@@ -5,11 +5,14 @@ import logging
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django_auth_ldap.backend import populate_user
 from django_cas_ng.signals import cas_user_authenticated
 
 from administration import roles
+from administration.models import Settings
+from common import utils
 
 
 LOGGER = logging.getLogger(__name__)
@@ -126,3 +129,12 @@ def ldap_populate_user_profile(sender, user=None, ldap_user=None, **kwargs):
 
     LOGGER.debug("Setting role %s for user %s", role, user.username)
     user.set_role(role)
+
+
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+def settings_changed(sender, instance, **kwargs):
+    """Invalidate the settings cache of every process when a setting changes."""
+    if instance.name == utils.SETTINGS_VERSION_NAME:
+        return
+    utils.bump_settings_version()
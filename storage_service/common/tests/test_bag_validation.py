@@ -0,0 +1,114 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import hashlib
+import os
+import tarfile
+import zipfile
+
+import bagit
+import pytest
+
+from common import bag_validation
+
+FIXTURES_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "locations", "fixtures")
+)
+
+
+def _make_bag(path, payload, oxum=None):
+    """Write a bag with ``payload``, a dict of contents by path, to ``path``."""
+    data = path / "data"
+    data.mkdir(parents=True)
+    for name, content in payload.items():
+        (data / name).write_bytes(content)
+    (path / "bagit.txt").write_bytes(
+        b"BagIt-Version: 0.97\nTag-File-Character-Encoding: UTF-8\n"
+    )
+    if oxum is None:
+        oxum = "{}.{}".format(sum(len(c) for c in payload.values()), len(payload))
+    bag_info = "Payload-Oxum: {}\n".format(oxum) if oxum else ""
+    (path / "bag-info.txt").write_bytes(bag_info.encode())
+    (path / "manifest-sha256.txt").write_bytes(
+        b"".join(
+            "{}  data/{}\n".format(hashlib.sha256(content).hexdigest(), name).encode()
+            for name, content in sorted(payload.items())
+        )
+    )
+    (path / "tagmanifest-md5.txt").write_bytes(
+        b"".join(
+            "{}  {}\n".format(
+                hashlib.md5((path / name).read_bytes()).hexdigest(), name
+            ).encode()
+            for name in ("bagit.txt", "bag-info.txt", "manifest-sha256.txt")
+        )
+    )
+
+
+def _make_tar(tmp_path, bag_name="bag", mode="w:gz"):
+    archive_path = tmp_path / "bag.tar.gz"
+    with tarfile.open(str(archive_path), mode) as archive:
+        archive.add(str(tmp_path / bag_name), arcname=bag_name)
+    return str(archive_path)
+
+
+def test_validate_archive_valid(tmp_path):
+    _make_bag(tmp_path / "bag", {"a.txt": b"a" * 10, "b.txt": b"b" * 3000000})
+
+    assert bag_validation.validate_archive(_make_tar(tmp_path), processes=2)
+    assert bag_validation.validate_archive(
+        os.path.join(FIXTURES_DIR, "working_bag.zip")
+    )
+
+
+def test_validate_archive_failures(tmp_path):
+    _make_bag(tmp_path / "bag", {"a.txt": b"a", "b.txt": b"b"})
+    (tmp_path / "bag" / "data" / "a.txt").write_bytes(b"c")
+    os.remove(str(tmp_path / "bag" / "data" / "b.txt"))
+
+    with pytest.raises(bagit.BagValidationError) as excinfo:
+        bag_validation.validate_archive(_make_tar(tmp_path))
+    assert excinfo.value.message.startswith("Payload-Oxum validation failed")
+
+    os.remove(str(tmp_path / "bag.tar.gz"))
+    _make_bag(tmp_path / "other", {"a.txt": b"a", "b.txt": b"b"}, oxum="")
+    (tmp_path / "other" / "data" / "a.txt").write_bytes(b"c")
+    os.remove(str(tmp_path / "other" / "data" / "b.txt"))
+    (tmp_path / "other" / "data" / "c.txt").write_bytes(b"c")
+    with zipfile.ZipFile(str(tmp_path / "other.zip"), "w") as archive:
+        for root, __, files in os.walk(str(tmp_path / "other")):
+            for name in files:
+                path = os.path.join(root, name)
+                archive.write(path, os.path.relpath(path, str(tmp_path)))
+
+    with pytest.raises(bagit.BagValidationError) as excinfo:
+        bag_validation.validate_archive(str(tmp_path / "other.zip"))
+    assert excinfo.value.message == "Bag validation failed"
+    details = excinfo.value.details
+    assert [type(detail) for detail in details] == [
+        bagit.FileMissing,
+        bagit.UnexpectedFile,
+    ]
+    assert [detail.path for detail in details] == ["data/b.txt", "data/c.txt"]
+
+    os.remove(str(tmp_path / "other" / "data" / "c.txt"))
+    (tmp_path / "other" / "data" / "b.txt").write_bytes(b"b")
+    os.remove(str(tmp_path / "other.zip"))
+    archive_path = _make_tar(tmp_path, bag_name="other", mode="w")
+
+    with pytest.raises(bagit.BagValidationError) as excinfo:
+        bag_validation.validate_archive(archive_path)
+    (detail,) = excinfo.value.details
+    assert isinstance(detail, bagit.ChecksumMismatch)
+    assert detail.path == "data/a.txt"
+    assert detail.algorithm == "sha256"
+    assert detail.found == hashlib.sha256(b"c").hexdigest()
+
+
+def test_validate_archive_unsupported(tmp_path):
+    """It should return None for the archives it can't validate."""
+    _make_bag(tmp_path / "bag", {"a.txt": b"a"})
+    (tmp_path / "bag" / "manifest-sha224.txt").write_bytes(b"")
+
+    assert bag_validation.validate_archive(_make_tar(tmp_path)) is None
+    assert bag_validation.validate_archive(str(tmp_path / "bag" / "bagit.txt")) is None
@@ -0,0 +1,29 @@
+from __future__ import absolute_import
+
+import os
+from unittest import mock
+
+from common import gpgutils
+
+
+def test_list_keys_is_cached_until_the_keyring_changes(tmp_path):
+    gpg = gpgutils.GPG()
+    gpg._gpg = mock.Mock(gnupghome=str(tmp_path))
+    gpg._gpg.list_keys.side_effect = lambda secret: [{"secret": secret}]
+    pubring = tmp_path / "pubring.gpg"
+    pubring.write_bytes(b"")
+
+    keys = gpg.list_keys(True)
+    assert gpg.list_keys(True) is keys
+    assert gpg.list_keys() == [{"secret": False}]
+    assert gpg._gpg.list_keys.call_count == 2
+
+    pubring.write_bytes(b"key")
+    os.utime(str(pubring), ns=(0, 0))
+    assert gpg.list_keys(True) is not keys
+    assert gpg._gpg.list_keys.call_count == 3
+
+    keys = gpg.list_keys(True)
+    gpg.invalidate()
+    assert gpg.list_keys(True) is not keys
+    assert gpg._gpg.list_keys.call_count == 4
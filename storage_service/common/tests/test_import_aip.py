@@ -0,0 +1,69 @@
+from __future__ import absolute_import
+
+from unittest import mock
+
+import pytest
+
+from common.management.commands import import_aip
+from locations import models
+
+
+def test_read_sources(tmp_path):
+    (tmp_path / "a.7z").write_bytes(b"")
+    (tmp_path / "b.7z").write_bytes(b"")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text(
+        u"# Legacy AIPs\n{0}/b.7z\n\n{0}/c\n".format(tmp_path), encoding="utf-8"
+    )
+
+    assert import_aip.read_sources(str(manifest), str(tmp_path / "*.7z")) == [
+        str(tmp_path / "b.7z"),
+        str(tmp_path / "c"),
+        str(tmp_path / "a.7z"),
+    ]
+    with pytest.raises(import_aip.ImportAIPException):
+        import_aip.read_sources(str(tmp_path / "missing.txt"))
+
+
+@pytest.mark.django_db
+def test_bulk_import_checkpoints():
+    """It should run every stage of each AIP, record how far they went and
+    resume from there."""
+    sources = ["/aips/a", "/aips/b", "/aips/c"]
+
+    def compress(checkpoint, options):
+        if checkpoint.source_path == "/aips/b":
+            raise import_aip.ImportAIPException("Boom")
+        return 10
+
+    stages = (
+        ("validate", models.AIPImport.PENDING, mock.Mock(return_value=10)),
+        ("compress", models.AIPImport.VALIDATED, compress),
+        ("store", models.AIPImport.COMPRESSED, mock.Mock(return_value=5)),
+    )
+    results = []
+    with mock.patch.object(import_aip, "BULK_STAGES", stages):
+        importer = import_aip.BulkImport(
+            {}, processes=0, on_result=lambda *result: results.append(result)
+        )
+        assert importer.run(import_aip.get_checkpoints(sources)) == (2, 1)
+
+    assert [
+        checkpoint.stage for checkpoint in models.AIPImport.objects.order_by("pk")
+    ] == [
+        models.AIPImport.STORED,
+        models.AIPImport.VALIDATED,
+        models.AIPImport.STORED,
+    ]
+    failed = models.AIPImport.objects.get(source_path="/aips/b")
+    assert failed.error == "Boom"
+    assert len(results) == 8
+    assert importer.throughput[2].count == 2
+    assert importer.throughput[2].size == 10
+
+    assert import_aip.get_checkpoints(sources) == []
+    with mock.patch("os.path.exists", return_value=True):
+        assert import_aip.get_checkpoints(sources, retry_failed=True) == [
+            (failed.pk, models.AIPImport.VALIDATED)
+        ]
+    assert models.AIPImport.objects.get(pk=failed.pk).error is None
@@ -0,0 +1,170 @@
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import os
+import stat
+
+import pytest
+
+from common import local_copy
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / "source"
+    (source / "sub" / "empty").mkdir(parents=True)
+    (source / "a.txt").write_bytes(b"a" * 100000)
+    (source / "sub" / "b.txt").write_bytes(b"b")
+    os.chmod(str(source / "sub" / "b.txt"), 0o604)
+    os.utime(str(source / "a.txt"), (1000000, 1000000))
+    return source
+
+
+def _tree(path):
+    return sorted(
+        os.path.relpath(os.path.join(dirpath, name), str(path))
+        for dirpath, dirnames, filenames in os.walk(str(path))
+        for name in dirnames + filenames
+    )
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_copy_directory(tmp_path, source, threads):
+    """It should interpret the paths like rsync does."""
+    local_copy.copy(str(source), str(tmp_path / "into"), threads=threads)
+    local_copy.copy(os.path.join(str(source), ""), str(tmp_path / "as"))
+
+    assert _tree(tmp_path / "into") == [
+        "source",
+        "source/a.txt",
+        "source/sub",
+        "source/sub/b.txt",
+        "source/sub/empty",
+    ]
+    assert _tree(tmp_path / "as") == ["a.txt", "sub", "sub/b.txt", "sub/empty"]
+    copied = tmp_path / "as" / "a.txt"
+    assert copied.read_bytes() == b"a" * 100000
+    assert os.stat(str(copied)).st_mtime == 1000000
+    assert stat.S_IMODE(os.stat(str(tmp_path / "as" / "sub" / "b.txt")).st_mode) == (
+        0o660
+    )
+    assert stat.S_IMODE(os.stat(str(tmp_path / "as" / "sub")).st_mode) == 0o770
+
+
+def test_copy_bounds_pending_files(tmp_path, monkeypatch):
+    """It should copy trees of more files than it submits to its threads at
+    once, reporting every one of them."""
+    monkeypatch.setattr(local_copy, "PENDING_FILES_PER_THREAD", 2)
+    source = tmp_path / "many"
+    source.mkdir()
+    for index in range(20):
+        (source / "{:02d}.txt".format(index)).write_bytes(b"x" * index)
+    sizes = []
+    local_copy.copy(
+        os.path.join(str(source), ""),
+        str(tmp_path / "copy"),
+        threads=2,
+        on_file=lambda size, copied: sizes.append(size),
+    )
+
+    assert len(_tree(tmp_path / "copy")) == 20
+    assert sorted(sizes) == list(range(20))
+
+
+def test_copy_file(tmp_path, source):
+    (tmp_path / "dir").mkdir()
+
+    local_copy.copy(str(source / "a.txt"), str(tmp_path / "dir"))
+    local_copy.copy(str(source / "a.txt"), os.path.join(str(tmp_path / "new"), ""))
+    local_copy.copy(str(source / "a.txt"), str(tmp_path / "renamed.txt"))
+
+    assert _tree(tmp_path / "dir") == ["a.txt"]
+    assert _tree(tmp_path / "new") == ["a.txt"]
+    assert (tmp_path / "renamed.txt").read_bytes() == b"a" * 100000
+
+
+def test_copy_skips_unchanged_files(tmp_path, source):
+    destination = tmp_path / "destination"
+    destination.mkdir()
+    (destination / "a.txt").write_bytes(b"b" * 100000)
+    os.utime(str(destination / "a.txt"), (1000000, 1000000))
+
+    local_copy.copy(os.path.join(str(source), ""), str(destination))
+
+    assert (destination / "a.txt").read_bytes() == b"b" * 100000
+    assert (destination / "sub" / "b.txt").read_bytes() == b"b"
+
+
+def test_copy_resumes_partial_files(tmp_path, source, monkeypatch):
+    """It should resume the copy of a file from its partial copy, unless the
+    end of the partial copy differs from the source."""
+    monkeypatch.setattr(local_copy, "RESUMABLE_SIZE", 1000)
+    monkeypatch.setattr(local_copy, "COPY_CHUNK_SIZE", 1000)
+    source_stat = os.stat(str(source / "a.txt"))
+    partial = tmp_path / ".a.txt.100000-{}.partial".format(source_stat.st_mtime_ns)
+    partial.write_bytes(b"a" * 50000)
+    copied = []
+    copy_data = local_copy._copy_data
+
+    def _copy_data(source_fd, destination_fd, size, offset=0):
+        copied.append(size - offset)
+        copy_data(source_fd, destination_fd, size, offset)
+
+    monkeypatch.setattr(local_copy, "_copy_data", _copy_data)
+
+    local_copy.copy(str(source / "a.txt"), str(tmp_path / "a.txt"))
+
+    assert copied == [50000]
+    assert (tmp_path / "a.txt").read_bytes() == b"a" * 100000
+    assert not partial.exists()
+
+    partial.write_bytes(b"a" * 49000 + b"\0" * 1000)
+    os.remove(str(tmp_path / "a.txt"))
+    local_copy.copy(str(source / "a.txt"), str(tmp_path / "a.txt"))
+
+    assert copied == [50000, 100000]
+    assert (tmp_path / "a.txt").read_bytes() == b"a" * 100000
+
+
+def test_copy_removes_stale_partial_files(tmp_path, source, monkeypatch):
+    """It should remove the partial copies of other versions of a file when
+    it starts a partial copy, and all those left once the copy succeeds."""
+    monkeypatch.setattr(local_copy, "RESUMABLE_SIZE", 1000)
+    destination = tmp_path / "destination"
+    (destination / "sub").mkdir(parents=True)
+    (destination / ".a.txt.50-1.partial").write_bytes(b"a" * 50)
+    (destination / ".other.txt.50-1.partial").write_bytes(b"o" * 50)
+    (destination / "sub" / ".gone.txt.50-1.partial").write_bytes(b"g" * 50)
+    (destination / "keep.partial").write_bytes(b"k")
+    opened = []
+    open_partial = local_copy._open_partial
+
+    def _open_partial(path, source_stat):
+        result = open_partial(path, source_stat)
+        opened.append(sorted(os.listdir(str(destination))))
+        return result
+
+    monkeypatch.setattr(local_copy, "_open_partial", _open_partial)
+    local_copy.copy(os.path.join(str(source), ""), str(destination), threads=1)
+
+    # Only the stale partial copy of a.txt is gone when a.txt is copied
+    assert ".a.txt.50-1.partial" not in opened[0]
+    assert ".other.txt.50-1.partial" in opened[0]
+    assert _tree(destination) == [
+        "a.txt",
+        "keep.partial",
+        "sub",
+        "sub/b.txt",
+        "sub/empty",
+    ]
+
+
+def test_copy_missing_source(tmp_path):
+    with pytest.raises(local_copy.CopyError):
+        local_copy.copy(str(tmp_path / "missing"), str(tmp_path / "destination"))
+
+
+def test_is_remote_path():
+    assert local_copy.is_remote_path("user@host:/path")
+    assert local_copy.is_remote_path("host::module/path")
+    assert not local_copy.is_remote_path("/path/with:colon")
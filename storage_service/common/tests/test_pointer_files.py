@@ -0,0 +1,76 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+
+from common import pointer_files, utils
+
+FIXTURES_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "locations", "fixtures")
+)
+POINTER_FILE = os.path.join(
+    FIXTURES_DIR, "pointer.c0f8498f-b92e-4a8b-8941-1b34ba062ed8.xml"
+)
+LOCKSS_POINTER_FILE = """<?xml version='1.0' encoding='utf-8'?>
+<mets:mets xmlns:mets="http://www.loc.gov/METS/">
+  <mets:fileSec>
+    <mets:fileGrp USE="LOCKSS chunk">
+      <mets:file ID="chunk-1" CHECKSUMTYPE="md5" CHECKSUM="abc"/>
+      <mets:file ID="chunk-2" CHECKSUMTYPE="md5" CHECKSUM="def"/>
+    </mets:fileGrp>
+  </mets:fileSec>
+  <mets:structMap>
+    <mets:div TYPE="LOCKSS chunk" ORDER="1">
+      <mets:fptr FILEID="chunk-1">
+        <mets:area BETYPE="BYTE" BEGIN="0" END="99"/>
+      </mets:fptr>
+    </mets:div>
+    <mets:div TYPE="LOCKSS chunk" ORDER="2">
+      <mets:fptr FILEID="chunk-2">
+        <mets:area BETYPE="BYTE" BEGIN="100" END="149"/>
+      </mets:fptr>
+    </mets:div>
+  </mets:structMap>
+</mets:mets>
+"""
+
+
+def test_get_reads_facts(tmp_path):
+    path = str(tmp_path / "pointer.xml")
+    shutil.copy(POINTER_FILE, path)
+
+    pointer_file = pointer_files.get(path)
+
+    assert pointer_file.compression == utils.get_compression(POINTER_FILE)
+    assert pointer_file.transforms == [
+        {"type": "decompression", "algorithm": "bzip2", "order": "1", "key": None}
+    ]
+    assert pointer_file.fixity.algorithm == "sha256"
+    assert pointer_file.fixity.size == 11231
+    assert pointer_file.lockss_chunks == {}
+
+    (tmp_path / "lockss.xml").write_text(LOCKSS_POINTER_FILE)
+    assert pointer_files.get(str(tmp_path / "lockss.xml")).lockss_chunks == {
+        1: pointer_files.ChunkRange(0, 100, "md5", "abc"),
+        2: pointer_files.ChunkRange(100, 50, "md5", "def"),
+    }
+
+
+def test_get_parses_changed_files_again(tmp_path, mocker):
+    path = str(tmp_path / "pointer.xml")
+    (tmp_path / "pointer.xml").write_text(LOCKSS_POINTER_FILE)
+    parse = mocker.spy(pointer_files.etree, "parse")
+
+    pointer_file = pointer_files.get(path)
+    assert pointer_files.get(path) is pointer_file
+    assert parse.call_count == 1
+
+    tree = pointer_files.parse(path)
+    assert tree is not pointer_file.tree
+    tree.getroot().clear()
+    assert len(pointer_files.get(path).lockss_chunks) == 2
+
+    (tmp_path / "pointer.xml").write_text(LOCKSS_POINTER_FILE.replace("99", "9"))
+    os.utime(path, ns=(0, 0))
+    assert pointer_files.get(path).lockss_chunks[1].size == 10
+    assert parse.call_count == 2
@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+
+import os
+
+from lxml import etree
+
+from common import pointer_validation
+
+FIXTURES_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "locations", "fixtures")
+)
+POINTER_FILE = os.path.join(
+    FIXTURES_DIR, "pointer.4781e745-96bc-4b06-995c-ee59fddf856d.xml"
+)
+
+
+def test_local_copy(tmp_path, settings):
+    settings.POINTER_FILE_SCHEMAS_DIR = ""
+    url = "http://www.loc.gov/standards/mods/v3/mods-3-7.xsd"
+    assert pointer_validation.local_copy(url) is None
+
+    settings.POINTER_FILE_SCHEMAS_DIR = str(tmp_path)
+    assert pointer_validation.local_copy(url) is None
+    (tmp_path / "mods-3-7.xsd").write_text(u"<schema/>")
+    assert pointer_validation.local_copy(url) == str(tmp_path / "mods-3-7.xsd")
+
+    # The schemas shipped are used if the directory has no copy
+    assert pointer_validation.local_copy(
+        "http://www.loc.gov/standards/xlink/xlink.xsd"
+    ) == os.path.join(pointer_validation.SCHEMAS_DIR, "xlink.xsd")
+
+
+def test_local_copy_from_catalog(tmp_path, settings):
+    settings.POINTER_FILE_SCHEMAS_DIR = str(tmp_path)
+    (tmp_path / "premis-v3.xsd").write_text(u"<schema/>")
+    (tmp_path / "catalog.xml").write_text(
+        u'<catalog xmlns="urn:oasis:names:tc:entity:xmlns:xml:catalog">'
+        u'<uri name="http://www.loc.gov/standards/premis/v3/premis.xsd"'
+        u' uri="premis-v3.xsd"/>'
+        u"</catalog>"
+    )
+
+    assert pointer_validation.local_copy(
+        "http://www.loc.gov/standards/premis/v3/premis.xsd"
+    ) == str(tmp_path / "premis-v3.xsd")
+
+
+def test_mets_schema_compiles_from_local_copies(mocker, settings):
+    settings.POINTER_FILE_SCHEMAS_DIR = ""
+    resolve = mocker.spy(pointer_validation.LocalSchemaResolver, "resolve")
+
+    xmlschema = pointer_validation._compile_xmlschema(())
+
+    assert isinstance(xmlschema, etree.XMLSchema)
+    resolved = [call[0][1] for call in resolve.call_args_list]
+    assert "http://www.loc.gov/standards/xlink/xlink.xsd" in resolved
+
+
+def test_validate_compiles_validators_once(mocker):
+    xmlschema = mocker.Mock(error_log=[])
+    xmlschema.validate.return_value = True
+    schematron = mocker.Mock(validation_report=etree.Element("report"))
+    schematron.validate.return_value = True
+    compile_xmlschema = mocker.patch(
+        "common.pointer_validation._compile_xmlschema", return_value=xmlschema
+    )
+    mocker.patch(
+        "common.pointer_validation._compile_schematron", return_value=schematron
+    )
+    mocker.patch.object(pointer_validation, "_xmlschemas", {})
+    mocker.patch.object(pointer_validation, "_schematron", None)
+    mets_doc = etree.parse(POINTER_FILE).getroot()
+
+    for __ in range(2):
+        is_valid, report = pointer_validation.validate(mets_doc)
+        assert is_valid
+        assert report["is_xsd_valid"] and report["is_sct_valid"]
+
+    compile_xmlschema.assert_called_once_with(
+        (
+            (
+                "http://www.loc.gov/premis/v3",
+                "http://www.loc.gov/standards/premis/v3/premis.xsd",
+            ),
+        )
+    )
+    assert xmlschema.validate.call_count == 2
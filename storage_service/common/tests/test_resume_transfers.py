@@ -0,0 +1,121 @@
+from __future__ import absolute_import
+
+import datetime
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from six import StringIO
+
+from common.management.commands import resume_transfers
+from locations import models
+
+AIP_UUID = "0d4e739b-bf60-4b87-bc20-67a379b28cea"
+AIP_STORE_UUID = "99536e72-97af-4f0c-811e-06160a995c36"
+
+
+@mock.patch.object(models.Package, "_update_existing_ptr_loc_info")
+@mock.patch.object(models.Space, "update_package_status")
+class TestResumeTransfers(TestCase):
+
+    fixtures = ["base.json", "package.json"]
+
+    def setUp(self):
+        self.aip = models.Package.objects.get(uuid=AIP_UUID)
+        self.aip_store = models.Location.objects.get(uuid=AIP_STORE_UUID)
+
+    @mock.patch.object(models.Space, "posix_move")
+    def test_failed_transfer_is_resumed(self, posix_move, *args):
+        """It should keep the checkpoint of a failed move and restart the move
+        from it."""
+        posix_move.side_effect = models.StorageException("Boom")
+        with self.assertRaises(models.StorageException):
+            self.aip.move(self.aip_store)
+
+        checkpoint = models.TransferCheckpoint.objects.get(package=AIP_UUID)
+        assert checkpoint.operation == models.TransferCheckpoint.MOVE
+        assert checkpoint.error == "Boom"
+        assert checkpoint.get_arguments() == {"to_location": AIP_STORE_UUID}
+        assert resume_transfers.get_interrupted_checkpoints(3600) == []
+        assert resume_transfers.get_interrupted_checkpoints(
+            3600, retry_failed=True
+        ) == [checkpoint]
+
+        posix_move.side_effect = None
+        out = StringIO()
+        call_command("resume_transfers", retry_failed=True, stdout=out)
+
+        assert "1 of 1 interrupted transfers completed" in out.getvalue()
+        assert not models.TransferCheckpoint.objects.exists()
+        aip = models.Package.objects.get(uuid=AIP_UUID)
+        assert aip.current_location_id == AIP_STORE_UUID
+
+    def test_interrupted_transfers(self, *args):
+        """It should only restart the transfers whose checkpoint was not
+        updated for a while."""
+        checkpoint = models.TransferCheckpoint.objects.create(
+            package=self.aip,
+            operation=models.TransferCheckpoint.MOVE,
+            arguments='{"to_location": "%s"}' % AIP_STORE_UUID,
+        )
+        assert resume_transfers.get_interrupted_checkpoints(3600) == []
+        models.TransferCheckpoint.objects.update(
+            updated_time=timezone.now() - datetime.timedelta(hours=2)
+        )
+        assert resume_transfers.get_interrupted_checkpoints(3600) == [checkpoint]
+
+        out = StringIO()
+        with mock.patch.object(models.Package, "move") as move:
+            call_command("resume_transfers", older_than=3600, dry_run=True, stdout=out)
+            move.assert_not_called()
+            call_command("resume_transfers", older_than=3600, stdout=out)
+        move.assert_called_once_with(self.aip_store)
+
+    def test_completed_files_are_rows(self, *args):
+        """It should insert every file completed once and find them when the
+        transfer is resumed."""
+        checkpoint = models.TransferCheckpoint.begin(
+            self.aip, models.TransferCheckpoint.MOVE, to_location=AIP_STORE_UUID
+        )
+        checkpoint.record_file("aips/a.txt")
+        checkpoint.record_file("aips/b.txt")
+        checkpoint.record_file("aips/a.txt")
+        checkpoint.fail("Boom")
+
+        assert sorted(checkpoint.files.values_list("path", flat=True)) == [
+            "aips/a.txt",
+            "aips/b.txt",
+        ]
+        resumed = models.TransferCheckpoint.begin(
+            self.aip, models.TransferCheckpoint.MOVE, to_location=AIP_STORE_UUID
+        )
+        assert resumed.is_completed("aips/a.txt")
+        assert not resumed.is_completed("aips/c.txt")
+        resumed.complete()
+        assert not models.TransferCheckpointFile.objects.exists()
+
+    def test_running_transfer_is_not_resumed(self, *args):
+        """It should refuse to restart a transfer whose heartbeat updated its
+        checkpoint recently, and restart it once the heartbeat stopped."""
+        checkpoint = models.TransferCheckpoint.objects.create(
+            package=self.aip,
+            operation=models.TransferCheckpoint.MOVE,
+            arguments='{"to_location": "%s"}' % AIP_STORE_UUID,
+            owner="otherhost:1234:5678",
+        )
+        with self.assertRaises(models.StorageException):
+            checkpoint.resume()
+
+        models.TransferCheckpoint.objects.update(
+            updated_time=timezone.now() - datetime.timedelta(hours=2)
+        )
+        assert checkpoint.beat()
+        assert resume_transfers.get_interrupted_checkpoints(3600) == []
+
+        models.TransferCheckpoint.objects.update(
+            updated_time=timezone.now() - datetime.timedelta(hours=2)
+        )
+        with mock.patch.object(models.Space, "posix_move"):
+            checkpoint.resume()
+        assert not models.TransferCheckpoint.objects.exists()
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 from collections import namedtuple
+from concurrent.futures.process import BrokenProcessPool
 from unittest import mock
 import os
 import shutil
@@ -9,10 +10,12 @@ import subprocess
 import tarfile
 
 from six import StringIO
+from six.moves import queue
 import pytest
 
 from metsrw import FSEntry
 
+from administration import models
 from common import utils
 
 # Until further work is done to bring compression into its own module we can
@@ -468,3 +471,140 @@ def test_create_tar(
 )
 def test_strip_quad_dirs_from_path(input_path, expected_path):
     assert utils.strip_quad_dirs_from_path(input_path) == expected_path
+
+
+@pytest.mark.django_db
+def test_settings_cache_is_invalidated_when_a_setting_is_saved():
+    utils.set_setting("pipelines_disabled", True)
+    assert utils.get_bool_setting("pipelines_disabled") is True
+
+    utils.set_setting("pipelines_disabled", False)
+    assert utils.get_bool_setting("pipelines_disabled") is False
+
+    models.Settings.objects.get(name="pipelines_disabled").delete()
+    assert utils.get_setting("pipelines_disabled", "missing") == "missing"
+
+
+@pytest.mark.django_db
+def test_settings_cache_checks_version_written_by_other_processes(settings):
+    utils.set_setting("object_counting_disabled", False)
+    assert utils.get_bool_setting("object_counting_disabled") is False
+
+    # Queryset updates do not send signals, like a change made elsewhere.
+    models.Settings.objects.filter(name="object_counting_disabled").update(value="True")
+    settings.SETTINGS_CACHE_CHECK_INTERVAL = 3600
+    models.Settings.objects.filter(name=utils.SETTINGS_VERSION_NAME).update(
+        value="other"
+    )
+    assert utils.get_bool_setting("object_counting_disabled") is False
+
+    settings.SETTINGS_CACHE_CHECK_INTERVAL = 0
+    assert utils.get_bool_setting("object_counting_disabled") is True
+
+
+@pytest.mark.django_db
+def test_typed_setting_accessors():
+    location_uuid = "7c1d5f0c-7b31-4b2a-a9e5-ad6f7a0e9c1e"
+    models.Settings.objects.create(name="default_AS_location", value=location_uuid)
+    utils.set_setting("default_transfer_source", [location_uuid])
+    utils.set_setting("recover_request_notification_url", "")
+
+    assert utils.get_setting("default_AS_location") == location_uuid
+    assert utils.get_list_setting("default_transfer_source") == [location_uuid]
+    assert utils.get_list_setting("default_backlog") == []
+    assert utils.get_str_setting("recover_request_notification_url") is None
+    assert utils.SETTINGS_VERSION_NAME not in utils.get_all_settings()
+
+
+def test_write_with_checksums(tmp_path):
+    dest = tmp_path / "file.txt"
+    with dest.open("wb") as f:
+        checksums = utils.write_with_checksums(
+            [b"hello ", b"world"], f, ("md5", "sha512")
+        )
+
+    assert dest.read_bytes() == b"hello world"
+    assert checksums["md5"].hexdigest() == "5eb63bbbe01eeed093cb22bb8f5acdc3"
+    assert (
+        checksums["sha512"].hexdigest()
+        == utils.generate_checksum(str(dest), "sha512").hexdigest()
+    )
+
+
+@pytest.mark.parametrize(
+    "range_header,expected",
+    [
+        (None, None),
+        ("bytes=0-9", (0, 9)),
+        ("bytes=5-", (5, 9)),
+        ("bytes=-3", (7, 9)),
+        ("bytes=2-100", (2, 9)),
+        ("bytes=9-5", None),
+        ("bytes=0-1,3-4", None),
+        ("items=0-1", None),
+    ],
+)
+def test_parse_range_header(range_header, expected):
+    assert utils.parse_range_header(range_header, 10) == expected
+
+
+@pytest.mark.parametrize("range_header", ["bytes=10-", "bytes=-0"])
+def test_parse_range_header_unsatisfiable(range_header):
+    with pytest.raises(ValueError):
+        utils.parse_range_header(range_header, 10)
+
+
+@pytest.mark.parametrize(
+    "range_header,status,content",
+    [(None, 200, b"3456"), ("bytes=1-2", 206, b"45"), ("bytes=8-", 416, b"")],
+)
+def test_download_file_range_stream(tmp_path, range_header, status, content):
+    path = tmp_path / "package.7z"
+    path.write_bytes(b"0123456789")
+
+    response = utils.download_file_range_stream(
+        str(path),
+        3,
+        4,
+        "package.tar-2",
+        range_header=range_header,
+        checksum_type="MD5",
+        checksum="def7924e3199be5e18060bb3e1d547a7",
+    )
+
+    assert response.status_code == status
+    if status != 416:
+        assert b"".join(response.streaming_content) == content
+        assert response["Content-Length"] == str(len(content))
+        assert response["Digest"] == "MD5=3veSTjGZvl4YBguz4dVHpw=="
+
+
+def _kill_worker():
+    os._exit(1)
+
+
+def test_process_pool_fails_jobs_of_dead_workers():
+    pool = utils.ProcessPool(1)
+    results = queue.Queue()
+    try:
+        pool.apply_async(
+            _kill_worker,
+            (),
+            callback=lambda result: results.put(("result", result)),
+            error_callback=lambda err: results.put(("error", err)),
+        )
+        kind, error = results.get(timeout=30)
+        assert kind == "error"
+        assert isinstance(error, BrokenProcessPool)
+
+        pool.apply_async(
+            os.getpid,
+            (),
+            callback=lambda result: results.put(("result", result)),
+            error_callback=lambda err: results.put(("error", err)),
+        )
+        kind, pid = results.get(timeout=30)
+        assert kind == "result"
+        assert pid != os.getpid()
+    finally:
+        pool.terminate()
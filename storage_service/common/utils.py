@@ -1,7 +1,10 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 import ast
+import base64
+import binascii
 from collections import namedtuple
+from concurrent import futures
 import datetime
 import hashlib
 import logging
@@ -13,12 +16,18 @@ import re
 import shutil
 import subprocess
 import tarfile
+import threading
+import time
 import uuid
 
 import scandir
+from django.conf import settings as django_settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, connections, transaction
 from django import http
 from django.utils.translation import ugettext as _
+import requests
+from requests.adapters import HTTPAdapter
 import six
 
 from administration import models
@@ -93,27 +102,127 @@ DECOMPRESS_TRANSFORM_TYPE = "decompression"
 
 # ########## SETTINGS ############
 
+# Name of the reserved row in the Settings table that holds the version token
+# of the whole table. It is bumped every time a setting is saved or deleted so
+# that each process can tell cheaply whether its cached copy is still valid.
+SETTINGS_VERSION_NAME = "_settings_version"
+
+
+def _parse_setting_value(value):
+    try:
+        return ast.literal_eval(value)
+    except (SyntaxError, ValueError):
+        return value  # Not all the settings are Python literals
+
+
+def _get_settings_version():
+    return (
+        models.Settings.objects.filter(name=SETTINGS_VERSION_NAME)
+        .values_list("value", flat=True)
+        .first()
+    )
+
+
+def bump_settings_version():
+    """Record that the Settings table has changed.
+
+    Uses queryset methods that do not send model signals so it can be called
+    from the Settings signal receivers.
+    """
+    version = uuid.uuid4().hex
+    updated = models.Settings.objects.filter(name=SETTINGS_VERSION_NAME).update(
+        value=version
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                models.Settings.objects.bulk_create(
+                    [models.Settings(name=SETTINGS_VERSION_NAME, value=version)]
+                )
+        except IntegrityError:
+            # Another process created the row concurrently.
+            models.Settings.objects.filter(name=SETTINGS_VERSION_NAME).update(
+                value=version
+            )
+    SETTINGS_CACHE.invalidate()
+
+
+class SettingsCache(object):
+    """Process-local copy of the Settings table.
+
+    The cached values are reused until the version token stored in the table
+    changes. The token is checked at most once every
+    ``settings.SETTINGS_CACHE_CHECK_INTERVAL`` seconds, so other processes
+    (e.g. gunicorn workers) see changes after that interval at the latest.
+    Changes made by this process invalidate the cache immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._version = None
+        self._checked_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._values = None
+
+    def get_all(self):
+        """Return a dict of 'setting_name': value with all of the settings."""
+        interval = getattr(django_settings, "SETTINGS_CACHE_CHECK_INTERVAL", 0)
+        now = time.time()
+        with self._lock:
+            if self._values is None or now - self._checked_at >= interval:
+                # Read the version before the values, so a change made while
+                # we load the table is detected in the next check.
+                version = _get_settings_version()
+                if self._values is None or version != self._version:
+                    self._values = {
+                        name: _parse_setting_value(value)
+                        for name, value in models.Settings.objects.exclude(
+                            name=SETTINGS_VERSION_NAME
+                        ).values_list("name", "value")
+                    }
+                    self._version = version
+                self._checked_at = now
+            return self._values
+
+
+SETTINGS_CACHE = SettingsCache()
+
 
 def get_all_settings():
     """ Returns a dict of 'setting_name': value with all of the settings. """
-    settings = dict(models.Settings.objects.all().values_list("name", "value"))
-    for setting, value in settings.items():
-        try:
-            settings[setting] = ast.literal_eval(value)
-        except (SyntaxError, ValueError):
-            pass  # Not all the settings are Python literals
-    return settings
+    return dict(SETTINGS_CACHE.get_all())
 
 
 def get_setting(setting, default=None):
     """ Returns the value of 'setting' from models.Settings, 'default' if not found."""
-    try:
-        setting = models.Settings.objects.get(name=setting)
-    except models.Settings.DoesNotExist:
-        return_value = default
-    else:
-        return_value = ast.literal_eval(setting.value)
-    return return_value
+    return SETTINGS_CACHE.get_all().get(setting, default)
+
+
+def get_bool_setting(setting, default=False):
+    """ Returns the value of 'setting' as a bool. """
+    return bool(get_setting(setting, default))
+
+
+def get_str_setting(setting, default=None):
+    """Returns the value of 'setting' as a string, 'default' if not found or
+    empty."""
+    value = get_setting(setting)
+    if value is None or value == "":
+        return default
+    return six.text_type(value)
+
+
+def get_list_setting(setting, default=None):
+    """ Returns the value of 'setting' as a list, 'default' (or []) if unset."""
+    value = get_setting(setting)
+    if value is None:
+        return [] if default is None else default
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
 
 
 def set_setting(setting, value=None):
@@ -186,6 +295,91 @@ def download_file_stream(filepath, temp_dir=None):
     return response
 
 
+def parse_range_header(range_header, length):
+    """Return the (first, last) byte positions requested by the HTTP Range
+    header ``range_header`` for a representation of ``length`` bytes.
+
+    Returns None if the header should be ignored (malformed, not in bytes or
+    with multiple ranges) and raises ValueError if the range can't be
+    satisfied.
+    """
+    match = re.match(r"^\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*$", range_header or "")
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if not suffix or not length:
+            raise ValueError("Unsatisfiable range")
+        return max(length - suffix, 0), length - 1
+    first = int(first)
+    if last and int(last) < first:
+        return None
+    if first >= length:
+        raise ValueError("Unsatisfiable range")
+    last = min(int(last), length - 1) if last else length - 1
+    return first, last
+
+
+def _read_file_range(filepath, offset, length, chunk_size=1024 * 1024):
+    with open(filepath, "rb") as f:
+        f.seek(offset)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def download_file_range_stream(
+    filepath,
+    offset,
+    length,
+    filename,
+    range_header=None,
+    checksum_type=None,
+    checksum=None,
+):
+    """
+    Returns ``length`` bytes of ``filepath`` from ``offset`` as a streamed
+    download named ``filename``, without copying them.
+
+    Supports single HTTP Range requests (``range_header``) relative to the
+    returned bytes. If ``checksum`` is given, the hex digest of the returned
+    bytes, it is sent in a Digest header.
+    """
+    # If not found, return 404
+    if not os.path.exists(filepath):
+        return http.HttpResponseNotFound(_("File not found"))
+
+    try:
+        byte_range = parse_range_header(range_header, length)
+    except ValueError:
+        response = http.HttpResponse(status=416)
+        response["Content-Range"] = "bytes */{}".format(length)
+        return response
+    first, last = byte_range or (0, length - 1)
+
+    response = http.StreamingHttpResponse(
+        _read_file_range(filepath, offset + first, last - first + 1),
+        status=206 if byte_range else 200,
+    )
+    response["Content-type"] = mimetypes.guess_type(filename)[0]
+    response["Content-Disposition"] = 'attachment; filename="' + filename + '"'
+    response["Content-Length"] = last - first + 1
+    response["Accept-Ranges"] = "bytes"
+    if byte_range:
+        response["Content-Range"] = "bytes {}-{}/{}".format(first, last, length)
+    if checksum and checksum_type:
+        response["Digest"] = "{}={}".format(
+            checksum_type,
+            base64.b64encode(binascii.unhexlify(checksum)).decode("ascii"),
+        )
+    return response
+
+
 # ########## XML & POINTER FILE ############
 
 
@@ -308,8 +502,12 @@ def get_compression(pointer_path):
     :param pointer_path: path to xml pointer file
     :returns: one of the constants in ``COMPRESSION_ALGORITHMS``.
     """
-    doc = etree.parse(pointer_path)
+    return get_compression_from_tree(etree.parse(pointer_path))
+
 
+def get_compression_from_tree(doc):
+    """Return the compression algorithm documented in the parsed pointer file
+    ``doc``, see ``get_compression``."""
     puid = doc.findtext(".//premis:formatRegistryKey", namespaces=NSMAP)
     if puid is None:
         # Try the PREMIS3 namespace as the pointer file may be newer.
@@ -646,6 +844,120 @@ def generate_checksum(file_path, checksum_type="md5"):
     return checksum
 
 
+def requests_session(pool_size=10, verify=None):
+    """Return a requests session that keeps up to ``pool_size`` connections
+    per host open, to be shared by the threads talking to that host.
+
+    :param pool_size: size of the connection pool (int)
+    :param verify: value for the session's ``verify`` attribute, defaults to
+        ``not settings.INSECURE_SKIP_VERIFY``
+    """
+    session = requests.Session()
+    session.verify = (
+        not django_settings.INSECURE_SKIP_VERIFY if verify is None else verify
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def read_in_chunks(file_obj, chunk_size=1024 * 1024):
+    """Yield the content of the binary file-like ``file_obj`` in chunks."""
+    return iter(lambda: file_obj.read(chunk_size), b"")
+
+
+def write_with_checksums(chunks, dest_file, checksum_types=("md5",)):
+    """Write the byte strings in the iterable ``chunks`` to the binary file
+    object ``dest_file`` and compute their checksums in the same pass.
+
+    Returns a dict of checksum type to checksum object.
+
+    If a checksum_type is not a valid checksum, ValueError raised by hashlib.
+    """
+    checksums = [(name, hashlib.new(name)) for name in checksum_types]
+    for chunk in chunks:
+        dest_file.write(chunk)
+        for _name, checksum in checksums:
+            checksum.update(chunk)
+    return dict(checksums)
+
+
+def hash_chunks(chunks, checksums):
+    """Yield the byte strings of ``chunks`` after updating each of the hashlib
+    objects in ``checksums`` with them."""
+    for chunk in chunks:
+        for checksum in checksums:
+            checksum.update(chunk)
+        yield chunk
+
+
+def buffered_chunks(chunks, buffer_size=8):
+    """Yield the byte strings of the iterable ``chunks``, read ahead by a
+    thread and buffered up to ``buffer_size`` chunks, so that producing and
+    consuming them overlap. Errors raised by ``chunks`` are raised again by
+    the consumer.
+    """
+    buffer = six.moves.queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+    end = object()
+
+    def put(item):
+        # Give up when the consumer stopped, rather than block forever
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except six.moves.queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        except Exception as err:
+            put(err)
+        else:
+            put(end)
+
+    producer = threading.Thread(target=produce)
+    producer.daemon = True
+    producer.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is end:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
+
+
+class ChunksReader(object):
+    """Read-only binary file-like object reading the byte strings of the
+    iterable ``chunks``, for libraries that upload file objects."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
 def uuid_to_path(uuid):
     """Converts a UUID into a path.
 
@@ -685,6 +997,93 @@ def removedirs(relative_path, base=None):
         head, tail = os.path.split(head)
 
 
+# Thread removing the quad directories left empty by deleted packages, see
+# removedirs_in_background
+_removedirs_executor = None
+_removedirs_executor_lock = threading.Lock()
+
+
+def removedirs_in_background(relative_path, base=None):
+    """Call ``removedirs`` in a background thread, which removes the
+    directories of one call at a time, so that deleting a package does not wait
+    for its emptied quad directories to be removed.
+
+    Returns a ``concurrent.futures.Future``.
+    """
+    global _removedirs_executor
+    with _removedirs_executor_lock:
+        if _removedirs_executor is None:
+            _removedirs_executor = futures.ThreadPoolExecutor(max_workers=1)
+        future = _removedirs_executor.submit(removedirs, relative_path, base=base)
+    future.add_done_callback(_log_removedirs_error)
+    return future
+
+
+def _log_removedirs_error(future):
+    if future.exception() is not None:
+        LOGGER.warning(
+            "Unable to remove the quad directories of a deleted package: %s",
+            future.exception(),
+        )
+
+
+class ProcessPool(object):
+    """Runs jobs in ``processes`` forked worker processes, like
+    ``multiprocessing.Pool.apply_async``.
+
+    A job whose worker dies, e.g. killed by the OOM killer, fails with
+    ``BrokenProcessPool`` instead of never completing, and new workers run
+    the jobs submitted after it.
+    """
+
+    def __init__(self, processes):
+        self.processes = processes
+        self._executor = None
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def apply_async(self, func, args, callback, error_callback):
+        """Run ``func(*args)`` in a worker, then ``callback`` with its result
+        or ``error_callback`` with its exception, in a thread of the pool."""
+        # The workers are forked as jobs are submitted, they must not inherit
+        # our connections
+        connections.close_all()
+        if self._executor is None:
+            self._executor = futures.ProcessPoolExecutor(self.processes)
+        try:
+            future = self._executor.submit(func, *args)
+        except futures.process.BrokenProcessPool:
+            # A worker died, this executor does not take jobs any more
+            self._executor.shutdown(wait=False)
+            self._executor = futures.ProcessPoolExecutor(self.processes)
+            future = self._executor.submit(func, *args)
+        with self._lock:
+            self._futures.add(future)
+
+        def done(future):
+            with self._lock:
+                self._futures.discard(future)
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                callback(future.result())
+            else:
+                error_callback(error)
+
+        future.add_done_callback(done)
+
+    def terminate(self):
+        """Cancel the jobs not started yet and wait for the running ones."""
+        with self._lock:
+            pending = list(self._futures)
+        for future in pending:
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
 def strip_quad_dirs_from_path(dest_path):
     """Return dest_path with UUID quad directories removed.
 
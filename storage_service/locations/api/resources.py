@@ -10,6 +10,7 @@ import os
 import pprint
 import re
 import shutil
+import time
 import six.moves.urllib.request
 import six.moves.urllib.parse
 import six.moves.urllib.error
@@ -19,7 +20,7 @@ from pathlib import Path
 from django.conf import settings
 from django.conf.urls import url
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.forms.models import model_to_dict
 from django.urls import reverse
 from django.utils.translation import ugettext as _
@@ -60,12 +61,14 @@ from ..models import (
     StorageException,
     Async,
     PosixMoveUnsupportedError,
+    StreamMoveUnsupportedError,
 )
 from ..forms import SpaceForm
 from ..constants import PROTOCOL
 from locations import signals
 
 from ..models.async_manager import AsyncManager
+from ..models.space import parse_browse_cursor
 
 LOGGER = logging.getLogger(__name__)
 
@@ -79,6 +82,21 @@ def _is_relative_path(path1, path2):
         return False
 
 
+def _get_browse_paging(request):
+    """Return the ``cursor`` and ``limit`` of a browse request as keyword
+    arguments for ``Space.browse``. Raises ValueError if limit is invalid and
+    StorageException if cursor is."""
+    paging = {}
+    if request.GET.get("cursor"):
+        paging["cursor"] = request.GET["cursor"]
+        parse_browse_cursor(paging["cursor"])
+    if request.GET.get("limit"):
+        paging["limit"] = int(request.GET["limit"])
+        if paging["limit"] < 1:
+            raise ValueError("limit must be a positive integer")
+    return paging
+
+
 # FIXME ModelResources with ForeignKeys to another model don't work with
 # validation = CleanedDataFormValidation  On creation, it errors with:
 # "Select a valid choice. That choice is not one of the available choices."
@@ -240,7 +258,7 @@ class PipelineResource(ModelResource):
 
     def obj_create(self, bundle, **kwargs):
         bundle = super(PipelineResource, self).obj_create(bundle, **kwargs)
-        bundle.obj.enabled = not utils.get_setting("pipelines_disabled", False)
+        bundle.obj.enabled = not utils.get_bool_setting("pipelines_disabled")
         create_default_locations = bundle.data.get("create_default_locations", False)
         # Try to guess Pipeline's IP if remote_name is undefined
         if bundle.data.get("remote_name") is None:
@@ -333,7 +351,7 @@ class SpaceResource(ModelResource):
         obj.save()
         return bundle
 
-    def get_objects(self, space, path):
+    def get_objects(self, space, path, **paging):
         message = _("This method should be accessed via a versioned subclass")
         raise NotImplementedError(message)
 
@@ -347,7 +365,11 @@ class SpaceResource(ModelResource):
         Directories is a subset of entries, all are just the name.
 
         If a path=<path> parameter is provided, will look in that path inside
-        the Space."""
+        the Space.
+
+        Spaces that support it return their entries in pages of at most
+        limit=<n> entries, starting at cursor=<cursor>, and add the cursor of
+        the next page as 'next_cursor' (None after the last page)."""
 
         space = bundle.obj
         path = request.GET.get("path", "")
@@ -359,7 +381,16 @@ class SpaceResource(ModelResource):
                 _("The path parameter must be relative to the space path")
             )
 
-        objects = self.get_objects(space, path)
+        try:
+            paging = _get_browse_paging(request)
+        except ValueError:
+            return http.HttpBadRequest(
+                _("The limit parameter must be a positive integer")
+            )
+        except StorageException as err:
+            return http.HttpBadRequest(six.text_type(err))
+
+        objects = self.get_objects(space, path, **paging)
 
         return self.create_response(request, objects)
 
@@ -446,7 +477,7 @@ class LocationResource(ModelResource):
     def decode_path(self, path):
         return path
 
-    def get_objects(self, space, path):
+    def get_objects(self, space, path, **paging):
         message = _("This method should be accessed via a versioned subclass")
         raise NotImplementedError(message)
 
@@ -510,7 +541,11 @@ class LocationResource(ModelResource):
         Directories is a subset of entries, all are just the name.
 
         If a path=<path> parameter is provided, will look in that path inside
-        the Location."""
+        the Location.
+
+        Spaces that support it return their entries in pages of at most
+        limit=<n> entries, starting at cursor=<cursor>, and add the cursor of
+        the next page as 'next_cursor' (None after the last page)."""
 
         location = bundle.obj
         path = request.GET.get("path", "")
@@ -524,7 +559,16 @@ class LocationResource(ModelResource):
                 _("The path parameter must be relative to the location path")
             )
 
-        objects = self.get_objects(location.space, path)
+        try:
+            paging = _get_browse_paging(request)
+        except ValueError:
+            return http.HttpBadRequest(
+                _("The limit parameter must be a positive integer")
+            )
+        except StorageException as err:
+            return http.HttpBadRequest(six.text_type(err))
+
+        objects = self.get_objects(location.space, path, **paging)
 
         return self.create_response(request, objects)
 
@@ -560,20 +604,29 @@ class LocationResource(ModelResource):
                     package=None,
                 )
             except PosixMoveUnsupportedError:
-                origin_space.move_to_storage_service(
-                    source_path=source_path,
-                    destination_path=destination_path,
-                    destination_space=destination_space,
-                )
-                origin_space.post_move_to_storage_service()
-                destination_space.move_from_storage_service(
-                    source_path=destination_path,
-                    destination_path=destination_path,
-                    package=None,
-                )
-                destination_space.post_move_from_storage_service(
-                    destination_path, destination_path
-                )
+                try:
+                    # stream_move copies, so it is allowed from any location
+                    origin_space.stream_move(
+                        source_path=source_path,
+                        destination_path=destination_path,
+                        destination_space=destination_space,
+                        package=None,
+                    )
+                except StreamMoveUnsupportedError:
+                    origin_space.move_to_storage_service(
+                        source_path=source_path,
+                        destination_path=destination_path,
+                        destination_space=destination_space,
+                    )
+                    origin_space.post_move_to_storage_service()
+                    destination_space.move_from_storage_service(
+                        source_path=destination_path,
+                        destination_path=destination_path,
+                        package=None,
+                    )
+                    destination_space.post_move_from_storage_service(
+                        destination_path, destination_path
+                    )
 
     def _handle_location_file_move(self, move_files_fn, request, *args, **kwargs):
         """
@@ -800,6 +853,12 @@ class PackageResource(ModelResource):
                 self.wrap_view("obj_create_async"),
                 name="obj_create_async",
             ),
+            url(
+                r"^(?P<resource_name>%s)/delete_aips%s$"
+                % (self._meta.resource_name, trailing_slash()),
+                self.wrap_view("delete_aips_request"),
+                name="delete_aips_request",
+            ),
             url(
                 r"^(?P<resource_name>%s)/(?P<%s>\w[\w/-]*)/delete_aip%s$"
                 % (
@@ -1239,7 +1298,6 @@ class PackageResource(ModelResource):
     )
     def delete_aip_request(self, request, bundle, **kwargs):
         """Create a delete request for an AIP. Does not perform the deletion."""
-        request_info = bundle.data
         package = bundle.obj
         if package.package_type not in Package.PACKAGE_TYPE_CAN_DELETE:
             # Can only request deletion on AIPs
@@ -1249,6 +1307,74 @@ class PackageResource(ModelResource):
                 response_json, content_type="application/json"
             )
 
+        status_code, response = self._attempt_delete_request(package, bundle.data)
+
+        self.log_throttled_access(request)
+        response_json = json.dumps(response)
+        return http.HttpResponse(
+            status=status_code, content=response_json, content_type="application/json"
+        )
+
+    def delete_aips_request(self, request, **kwargs):
+        """Create delete requests for several AIPs. Called when a POST request
+        is made to api/v2/file/delete_aips/ with the fields of delete_aip and
+        the list of the UUIDs of the AIPs in ``uuids``. Does not perform the
+        deletions, the requests can then be approved together.
+
+        Returns the status code and response of each AIP by UUID.
+        """
+        self.method_check(request, allowed=["post"])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+
+        try:
+            request_info = self.deserialize(
+                request,
+                request.body,
+                format=request.META.get("CONTENT_TYPE", "application/json"),
+            )
+        except Exception:
+            request_info = {}
+        required_fields = ("uuids", "event_reason", "pipeline", "user_id", "user_email")
+        if not all(k in request_info for k in required_fields) or not isinstance(
+            request_info["uuids"], list
+        ):
+            return http.HttpBadRequest(
+                _("All of these fields must be provided: %(fields)s")
+                % {"fields": ", ".join(required_fields)}
+            )
+
+        packages = {
+            package.uuid: package
+            for package in Package.objects.filter(uuid__in=request_info["uuids"])
+        }
+        results = {}
+        for uuid in request_info["uuids"]:
+            package = packages.get(uuid)
+            if package is None:
+                status_code = 404
+                response = {
+                    "message": _("Resource with UUID %(uuid)s does not exist")
+                    % {"uuid": uuid}
+                }
+            elif package.package_type not in Package.PACKAGE_TYPE_CAN_DELETE:
+                status_code = 405
+                response = {"message": _("Deletes not allowed on this package type.")}
+            else:
+                status_code, response = self._attempt_delete_request(
+                    package, request_info
+                )
+            response["status_code"] = status_code
+            results[uuid] = response
+
+        self.log_throttled_access(request)
+        return http.HttpResponse(
+            content=json.dumps(results), content_type="application/json"
+        )
+
+    def _attempt_delete_request(self, package, request_info):
+        """Create a delete request for ``package`` and send the deletion
+        request signal. Returns the status code and response."""
         (status_code, response) = self._attempt_package_request_event(
             package, request_info, Event.DELETE, Package.DEL_REQ
         )
@@ -1265,12 +1391,7 @@ class PackageResource(ModelResource):
             )
         else:
             response = {"message": _("A deletion request already exists for this AIP.")}
-
-        self.log_throttled_access(request)
-        response_json = json.dumps(response)
-        return http.HttpResponse(
-            status=status_code, content=response_json, content_type="application/json"
-        )
+        return status_code, response
 
     @_custom_endpoint(
         expected_methods=["post"],
@@ -1424,6 +1545,20 @@ class PackageResource(ModelResource):
                     status=502,
                 )
         lockss_au_number = kwargs.get("chunk_number")
+        if lockss_au_number is not None:
+            # LOCKSS chunks are byte ranges of the stored package
+            chunk = package.get_lockss_chunk(lockss_au_number)
+            if chunk is not None:
+                name = os.path.splitext(os.path.basename(chunk.path))[0]
+                return utils.download_file_range_stream(
+                    chunk.path,
+                    chunk.offset,
+                    chunk.size,
+                    filename="{}.tar-{}".format(name, lockss_au_number),
+                    range_header=request.META.get("HTTP_RANGE"),
+                    checksum_type=chunk.checksum_type,
+                    checksum=chunk.checksum,
+                )
         try:
             temp_dir = None
             full_path = package.get_download_path(lockss_au_number)
@@ -2025,7 +2160,8 @@ class PackageResource(ModelResource):
 
 class AsyncResource(ModelResource):
     """
-    Represents an async task that may or may not still be running.
+    Represents an async task that may or may not still be running, with the
+    progress of the phase it is in.
     """
 
     class Meta:
@@ -2043,11 +2179,32 @@ class AsyncResource(ModelResource):
             "created_time",
             "updated_time",
             "completed_time",
+            "phase",
+            "bytes_done",
+            "bytes_total",
+            "files_done",
+            "files_total",
+            "bytes_per_second",
+            "progress_time",
         ]
         always_return_data = True
         detail_allowed_methods = ["get"]
         detail_uri_name = "id"
 
+    def prepend_urls(self):
+        return [
+            url(
+                r"^(?P<resource_name>%s)/(?P<%s>\d+)/events%s$"
+                % (
+                    self._meta.resource_name,
+                    self._meta.detail_uri_name,
+                    trailing_slash(),
+                ),
+                self.wrap_view("events"),
+                name="async_events",
+            )
+        ]
+
     def dehydrate(self, bundle):
         """Pull out errors and results using our accessors so they get unpickled."""
         if bundle.obj.completed:
@@ -2055,5 +2212,73 @@ class AsyncResource(ModelResource):
                 bundle.data["error"] = bundle.obj.error
             else:
                 bundle.data["result"] = bundle.obj.result
+        elif bundle.obj.bytes_total and bundle.obj.bytes_per_second:
+            # Estimated from the current rate
+            bundle.data["seconds_remaining"] = int(
+                max(0, bundle.obj.bytes_total - bundle.obj.bytes_done)
+                / bundle.obj.bytes_per_second
+            )
 
         return bundle
+
+    def events(self, request, **kwargs):
+        """Stream the progress of the task as server-sent events.
+
+        A ``progress`` event, with the task as returned by its detail
+        endpoint, is sent every ``ASYNC_PROGRESS_INTERVAL`` seconds until the
+        task completes, when a ``completed`` event is sent and the stream
+        ends. An ``expired`` event ends it if the task is deleted meanwhile.
+
+        The stream also ends after ``ASYNC_EVENTS_MAX_DURATION`` seconds,
+        when clients reconnect, as ``EventSource`` does on its own, or poll
+        the detail endpoint instead. Every event has an ``id``, the time of
+        the progress it reports, but as each event carries the whole progress
+        the ``Last-Event-ID`` of a reconnection is not needed to resume.
+
+        The stream holds the worker serving it for its whole duration, so it
+        needs asynchronous (e.g. gevent) Gunicorn workers.
+        """
+        self.method_check(request, allowed=["get"])
+        self.is_authenticated(request)
+        self.throttle_check(request)
+        self.log_throttled_access(request)
+
+        try:
+            async_task = Async.objects.get(id=kwargs["id"])
+        except Async.DoesNotExist:
+            return http.HttpNotFound()
+        self.authorized_read_detail(
+            [async_task], self.build_bundle(obj=async_task, request=request)
+        )
+
+        response = StreamingHttpResponse(
+            self._generate_events(request, async_task.id),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # Don't let proxies buffer the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def _generate_events(self, request, async_id):
+        # Reconnect once the next progress is written
+        yield "retry: {}\n\n".format(settings.ASYNC_PROGRESS_INTERVAL * 1000)
+        end_time = time.time() + settings.ASYNC_EVENTS_MAX_DURATION
+        while True:
+            try:
+                async_task = Async.objects.get(id=async_id)
+            except Async.DoesNotExist:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            bundle = self.full_dehydrate(
+                self.build_bundle(obj=async_task, request=request)
+            )
+            event_time = async_task.progress_time or async_task.updated_time
+            yield "id: {}\nevent: {}\ndata: {}\n\n".format(
+                event_time.isoformat() if event_time else "",
+                "completed" if async_task.completed else "progress",
+                self.serialize(request, bundle.data, "application/json"),
+            )
+            if async_task.completed or time.time() >= end_time:
+                return
+            time.sleep(settings.ASYNC_PROGRESS_INTERVAL)
@@ -1,6 +1,7 @@
 # stdlib, alphabetical
 from __future__ import absolute_import
 import cgi
+from concurrent import futures
 import datetime
 import logging
 import os
@@ -21,10 +22,13 @@ import requests
 # This project, alphabetical
 from locations import models
 from locations.models.async_manager import AsyncManager
-from common.utils import generate_checksum
+from common.utils import read_in_chunks, requests_session, write_with_checksums
 
 LOGGER = logging.getLogger(__name__)
 
+# Size of the buffers used to stream request bodies and downloads to disk.
+STREAM_CHUNK_SIZE = 1024 * 1024
+
 
 def get_deposit(uuid):
     """
@@ -52,15 +56,28 @@ def deposit_list(location_uuid):
     return deposits
 
 
-def write_request_body_to_temp_file(request):
+def write_request_body_to_file(request, file_path, checksum_types=()):
+    """
+    Stream HTTP request's body content to a file without holding it in memory.
+
+    Returns a dict of checksum type to hex digest of the content written
+    """
+    with open(file_path, "wb") as f:
+        checksums = write_with_checksums(
+            read_in_chunks(request, STREAM_CHUNK_SIZE), f, checksum_types
+        )
+    return {name: checksum.hexdigest() for name, checksum in checksums.items()}
+
+
+def write_request_body_to_temp_file(request, dir=None):
     """
     Write HTTP request's body content to a temp file.
 
     Return the temp file's path
     """
-    _, temp_filepath = tempfile.mkstemp()
-    with open(temp_filepath, "ab") as f:
-        f.write(request.body)
+    fd, temp_filepath = tempfile.mkstemp(dir=dir)
+    os.close(fd)
+    write_request_body_to_file(request, temp_filepath)
     return temp_filepath
 
 
@@ -94,14 +111,25 @@ def pad_destination_filepath_if_it_already_exists(filepath, original=None, attem
 
 
 def download_resource(
-    url, destination_path, filename=None, username=None, password=None
+    url,
+    destination_path,
+    filename=None,
+    username=None,
+    password=None,
+    session=None,
+    checksum_types=(),
 ):
     """
     Download a resource.
 
     Download a URL resource to a destination directory, using the response's Content-Disposition header, if available, to determine the destination filename (using the filename at the end of the URL otherwise)
 
-    Returns filename of downloaded resource
+    The response is streamed to disk and the checksums listed in
+    `checksum_types` are computed while it is written. If `session` is
+    provided it is used to make the request, so its connections are reused.
+
+    Returns (filename, checksums) where `checksums` is a dict of checksum type
+    to hex digest of the downloaded resource
     """
     LOGGER.info("downloading url: %s", url)
 
@@ -110,21 +138,29 @@ def download_resource(
         auth = (username, password)
 
     verify = not settings.INSECURE_SKIP_VERIFY
-    response = requests.get(url, auth=auth, verify=verify)
-    if filename is None:
-        if "content-disposition" in response.headers:
-            filename = parse_filename_from_content_disposition(
-                response.headers["content-disposition"]
+    response = (session or requests).get(url, auth=auth, verify=verify, stream=True)
+    with response:
+        response.raise_for_status()
+        if filename is None:
+            if "content-disposition" in response.headers:
+                filename = parse_filename_from_content_disposition(
+                    response.headers["content-disposition"]
+                )
+            else:
+                filename = os.path.basename(url)
+        LOGGER.info("Filename set to " + filename)
+
+        filepath = os.path.join(destination_path, filename)
+        with open(filepath, "wb") as fp:
+            checksums = write_with_checksums(
+                response.iter_content(chunk_size=STREAM_CHUNK_SIZE),
+                fp,
+                checksum_types,
             )
-        else:
-            filename = os.path.basename(url)
-    LOGGER.info("Filename set to " + filename)
-
-    filepath = os.path.join(destination_path, filename)
-    with open(filepath, "wb") as fp:
-        fp.write(response.content)
 
-    return filename
+    return filename, {
+        name: checksum.hexdigest() for name, checksum in checksums.items()
+    }
 
 
 def deposit_download_tasks(deposit):
@@ -163,6 +199,11 @@ def _fetch_content(deposit_uuid, objects, subdirs=None):
     Download a number of files, keeping track of progress and success using a
     database record. After downloading, finalize deposit if requested.
 
+    Files are downloaded concurrently by up to
+    ``settings.SWORD_DOWNLOAD_CONCURRENCY`` threads sharing a pool of
+    connections. Their MD5 and SHA-512 checksums are computed while they are
+    written to disk.
+
     If subdirs is provided, the file will be moved into a subdirectory of the
     new transfer; otherwise, it will be placed in the transfer's root.
     """
@@ -178,72 +219,68 @@ def _fetch_content(deposit_uuid, objects, subdirs=None):
     fedora_username = getattr(deposit_space, "fedora_user", None)
     fedora_password = getattr(deposit_space, "fedora_password", None)
 
-    # download the files
-    temp_dir = tempfile.mkdtemp()
-    completed = 0
+    if subdirs:
+        base_path = os.path.join(deposit.full_path, *subdirs)
+    else:
+        base_path = deposit.full_path
+
+    # create download task file records, all the database access happens in
+    # this thread, the workers only download and move files
+    task_files = []
     for item in objects:
-        # create download task file record
-        task_file = models.PackageDownloadTaskFile(task=task)
+        task_file = models.PackageDownloadTaskFile(
+            task=task, filename=item["filename"], url=item["url"]
+        )
         task_file.save()
+        task_files.append(task_file)
 
-        try:
-            filename = item["filename"]
-
-            task_file.filename = filename
-            task_file.url = item["url"]
-            task_file.save()
-
-            download_resource(
-                url=item["url"],
-                destination_path=temp_dir,
-                filename=filename,
-                username=fedora_username,
-                password=fedora_password,
-            )
-
-            temp_filename = os.path.join(temp_dir, filename)
-
-            if (
-                item["checksum"] is not None
-                and item["checksum"]
-                != generate_checksum(temp_filename, "md5").hexdigest()
-            ):
-                os.unlink(temp_filename)
-                raise Exception(_("Incorrect checksum"))
-
-            # Some MODS records have no proper filenames
-            if filename == "MODS Record":
-                filename = item["object_id"].replace(":", "-") + "-MODS.xml"
-
-            if subdirs:
-                base_path = os.path.join(deposit.full_path, *subdirs)
-            else:
-                base_path = deposit.full_path
-
-            new_path = os.path.join(base_path, filename)
-            shutil.move(temp_filename, new_path)
-
-            # mark download task file record complete or failed
-            task_file.completed = True
-            task_file.save()
-
-            LOGGER.info("Saved file to " + new_path)
-            completed += 1
-
-            file_record = models.File(
-                name=item["filename"],
-                source_id=item["object_id"],
-                checksum=generate_checksum(new_path, "sha512").hexdigest(),
-            )
-            file_record.save()
-        except Exception as e:
-            LOGGER.exception("Package download task encountered an error:" + str(e))
-            # an error occurred
-            task_file.failed = True
-            task_file.save()
-
-    # remove temp dir
-    shutil.rmtree(temp_dir)
+    # download the files
+    temp_dir = tempfile.mkdtemp()
+    completed = 0
+    max_workers = max(1, min(settings.SWORD_DOWNLOAD_CONCURRENCY, len(objects)))
+    session = requests_session(max_workers)
+    try:
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {
+                executor.submit(
+                    _fetch_item,
+                    item,
+                    temp_dir,
+                    base_path,
+                    session,
+                    fedora_username,
+                    fedora_password,
+                ): (item, task_file)
+                for item, task_file in zip(objects, task_files)
+            }
+            for future in futures.as_completed(pending):
+                item, task_file = pending[future]
+                try:
+                    new_path, sha512 = future.result()
+                except Exception as e:
+                    LOGGER.exception(
+                        "Package download task encountered an error:" + str(e)
+                    )
+                    # an error occurred
+                    task_file.failed = True
+                    task_file.save()
+                    continue
+
+                # mark download task file record complete
+                task_file.completed = True
+                task_file.save()
+
+                LOGGER.info("Saved file to " + new_path)
+                completed += 1
+
+                file_record = models.File(
+                    name=item["filename"], source_id=item["object_id"], checksum=sha512
+                )
+                file_record.save()
+    finally:
+        session.close()
+        # remove temp dir
+        shutil.rmtree(temp_dir)
 
     # record the number of successful downloads and completion time
     task.downloads_completed = completed
@@ -262,6 +299,42 @@ def _fetch_content(deposit_uuid, objects, subdirs=None):
         _finalize_if_not_empty(deposit_uuid)
 
 
+def _fetch_item(item, temp_dir, base_path, session, username, password):
+    """
+    Download a single object of a batch download and move it to `base_path`.
+
+    Returns (new_path, sha512) where `sha512` is the hex digest of the file
+    """
+    filename = item["filename"]
+    # Each download gets its own directory so files with the same name
+    # cannot overwrite each other while they are being fetched.
+    download_dir = tempfile.mkdtemp(dir=temp_dir)
+    __, checksums = download_resource(
+        url=item["url"],
+        destination_path=download_dir,
+        filename=filename,
+        username=username,
+        password=password,
+        session=session,
+        checksum_types=("md5", "sha512"),
+    )
+
+    temp_filename = os.path.join(download_dir, filename)
+
+    if item["checksum"] is not None and item["checksum"] != checksums["md5"]:
+        os.unlink(temp_filename)
+        raise Exception(_("Incorrect checksum"))
+
+    # Some MODS records have no proper filenames
+    if filename == "MODS Record":
+        filename = item["object_id"].replace(":", "-") + "-MODS.xml"
+
+    new_path = os.path.join(base_path, filename)
+    shutil.move(temp_filename, new_path)
+
+    return new_path, checksums["sha512"]
+
+
 def spawn_finalization(deposit_uuid):
     """
     Spawn an asynchronous finalization
@@ -6,6 +6,7 @@ from lxml import etree as etree
 import os
 import shutil
 import traceback
+import uuid
 
 # Core Django, alphabetical
 from django.http import HttpResponse
@@ -825,33 +826,40 @@ def _handle_upload_request_with_potential_md5_checksum(
     Write the HTTP request body to a file and, if the HTTP Content-MD5 header is
     set, make sure the destination file has the expected checkcum
 
+    The body is streamed to a temporary file next to the destination, hashing
+    it on the way, and renamed into place once it has been verified.
+
     Returns a response (with a specified HTTP status code) or an error response
     if a checksum has been provided but the destination file's is different
     """
-    temp_filepath = helpers.write_request_body_to_temp_file(request)
-    if "HTTP_CONTENT_MD5" in request.META:
-        md5sum = helpers.get_file_md5_checksum(temp_filepath)
-        if request.META["HTTP_CONTENT_MD5"] != md5sum:
-            os.remove(temp_filepath)
-            return helpers.sword_error_response(
-                request,
-                400,
-                _(
-                    "MD5 checksum of uploaded file (%(uploaded_md5sum)s) does not match checksum provided in header (%(header_md5sum)s)."
-                )
-                % {
-                    "uploaded_md5sum": md5sum,
-                    "header_md5sum": request.META["HTTP_CONTENT_MD5"],
-                },
-            )
-        else:
-            shutil.copyfile(temp_filepath, file_path)
+    temp_filepath = os.path.join(
+        os.path.dirname(file_path),
+        ".{}.{}.upload".format(os.path.basename(file_path), uuid.uuid4().hex),
+    )
+    try:
+        checksums = helpers.write_request_body_to_file(request, temp_filepath, ("md5",))
+    except Exception:
+        if os.path.exists(temp_filepath):
             os.remove(temp_filepath)
-            return HttpResponse(status=success_status_code)
-    else:
-        shutil.copyfile(temp_filepath, file_path)
+        raise
+    if (
+        "HTTP_CONTENT_MD5" in request.META
+        and request.META["HTTP_CONTENT_MD5"] != checksums["md5"]
+    ):
         os.remove(temp_filepath)
-        return HttpResponse(status=success_status_code)
+        return helpers.sword_error_response(
+            request,
+            400,
+            _(
+                "MD5 checksum of uploaded file (%(uploaded_md5sum)s) does not match checksum provided in header (%(header_md5sum)s)."
+            )
+            % {
+                "uploaded_md5sum": checksums["md5"],
+                "header_md5sum": request.META["HTTP_CONTENT_MD5"],
+            },
+        )
+    os.rename(temp_filepath, file_path)
+    return HttpResponse(status=success_status_code)
 
 
 def _deposit_receipt_response(request, deposit, status_code):
@@ -10,8 +10,8 @@ class PipelineResource(resources.PipelineResource):
 
 
 class SpaceResource(resources.SpaceResource):
-    def get_objects(self, space, path):
-        return space.browse(path)
+    def get_objects(self, space, path, **paging):
+        return space.browse(path, **paging)
 
 
 class LocationResource(resources.LocationResource):
@@ -20,8 +20,8 @@ class LocationResource(resources.LocationResource):
     description = fields.CharField(attribute="get_description", readonly=True)
     pipeline = fields.ToManyField(PipelineResource, "pipeline")
 
-    def get_objects(self, space, path):
-        return space.browse(path)
+    def get_objects(self, space, path, **paging):
+        return space.browse(path, **paging)
 
 
 class PackageResource(resources.PackageResource):
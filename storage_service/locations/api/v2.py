@@ -17,8 +17,8 @@ class PipelineResource(resources.PipelineResource):
 
 
 class SpaceResource(resources.SpaceResource):
-    def get_objects(self, space, path):
-        objects = space.browse(path)
+    def get_objects(self, space, path, **paging):
+        objects = space.browse(path, **paging)
         objects["entries"] = [b64encode_string(e) for e in objects["entries"]]
         objects["directories"] = [b64encode_string(d) for d in objects["directories"]]
 
@@ -33,8 +33,8 @@ class LocationResource(resources.LocationResource):
     def decode_path(self, path):
         return base64.b64decode(path).decode("utf8")
 
-    def get_objects(self, space, path):
-        objects = space.browse(path)
+    def get_objects(self, space, path, **paging):
+        objects = space.browse(path, **paging)
         objects["entries"] = [b64encode_string(e) for e in objects["entries"]]
         objects["directories"] = [b64encode_string(d) for d in objects["directories"]]
         objects["properties"] = {
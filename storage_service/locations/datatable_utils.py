@@ -11,8 +11,7 @@ http://legacy.datatables.net/usage/server-side
 from __future__ import absolute_import
 import os
 
-from django.db.models import Q
-from django.utils import timezone
+from django.db.models import F, Q
 
 from .models import FixityLog
 from .models import Package
@@ -35,8 +34,13 @@ class PackageDataTable(object):
         1: "origin_pipeline__description",
         3: "size",
         5: "replicated_package__uuid",
+        7: "last_fixity_datetime",
+        8: "last_fixity_success",
     }
 
+    # columns of ORDER_BY_MAPPING whose empty values are sorted last
+    NULLS_LAST_COLUMNS = (7,)
+
     # these columns instead can't be sorted directly with the
     # queryset so the queryset needs to be converted into a list
     # and then sorted using helper methods
@@ -44,8 +48,6 @@ class PackageDataTable(object):
         2: "sort_by_full_path_key",
         4: "sort_by_package_type_key",
         6: "sort_by_status_key",
-        7: "sort_by_fixity_date_key",
-        8: "sort_by_fixity_status_key",
     }
 
     def __init__(self, query_dict):
@@ -75,7 +77,7 @@ class PackageDataTable(object):
             )
         queryset = self.model.objects.filter(search_filter).distinct()
         self.total_display_records = queryset.count()
-        self.records = self.get_records(queryset)
+        self.records = self.get_records(Package.with_latest_fixity_check(queryset))
 
     def _get_int_parameter(self, query_dict, param, default=0):
         """Get an integer parameter from the request QueryDict.
@@ -136,6 +138,10 @@ class PackageDataTable(object):
         sort_descending = sorting_column.get("direction") == "desc"
         if sorting_column["index"] in self.ORDER_BY_MAPPING:
             field = self.ORDER_BY_MAPPING[sorting_column["index"]]
+            if sorting_column["index"] in self.NULLS_LAST_COLUMNS:
+                if sort_descending:
+                    return queryset.order_by(F(field).desc(nulls_first=True))
+                return queryset.order_by(F(field).asc(nulls_last=True))
             if sort_descending:
                 field = "-{}".format(field)
             return queryset.order_by(field)
@@ -164,13 +170,6 @@ class PackageDataTable(object):
     def sort_by_status_key(self, package):
         return package.get_status_display()
 
-    def sort_by_fixity_date_key(self, package):
-        # avoid comparing datetimes with None
-        return package.latest_fixity_check_datetime or timezone.now()
-
-    def sort_by_fixity_status_key(self, package):
-        return package.latest_fixity_check_result
-
 
 class FixityLogDataTable(PackageDataTable):
 
@@ -181,6 +180,8 @@ class FixityLogDataTable(PackageDataTable):
         1: "error_details",
     }
 
+    NULLS_LAST_COLUMNS = ()
+
     def __init__(self, query_dict):
         search_filter = Q()
         package_uuid = query_dict.get("package-uuid")
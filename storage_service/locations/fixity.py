@@ -0,0 +1,268 @@
+"""Scheduling of fixity checks.
+
+The packages whose last fixity check is the oldest, or that were never checked,
+are checked first. The checks run in a pool of worker processes and the checks
+of each Space are paced so that, on average, they stay within a budget of bytes
+read and operations per second. Failures are recorded as usual but reported to
+the administrators in digests, see ``FixityScheduler``.
+"""
+from __future__ import absolute_import
+
+# stdlib, alphabetical
+from collections import deque, OrderedDict
+import json
+import logging
+import time
+
+# Core Django, alphabetical
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.six.moves import queue
+
+# Third party dependencies, alphabetical
+
+# This project, alphabetical
+from common import utils
+
+# This module, alphabetical
+from . import models, signals
+
+LOGGER = logging.getLogger(__name__)
+
+# Bytes read for every operation counted against the IOPS budget, on top of
+# one operation per file of the package
+BYTES_PER_OPERATION = 1024 * 1024
+
+
+class IOBudget(object):
+    """Paces the fixity checks of a Space so that, on average, they read at
+    most ``bytes_per_second`` bytes and ``iops`` operations per second. Zero
+    means unlimited.
+
+    A check may start once the checks started before it are paid for, its own
+    cost then delays the next one.
+    """
+
+    def __init__(self, bytes_per_second=0, iops=0):
+        self.bytes_per_second = bytes_per_second
+        self.iops = iops
+        self.available_at = 0.0
+
+    def wait_time(self, now):
+        """Seconds from ``now`` until the next check may start."""
+        return max(0.0, self.available_at - now)
+
+    def spend(self, now, size, operations):
+        cost = 0.0
+        if self.bytes_per_second:
+            cost = max(cost, float(size) / self.bytes_per_second)
+        if self.iops:
+            cost = max(cost, float(operations) / self.iops)
+        self.available_at = max(self.available_at, now) + cost
+
+
+def get_packages_due(min_age=None, space_uuid=None):
+    """Return the AIPs and AICs to check, those never checked first and then
+    by age of their last fixity check.
+
+    :param min_age: timedelta, skip the packages checked more recently.
+    :param space_uuid: only return the packages stored in this Space.
+    """
+    packages = models.Package.objects.filter(
+        package_type__in=(models.Package.AIP, models.Package.AIC),
+        status=models.Package.UPLOADED,
+    )
+    if space_uuid:
+        packages = packages.filter(current_location__space__uuid=space_uuid)
+    # Correlated subqueries: joining both the fixity logs and the files of
+    # the packages would make as many rows as their product
+    file_counts = (
+        models.File.objects.filter(package=OuterRef("pk"))
+        .order_by()
+        .values("package")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    packages = models.Package.with_latest_fixity_check(packages).annotate(
+        file_count=Coalesce(Subquery(file_counts, output_field=IntegerField()), 0)
+    )
+    if min_age:
+        packages = packages.filter(
+            Q(last_fixity_datetime__isnull=True)
+            | Q(last_fixity_datetime__lt=timezone.now() - min_age)
+        )
+    return packages.select_related("current_location__space").order_by(
+        F("last_fixity_datetime").asc(nulls_first=True), "pk"
+    )
+
+
+def _check_fixity(package_uuid, force_local):
+    """Check the fixity of a package, in a worker process.
+
+    Returns the success of the check and its JSON report.
+    """
+    package = models.Package.objects.get(uuid=package_uuid)
+    try:
+        report, response = package.get_fixity_check_report(force_local=force_local)
+    finally:
+        package.clear_local_tempdirs()
+    return response["success"], report
+
+
+def _not_run_report(message):
+    return json.dumps(
+        {
+            "success": None,
+            "message": message,
+            "failures": {"files": {"missing": [], "changed": [], "untracked": []}},
+            "timestamp": None,
+        }
+    )
+
+
+class FixityScheduler(object):
+    """Checks the fixity of packages within the I/O budget of their Spaces.
+
+    The results are recorded in the parent process, as ``FixityLog`` entries
+    through the usual signals, but failures are emailed to the administrators
+    in digests sent at most every ``settings.FIXITY_DIGEST_INTERVAL`` seconds
+    and at the end of every run.
+
+    :param processes: number of worker processes. With 0 the checks run in
+        the current process, one at a time.
+    :param bytes_per_second: budget of bytes read per second for each Space.
+    :param iops: budget of operations per second for each Space.
+    :param force_local: run the checks locally, see ``Package.check_fixity``.
+    :param on_result: called with the package, the success and the JSON
+        report of every check.
+    """
+
+    def __init__(
+        self,
+        processes=None,
+        bytes_per_second=None,
+        iops=None,
+        force_local=False,
+        on_result=None,
+    ):
+        if processes is None:
+            processes = settings.FIXITY_PROCESSES
+        if bytes_per_second is None:
+            bytes_per_second = settings.FIXITY_SPACE_BYTES_PER_SECOND
+        if iops is None:
+            iops = settings.FIXITY_SPACE_IOPS
+        self.processes = processes
+        self.bytes_per_second = bytes_per_second
+        self.iops = iops
+        self.force_local = force_local
+        self.on_result = on_result
+        self.budgets = {}
+        self.failures = []
+        self.last_digest = time.time()
+        self._pool = None
+        self._results = queue.Queue()
+
+    def get_budget(self, space_uuid):
+        if space_uuid not in self.budgets:
+            self.budgets[space_uuid] = IOBudget(self.bytes_per_second, self.iops)
+        return self.budgets[space_uuid]
+
+    def run(self, packages):
+        """Check ``packages``, in order within each Space. Returns the number
+        of packages checked."""
+        queues = OrderedDict()
+        for index, package in enumerate(packages):
+            space_uuid = package.current_location.space_id
+            queues.setdefault(space_uuid, deque()).append((index, package))
+        slots = max(1, self.processes)
+        running = checked = 0
+        if self.processes:
+            self._pool = utils.ProcessPool(self.processes)
+        try:
+            while queues or running:
+                now = time.time()
+                while running < slots:
+                    # The first package, in the original order, of the Spaces
+                    # within budget
+                    ready = [
+                        (packages_queue[0][0], space_uuid)
+                        for space_uuid, packages_queue in queues.items()
+                        if not self.get_budget(space_uuid).wait_time(now)
+                    ]
+                    if not ready:
+                        break
+                    __, space_uuid = min(ready)
+                    __, package = queues[space_uuid].popleft()
+                    if not queues[space_uuid]:
+                        del queues[space_uuid]
+                    size = package.size or 0
+                    self.get_budget(space_uuid).spend(
+                        now,
+                        size,
+                        getattr(package, "file_count", 0) + size // BYTES_PER_OPERATION,
+                    )
+                    self._start(package)
+                    running += 1
+                wait = None
+                if queues and running < slots:
+                    wait = min(
+                        self.get_budget(space_uuid).wait_time(now)
+                        for space_uuid in queues
+                    )
+                if not running:
+                    time.sleep(wait)
+                    continue
+                try:
+                    package, result, error = self._results.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                running -= 1
+                checked += 1
+                self._record(package, result, error)
+        finally:
+            if self._pool is not None:
+                # All the checks started have been recorded
+                self._pool.terminate()
+                self._pool = None
+            self.send_digest()
+        return checked
+
+    def _start(self, package):
+        args = (package.uuid, self.force_local)
+        if self._pool is None:
+            try:
+                self._results.put((package, _check_fixity(*args), None))
+            except Exception as err:
+                self._results.put((package, None, err))
+            return
+        self._pool.apply_async(
+            _check_fixity,
+            args,
+            callback=lambda result: self._results.put((package, result, None)),
+            error_callback=lambda err: self._results.put((package, None, err)),
+        )
+
+    def _record(self, package, result, error):
+        if error is None:
+            success, report = result
+        else:
+            LOGGER.error(
+                "Fixity check of package %s could not run: %s", package.uuid, error
+            )
+            success = None
+            report = _not_run_report("Fixity check could not run: {}".format(error))
+        package.send_fixity_check_signals(success, report, notify=False)
+        if success is False:
+            self.failures.append((package.uuid, package.full_path, report))
+            if time.time() - self.last_digest >= settings.FIXITY_DIGEST_INTERVAL:
+                self.send_digest()
+        if self.on_result is not None:
+            self.on_result(package, success, report)
+
+    def send_digest(self):
+        """Email the failures recorded since the last digest, if any."""
+        failures, self.failures = self.failures, []
+        self.last_digest = time.time()
+        signals.notify_failed_fixity_checks(failures)
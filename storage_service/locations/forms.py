@@ -390,6 +390,22 @@ class ConfirmEventForm(forms.ModelForm):
         self.fields["status_reason"].required = True
 
 
+class BulkConfirmEventForm(forms.Form):
+    """Approve or reject several of the package requests ``events`` at once."""
+
+    events = forms.ModelMultipleChoiceField(
+        label=_("Requests"),
+        queryset=models.Event.objects.none(),
+        widget=forms.CheckboxSelectMultiple,
+    )
+    status_reason = forms.CharField(label=_("Status reason"), widget=forms.Textarea)
+
+    def __init__(self, *args, **kwargs):
+        events = kwargs.pop("events")
+        super(BulkConfirmEventForm, self).__init__(*args, **kwargs)
+        self.fields["events"].queryset = events.select_related("package")
+
+
 class HeaderWidget(forms.MultiWidget):
     """Key/value text inputs widget for Callback header."""
 
@@ -1,10 +1,38 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, unicode_literals
 
+import functools
+import logging
+import threading
 import time
 from contextlib import contextmanager
 
-from prometheus_client import Counter, Gauge
+from django.conf import settings
+from prometheus_client import Counter, Gauge, Histogram
+
+LOGGER = logging.getLogger(__name__)
+
+# Storage operations take from milliseconds to hours
+STORAGE_OPERATION_BUCKETS = (
+    0.1,
+    0.5,
+    1,
+    5,
+    10,
+    30,
+    60,
+    300,
+    900,
+    1800,
+    3600,
+    14400,
+    float("inf"),
+)
+STORAGE_OPERATION_LABELS = ("protocol", "operation")
+
+# Bytes counted by the storage operations running in each thread, innermost
+# last, see count_bytes
+_operation_bytes = threading.local()
 
 
 async_manager_running_tasks = Gauge(
@@ -17,6 +45,31 @@ async_manager_watchdog_time_counter = Counter(
     ("Total time taken by a watchdog loop iteration in seconds"),
 )
 
+storage_operation_duration = Histogram(
+    "storage_operation_duration_seconds",
+    "Duration of storage operations in seconds, by space protocol",
+    STORAGE_OPERATION_LABELS,
+    buckets=STORAGE_OPERATION_BUCKETS,
+)
+
+storage_operation_bytes = Counter(
+    "storage_operation_bytes",
+    "Bytes transferred by successful storage operations, by space protocol",
+    STORAGE_OPERATION_LABELS,
+)
+
+storage_operations_in_progress = Gauge(
+    "storage_operations_in_progress",
+    "Number of storage operations running, by space protocol",
+    STORAGE_OPERATION_LABELS,
+)
+
+storage_operation_errors = Counter(
+    "storage_operation_errors",
+    "Number of storage operations that raised an error, by space protocol",
+    STORAGE_OPERATION_LABELS,
+)
+
 
 @contextmanager
 def watchdog_loop_timer():
@@ -26,3 +79,82 @@ def watchdog_loop_timer():
     finally:
         duration = time.time() - start_time
         async_manager_watchdog_time_counter.inc(duration)
+
+
+def space_protocol(space, *args, **kwargs):
+    """Protocol label of the storage operations of a Space."""
+    return space.access_protocol
+
+
+def package_protocol(package, *args, **kwargs):
+    """Protocol label of the storage operations of a Package."""
+    try:
+        return package.current_location.space.access_protocol
+    except AttributeError:
+        # No current location
+        return ""
+
+
+def count_bytes(count):
+    """Count ``count`` bytes as transferred by the storage operations running
+    in the current thread, called by the code copying the data."""
+    for counter in getattr(_operation_bytes, "counters", ()):
+        counter[0] += count
+
+
+def instrument_storage_operation(
+    operation, protocol=space_protocol, size=None, unsupported=()
+):
+    """Decorator recording the duration, the number in progress and the
+    errors of a storage ``operation``, labelled with the protocol returned by
+    ``protocol``, called with the arguments of the decorated function.
+
+    :param size: called with the result of a successful call followed by its
+        arguments, returns the number of bytes transferred or None. By
+        default the bytes given to ``count_bytes`` during the call are
+        recorded.
+    :param unsupported: exceptions meaning that the operation is not
+        supported and the caller falls back to another one. They are not
+        recorded at all.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            labels = (protocol(*args, **kwargs), operation)
+            in_progress = storage_operations_in_progress.labels(*labels)
+            in_progress.inc()
+            counter = [0]
+            counters = getattr(_operation_bytes, "counters", None)
+            if counters is None:
+                counters = _operation_bytes.counters = []
+            counters.append(counter)
+            start_time = time.time()
+            try:
+                result = func(*args, **kwargs)
+            except unsupported:
+                raise
+            except Exception:
+                storage_operation_errors.labels(*labels).inc()
+                storage_operation_duration.labels(*labels).observe(
+                    time.time() - start_time
+                )
+                raise
+            finally:
+                counters.pop()
+                in_progress.dec()
+            storage_operation_duration.labels(*labels).observe(time.time() - start_time)
+            transferred = counter[0]
+            if size is not None and settings.PROMETHEUS_ENABLED:
+                try:
+                    transferred = size(result, *args, **kwargs)
+                except Exception:
+                    LOGGER.debug("Unable to measure %s", operation, exc_info=True)
+                    transferred = None
+            if transferred:
+                storage_operation_bytes.labels(*labels).inc(transferred)
+            return result
+
+        return wrapper
+
+    return decorator
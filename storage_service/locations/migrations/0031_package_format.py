@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to record the format of the packages in the database.
+
+The fields are filled in when packages are stored, the format of the packages
+stored before can be recorded with the ``record_package_format`` command.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("locations", "0030_user_groups")]
+
+    operations = [
+        migrations.AddField(
+            model_name="package",
+            name="compressed",
+            field=models.NullBooleanField(
+                default=None,
+                db_index=True,
+                help_text="Whether the package is a compressed file",
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="compression_algorithm",
+            field=models.CharField(
+                max_length=30,
+                null=True,
+                blank=True,
+                default=None,
+                db_index=True,
+                help_text="Algorithm used to compress the package, if compressed",
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="base_directory",
+            field=models.TextField(
+                null=True,
+                blank=True,
+                default=None,
+                help_text="Directory containing the contents of the package",
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="member_count",
+            field=models.IntegerField(
+                null=True, blank=True, default=None, help_text="Number of files"
+            ),
+        ),
+        migrations.AddField(
+            model_name="package",
+            name="payload_checksum_algorithm",
+            field=models.CharField(
+                max_length=16,
+                null=True,
+                blank=True,
+                default=None,
+                db_index=True,
+                help_text="Algorithm of the checksums of the bag manifest",
+            ),
+        ),
+    ]
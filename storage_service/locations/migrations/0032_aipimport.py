@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to checkpoint the bulk imports of AIPs by ``import_aip``."""
+
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("locations", "0031_package_format")]
+
+    operations = [
+        migrations.CreateModel(
+            name="AIPImport",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        verbose_name="ID",
+                        serialize=False,
+                        auto_created=True,
+                        primary_key=True,
+                    ),
+                ),
+                (
+                    "source_path",
+                    models.TextField(help_text="Path of the AIP imported"),
+                ),
+                (
+                    "aip_uuid",
+                    models.CharField(
+                        max_length=36, null=True, blank=True, default=None
+                    ),
+                ),
+                (
+                    "stage",
+                    models.CharField(
+                        max_length=10,
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("VALIDATED", "Validated"),
+                            ("COMPRESSED", "Compressed"),
+                            ("STORED", "Stored"),
+                        ],
+                        default="PENDING",
+                        db_index=True,
+                    ),
+                ),
+                (
+                    "work_path",
+                    models.TextField(null=True, blank=True, default=None),
+                ),
+                (
+                    "compression_details",
+                    models.TextField(
+                        null=True,
+                        blank=True,
+                        default=None,
+                        help_text="JSON details of the compression, for its PREMIS event",
+                    ),
+                ),
+                ("error", models.TextField(null=True, blank=True, default=None)),
+                ("created_time", models.DateTimeField(auto_now_add=True)),
+                ("updated_time", models.DateTimeField(auto_now=True)),
+            ],
+            options={"verbose_name": "AIP import"},
+        )
+    ]
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to index the fixity log entries of each package by date."""
+
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("locations", "0032_aipimport")]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="fixitylog",
+            index=models.Index(
+                fields=["package", "datetime_reported"],
+                name="locations_fixitylog_pkg_dt_idx",
+            ),
+        )
+    ]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to checkpoint the transfers of packages to their spaces."""
+
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("locations", "0033_fixitylog_package_datetime_index")]
+
+    operations = [
+        migrations.CreateModel(
+            name="TransferCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        verbose_name="ID",
+                        serialize=False,
+                        auto_created=True,
+                        primary_key=True,
+                    ),
+                ),
+                (
+                    "operation",
+                    models.CharField(
+                        max_length=10,
+                        choices=[
+                            ("STORE", "Store"),
+                            ("REPLICATE", "Replicate"),
+                            ("MOVE", "Move"),
+                        ],
+                    ),
+                ),
+                (
+                    "arguments",
+                    models.TextField(
+                        default="{}",
+                        help_text="JSON arguments the transfer was started with",
+                    ),
+                ),
+                (
+                    "completed_files",
+                    models.TextField(
+                        default="[]",
+                        help_text="JSON list of the destination paths written completely",
+                    ),
+                ),
+                ("bytes_completed", models.BigIntegerField(default=0)),
+                (
+                    "upload_path",
+                    models.TextField(null=True, blank=True, default=None),
+                ),
+                (
+                    "upload_id",
+                    models.TextField(
+                        null=True,
+                        blank=True,
+                        default=None,
+                        help_text="Multipart upload in progress to upload_path",
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("error", models.TextField(null=True, blank=True, default=None)),
+                ("created_time", models.DateTimeField(auto_now_add=True)),
+                ("updated_time", models.DateTimeField(auto_now=True, db_index=True)),
+                (
+                    "package",
+                    models.ForeignKey(
+                        to="locations.Package",
+                        to_field="uuid",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transfer_checkpoints",
+                    ),
+                ),
+            ],
+            options={"verbose_name": "Transfer checkpoint"},
+        ),
+        migrations.AlterUniqueTogether(
+            name="transfercheckpoint", unique_together={("package", "operation")}
+        ),
+    ]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to record the progress of asynchronous tasks."""
+
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("locations", "0034_transfercheckpoint")]
+
+    operations = [
+        migrations.AddField(
+            model_name="async",
+            name="phase",
+            field=models.CharField(
+                default="",
+                max_length=50,
+                blank=True,
+                verbose_name="Phase",
+                help_text="What the task is currently doing.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="async",
+            name="bytes_done",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="async",
+            name="bytes_total",
+            field=models.BigIntegerField(
+                null=True, help_text="Bytes to process in this phase, if known."
+            ),
+        ),
+        migrations.AddField(
+            model_name="async",
+            name="files_done",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="async",
+            name="files_total",
+            field=models.BigIntegerField(
+                null=True, help_text="Files to process in this phase, if known."
+            ),
+        ),
+        migrations.AddField(
+            model_name="async",
+            name="bytes_per_second",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="async",
+            name="progress_time",
+            field=models.DateTimeField(
+                null=True, help_text="When the progress was last written."
+            ),
+        ),
+    ]
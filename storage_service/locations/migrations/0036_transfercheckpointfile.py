@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to record the files completed by checkpointed transfers as
+rows instead of a JSON list."""
+
+from __future__ import absolute_import, unicode_literals
+import hashlib
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _hash_path(path):
+    return hashlib.sha1(path.encode("utf-8")).hexdigest()
+
+
+def data_migration_up(apps, schema_editor):
+    TransferCheckpoint = apps.get_model("locations", "TransferCheckpoint")
+    TransferCheckpointFile = apps.get_model("locations", "TransferCheckpointFile")
+    for checkpoint in TransferCheckpoint.objects.iterator():
+        paths = set(json.loads(checkpoint.completed_files or "[]"))
+        TransferCheckpointFile.objects.bulk_create(
+            [
+                TransferCheckpointFile(
+                    checkpoint=checkpoint, path=path, path_hash=_hash_path(path)
+                )
+                for path in paths
+            ],
+            batch_size=500,
+        )
+
+
+def data_migration_down(apps, schema_editor):
+    TransferCheckpoint = apps.get_model("locations", "TransferCheckpoint")
+    for checkpoint in TransferCheckpoint.objects.iterator():
+        checkpoint.completed_files = json.dumps(
+            sorted(checkpoint.files.values_list("path", flat=True))
+        )
+        checkpoint.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("locations", "0035_async_progress")]
+
+    operations = [
+        migrations.CreateModel(
+            name="TransferCheckpointFile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        verbose_name="ID",
+                        serialize=False,
+                        auto_created=True,
+                        primary_key=True,
+                    ),
+                ),
+                ("path", models.TextField()),
+                ("path_hash", models.CharField(max_length=40)),
+                (
+                    "checkpoint",
+                    models.ForeignKey(
+                        to="locations.TransferCheckpoint",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="files",
+                    ),
+                ),
+            ],
+            options={"verbose_name": "Transfer checkpoint file"},
+        ),
+        migrations.AlterUniqueTogether(
+            name="transfercheckpointfile",
+            unique_together={("checkpoint", "path_hash")},
+        ),
+        migrations.RunPython(data_migration_up, data_migration_down),
+        migrations.RemoveField(model_name="transfercheckpoint", name="completed_files"),
+    ]
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+"""Migration to record the owner of the checkpoint of a running transfer."""
+
+from __future__ import absolute_import, unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("locations", "0036_transfercheckpointfile")]
+
+    operations = [
+        migrations.AddField(
+            model_name="transfercheckpoint",
+            name="owner",
+            field=models.CharField(
+                max_length=255,
+                null=True,
+                blank=True,
+                default=None,
+                help_text="Host, process and thread running the transfer",
+            ),
+        )
+    ]
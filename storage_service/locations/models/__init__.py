@@ -24,6 +24,8 @@ from .package import *
 from .pipeline import *
 from .space import *
 from .fixity_log import *
+from .aip_import import *
+from .transfer_checkpoint import *
 
 # not importing managers as that is internal
 
@@ -0,0 +1,60 @@
+# stdlib, alphabetical
+
+# Core Django, alphabetical
+from __future__ import absolute_import
+from django.db import models
+from django.utils import six
+from django.utils.translation import ugettext_lazy as _
+
+# Third party dependencies, alphabetical
+
+# This project, alphabetical
+
+# This module, alphabetical
+
+__all__ = ("AIPImport",)
+
+
+@six.python_2_unicode_compatible
+class AIPImport(models.Model):
+    """Checkpoint of the bulk import of an AIP by the ``import_aip`` command.
+
+    ``stage`` is the last stage of the import completed and ``work_path`` the
+    path of the AIP after it: the validated AIP after ``VALIDATED`` and its
+    path in the local AIP storage location after ``COMPRESSED``. An import
+    that failed has an ``error`` and is resumed from ``stage`` when retried.
+    """
+
+    PENDING = "PENDING"
+    VALIDATED = "VALIDATED"
+    COMPRESSED = "COMPRESSED"
+    STORED = "STORED"
+    STAGE_CHOICES = (
+        (PENDING, _("Pending")),
+        (VALIDATED, _("Validated")),
+        (COMPRESSED, _("Compressed")),
+        (STORED, _("Stored")),
+    )
+
+    source_path = models.TextField(help_text=_("Path of the AIP imported"))
+    aip_uuid = models.CharField(max_length=36, null=True, blank=True, default=None)
+    stage = models.CharField(
+        max_length=10, choices=STAGE_CHOICES, default=PENDING, db_index=True
+    )
+    work_path = models.TextField(null=True, blank=True, default=None)
+    compression_details = models.TextField(
+        null=True,
+        blank=True,
+        default=None,
+        help_text=_("JSON details of the compression, for its PREMIS event"),
+    )
+    error = models.TextField(null=True, blank=True, default=None)
+    created_time = models.DateTimeField(auto_now_add=True)
+    updated_time = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("AIP import")
+        app_label = "locations"
+
+    def __str__(self):
+        return _(u"Import of %(path)s") % {"path": self.source_path}
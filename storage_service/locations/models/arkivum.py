@@ -1,11 +1,14 @@
 from __future__ import absolute_import
 
 # stdlib, alphabetical
+from concurrent import futures
+import hashlib
 import json
 import logging
-from lxml import etree
 import os
 import requests
+import threading
+import time
 import six.moves.urllib.request
 import six.moves.urllib.parse
 import six.moves.urllib.error
@@ -14,6 +17,7 @@ import six.moves.urllib.error
 from django.conf import settings
 import django.core.mail
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
@@ -22,7 +26,7 @@ import dateutil.parser
 import scandir
 
 # This project, alphabetical
-from common import utils
+from common import pointer_files, utils
 
 # This module, alphabetical
 from . import StorageException
@@ -33,6 +37,48 @@ LOGGER = logging.getLogger(__name__)
 
 VERIFY = not settings.INSECURE_SKIP_VERIFY
 
+# Kinds of the answers from Arkivum kept in the Django cache, see _cache_key
+PACKAGE_INFO_CACHE_KEY = "arkivum_package_info"
+FILE_INFO_CACHE_KEY = "arkivum_file_info"
+SAMPLE_FILE_KEY = "arkivum_sample_file"
+# Seconds the file picked to check the locality of an uncompressed package is
+# kept, see Arkivum._get_sample_file
+SAMPLE_FILE_CACHE_TTL = 24 * 60 * 60
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Return the requests session shared by all the Arkivum spaces."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = utils.requests_session(
+                pool_size=settings.ARKIVUM_STATUS_CONCURRENCY, verify=VERIFY
+            )
+        return _session
+
+
+def _cache_key(kind, package, path=""):
+    """Return the key of the Django cache where the answer ``kind`` about
+    (the file ``path`` of) ``package`` is kept."""
+    key = u"{}:{}:{}".format(kind, package.uuid, path)
+    return "arkivum:" + hashlib.md5(key.encode("utf-8")).hexdigest()
+
+
+def _cache_entry(kind, package, info, path=""):
+    # Kept as long as the longest max_age it is read with
+    cache.set(
+        _cache_key(kind, package, path),
+        {"time": time.time(), "info": info},
+        max(settings.ARKIVUM_STATUS_CACHE_TTL, settings.ARKIVUM_LOCALITY_CACHE_TTL),
+    )
+
+
+def _is_fresh(entry, max_age):
+    return bool(entry) and time.time() - entry.get("time", 0) < max_age
+
 
 class Arkivum(models.Model):
     space = models.OneToOneField("Space", to_field="uuid", on_delete=models.CASCADE)
@@ -84,7 +130,9 @@ class Arkivum(models.Model):
         # TODO folders
         url = "https://" + self.host + "/files/" + delete_path
         LOGGER.info("URL: %s", url)
-        response = requests.delete(url, verify=VERIFY)
+        response = _get_session().delete(
+            url, verify=VERIFY, timeout=settings.ARKIVUM_REQUEST_TIMEOUT
+        )
         LOGGER.info(
             "Response: %s, Response text: %s", response.status_code, response.text
         )
@@ -131,19 +179,11 @@ class Arkivum(models.Model):
 
             # Get size, checksum, and checksum algorithm from pointer file;
             # infer compression algorithm from filename.
-            root = etree.parse(package.full_pointer_file_path)
-            fixity_elem = root.find(".//premis:fixity", namespaces=utils.NSMAP)
-            algorithm = fixity_elem.findtext(
-                "premis:messageDigestAlgorithm", namespaces=utils.NSMAP
-            )
-            checksum = fixity_elem.findtext(
-                "premis:messageDigest", namespaces=utils.NSMAP
-            )
-            size = fixity_elem.findtext("premis:size", namespaces=utils.NSMAP)
+            fixity = pointer_files.get(package.full_pointer_file_path).fixity
             payload = {
-                "size": size,
-                "checksum": checksum,
-                "checksumAlgorithm": algorithm,
+                "size": fixity.size,
+                "checksum": fixity.checksum,
+                "checksumAlgorithm": fixity.algorithm,
                 "compressionAlgorithm": os.path.splitext(package.current_path)[1],
             }
             payload = json.dumps(payload)
@@ -163,10 +203,15 @@ class Arkivum(models.Model):
             files,
         )
         try:
-            response = requests.post(
-                url, headers=headers, data=payload, files=files, verify=VERIFY
+            response = _get_session().post(
+                url,
+                headers=headers,
+                data=payload,
+                files=files,
+                verify=VERIFY,
+                timeout=settings.ARKIVUM_REQUEST_TIMEOUT,
             )
-        except requests.exceptions.ConnectionError:
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
             LOGGER.exception("Error in connection for POST to %s", url)
             raise StorageException(
                 _("Error in connection for POST to %(url)s"), {"url": url}
@@ -196,44 +241,34 @@ class Arkivum(models.Model):
         package.misc_attributes.update({"arkivum_identifier": request_id})
         package.save()
 
-    def _get_package_info(self, package):
-        """
-        Return status and file info for a package in Arkivum.
-        """
-        # If no request ID, try POSTing to Arkivum again
-        if "arkivum_identifier" not in package.misc_attributes:
-            # Get local copy
-            local_path = package.fetch_local_path()
-            self.post_move_from_storage_service(local_path, package.full_path, package)
-        # If still no request ID, cannot check status
-        if "arkivum_identifier" not in package.misc_attributes:
-            msg = _("Unable to contact Arkivum")
-            LOGGER.warning(msg)
-            return {"error": True, "error_message": msg}
-
-        # Ask Arkivum for replication status
+    def _package_info_url(self, package):
         if package.is_compressed:
-            url = (
+            return (
                 "https://"
                 + self.host
                 + "/api/2/files/release/"
                 + package.misc_attributes["arkivum_identifier"]
             )
-        else:
-            url = (
-                "https://"
-                + self.host
-                + "/api/3/ingest-manifest/status/"
-                + package.misc_attributes["arkivum_identifier"]
-            )
+        return (
+            "https://"
+            + self.host
+            + "/api/3/ingest-manifest/status/"
+            + package.misc_attributes["arkivum_identifier"]
+        )
 
+    def _get_json(self, url, fetch_error, parse_error):
+        """
+        GET `url` from Arkivum and return the decoded JSON response, or a dict
+        with the error and the relevant error message.
+        """
         LOGGER.info("URL: %s", url)
         try:
-            response = requests.get(url, verify=VERIFY)
+            response = _get_session().get(
+                url, verify=VERIFY, timeout=settings.ARKIVUM_REQUEST_TIMEOUT
+            )
         except Exception:
-            msg = _("Error fetching package status")
-            LOGGER.warning(msg, exc_info=True)
-            return {"error": True, "error_message": msg}
+            LOGGER.warning(fetch_error, exc_info=True)
+            return {"error": True, "error_message": fetch_error}
         LOGGER.info(
             "Response: %s, Response text: %s", response.status_code, response.text
         )
@@ -245,12 +280,52 @@ class Arkivum(models.Model):
             return {"error": True, "error_message": msg}
 
         try:
-            response_json = response.json()
+            return response.json()
         except ValueError:
-            msg = _("JSON could not be parsed from package info")
+            LOGGER.warning(parse_error)
+            return {"error": True, "error_message": parse_error}
+
+    def _fetch_package_info(self, package):
+        """
+        Ask Arkivum for the status and file info of a package.
+        """
+        # If no request ID, try POSTing to Arkivum again
+        if "arkivum_identifier" not in package.misc_attributes:
+            # Get local copy
+            local_path = package.fetch_local_path()
+            self.post_move_from_storage_service(local_path, package.full_path, package)
+        # If still no request ID, cannot check status
+        if "arkivum_identifier" not in package.misc_attributes:
+            msg = _("Unable to contact Arkivum")
             LOGGER.warning(msg)
             return {"error": True, "error_message": msg}
-        return response_json
+
+        # Ask Arkivum for replication status
+        return self._get_json(
+            self._package_info_url(package),
+            _("Error fetching package status"),
+            _("JSON could not be parsed from package info"),
+        )
+
+    def _get_package_info(self, package, max_age=None):
+        """
+        Return status and file info for a package in Arkivum.
+
+        The last successful answer is kept in the Django cache, not in the
+        package, so that checking a package doesn't write it, and reused
+        while it is less than `max_age` seconds old
+        (``settings.ARKIVUM_STATUS_CACHE_TTL`` by default). Only locality and
+        status queries use it, fixity checks always ask Arkivum.
+        """
+        if max_age is None:
+            max_age = settings.ARKIVUM_STATUS_CACHE_TTL
+        cached = cache.get(_cache_key(PACKAGE_INFO_CACHE_KEY, package))
+        if _is_fresh(cached, max_age):
+            return cached["info"]
+        package_info = self._fetch_package_info(package)
+        if not package_info.get("error"):
+            _cache_entry(PACKAGE_INFO_CACHE_KEY, package, package_info)
+        return package_info
 
     def _get_baginfo_txt_info(self, package):
         """
@@ -269,35 +344,18 @@ class Arkivum(models.Model):
             + package.current_path.strip("/")
             + "/bag-info.txt"
         )
-        LOGGER.info("URL: %s", url)
-
-        try:
-            response = requests.get(url, verify=VERIFY)
-        except Exception:
-            msg = _("Error fetching file info")
-            LOGGER.warning(msg, exc_info=True)
-            return {"error": True, "error_message": msg}
-        LOGGER.info(
-            "Response: %s, Response text: %s", response.status_code, response.text
+        return self._get_json(
+            url,
+            _("Error fetching file info"),
+            _("JSON could not be parsed from file info"),
         )
-        if response.status_code != 200:
-            msg = _("Response from Arkivum server was %(response)s") % {
-                "response": response
-            }
-            LOGGER.warning(msg)
-            return {"error": True, "error_message": msg}
-
-        try:
-            response_json = response.json()
-        except ValueError:
-            msg = _("JSON could not be parsed from file info")
-            LOGGER.warning(msg)
-            return {"error": True, "error_message": msg}
-        return response_json
 
     def update_package_status(self, package):
         LOGGER.info("Package status: %s", package.status)
-        response_json = self._get_package_info(package)
+        response_json = self._get_package_info(package, max_age=0)
+        return self._update_package_status_from_info(package, response_json)
+
+    def _update_package_status_from_info(self, package, response_json):
         if response_json.get("error"):
             return (None, response_json["error_message"])
         if package.is_compressed:
@@ -319,9 +377,59 @@ class Arkivum(models.Model):
             # Set status to UPLOADED
             package.status = Package.UPLOADED
             package.save()
+            # Answers cached while the package was pending are outdated
+            cache.delete(_cache_key(PACKAGE_INFO_CACHE_KEY, package))
         LOGGER.info("Package status: %s", package.status)
         return (package.status, _("Replication status: ") + replication)
 
+    def update_pending_packages_status(self):
+        """
+        Poll Arkivum for the status of every package of this space that is
+        still pending replication.
+
+        The requests are made concurrently (up to
+        ``settings.ARKIVUM_STATUS_CONCURRENCY``) over the shared session. The
+        statuses are saved on the packages; the answers are also put in the
+        Django cache, which only spares the API requests to Arkivum if the
+        cache backend is shared by the processes, unlike the local-memory
+        backend configured by default.
+
+        :return: dict of package UUID to the (status, message) tuple returned
+            by update_package_status.
+        """
+        packages = [
+            package
+            for package in Package.objects.filter(
+                current_location__space=self.space, status=Package.PENDING
+            )
+            if "arkivum_identifier" in package.misc_attributes
+        ]
+        if not packages:
+            return {}
+        # Only the HTTP requests run in the pool, the database is updated here.
+        urls = [self._package_info_url(package) for package in packages]
+        with futures.ThreadPoolExecutor(
+            max_workers=min(settings.ARKIVUM_STATUS_CONCURRENCY, len(urls))
+        ) as executor:
+            infos = list(
+                executor.map(
+                    lambda url: self._get_json(
+                        url,
+                        _("Error fetching package status"),
+                        _("JSON could not be parsed from package info"),
+                    ),
+                    urls,
+                )
+            )
+        results = {}
+        for package, package_info in zip(packages, infos):
+            if not package_info.get("error"):
+                _cache_entry(PACKAGE_INFO_CACHE_KEY, package, package_info)
+            results[package.uuid] = self._update_package_status_from_info(
+                package, package_info
+            )
+        return results
+
     def is_file_local(self, package, path=None, email_nonlocal=False):
         """
         Check if (a file in) this package is locally available.
@@ -337,46 +445,22 @@ class Arkivum(models.Model):
             package,
             email_nonlocal,
         )
+        max_age = settings.ARKIVUM_LOCALITY_CACHE_TTL
         if package.is_compressed:
-            package_info = self._get_package_info(package)
+            package_info = self._get_package_info(package, max_age)
             if package_info.get("error"):
                 return None
             # Look for ['fileInformation']['local'] == True
             package_info = package_info["fileInformation"]
         else:  # uncompressed
             if path:
-                url_path = (
-                    package.current_location.relative_path
-                    + "/"
-                    + package.current_path
-                    + "/"
-                    + path
-                )
-                url_path = six.moves.urllib.parse.quote_plus(url_path, safe="/")
-                url = "https://" + self.host + "/api/2/files/fileInfo/" + url_path
-                LOGGER.info("URL: %s", url)
-                try:
-                    response = requests.get(url, verify=VERIFY)
-                except Exception:
-                    LOGGER.warning("Error fetching file information", exc_info=True)
-                    return None
-                LOGGER.info(
-                    "Response: %s, Response text: %s",
-                    response.status_code,
-                    response.text,
-                )
-                if response.status_code != 200:
-                    LOGGER.warning("Response from Arkivum server was %s", response)
-                    return None
-                try:
-                    package_info = response.json()
-                except ValueError:
-                    LOGGER.warning("JSON could not be parsed from package info")
+                package_info = self._get_file_info(package, path, max_age)
+                if package_info is None:
                     return None
             else:
                 # TODO Implement checking all files in an uncompressed package
                 # TODO This may be available from _get_package_info in future
-                package_info = self._get_package_info(package)
+                package_info = self._get_package_info(package, max_age)
                 if package_info.get("error"):
                     return None
                 if "local" not in package_info:
@@ -385,11 +469,7 @@ class Arkivum(models.Model):
                     )
                     # Pick a random file and check the locality of it.
                     # WARNING assumes the package is local/not local as a unit.
-                    for dirpath, dirs, files in scandir.walk(package.full_path):
-                        if files:
-                            file_path = os.path.join(dirpath, files[0])
-                            break
-                    file_path = os.path.relpath(file_path, package.full_path)
+                    file_path = self._get_sample_file(package)
                     return self.is_file_local(package, file_path, email_nonlocal)
         LOGGER.debug("File info local: %s", package_info.get("local"))
         if package_info.get("local"):
@@ -418,6 +498,53 @@ class Arkivum(models.Model):
                 )
             return False
 
+    def _get_file_info(self, package, path, max_age):
+        """
+        Return Arkivum's file info for `path` inside an uncompressed package,
+        or None on error. Answers are cached per path in the Django cache for
+        `max_age` seconds.
+        """
+        cached = cache.get(_cache_key(FILE_INFO_CACHE_KEY, package, path))
+        if _is_fresh(cached, max_age):
+            return cached["info"]
+
+        url_path = (
+            package.current_location.relative_path
+            + "/"
+            + package.current_path
+            + "/"
+            + path
+        )
+        url_path = six.moves.urllib.parse.quote_plus(url_path, safe="/")
+        url = "https://" + self.host + "/api/2/files/fileInfo/" + url_path
+        file_info = self._get_json(
+            url,
+            _("Error fetching file information"),
+            _("JSON could not be parsed from package info"),
+        )
+        if file_info.get("error"):
+            return None
+        _cache_entry(FILE_INFO_CACHE_KEY, package, file_info, path)
+        return file_info
+
+    def _get_sample_file(self, package):
+        """
+        Return the relative path of a file inside an uncompressed package,
+        used to check the locality of the whole package. The choice is kept
+        in the Django cache so the package is walked only once.
+        """
+        key = _cache_key(SAMPLE_FILE_KEY, package)
+        sample_file = cache.get(key)
+        if sample_file:
+            return sample_file
+        for dirpath, dirs, files in scandir.walk(package.full_path):
+            if files:
+                file_path = os.path.join(dirpath, files[0])
+                break
+        sample_file = os.path.relpath(file_path, package.full_path)
+        cache.set(key, sample_file, SAMPLE_FILE_CACHE_TTL)
+        return sample_file
+
     def check_package_fixity(self, package):
         """
         Check fixity for package stored in this space. See Package.check_fixity for detailed description.
@@ -434,7 +561,8 @@ class Arkivum(models.Model):
             raise NotImplementedError(
                 "Arkivum does not implement fixity for compressed packages"
             )
-        package_info = self._get_package_info(package)
+        # Always asked, a cached answer could be older than the check
+        package_info = self._fetch_package_info(package)
         if package_info.get("error"):
             return (False, [], package_info["error_message"], None)
 
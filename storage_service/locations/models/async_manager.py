@@ -17,6 +17,7 @@ import threading
 import time
 import traceback
 
+from django.conf import settings
 from django.utils import timezone
 
 from .asynchronous import Async  # noqa
@@ -38,6 +39,116 @@ MAX_TASK_AGE_SECONDS = datetime.timedelta(seconds=86400)
 # check the status of our tasks.
 WATCHDOG_POLL_SECONDS = 5
 
+# Weight of the latest measure in the transfer rate reported, the others
+# being smoothed out
+RATE_SMOOTHING = 0.5
+
+# The TaskProgress of the task run by the current thread, if any
+_current = threading.local()
+
+
+class TaskProgress(object):
+    """Progress of a running task, reported to the client polling its Async.
+
+    The transfer code reports the phase it starts, with the bytes and files
+    it will process if it knows them, and then what it processed. The
+    progress is only written to the database, in a single UPDATE of the
+    Async, every ``interval`` seconds and when a phase starts or ends, so
+    that the transfer of many small files or chunks doesn't load it.
+
+    The progress of a thread not running a task, ``async_id`` None, is not
+    recorded.
+    """
+
+    def __init__(self, async_id, interval=None):
+        if interval is None:
+            interval = settings.ASYNC_PROGRESS_INTERVAL
+        self.async_id = async_id
+        self.interval = interval
+        self.phase = ""
+        self.bytes_done = 0
+        self.bytes_total = None
+        self.files_done = 0
+        self.files_total = None
+        self.bytes_per_second = None
+        self._saved_time = None
+        self._saved_bytes = 0
+
+    def start_phase(self, phase, bytes_total=None, files_total=None):
+        """Start the phase ``phase``, which processes ``bytes_total`` bytes
+        in ``files_total`` files if they are known."""
+        self.phase = phase
+        self.bytes_done = 0
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.files_total = files_total
+        self.bytes_per_second = None
+        self._saved_time = None
+        self._save()
+
+    def advance(self, bytes_count=0, files_count=0, transferred=True):
+        """Record that ``bytes_count`` bytes and ``files_count`` files more
+        were processed, counted as transferred by the storage operations
+        running unless ``transferred`` is False, e.g. if a previous attempt
+        transferred them."""
+        if transferred:
+            metrics.count_bytes(bytes_count)
+        self.bytes_done += bytes_count
+        self.files_done += files_count
+        if (
+            self._saved_time is not None
+            and time.time() - self._saved_time < self.interval
+        ):
+            return
+        self._save()
+
+    def end_phase(self):
+        """Record that the current phase processed everything it had to,
+        even if it did not report its progress as it went."""
+        if self.bytes_total is not None:
+            self.bytes_done = max(self.bytes_done, self.bytes_total)
+        if self.files_total is not None:
+            self.files_done = max(self.files_done, self.files_total)
+        self._save()
+
+    def _save(self):
+        now = time.time()
+        if self._saved_time is not None and now > self._saved_time:
+            rate = float(self.bytes_done - self._saved_bytes) / (now - self._saved_time)
+            if self.bytes_per_second is not None:
+                rate = (
+                    RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.bytes_per_second
+                )
+            self.bytes_per_second = rate
+        self._saved_time = now
+        self._saved_bytes = self.bytes_done
+        if self.async_id is None:
+            return
+        try:
+            Async.objects.filter(id=self.async_id).update(
+                phase=self.phase[:50],
+                bytes_done=self.bytes_done,
+                bytes_total=self.bytes_total,
+                files_done=self.files_done,
+                files_total=self.files_total,
+                bytes_per_second=self.bytes_per_second,
+                progress_time=timezone.now(),
+            )
+        except Exception as e:
+            # The progress is informative, the task goes on without it
+            LOGGER.warning(
+                "Unable to record the progress of task %s: %s", self.async_id, e
+            )
+
+
+def get_task_progress():
+    """Return the ``TaskProgress`` of the task run by the current thread, one
+    not recorded if it does not run a task."""
+    progress = getattr(_current, "progress", None)
+    if progress is None:
+        return TaskProgress(None)
+    return progress
+
 
 class RunningTask(object):
     def __init__(self):
@@ -135,11 +246,14 @@ class AsyncManager(object):
         def wrapper(*args, **kwargs):
             value = error = None
 
+            _current.progress = TaskProgress(task.async_id)
             try:
                 value = task_fn(*args, **kwargs)
             except Exception as e:
                 error = e
                 LOGGER.exception("Task threw an error: " + str(e) + "\n" + message)
+            finally:
+                _current.progress = None
 
             if error:
                 task.was_error = True
@@ -38,6 +38,28 @@ class Async(models.Model):
     updated_time = models.DateTimeField(auto_now=True)
     completed_time = models.DateTimeField(null=True)
 
+    # Progress of the phase the task is in, written by the running task at
+    # most every ASYNC_PROGRESS_INTERVAL seconds, see async_manager.TaskProgress
+    phase = models.CharField(
+        max_length=50,
+        blank=True,
+        default="",
+        verbose_name=_("Phase"),
+        help_text=_("What the task is currently doing."),
+    )
+    bytes_done = models.BigIntegerField(default=0)
+    bytes_total = models.BigIntegerField(
+        null=True, help_text=_("Bytes to process in this phase, if known.")
+    )
+    files_done = models.BigIntegerField(default=0)
+    files_total = models.BigIntegerField(
+        null=True, help_text=_("Files to process in this phase, if known.")
+    )
+    bytes_per_second = models.FloatField(null=True)
+    progress_time = models.DateTimeField(
+        null=True, help_text=_("When the progress was last written.")
+    )
+
     @property
     def result(self):
         result = self._result
@@ -2,25 +2,59 @@ from __future__ import absolute_import
 
 # stdlib, alphabetical
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import json
 import logging
 import os
 import re
+import threading
 import zipfile
 
 # Core Django, alphabetical
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
-# Third party dependencies, alphabetical
-import requests
-
 # This project, alphabetical
+from common import utils
+
 LOGGER = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Suffix of the files being downloaded, see Dataverse._fetch_file
+PARTIAL_DOWNLOAD_SUFFIX = ".part"
+
+# Number of datasets requested per search page
+SEARCH_PAGE_SIZE = 50
+
+# Checksum types used by Dataverse and their hashlib names
+CHECKSUM_TYPES = {
+    "MD5": "md5",
+    "SHA-1": "sha1",
+    "SHA-256": "sha256",
+    "SHA-512": "sha512",
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """Return the requests session shared by all the Dataverse spaces."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = utils.requests_session()
+        return _session
+
+
 # This module, alphabetical
 from . import StorageException  # noqa: E402
 from .location import Location  # noqa: E402
+from .space import parse_browse_cursor  # noqa: E402
 from .urlmixin import URLMixin  # noqa: E40
 
 
@@ -65,6 +99,9 @@ class Dataverse(URLMixin, models.Model):
 
     ALLOWED_LOCATION_PURPOSE = [Location.TRANSFER_SOURCE]
 
+    # browse accepts cursor and limit, see Space.browse
+    BROWSE_PAGING = True
+
     @staticmethod
     def get_query_value(key, path, default=None):
         """Retrieve the value corresponding to ``key`` from the string
@@ -100,9 +137,9 @@ class Dataverse(URLMixin, models.Model):
         query_string, path = self.get_query_value("query:", path, default="*")
         return dataset, subtree, query_string
 
-    def browse(self, path):
+    def browse(self, path, cursor=None, limit=None):
         """Fetch the datasets in this dataverse or the files in the dataset
-        referenced in ``path``.
+        referenced in ``path``, ``limit`` at a time if given.
         """
         LOGGER.info("Path received: %s", path)
         dataset_id, subtree, query_string = self.get_query_and_subtree(path)
@@ -110,15 +147,43 @@ class Dataverse(URLMixin, models.Model):
             "Dataset ID: %s Subtree: %s Query: %s", dataset_id, subtree, query_string
         )
         if dataset_id:
-            return self._browse_dataset(dataset_id)
-        return self._browse_dataverse(query_string, subtree)
+            return self._browse_dataset(dataset_id, cursor, limit)
+        return self._browse_dataverse(query_string, subtree, cursor, limit)
 
-    def _browse_dataverse(self, query_string, subtree):
-        """Return all datasets in all Dataverses (conforming to ``browse``
-        protocol).
-        """
-        LOGGER.info("Subtree: %s", subtree)
-        LOGGER.info("Query: %s", query_string)
+    def _cached(self, key, fetch):
+        """Return the value cached for ``key`` or cache and return the result
+        of ``fetch()``. Keys are scoped to this space and its credentials."""
+        key = json.dumps([self.space_id, self.host, self.api_key] + key)
+        key = "dataverse:" + hashlib.md5(key.encode("utf-8")).hexdigest()
+        value = cache.get(key)
+        if value is None:
+            value = fetch()
+            cache.set(key, value, settings.DATAVERSE_BROWSE_CACHE_TTL)
+        return value
+
+    def _get_json_data(self, url, params, error_message):
+        """Return the "data" member of the JSON document at ``url``."""
+        LOGGER.debug("URL: %s, params: %s", url, params)
+        response = _get_session().get(url, params=params)
+        LOGGER.debug("Response: %s", response)
+        # If the request isn't successful, i.e. doesn't return 200, then
+        # raise an exception. Other use cases from Dataverse might need to
+        # be considered, but we haven't examples of those as yet to go on
+        # and test with. We're only looking for 200 OK at present.
+        if response.status_code != 200:
+            LOGGER.warning("%s: Response: %s", response, response.text)
+            raise StorageException(error_message)
+        try:
+            return response.json()["data"]
+        except json.JSONDecodeError:
+            LOGGER.error("Could not parse JSON from response to %s", url)
+            raise StorageException(
+                _("Unable to parse JSON from response to %(url)s") % {"url": url}
+            )
+
+    def _get_search_page(self, query_string, subtree, start):
+        """Return the datasets of the search results page at ``start``, and
+        the total number of results, as a 2-tuple."""
         url = self._generate_dataverse_url(slug="/api/search/")
         params = {
             "key": self.api_key,
@@ -127,43 +192,53 @@ class Dataverse(URLMixin, models.Model):
             "type": "dataset",
             "sort": "name",
             "order": "asc",
-            "start": 0,
-            "per_page": 50,
+            "start": start,
+            "per_page": SEARCH_PAGE_SIZE,
             "show_entity_ids": True,
         }
+
+        def fetch():
+            data = self._get_json_data(
+                url, params, _("Unable to fetch datasets from %(url)s") % {"url": url}
+            )
+            datasets = [(str(ds["entity_id"]), ds["name"]) for ds in data["items"]]
+            return datasets, data["total_count"]
+
+        return self._cached(["search", query_string, subtree, start], fetch)
+
+    def _browse_dataverse(self, query_string, subtree, cursor=None, limit=None):
+        """Return the datasets in all Dataverses matching the query (conforming
+        to ``browse`` protocol).
+        """
+        LOGGER.info("Subtree: %s", subtree)
+        LOGGER.info("Query: %s", query_string)
+        position = parse_browse_cursor(cursor)
         properties = OrderedDict()
         while True:
-            LOGGER.debug("URL: %s, params: %s", url, params)
-            response = requests.get(url, params=params)
-            LOGGER.debug("Response: %s", response)
-            # If the request isn't successful, i.e. doesn't return 200, then
-            # raise an exception. Other use cases from Dataverse might need to
-            # be considered, but we haven't examples of those as yet to go on
-            # and test with. We're only looking for 200 OK at present.
-            if response.status_code != 200:
-                LOGGER.warning("%s: Response: %s", response, response.text)
-                raise StorageException(
-                    _("Unable to fetch datasets from %(url)s") % {"url": url}
-                )
-            try:
-                data = response.json()["data"]
-                items = data["items"]
-            except json.JSONDecodeError:
-                LOGGER.error("Could not parse JSON from response to %s", url)
-                raise StorageException(
-                    _("Unable to parse JSON from response to %(url)s") % {"url": url}
-                )
-            for ds in items:
-                properties[str(ds["entity_id"])] = {"verbose name": ds["name"]}
-            if params["start"] + data["count_in_response"] < data["total_count"]:
-                params["start"] += data["count_in_response"]
-            else:
+            # Dataverse may return fewer results than requested, so pages are
+            # fetched from wherever the previous one ended
+            datasets, total_count = self._get_search_page(
+                query_string, subtree, position
+            )
+            if limit is not None:
+                datasets = datasets[: limit - len(properties)]
+            for entity_id, name in datasets:
+                properties[entity_id] = {"verbose name": name}
+            position += len(datasets)
+            if (
+                not datasets
+                or position >= total_count
+                or (limit is not None and len(properties) >= limit)
+            ):
                 break
         entries = list(properties.keys())
-        return {"directories": entries, "entries": entries, "properties": properties}
+        result = {"directories": entries, "entries": entries, "properties": properties}
+        if limit is not None:
+            result["next_cursor"] = str(position) if position < total_count else None
+        return result
 
-    def _browse_dataset(self, dataset_identifier):
-        """Return all files in the dataset with ``entity_id``
+    def _browse_dataset(self, dataset_identifier, cursor=None, limit=None):
+        """Return the files in the dataset with ``entity_id``
         ``dataset_identifier`` (conforming to ``browse`` protocol).
         """
         files_in_dataset_path = (
@@ -173,31 +248,27 @@ class Dataverse(URLMixin, models.Model):
         )
         url = self._generate_dataverse_url(slug=files_in_dataset_path)
         params = {"key": self.api_key, "sort": "name", "order": "asc"}
-        LOGGER.debug("URL: %s, params: %s", url, params)
-        response = requests.get(url, params=params)
-        LOGGER.debug("Response: %s", response)
-        # If the request isn't successful, i.e. doesn't return 200, then raise
-        # an exception. Other use cases from Dataverse might need to be
-        # considered, but we haven't examples of those as yet to go on and test
-        # with. We're only looking for 200 OK at present.
-        if response.status_code != 200:
-            LOGGER.warning("%s: Response: %s", response, response.text)
-            raise StorageException(
-                _("Unable to fetch datasets from %(url)s") % {"url": url}
-            )
-        try:
-            data = response.json()["data"]
-            files = data["files"]
-        except json.JSONDecodeError:
-            LOGGER.error("Could not parse JSON from response to %s", url)
-            raise StorageException(
-                _("Unable to parse JSON from response to %(url)s") % {"url": url}
+
+        def fetch():
+            data = self._get_json_data(
+                url, params, _("Unable to fetch datasets from %(url)s") % {"url": url}
             )
+            return [
+                (f["dataFile"]["filename"], f["dataFile"]["filesize"])
+                for f in data["files"]
+            ]
+
+        files = self._cached(["dataset", dataset_identifier], fetch)
+        position = parse_browse_cursor(cursor)
+        end = len(files) if limit is None else position + limit
         properties = OrderedDict()
-        for f in files:
-            properties[f["dataFile"]["filename"]] = {"size": f["dataFile"]["filesize"]}
+        for filename, filesize in files[position:end]:
+            properties[filename] = {"size": filesize}
         entries = list(properties.keys())
-        return {"directories": [], "entries": entries, "properties": properties}
+        result = {"directories": [], "entries": entries, "properties": properties}
+        if limit is not None:
+            result["next_cursor"] = str(end) if end < len(files) else None
+        return result
 
     def move_to_storage_service(self, src_path, dest_path, dest_space):
         """
@@ -215,8 +286,10 @@ class Dataverse(URLMixin, models.Model):
         datasets_url = "/api/datasets/{}".format(src_path)
         url = self._generate_dataverse_url(slug=datasets_url)
         params = {"key": self.api_key}
+        concurrency = settings.DATAVERSE_DOWNLOAD_CONCURRENCY
+        session = utils.requests_session(pool_size=concurrency)
         LOGGER.debug("URL: %s, params: %s", url, params)
-        response = requests.get(url, params=params)
+        response = session.get(url, params=params)
         LOGGER.debug("Response: %s", response)
         if response.status_code != 200:
             raise StorageException(
@@ -233,52 +306,24 @@ class Dataverse(URLMixin, models.Model):
         self.space.create_local_directory(dest_path)
 
         # Write out dataset info as dataset.json to the metadata directory
-        os.makedirs(os.path.join(dest_path, "metadata"))
+        if not os.path.isdir(os.path.join(dest_path, "metadata")):
+            os.makedirs(os.path.join(dest_path, "metadata"))
         datasetjson_path = os.path.join(dest_path, "metadata", "dataset.json")
         with open(datasetjson_path, "w") as f:
             json.dump(dataset, f, sort_keys=True, indent=4, separators=(",", ": "))
 
         # Fetch all files in dataset.json
-        for file_entry in dataset["latestVersion"]["files"]:
-            zipped_bundle = False
-            entry_id = str(file_entry["dataFile"]["id"])
-            if file_entry["label"].endswith(".tab"):
-                # If the file is a tab file, download the bundle instead.
-                #
-                # A table based dataset ingested into Dataverse is called a
-                # Tabular Data File. The .tab file format is downloaded as a
-                # 'bundle' from Dataverse. This bundle provides multiple
-                # representations in different formats of the same data.
-                #
-                # A bundle has the property of being a zip file when pulled
-                # down by the storage service. We want to extract this bundle
-                # below, and allow Archivematica to process other zip files as
-                # it would normally (as configured) in the transfer workflow.
-                #
-                # Integrity checks are completed by the Dataverse
-                # microservices.
-                zipped_bundle = True
-                download_path = os.path.join(
-                    dest_path, file_entry["label"][:-4] + ".zip"
+        files = dataset["latestVersion"]["files"]
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            # Re-raises the exception of the first failed download
+            list(
+                executor.map(
+                    lambda file_entry: self._fetch_dataset_file(
+                        session, params, dest_path, file_entry
+                    ),
+                    files,
                 )
-                bundle_url = "/api/access/datafile/bundle/{}".format(entry_id)
-                url = self._generate_dataverse_url(slug=bundle_url)
-            else:
-                download_path = os.path.join(
-                    dest_path, file_entry["dataFile"]["filename"]
-                )
-                datafile_url = "/api/access/datafile/{}".format(entry_id)
-                url = self._generate_dataverse_url(slug=datafile_url)
-            LOGGER.debug("URL: %s, params: %s", url, params)
-            response = requests.get(url, params=params, stream=True)
-            with open(download_path, "wb") as f:
-                for chunk in response.iter_content(8192):
-                    f.write(chunk)
-            if zipped_bundle:
-                # The bundle .zip itself is ephemeral, and so once downloaded
-                # unzip and remove the container here.
-                LOGGER.info("Bundle downloaded. Deleting.")
-                self.extract_and_remove_bundle(dest_path, download_path)
+            )
 
         # Add Agent info
         agent_info = [
@@ -293,6 +338,125 @@ class Dataverse(URLMixin, models.Model):
         with open(agentjson_path, "w") as f:
             json.dump(agent_info, f, sort_keys=True, indent=4, separators=(",", ": "))
 
+    def _fetch_dataset_file(self, session, params, dest_path, file_entry):
+        """Download the file described by ``file_entry`` of the dataset JSON
+        to ``dest_path``.
+        """
+        entry_id = str(file_entry["dataFile"]["id"])
+        if file_entry["label"].endswith(".tab"):
+            # If the file is a tab file, download the bundle instead.
+            #
+            # A table based dataset ingested into Dataverse is called a
+            # Tabular Data File. The .tab file format is downloaded as a
+            # 'bundle' from Dataverse. This bundle provides multiple
+            # representations in different formats of the same data.
+            #
+            # A bundle has the property of being a zip file when pulled
+            # down by the storage service. We want to extract this bundle
+            # below, and allow Archivematica to process other zip files as
+            # it would normally (as configured) in the transfer workflow.
+            #
+            # Integrity checks are completed by the Dataverse
+            # microservices.
+            download_path = os.path.join(dest_path, file_entry["label"][:-4] + ".zip")
+            bundle_url = "/api/access/datafile/bundle/{}".format(entry_id)
+            url = self._generate_dataverse_url(slug=bundle_url)
+            # Bundles are generated on request, they can't be resumed
+            self._fetch_file(session, url, params, download_path, resume=False)
+            # The bundle .zip itself is ephemeral, and so once downloaded
+            # unzip and remove the container here.
+            LOGGER.info("Bundle downloaded. Deleting.")
+            self.extract_and_remove_bundle(dest_path, download_path)
+        else:
+            download_path = os.path.join(dest_path, file_entry["dataFile"]["filename"])
+            datafile_url = "/api/access/datafile/{}".format(entry_id)
+            url = self._generate_dataverse_url(slug=datafile_url)
+            checksum_type, checksum = self._get_datafile_checksum(
+                file_entry["dataFile"]
+            )
+            self._fetch_file(
+                session, url, params, download_path, checksum_type, checksum
+            )
+
+    @staticmethod
+    def _get_datafile_checksum(datafile):
+        """Return the hashlib name and the value of the checksum Dataverse
+        recorded for ``datafile``, or ``(None, None)`` if there is none.
+        """
+        checksum = datafile.get("checksum") or {}
+        checksum_type = CHECKSUM_TYPES.get(checksum.get("type", "").upper())
+        if checksum_type and checksum.get("value"):
+            return checksum_type, checksum["value"].lower()
+        # Older versions of Dataverse only provide the MD5
+        if datafile.get("md5"):
+            return "md5", datafile["md5"].lower()
+        return None, None
+
+    @staticmethod
+    def _fetch_file(
+        session,
+        url,
+        params,
+        download_path,
+        checksum_type=None,
+        checksum=None,
+        resume=True,
+    ):
+        """Stream ``url`` to ``download_path`` and verify it against
+        ``checksum`` as it is written.
+
+        The content is written to ``download_path`` + ``.part`` and only
+        moved into place once verified. If ``resume``, a partial download
+        left by a previous attempt is continued with a range request, and a
+        complete file that matches ``checksum`` is not fetched again.
+        """
+        if not checksum_type:
+            LOGGER.debug("No checksum to verify %s against", url)
+        elif os.path.isfile(download_path) and resume:
+            if utils.generate_checksum(download_path, checksum_type).hexdigest() == (
+                checksum
+            ):
+                LOGGER.info("%s already downloaded", download_path)
+                return
+        part_path = download_path + PARTIAL_DOWNLOAD_SUFFIX
+        offset = 0
+        if resume and os.path.isfile(part_path):
+            offset = os.path.getsize(part_path)
+        digest = hashlib.new(checksum_type) if checksum_type else None
+        headers = {"Range": "bytes={}-".format(offset)} if offset else None
+        LOGGER.debug("URL: %s, params: %s, offset: %s", url, params, offset)
+        with session.get(url, params=params, headers=headers, stream=True) as response:
+            if offset and response.status_code == 416:
+                # The previous attempt fetched the whole file
+                chunks = []
+            elif offset and response.status_code == 206:
+                chunks = response.iter_content(STREAM_CHUNK_SIZE)
+            elif response.status_code == 200:
+                offset = 0
+                chunks = response.iter_content(STREAM_CHUNK_SIZE)
+            else:
+                LOGGER.warning("%s: Response: %s", response, response.text)
+                raise StorageException(_("Unable to fetch %(url)s") % {"url": url})
+            if digest and offset:
+                with open(part_path, "rb") as f:
+                    for chunk in utils.read_in_chunks(f, STREAM_CHUNK_SIZE):
+                        digest.update(chunk)
+            with open(part_path, "ab" if offset else "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    if digest:
+                        digest.update(chunk)
+        if digest and digest.hexdigest() != checksum:
+            os.remove(part_path)
+            raise StorageException(
+                _(
+                    "Checksum mismatch for %(url)s: expected %(expected)s, got "
+                    "%(actual)s"
+                )
+                % {"url": url, "expected": checksum, "actual": digest.hexdigest()}
+            )
+        os.rename(part_path, download_path)
+
     @staticmethod
     def extract_and_remove_bundle(dest_path, bundle_path):
         """Given a bundle from Dataverse, extract the files from the ZIP and
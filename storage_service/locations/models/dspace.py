@@ -7,15 +7,18 @@ IRI.
 from __future__ import absolute_import
 
 # stdlib, alphabetical
+import functools
 import logging
 import mimetypes
 import os
 import re
 import shutil
 import subprocess
+import tarfile
+import time
+import zipfile
 import six.moves.urllib.parse
 import six.moves.urllib.request
-import six.moves.urllib.parse
 import six.moves.urllib.error
 
 # Core Django, alphabetical
@@ -36,6 +39,65 @@ from .location import Location
 
 LOGGER = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Earliest timestamp that can be stored in a ZIP archive
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def _archive_members(input_path):
+    """Yield ``(name, date_time, is_dir, size, open_member)`` for the
+    directories and regular files of the tar or ZIP archive ``input_path``,
+    in archive order. ``open_member()`` returns a binary file object with the
+    content of the member and must be read before the next one is yielded.
+    """
+    if zipfile.is_zipfile(input_path):
+        with zipfile.ZipFile(input_path) as archive:
+            for info in archive.infolist():
+                yield (
+                    info.filename.rstrip("/"),
+                    info.date_time,
+                    info.filename.endswith("/"),
+                    info.file_size,
+                    functools.partial(archive.open, info),
+                )
+        return
+    # Stream mode reads compressed tar files sequentially, once
+    with tarfile.open(input_path, "r|*") as archive:
+        for member in archive:
+            if not (member.isdir() or member.isfile()):
+                LOGGER.warning(
+                    "Skipping %s in %s: not a file or directory",
+                    member.name,
+                    input_path,
+                )
+                continue
+            yield (
+                os.path.normpath(member.name),
+                time.localtime(member.mtime)[:6],
+                member.isdir(),
+                member.size,
+                functools.partial(archive.extractfile, member),
+            )
+
+
+def _write_zip_member(archive, name, date_time, is_dir, size=0, open_member=None):
+    """Add a directory or a file read from ``open_member()`` to the ZIP
+    archive ``archive`` without holding its content in memory."""
+    date_time = max(tuple(date_time), ZIP_EPOCH)
+    if is_dir:
+        info = zipfile.ZipInfo(name + "/", date_time)
+        info.external_attr = (0o40755 << 16) | 0x10
+        archive.writestr(info, b"")
+        return
+    info = zipfile.ZipInfo(name, date_time)
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.external_attr = 0o644 << 16
+    # Lets zipfile decide whether the entry needs ZIP64 extensions
+    info.file_size = size
+    with open_member() as src, archive.open(info, "w") as dst:
+        shutil.copyfileobj(src, dst, STREAM_CHUNK_SIZE)
+
 
 class DSpace(models.Model):
     """Integration with DSpace using the SWORD2 protocol."""
@@ -254,11 +316,52 @@ class DSpace(models.Model):
         """
         Splits the input package into objects and metadata & logs.
 
+        Tar and ZIP packages are repackaged into ZIP archives by streaming
+        their members, other packages are extracted and compressed again.
+
         :param str input_path: Path to the input AIP
         :return: List of packages to be stored
         """
         # TODO Should output dir be a temp dir?
         output_dir = os.path.dirname(input_path) + "/"
+        if self.archive_format == self.ARCHIVE_FORMAT_ZIP and (
+            zipfile.is_zipfile(input_path) or tarfile.is_tarfile(input_path)
+        ):
+            return self._stream_split_package(input_path, output_dir)
+        return self._extract_split_package(input_path, output_dir)
+
+    def _stream_split_package(self, input_path, output_dir):
+        """Split the tar or ZIP package ``input_path`` into the ZIP archives
+        ``objects.zip`` and ``metadata.zip`` without extracting it."""
+        objects_zip = os.path.join(output_dir, "objects.zip")
+        metadata_zip = os.path.join(output_dir, "metadata.zip")
+        with zipfile.ZipFile(
+            objects_zip, "w", zipfile.ZIP_DEFLATED, allowZip64=True
+        ) as objects, zipfile.ZipFile(
+            metadata_zip, "w", zipfile.ZIP_DEFLATED, allowZip64=True
+        ) as metadata:
+            _write_zip_member(objects, "objects", time.localtime()[:6], True)
+            for name, date_time, is_dir, size, open_member in _archive_members(
+                input_path
+            ):
+                # Same split as _extract_split_package: the items of
+                # data/objects go to objects, everything else to metadata
+                parts = name.split("/")
+                if (
+                    len(parts) > 3
+                    and parts[1:3] == ["data", "objects"]
+                    and parts[3] not in ("metadata", "submissionDocumentation")
+                ):
+                    archive = objects
+                    name = "/".join(["objects"] + parts[3:])
+                else:
+                    archive = metadata
+                _write_zip_member(archive, name, date_time, is_dir, size, open_member)
+        return [objects_zip, metadata_zip]
+
+    def _extract_split_package(self, input_path, output_dir):
+        """Split the package ``input_path`` by extracting it to
+        ``output_dir`` and compressing objects and metadata separately."""
         dirname = os.path.splitext(os.path.basename(input_path))[0]
         command = [
             "unar",
@@ -338,37 +441,26 @@ class DSpace(models.Model):
         # Split package
         upload_paths = self._split_package(source_path)
 
+        # sword2 reads the whole payload into memory (and httplib2 sends it
+        # once without authentication first), so the files are streamed from
+        # disk with requests instead, replicating the sword2 behaviour.
+        session = utils.requests_session(pool_size=1)
+        session.auth = (self.user, self.password)
         for upload_path in upload_paths:
             LOGGER.info("Add file %s to %s", upload_path, entry_receipt.edit_media)
-            # Add file to DSpace item
-            with open(upload_path, "rb") as f:
-                content = f.read()  # sword2 iterates over this twice
-
-            # Note: This has problems because httplib2 tries all requests using basic auth without any auth and retries after getting a 401. This breaks with files over 2097152 bytes.
-            # A possible solution is to use a different http_impl in the connection, but that returns incorrect URIs in the deposit recept
-            # LOGGER.debug('Using sword2')
-            # self.sword_connection.add_file_to_resource(
-            #     edit_media_iri=entry_receipt.edit_media,
-            #     payload=content,
-            #     filename=os.path.basename(upload_path),
-            #     mimetype=mimetypes.guess_type(upload_path),
-            # )
-
-            # This replicates the sword2 behaviour but using requests for the basic auth
-            LOGGER.debug("Using requests")
             headers = {
-                "Content-Type": str(mimetypes.guess_type(upload_path)),
-                # 'Content-MD5': str(md5sum),
+                "Content-Type": mimetypes.guess_type(upload_path)[0]
+                or "application/octet-stream",
+                "Content-MD5": utils.generate_checksum(upload_path, "md5").hexdigest(),
                 "Content-Length": str(os.path.getsize(upload_path)),
                 "Content-Disposition": "attachment; filename=%s"
                 % six.moves.urllib.parse.quote(os.path.basename(upload_path)),
             }
-            requests.post(
-                entry_receipt.edit_media,
-                headers=headers,
-                data=content,
-                auth=(self.user, self.password),
-            )
+            with open(upload_path, "rb") as f:
+                response = session.post(
+                    entry_receipt.edit_media, headers=headers, data=f
+                )
+            response.raise_for_status()
 
         # Finalize deposit
         LOGGER.info("Complete deposit for %s", entry_receipt.edit)
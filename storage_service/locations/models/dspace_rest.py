@@ -5,6 +5,7 @@ Integration with DSpace, using REST API as the protocol.
 from __future__ import absolute_import, print_function
 
 # stdlib, alphabetical
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
 import os
@@ -15,6 +16,7 @@ import six.moves.urllib.parse
 import six.moves.urllib.error
 
 # Core Django, alphabetical
+from django.conf import settings
 from django.db import models
 from django.utils.six.moves.urllib.parse import urlparse
 from django.utils.translation import ugettext_lazy as _
@@ -341,8 +343,8 @@ class DSpaceREST(models.Model):
                 netloc="{}:{}".format(self.ds_rest_url.netloc, DFLT_DS_PORT)
             )
 
-    def _post(self, url, data=None, cookies=None, headers=HEADERS):
-        return requests.post(
+    def _post(self, url, data=None, cookies=None, headers=HEADERS, session=None):
+        return (session or requests).post(
             url, cookies=cookies, data=data, headers=headers, verify=self.verify_ssl
         )
 
@@ -389,26 +391,49 @@ class DSpaceREST(models.Model):
     def _get_base_url(parsed_url):
         return "{url.scheme}://{url.netloc}{url.path}".format(url=parsed_url)
 
-    def _deposit_dip_to_dspace(self, source_path, ds_item, ds_sessionid):
-        base_url = "{}/items/{}".format(
-            self._get_base_url(self.ds_rest_url), ds_item["uuid"]
+    def _get_bitstreams_session(self, pool_size=1):
+        return utils.requests_session(pool_size=pool_size, verify=self.verify_ssl)
+
+    def _get_bitstream_url(self, ds_item, path):
+        return "{base_url}/items/{uuid}/bitstreams?name={name}".format(
+            base_url=self._get_base_url(self.ds_rest_url),
+            uuid=ds_item["uuid"],
+            name=six.moves.urllib.parse.quote(os.path.basename(path).encode("utf-8")),
         )
-        for root, __, files in scandir.walk(source_path):
-            for name in files:
-                bitstream_url = "{}/bitstreams?name={}".format(
-                    base_url, six.moves.urllib.parse.quote(name.encode("utf-8"))
-                )
-                try:
-                    with open(os.path.join(root, name), "rb") as content:
-                        self._post(
-                            bitstream_url,
-                            data=content,
-                            cookies={"JSESSIONID": ds_sessionid},
-                        )
-                except Exception:
-                    raise DSpaceRESTException(
-                        "Error sending {} to {}.".format(name, bitstream_url)
+
+    def _post_bitstream(self, session, bitstream_url, path, ds_sessionid):
+        """Stream the file ``path`` from disk to ``bitstream_url``."""
+        with open(path, "rb") as content:
+            return self._post(
+                bitstream_url,
+                data=content,
+                cookies={"JSESSIONID": ds_sessionid},
+                session=session,
+            )
+
+    def _deposit_dip_to_dspace(self, source_path, ds_item, ds_sessionid):
+        paths = [
+            os.path.join(root, name)
+            for root, __, files in scandir.walk(source_path)
+            for name in files
+        ]
+        concurrency = max(1, min(settings.DSPACE_DEPOSIT_CONCURRENCY, len(paths)))
+        session = self._get_bitstreams_session(pool_size=concurrency)
+
+        def deposit(path):
+            bitstream_url = self._get_bitstream_url(ds_item, path)
+            try:
+                self._post_bitstream(session, bitstream_url, path, ds_sessionid)
+            except Exception:
+                raise DSpaceRESTException(
+                    "Error sending {} to {}.".format(
+                        os.path.basename(path), bitstream_url
                     )
+                )
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # Re-raises the exception of the first failed deposit
+            list(executor.map(deposit, paths))
 
     def _get_as_client(self, as_archival_repo):
         try:
@@ -461,18 +486,11 @@ class DSpaceREST(models.Model):
             raise DSpaceRESTException("ArchivesSpace Server error: {}.".format(err))
 
     def _deposit_aip_to_dspace(self, source_path, ds_item, ds_sessionid):
-        bitstream_url = "{base_url}/items/{uuid}/bitstreams?name={name}".format(
-            base_url=self._get_base_url(self.ds_rest_url),
-            uuid=ds_item["uuid"],
-            name=six.moves.urllib.parse.quote(
-                os.path.basename(source_path).encode("utf-8")
-            ),
-        )
+        bitstream_url = self._get_bitstream_url(ds_item, source_path)
         try:
-            with open(source_path, "rb") as content:
-                response = self._post(
-                    bitstream_url, data=content, cookies={"JSESSIONID": ds_sessionid}
-                )
+            response = self._post_bitstream(
+                self._get_bitstreams_session(), bitstream_url, source_path, ds_sessionid
+            )
             response.raise_for_status()
         except Exception:
             raise DSpaceRESTException(
@@ -25,6 +25,13 @@ class FixityLog(models.Model):
     class Meta:
         verbose_name = _("Fixity Log")
         app_label = "locations"
+        # Backs the latest fixity check of packages and the fixity log table
+        indexes = [
+            models.Index(
+                fields=["package", "datetime_reported"],
+                name="locations_fixitylog_pkg_dt_idx",
+            )
+        ]
 
     def __str__(self):
         return _(u"Fixity check of %(package)s") % {"package": self.package}
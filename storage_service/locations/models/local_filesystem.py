@@ -54,6 +54,14 @@ class LocalFilesystem(models.Model):
         self.space.verified = verified
         self.space.last_verified = datetime.datetime.now()
 
+    def read_stream(self, path):
+        """ Generates the files under path for Space.stream_move. """
+        return self.space.read_stream_local(path)
+
+    def write_stream(self, path, size, chunks, package=None):
+        """ Writes the byte strings of chunks to path for Space.stream_move. """
+        self.space.write_stream_local(path, chunks)
+
     def posix_move(
         self, source_path, destination_path, destination_space, package=None
     ):
@@ -16,6 +16,7 @@ from django_extensions.db.fields import UUIDField
 
 # This project, alphabetical
 from administration.models import Settings
+from common import utils
 
 # This module, alphabetical
 from .managers import Enabled
@@ -148,12 +149,8 @@ class Location(models.Model):
     def default(self):
         """ Looks up whether this location is the default one application-wise. """
         if self._default is None:
-            try:
-                name = "default_{}_location".format(self.purpose)
-                Settings.objects.get(name=name, value=self.uuid)
-                self._default = True
-            except Settings.DoesNotExist:
-                self._default = False
+            name = "default_{}_location".format(self.purpose)
+            self._default = utils.get_setting(name) == self.uuid
         return self._default
 
     @default.setter
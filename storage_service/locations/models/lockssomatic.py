@@ -2,13 +2,14 @@ from __future__ import absolute_import
 from __future__ import division
 
 # stdlib, alphabetical
+from collections import namedtuple
 import errno
+import hashlib
 import logging
 from lxml import etree
 import math
 import os
 import shutil
-import subprocess
 
 # Core Django, alphabetical
 from django.db import models
@@ -19,7 +20,8 @@ from django.utils.translation import ugettext_lazy as _
 import sword2
 
 # This project, alphabetical
-from common import utils
+from common import pointer_files, utils
+from storage_service import __version__ as ss_version
 
 # This module, alphabetical
 from .location import Location
@@ -27,6 +29,54 @@ from .package import Package
 
 LOGGER = logging.getLogger(__name__)
 
+# Size of the reads used to hash the LOCKSS chunks of packages
+SPLIT_BUFFER_SIZE = 8 * 1024 * 1024
+
+Chunk = namedtuple("Chunk", ["offset", "size", "checksum"])
+
+
+def _new_checksum(checksum_type):
+    """Return a new hash object of `checksum_type`, MD5 if it is invalid."""
+    try:
+        return hashlib.new(checksum_type)
+    except (TypeError, ValueError):  # Invalid checksum type
+        return hashlib.md5()
+
+
+def _checksum_name(checksum):
+    return checksum.name.upper().replace("SHA", "SHA-")
+
+
+def hash_chunks(file_path, chunk_size, checksum_type):
+    """
+    Describe the file at `file_path` as consecutive chunks of at most
+    `chunk_size` bytes, without copying it.
+
+    The file is read only once, hashing each chunk with `checksum_type` (MD5
+    if invalid).
+
+    :returns: list of Chunk, in order.
+    """
+    chunks = []
+    with open(file_path, "rb") as source:
+        offset = 0
+        while True:
+            data = source.read(min(chunk_size, SPLIT_BUFFER_SIZE))
+            if not data:
+                break
+            checksum = _new_checksum(checksum_type)
+            size = 0
+            while data:
+                checksum.update(data)
+                size += len(data)
+                remaining = chunk_size - size
+                if not remaining:
+                    break
+                data = source.read(min(remaining, SPLIT_BUFFER_SIZE))
+            chunks.append(Chunk(offset, size, checksum))
+            offset += size
+    return chunks
+
 
 class Lockssomatic(models.Model):
     """ Spaces that store their contents in LOCKSS, via LOCKSS-o-matic. """
@@ -212,7 +262,7 @@ class Lockssomatic(models.Model):
 
         # Add LOCKSS URLs to each chunk
         if not self.pointer_root:
-            self.pointer_root = etree.parse(package.full_pointer_file_path)
+            self.pointer_root = pointer_files.parse(package.full_pointer_file_path)
         files = self.pointer_root.findall(
             ".//mets:fileSec/mets:fileGrp[@USE='LOCKSS chunk']/mets:file",
             namespaces=utils.NSMAP,
@@ -391,6 +441,12 @@ class Lockssomatic(models.Model):
                     namespaces=utils.NSMAP,
                 )
                 del_elem.getparent().remove(del_elem)
+                # Delete byte ranges of the local copy
+                for del_elem in self.pointer_root.findall(
+                    ".//mets:div[@TYPE='LOCKSS chunk']/mets:fptr/mets:area",
+                    namespaces=utils.NSMAP,
+                ):
+                    del_elem.getparent().remove(del_elem)
         return None
 
     def update_service_document(self):
@@ -436,7 +492,11 @@ class Lockssomatic(models.Model):
 
     def _split_package(self, package):
         """
-        Splits the package into chunks of size self.au_size. Returns list of paths to the chunks.
+        Splits the package into chunks of size self.au_size. Returns list of IDs of the chunks.
+
+        Chunks are not copied to disk: each is recorded in the pointer file
+        as a byte range (mets:area) of the stored package, with its size and
+        checksum, and is served from that range when downloaded.
 
         If the package has already been split (and an event is in the pointer
         file), returns the list if file paths from the pointer file.
@@ -446,7 +506,7 @@ class Lockssomatic(models.Model):
         """
         # Parse pointer file
         if not self.pointer_root:
-            self.pointer_root = etree.parse(package.full_pointer_file_path)
+            self.pointer_root = pointer_files.parse(package.full_pointer_file_path)
 
         # Check if file is already split, and if so just return split files
         if self.pointer_root.xpath(
@@ -474,50 +534,29 @@ class Lockssomatic(models.Model):
             LOGGER.info("LOCKSS: after splitting: %s", output_files)
             return output_files
 
-        # Split file
-        # Strip extension, add .tar-1 ('-1' to make rename script happy)
-        output_path = os.path.splitext(file_path)[0] + ".tar-1"
-        command = [
-            "tar",
-            "--create",
-            "--multi-volume",
-            "--tape-length",
-            str(self.au_size),
-            "--new-volume-script",
-            "common/tar_new_volume.sh",
-            "-f",
-            output_path,
-            file_path,
-        ]
-        # TODO reserve space in quota for extra files
-        LOGGER.info("LOCKSS split command: %s", command)
+        # Split file, hashing each chunk in a single read of the package
+        # Strip extension, add .tar-N to name the chunks
+        output_prefix = os.path.basename(os.path.splitext(file_path)[0]) + ".tar-"
+        LOGGER.info("LOCKSS: splitting %s into %s*", file_path, output_prefix)
         try:
-            subprocess.check_call(command)
+            chunks = hash_chunks(file_path, self.au_size, self.checksum_type)
         except Exception:
-            LOGGER.exception("Split of %s failed with command %s", file_path, command)
+            LOGGER.exception("Split of %s failed", file_path)
             raise
-        output_path = output_path[:-2]  # Remove '-1'
-        dirname, basename = os.path.split(output_path)
-        output_files = sorted(
-            [
-                os.path.join(dirname, entry)
-                for entry in os.listdir(dirname)
-                if entry.startswith(basename)
-            ]
-        )
+        output_files = [
+            output_prefix + str(idx + 1) for idx, _chunk in enumerate(chunks)
+        ]
 
         # Update pointer file
         amdsec = self.pointer_root.find("mets:amdSec", namespaces=utils.NSMAP)
 
         # Add 'division' PREMIS:EVENT
-        try:
-            event_detail = subprocess.check_output(["tar", "--version"])
-        except subprocess.CalledProcessError as e:
-            event_detail = e.output or _("Error: getting tool info; probably GNU tar")
         utils.mets_add_event(
             amdsec,
             event_type="division",
-            event_detail=event_detail,
+            event_detail='program="Archivematica Storage Service"; version="{}"'.format(
+                ss_version
+            ),
             event_outcome_detail_note="{} LOCKSS chunks created".format(
                 len(output_files)
             ),
@@ -538,6 +577,7 @@ class Lockssomatic(models.Model):
 
         # Move ftpr to Local copy div
         local_ftpr = aip_div.find("mets:fptr", namespaces=utils.NSMAP)
+        aip_file_id = local_ftpr.get("FILEID") if local_ftpr is not None else None
         if local_ftpr is not None:
             div = etree.SubElement(
                 aip_div, utils.PREFIX_NS["mets"] + "div", TYPE="Local copy"
@@ -545,7 +585,7 @@ class Lockssomatic(models.Model):
             div.append(local_ftpr)  # This moves local_fptr
 
         # Add each split chunk to structMap & fileSec
-        for idx, out_path in enumerate(output_files):
+        for idx, (chunk, chunk_id) in enumerate(zip(chunks, output_files)):
             # Add div to structMap
             div = etree.SubElement(
                 aip_div,
@@ -553,35 +593,31 @@ class Lockssomatic(models.Model):
                 TYPE="LOCKSS chunk",
                 ORDER=str(idx + 1),
             )
-            etree.SubElement(
-                div, utils.PREFIX_NS["mets"] + "fptr", FILEID=os.path.basename(out_path)
+            fptr = etree.SubElement(
+                div, utils.PREFIX_NS["mets"] + "fptr", FILEID=chunk_id
             )
-            # Get checksum and size for fileSec
-            try:
-                checksum = utils.generate_checksum(out_path, self.checksum_type)
-            except ValueError:  # Invalid checksum type
-                checksum = utils.generate_checksum(out_path, "md5")
-            checksum_name = checksum.name.upper().replace("SHA", "SHA-")
-            size = os.path.getsize(out_path)
-            # Add file & FLocat to fileSec
-            file_e = etree.SubElement(
+            # Byte range of the stored package holding this chunk
+            if aip_file_id is not None:
+                etree.SubElement(
+                    fptr,
+                    utils.PREFIX_NS["mets"] + "area",
+                    FILEID=aip_file_id,
+                    BETYPE="BYTE",
+                    BEGIN=str(chunk.offset),
+                    END=str(chunk.offset + chunk.size - 1),
+                )
+            # Add file to fileSec
+            etree.SubElement(
                 filegrp,
                 utils.PREFIX_NS["mets"] + "file",
-                ID=os.path.basename(out_path),
-                SIZE=str(size),
-                CHECKSUM=checksum.hexdigest(),
-                CHECKSUMTYPE=checksum_name,
-            )
-            flocat = etree.SubElement(
-                file_e,
-                utils.PREFIX_NS["mets"] + "FLocat",
-                OTHERLOCTYPE="SYSTEM",
-                LOCTYPE="OTHER",
+                ID=chunk_id,
+                SIZE=str(chunk.size),
+                CHECKSUM=chunk.checksum.hexdigest(),
+                CHECKSUMTYPE=_checksum_name(chunk.checksum),
             )
-            flocat.set(utils.NSMAP["xlink"] + "href", out_path)
 
         # Write out pointer file again
-        with open(package.full_pointer_file_path, "w") as f:
+        with open(package.full_pointer_file_path, "wb") as f:
             f.write(
                 etree.tostring(
                     self.pointer_root,
@@ -673,7 +709,7 @@ class Lockssomatic(models.Model):
 
         # Add each chunk to the atom entry
         if not self.pointer_root:
-            self.pointer_root = etree.parse(package.full_pointer_file_path)
+            self.pointer_root = pointer_files.parse(package.full_pointer_file_path)
         entry.register_namespace("lom", utils.NSMAP["lom"])
         for index, file_path in enumerate(output_files):
             # Get external URL
@@ -695,11 +731,11 @@ class Lockssomatic(models.Model):
                 size = int(file_e.get("SIZE"))
             else:
                 # Not split, generate
-                try:
-                    checksum = utils.generate_checksum(file_path, self.checksum_type)
-                except ValueError:  # Invalid checksum type
-                    checksum = utils.generate_checksum(file_path, "md5")
-                checksum_name = checksum.name.upper().replace("SHA", "SHA-")
+                checksum = _new_checksum(self.checksum_type)
+                with open(file_path, "rb") as f:
+                    for data in utils.read_in_chunks(f, SPLIT_BUFFER_SIZE):
+                        checksum.update(data)
+                checksum_name = _checksum_name(checksum)
                 checksum_value = checksum.hexdigest()
                 size = os.path.getsize(file_path)
 
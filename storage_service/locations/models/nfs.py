@@ -94,6 +94,14 @@ class NFS(models.Model):
         # may need to tweak options
         pass
 
+    def read_stream(self, path):
+        """ Generates the files under path for Space.stream_move. """
+        return self.space.read_stream_local(path)
+
+    def write_stream(self, path, size, chunks, package=None):
+        """ Writes the byte strings of chunks to path for Space.stream_move. """
+        self.space.write_stream_local(path, chunks)
+
     def posix_move(
         self, source_path, destination_path, destination_space, package=None
     ):
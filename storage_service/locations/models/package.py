@@ -4,6 +4,8 @@ from __future__ import absolute_import
 # stdlib, alphabetical
 from collections import namedtuple
 import codecs
+from concurrent import futures
+import contextlib
 import copy
 import distutils.dir_util
 import json
@@ -19,7 +21,7 @@ from uuid import uuid4
 
 # Core Django, alphabetical
 from django.conf import settings
-from django.db import models
+from django.db import connection, models
 from django.utils.translation import ugettext_lazy as _
 
 # Third party dependencies, alphabetical
@@ -33,15 +35,16 @@ import requests
 import scandir
 
 # This project, alphabetical
-from common import premis, utils
-from locations import signals
+from common import bag_validation, pointer_files, pointer_validation, premis, utils
+from locations import metrics, signals
 
 # This module, alphabetical
 from . import StorageException
 from .location import Location
-from .space import Space, PosixMoveUnsupportedError
+from .space import Space, PosixMoveUnsupportedError, StreamMoveUnsupportedError
 from .event import Callback, CallbackError, File
 from .fixity_log import FixityLog
+from .transfer_checkpoint import TransferCheckpoint
 from six.moves import range
 
 __all__ = ("Package",)
@@ -49,6 +52,32 @@ __all__ = ("Package",)
 
 LOGGER = logging.getLogger(__name__)
 
+# Byte range of a stored package that makes up one of its LOCKSS chunks
+LockssChunk = namedtuple(
+    "LockssChunk", ["path", "offset", "size", "checksum_type", "checksum"]
+)
+
+# Errors of the deletion of a package from its space reported to the caller
+DELETE_ERRORS = (StorageException, NotImplementedError, ValueError)
+
+# Checksum algorithms of bag manifests, strongest first
+PAYLOAD_CHECKSUM_ALGORITHMS = ("sha512", "sha256", "sha1", "md5")
+
+
+def _package_size(result, package, *args, **kwargs):
+    return package.size
+
+
+def _extracted_size(result, package, relative_path="", *args, **kwargs):
+    # Extracting a single file reads only part of the package
+    return None if relative_path else package.size
+
+
+def _instrument(operation, size=_package_size):
+    return metrics.instrument_storage_operation(
+        operation, protocol=metrics.package_protocol, size=size
+    )
+
 
 @six.python_2_unicode_compatible
 class Package(models.Model):
@@ -101,6 +130,38 @@ class Package(models.Model):
         related_name="replicas",
         on_delete=models.CASCADE,
     )
+    # Format of the package, recorded when it is stored so that it is known
+    # without fetching the package. None if unknown, see record_format.
+    compressed = models.NullBooleanField(
+        default=None,
+        db_index=True,
+        help_text=_("Whether the package is a compressed file"),
+    )
+    compression_algorithm = models.CharField(
+        max_length=30,
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True,
+        help_text=_("Algorithm used to compress the package, if compressed"),
+    )
+    base_directory = models.TextField(
+        null=True,
+        blank=True,
+        default=None,
+        help_text=_("Directory containing the contents of the package"),
+    )
+    member_count = models.IntegerField(
+        null=True, blank=True, default=None, help_text=_("Number of files")
+    )
+    payload_checksum_algorithm = models.CharField(
+        max_length=16,
+        null=True,
+        blank=True,
+        default=None,
+        db_index=True,
+        help_text=_("Algorithm of the checksums of the bag manifest"),
+    )
 
     AIP = "AIP"
     AIC = "AIC"
@@ -189,6 +250,8 @@ class Package(models.Model):
         self.local_path_location = None
         self.origin_location = None
         self.local_tempdirs = []
+        # Checkpoint of the transfer of the package in progress, if any
+        self.transfer_checkpoint = None
 
     def __str__(self):
         return u"{uuid}: {path}".format(uuid=self.uuid, path=self.full_path)
@@ -254,6 +317,8 @@ class Package(models.Model):
     @property
     def is_compressed(self):
         """ Determines whether or not the package is a compressed file. """
+        if self.compressed is not None:
+            return self.compressed
         full_path = self.get_local_path() or self.fetch_local_path()
         if os.path.isdir(full_path):
             return False
@@ -274,11 +339,15 @@ class Package(models.Model):
 
     @property
     def latest_fixity_check_datetime(self):
+        if "last_fixity_datetime" in self.__dict__:
+            return self.last_fixity_datetime
         latest_check = self._latest_fixity_check()
         return latest_check.datetime_reported if latest_check is not None else None
 
     @property
     def latest_fixity_check_result(self):
+        if "last_fixity_success" in self.__dict__:
+            return self.last_fixity_success
         latest_check = self._latest_fixity_check()
         return latest_check.success if latest_check is not None else None
 
@@ -292,6 +361,28 @@ class Package(models.Model):
         except IndexError:
             return None
 
+    @staticmethod
+    def with_latest_fixity_check(queryset):
+        """Annotate the packages of ``queryset`` with the date and result of
+        their latest fixity check, as ``last_fixity_datetime`` and
+        ``last_fixity_success``, so that they can be sorted by them and
+        ``latest_fixity_check_datetime`` and ``latest_fixity_check_result``
+        do not query them for each package.
+        """
+        latest_checks = FixityLog.objects.filter(
+            package=models.OuterRef("uuid")
+        ).order_by("-datetime_reported")
+        return queryset.annotate(
+            last_fixity_datetime=models.Subquery(
+                latest_checks.values("datetime_reported")[:1],
+                output_field=models.DateTimeField(),
+            ),
+            last_fixity_success=models.Subquery(
+                latest_checks.values("success")[:1],
+                output_field=models.NullBooleanField(),
+            ),
+        )
+
     def get_download_path(self, lockss_au_number=None):
         full_path = self.fetch_local_path()
         if lockss_au_number is None:
@@ -311,6 +402,30 @@ class Package(models.Model):
         LOGGER.debug("Got download path %s for package %s", path, self.uuid)
         return path
 
+    def get_lockss_chunk(self, lockss_au_number):
+        """Return the LockssChunk for LOCKSS chunk `lockss_au_number`.
+
+        Returns None if the package is not in LOCKSS or if the pointer file
+        does not describe the chunk as a byte range of the stored package,
+        e.g. chunks written to disk by older versions or chunks whose local
+        copy has been deleted.
+        """
+        if self.current_location.space.access_protocol != Space.LOM:
+            return None
+        pointer_path = self.full_pointer_file_path
+        if not pointer_path or not os.path.isfile(pointer_path):
+            return None
+        chunk = pointer_files.get(pointer_path).lockss_chunks.get(int(lockss_au_number))
+        if chunk is None:
+            return None
+        return LockssChunk(
+            path=self.fetch_local_path(),
+            offset=chunk.offset,
+            size=chunk.size,
+            checksum_type=chunk.checksum_type,
+            checksum=chunk.checksum,
+        )
+
     def get_local_path(self):
         """Return a locally accessible path to this Package if available.
 
@@ -400,9 +515,12 @@ class Package(models.Model):
         The string "package-00000000-0000-0000-0000-000000000000" would be
         returned.
 
-        Note that this currently only supports locally-available packages.
-        If the package is stored externally, raises NotImplementedError.
+        Note that unless it was recorded by record_format, this currently
+        only supports locally-available packages. If the package is stored
+        externally, raises NotImplementedError.
         """
+        if self.base_directory:
+            return self.base_directory
         full_path = self.get_local_path()
         if full_path is None:
             raise NotImplementedError(
@@ -417,21 +535,57 @@ class Package(models.Model):
             # not be consistent, determine it by filtering all entries
             # for directories, then determine the directory with the
             # shortest name. (e.g. foo is the parent of foo/bar)
-            # NOTE: lsar's JSON output is broken in certain circumstances in
-            #       all released versions; make sure to use a patched version
-            #       for this to work.
-            command = ["lsar", "-ja", full_path]
-            output = subprocess.check_output(command).decode("utf8")
-            output = json.loads(output)
-            directories = [
-                d["XADFileName"]
-                for d in output["lsarContents"]
-                if d.get("XADIsDirectory", False)
-            ]
+            directories = [name for name, is_dir in _list_archive(full_path) if is_dir]
             directories = sorted(directories, key=len)
             return directories[0]
         return os.path.basename(full_path)
 
+    def record_format(self, local_path, compression_algorithm=None):
+        """Record the format of the package from its locally accessible copy
+        at ``local_path``, so that ``is_compressed`` and
+        ``get_base_directory`` don't have to fetch it. Does not save.
+
+        :param compression_algorithm: one of ``utils.COMPRESSION_ALGORITHMS``
+            if the package is compressed. Read from the pointer file if None.
+        """
+        self.compressed = os.path.isfile(local_path)
+        self.compression_algorithm = None
+        self.base_directory = self.member_count = None
+        self.payload_checksum_algorithm = None
+        if self.compressed:
+            pointer_path = self.full_pointer_file_path
+            if (
+                compression_algorithm is None
+                and pointer_path
+                and os.path.isfile(pointer_path)
+            ):
+                compression_algorithm = pointer_files.get(pointer_path).compression
+            self.compression_algorithm = compression_algorithm
+            try:
+                members = _list_archive(local_path)
+            except (OSError, ValueError, KeyError, subprocess.CalledProcessError):
+                LOGGER.warning("Unable to list %s", local_path, exc_info=True)
+                return
+            directories = sorted((name for name, is_dir in members if is_dir), key=len)
+            if directories:
+                self.base_directory = directories[0]
+            files = [name for name, is_dir in members if not is_dir]
+        else:
+            local_path = os.path.normpath(local_path)
+            self.base_directory = os.path.basename(local_path)
+            files = [
+                os.path.relpath(
+                    os.path.join(dirpath, filename), os.path.dirname(local_path)
+                )
+                for dirpath, __, filenames in scandir.walk(local_path)
+                for filename in filenames
+            ]
+        self.member_count = len(files)
+        if self.base_directory:
+            self.payload_checksum_algorithm = _payload_checksum_algorithm(
+                files, self.base_directory
+            )
+
     def _check_quotas(self, dest_space, dest_location):
         """
         Verify that there is enough storage space on dest_space and dest_location for this package.  All sizes in bytes.
@@ -478,6 +632,7 @@ class Package(models.Model):
         location.used += self.size
         location.save()
 
+    @_instrument("move")
     def move(self, to_location):
         """Move the package to location."""
         if self.current_location == to_location:
@@ -492,38 +647,69 @@ class Package(models.Model):
 
         destination_path = os.path.join(to_location.relative_path, self.current_path)
 
-        try:
-            origin_space.posix_move(
-                source_path=source_path,
-                destination_path=destination_path,
-                destination_space=destination_space,
-                package=None,
-            )
+        with self._checkpointed_transfer(
+            TransferCheckpoint.MOVE, to_location=to_location.uuid
+        ):
+            try:
+                origin_space.posix_move(
+                    source_path=source_path,
+                    destination_path=destination_path,
+                    destination_space=destination_space,
+                    package=None,
+                )
 
-        except PosixMoveUnsupportedError:
-            origin_space.move_to_storage_service(
-                source_path=source_path,
-                destination_path=destination_path,
-                destination_space=destination_space,
-            )
+            except PosixMoveUnsupportedError:
+                try:
+                    origin_space.stream_move(
+                        source_path=source_path,
+                        destination_path=destination_path,
+                        destination_space=destination_space,
+                        package=None,
+                    )
+                except StreamMoveUnsupportedError:
+                    origin_space.move_to_storage_service(
+                        source_path=source_path,
+                        destination_path=destination_path,
+                        destination_space=destination_space,
+                    )
 
-            origin_space.post_move_to_storage_service()
-            destination_space.move_from_storage_service(
-                source_path=destination_path,
-                destination_path=destination_path,
-                package=None,
-            )
+                    origin_space.post_move_to_storage_service()
+                    destination_space.move_from_storage_service(
+                        source_path=destination_path,
+                        destination_path=destination_path,
+                        package=None,
+                    )
 
-            destination_space.post_move_from_storage_service(
-                destination_path, destination_path
-            )
+                    destination_space.post_move_from_storage_service(
+                        destination_path, destination_path
+                    )
 
-        # If we get here everything went well, update with new location
-        self.current_location = to_location
-        self.save()
+            # If we get here everything went well, update with new location
+            self.current_location = to_location
+            self.save()
         self.current_location.space.update_package_status(self)
         self._update_existing_ptr_loc_info()
 
+    @contextlib.contextmanager
+    def _checkpointed_transfer(self, operation, **arguments):
+        """Run the transfer ``operation`` of this package with a
+        ``TransferCheckpoint`` recording its progress, kept if the transfer
+        fails or is interrupted for it to be resumed. Raises
+        ``StorageException`` if the transfer is already running."""
+        checkpoint = TransferCheckpoint.begin(self, operation, **arguments)
+        # The spaces given no package don't record their progress, the
+        # heartbeat shows that the transfer is still running meanwhile
+        checkpoint.start_heartbeat()
+        try:
+            yield checkpoint
+        except Exception as err:
+            checkpoint.fail(err)
+            raise
+        finally:
+            checkpoint.stop_heartbeat()
+            self.transfer_checkpoint = None
+        checkpoint.complete()
+
     def recover_aip(self, origin_location, origin_path):
         """Recovers an AIP using files at a given location.
 
@@ -604,7 +790,8 @@ class Package(models.Model):
         success, failures, message, __ = self.check_fixity(force_local=True)
         return success, failures, message
 
-    def replicate(self, replicator_location):
+    @_instrument("replicate")
+    def replicate(self, replicator_location, replica_package=None):
         """Replicate this package in the database and on disk by
         1. creating a new ``Package`` model instance that references this one in
            its ``replicated_package`` attribute,
@@ -614,6 +801,9 @@ class Package(models.Model):
            replication event, and
         4. updating the pointer file for the replicated AIP, which encodes the
            replication event.
+
+        ``replica_package`` is a replica whose replication was interrupted,
+        resumed instead of creating a new one.
         """
         # Replicandum is the package to be replicated, i.e., ``self``
         replicandum_location = self.current_location
@@ -627,27 +817,29 @@ class Package(models.Model):
             replicator_location.uuid,
         )
 
-        replica_package = self._clone()
-        replica_package.replicated_package = self
+        if replica_package is None:
+            replica_package = self._clone()
+            replica_package.replicated_package = self
 
-        # Remove the /uuid/path from the replica's current_path and replace the
-        # old UUID in the basename with the new UUID.
-        replica_package.current_path = os.path.basename(replicandum_path).replace(
-            replicandum_uuid, replica_package.uuid, 1
-        )
-        replica_package.current_location = replicator_location
+            # Remove the /uuid/path from the replica's current_path and
+            # replace the old UUID in the basename with the new UUID.
+            replica_package.current_path = os.path.basename(replicandum_path).replace(
+                replicandum_uuid, replica_package.uuid, 1
+            )
+            replica_package.current_location = replicator_location
+
+            # Replicate AIP at
+            # destination_location/uuid/split/into/chunks/destination_path
+            uuid_path = utils.uuid_to_path(replica_package.uuid)
+            replica_package.current_path = os.path.join(
+                uuid_path, replica_package.current_path
+            )
 
         # Check if enough space on the space and location
         src_space = replicandum_location.space
         dest_space = replica_package.current_location.space
         self._check_quotas(dest_space, replica_package.current_location)
 
-        # Replicate AIP at
-        # destination_location/uuid/split/into/chunks/destination_path
-        uuid_path = utils.uuid_to_path(replica_package.uuid)
-        replica_package.current_path = os.path.join(
-            uuid_path, replica_package.current_path
-        )
         replica_destination_path = os.path.join(
             replica_package.current_location.relative_path, replica_package.current_path
         )
@@ -659,103 +851,143 @@ class Package(models.Model):
         replica_package.status = Package.PENDING
         replica_package.save()
 
-        # Copy replicandum AIP from its source location to the SS
-        src_path = os.path.join(replicandum_location.relative_path, replicandum_path)
-        if not replicandum_is_file:
-            # Ensure directory paths are terminated by a trailing slash.
-            src_path = os.path.join(src_path, "")
-        src_space.move_to_storage_service(
-            source_path=src_path,
-            destination_path=replica_package.current_path,
-            destination_space=dest_space,
-        )
-        replica_package.status = Package.STAGING
-        replica_package.save()
-        src_space.post_move_to_storage_service()
-
-        # Get the master AIP's pointer file and extract the checksum details
-        master_ptr = self.get_pointer_instance()
-        if master_ptr:
-            master_ptr_aip_fsentry = master_ptr.get_file(file_uuid=self.uuid)
-            master_premis_object = master_ptr_aip_fsentry.get_premis_objects()[0]
-            master_checksum_algorithm = master_premis_object.message_digest_algorithm
-            master_checksum = master_premis_object.message_digest
-
-            # Calculate the checksum of the replica while we have it locally,
-            # compare it to the master's checksum and create a PREMIS validation
-            # event out of the result.
-            replica_local_path = self.get_local_path()
-            replica_checksum = utils.generate_checksum(
-                replica_local_path, master_checksum_algorithm
-            ).hexdigest()
-            checksum_report = _get_checksum_report(
-                master_checksum,
-                self.uuid,
-                replica_checksum,
-                replica_package.uuid,
-                master_checksum_algorithm,
-            )
-            replication_validation_event = premis.create_replication_validation_event(
-                replica_package.uuid,
-                checksum_report=checksum_report,
-                master_aip_uuid=self.uuid,
-            )
+        with replica_package._checkpointed_transfer(
+            TransferCheckpoint.REPLICATE, replicator_location=replicator_location.uuid
+        ):
+            # Get the master AIP's pointer file and extract the checksum details
+            master_ptr = self.get_pointer_instance()
+            master_checksum_algorithm = Package.DEFAULT_CHECKSUM_ALGORITHM
+            if master_ptr:
+                master_ptr_aip_fsentry = master_ptr.get_file(file_uuid=self.uuid)
+                master_premis_object = master_ptr_aip_fsentry.get_premis_objects()[0]
+                master_checksum_algorithm = (
+                    master_premis_object.message_digest_algorithm
+                )
+                master_checksum = master_premis_object.message_digest
 
-            # Create and write to disk the pointer file for the replica, which
-            # contains the PREMIS replication event.
-            replication_event_uuid = str(uuid4())
-            replica_pointer_file = self.create_replica_pointer_file(
-                replica_package,
-                replication_event_uuid,
-                replication_validation_event,
-                master_ptr=master_ptr,
-            )
-            write_pointer_file(
-                replica_pointer_file, replica_package.full_pointer_file_path
+            src_path = os.path.join(
+                replicandum_location.relative_path, replicandum_path
             )
-            replica_package.save()
-
-        # Copy replicandum AIP from the SS to replica package's replicator
-        # location.
-        replica_storage_effects = dest_space.move_from_storage_service(
-            source_path=replica_package.current_path,
-            destination_path=replica_destination_path,
-            package=replica_package,
-        )
-        if dest_space.access_protocol not in (Space.LOM, Space.ARKIVUM):
-            replica_package.status = Package.UPLOADED
-        replica_package.save()
-        dest_space.post_move_from_storage_service(
-            staging_path=replica_package.current_path,
-            destination_path=replica_destination_path,
-            package=replica_package,
-        )
-        self._update_quotas(dest_space, replica_package.current_location)
-
-        # Any effects resulting from AIP storage (e.g., encryption) are
-        # recorded in the replica's pointer file.
-        if replica_storage_effects:
-            # Note: unclear why the existing ``replica_pointer_file`` is
-            # a ``lxml.etree._Element`` instance and not the expected
-            # ``premisrw.PREMISObject``. As a result, the following is required:
-            replica_pointer_file = replica_package.get_pointer_instance()
-            if replica_pointer_file:
-                revised_replica_pointer_file = (
-                    replica_package.create_new_pointer_file_given_storage_effects(
-                        replica_pointer_file, replica_storage_effects
+            if not replicandum_is_file:
+                # Ensure directory paths are terminated by a trailing slash.
+                src_path = os.path.join(src_path, "")
+            try:
+                # Pipe the replicandum AIP directly to the replica package's
+                # replicator location, computing the checksum of the replica.
+                # An uncompressed AIP is streamed file by file, which gives no
+                # checksum of the whole replica to compare with the master's,
+                # so it is staged instead.
+                if not replicandum_is_file:
+                    raise StreamMoveUnsupportedError()
+                replica_checksums = src_space.stream_move(
+                    source_path=src_path,
+                    destination_path=replica_destination_path,
+                    destination_space=dest_space,
+                    package=replica_package,
+                    checksum_algorithm=master_checksum_algorithm,
+                )
+            except StreamMoveUnsupportedError:
+                replica_checksums = None
+                # Copy replicandum AIP from its source location to the SS
+                src_space.move_to_storage_service(
+                    source_path=src_path,
+                    destination_path=replica_package.current_path,
+                    destination_space=dest_space,
+                )
+                replica_package.status = Package.STAGING
+                replica_package.save()
+                src_space.post_move_to_storage_service()
+
+            if master_ptr:
+                # Calculate the checksum of the replica while we have it locally,
+                # unless it was computed while streaming it, compare it to the
+                # master's checksum and create a PREMIS validation event out of
+                # the result.
+                if replica_checksums is not None:
+                    replica_checksum = replica_checksums[""]
+                else:
+                    replica_local_path = self.get_local_path()
+                    replica_checksum = utils.generate_checksum(
+                        replica_local_path, master_checksum_algorithm
+                    ).hexdigest()
+                checksum_report = _get_checksum_report(
+                    master_checksum,
+                    self.uuid,
+                    replica_checksum,
+                    replica_package.uuid,
+                    master_checksum_algorithm,
+                )
+                replication_validation_event = (
+                    premis.create_replication_validation_event(
+                        replica_package.uuid,
+                        checksum_report=checksum_report,
+                        master_aip_uuid=self.uuid,
                     )
                 )
+
+                # Create and write to disk the pointer file for the replica, which
+                # contains the PREMIS replication event.
+                replication_event_uuid = str(uuid4())
+                replica_pointer_file = self.create_replica_pointer_file(
+                    replica_package,
+                    replication_event_uuid,
+                    replication_validation_event,
+                    master_ptr=master_ptr,
+                )
                 write_pointer_file(
-                    revised_replica_pointer_file, replica_package.full_pointer_file_path
+                    replica_pointer_file, replica_package.full_pointer_file_path
                 )
+                replica_package.save()
 
-        # Update the pointer file of the replicated AIP (master) so that it
-        # contains a record of its replication.
-        if master_ptr:
-            new_master_pointer_file = self.create_new_pointer_file_with_replication(
-                master_ptr, replica_package, replication_event_uuid
-            )
-            write_pointer_file(new_master_pointer_file, self.full_pointer_file_path)
+            if replica_checksums is not None:
+                replica_storage_effects = None
+                replica_package.status = Package.UPLOADED
+                replica_package.save()
+            else:
+                # Copy replicandum AIP from the SS to replica package's replicator
+                # location.
+                replica_storage_effects = dest_space.move_from_storage_service(
+                    source_path=replica_package.current_path,
+                    destination_path=replica_destination_path,
+                    package=replica_package,
+                )
+                if dest_space.access_protocol not in (Space.LOM, Space.ARKIVUM):
+                    replica_package.status = Package.UPLOADED
+                replica_package.save()
+            # Nothing is staged when streaming, but the destination space's
+            # hooks still run for the replica
+            dest_space.post_move_from_storage_service(
+                staging_path=replica_package.current_path,
+                destination_path=replica_destination_path,
+                package=replica_package,
+            )
+            self._update_quotas(dest_space, replica_package.current_location)
+
+            # Any effects resulting from AIP storage (e.g., encryption) are
+            # recorded in the replica's pointer file.
+            if replica_storage_effects:
+                # Note: unclear why the existing ``replica_pointer_file`` is
+                # a ``lxml.etree._Element`` instance and not the expected
+                # ``premisrw.PREMISObject``. As a result, the following is required:
+                replica_pointer_file = replica_package.get_pointer_instance()
+                if replica_pointer_file:
+                    revised_replica_pointer_file = (
+                        replica_package.create_new_pointer_file_given_storage_effects(
+                            replica_pointer_file, replica_storage_effects
+                        )
+                    )
+                    write_pointer_file(
+                        revised_replica_pointer_file,
+                        replica_package.full_pointer_file_path,
+                    )
+
+            # Update the pointer file of the replicated AIP (master) so that it
+            # contains a record of its replication.
+            if master_ptr:
+                new_master_pointer_file = self.create_new_pointer_file_with_replication(
+                    master_ptr, replica_package, replication_event_uuid
+                )
+                write_pointer_file(new_master_pointer_file, self.full_pointer_file_path)
 
         LOGGER.info(
             "Finished replicating package %s as replica package %s",
@@ -841,24 +1073,51 @@ class Package(models.Model):
         """
         LOGGER.info("store_aip called in Package class of SS")
         LOGGER.info("store_aip got origin_path {}".format(origin_path))
+        # Recorded before it is made relative to the UUID path of the AIP
+        current_path = self.current_path
         v = self._store_aip_to_pending(origin_location, origin_path)
-        storage_effects, checksum = self._store_aip_to_uploaded(v, related_package_uuid)
-        self._store_aip_ensure_pointer_file(
-            v,
-            checksum,
+        with self._checkpointed_transfer(
+            TransferCheckpoint.STORE,
+            origin_location=origin_location.uuid,
+            origin_path=origin_path,
+            current_path=current_path,
+            related_package_uuid=related_package_uuid,
             premis_events=premis_events,
             premis_agents=premis_agents,
             aip_subtype=aip_subtype,
-        )
-        if storage_effects:
-            pointer_file = self.get_pointer_instance()
-            if pointer_file:
-                revised_pointer_file = (
-                    self.create_new_pointer_file_given_storage_effects(
-                        pointer_file, storage_effects
+        ):
+            storage_effects, checksum = self._store_aip_to_uploaded(
+                v, related_package_uuid
+            )
+            self._store_aip_ensure_pointer_file(
+                v,
+                checksum,
+                premis_events=premis_events,
+                premis_agents=premis_agents,
+                aip_subtype=aip_subtype,
+            )
+            if (
+                self.compressed
+                and self.compression_algorithm is None
+                and self.full_pointer_file_path
+                and os.path.isfile(self.full_pointer_file_path)
+            ):
+                # The pointer file was created by the storage service
+                self.compression_algorithm = pointer_files.get(
+                    self.full_pointer_file_path
+                ).compression
+                self.save()
+            if storage_effects:
+                pointer_file = self.get_pointer_instance()
+                if pointer_file:
+                    revised_pointer_file = (
+                        self.create_new_pointer_file_given_storage_effects(
+                            pointer_file, storage_effects
+                        )
+                    )
+                    write_pointer_file(
+                        revised_pointer_file, self.full_pointer_file_path
                     )
-                )
-                write_pointer_file(revised_pointer_file, self.full_pointer_file_path)
         self.create_replicas()
         self.run_post_store_callbacks()
 
@@ -927,6 +1186,15 @@ class Package(models.Model):
             already_generated_ptr_exists = os.path.isfile(
                 already_generated_ptr_full_path
             )
+        if os.path.exists(origin_full_path):
+            # Recorded while the AIP is locally accessible, before the
+            # destination space encrypts or packages it
+            compression_algorithm = None
+            if already_generated_ptr_exists:
+                compression_algorithm = pointer_files.get(
+                    already_generated_ptr_full_path
+                ).compression
+            self.record_format(origin_full_path, compression_algorithm)
         return V(
             src_space=src_space,
             dest_space=dest_space,
@@ -977,6 +1245,10 @@ class Package(models.Model):
             self._update_quotas(v.dest_space, self.current_location)
             return storage_effects, checksum
         except PosixMoveUnsupportedError:
+            try:
+                return self._stream_aip_to_uploaded(v, related_package_uuid)
+            except StreamMoveUnsupportedError:
+                pass
             # 1. move AIP to the SS internal location,
             # 2. get its checksum,
             # 3. set its status to "staging",
@@ -1029,6 +1301,37 @@ class Package(models.Model):
             self._update_quotas(v.dest_space, self.current_location)
             return storage_effects, checksum
 
+    def _stream_aip_to_uploaded(self, v, related_package_uuid):
+        """Get this AIP to the "uploaded" stage of ``store_aip`` by piping it
+        from its origin space to its destination space, see
+        ``Space.stream_move``, computing its checksum on the way.
+
+        :raises StreamMoveUnsupportedError: if the spaces can't stream to one
+            another.
+        :returns tuple 2-tuple of (storage_effects, checksum):
+        """
+        checksums = v.src_space.stream_move(
+            source_path=os.path.join(
+                self.origin_location.relative_path, self.origin_path
+            ),
+            destination_path=os.path.join(
+                self.current_location.relative_path, self.current_path
+            ),
+            destination_space=v.dest_space,
+            package=self,
+            checksum_algorithm=Package.DEFAULT_CHECKSUM_ALGORITHM,
+        )
+        checksum = None
+        if v.should_have_pointer and (not v.already_generated_ptr_exists):
+            checksum = checksums.get("")
+        if related_package_uuid is not None:
+            related_package = Package.objects.get(uuid=related_package_uuid)
+            self.related_packages.add(related_package)
+        self.status = Package.UPLOADED
+        self.save()
+        self._update_quotas(v.dest_space, self.current_location)
+        return None, checksum
+
     def _store_aip_ensure_pointer_file(
         self, v, checksum, premis_events=None, premis_agents=None, aip_subtype=None
     ):
@@ -1119,7 +1422,7 @@ class Package(models.Model):
     def _update_existing_ptr_loc_info(self):
         """Update an AM-created pointer file's location information."""
         pointer_absolute_path = self.full_pointer_file_path
-        root = etree.parse(pointer_absolute_path)
+        root = pointer_files.parse(pointer_absolute_path)
         element = root.find(".//mets:file", namespaces=utils.NSMAP)
         flocat = element.find("mets:FLocat", namespaces=utils.NSMAP)
         if self.uuid in element.get("ID", "") and flocat is not None:
@@ -1158,7 +1461,7 @@ class Package(models.Model):
         ptr_path = self.full_pointer_file_path
         if not ptr_path:
             return None
-        return metsrw.METSDocument.fromfile(ptr_path)
+        return metsrw.METSDocument.fromtree(pointer_files.parse(ptr_path))
 
     def create_replica_pointer_file(
         self,
@@ -1474,9 +1777,7 @@ class Package(models.Model):
         # Validate the pointer file
         if validate:
             try:
-                is_valid, report = metsrw.validate(
-                    pointer_file.serialize(), schematron=metsrw.AM_PNTR_SCT_PATH
-                )
+                is_valid, report = pointer_validation.validate(pointer_file.serialize())
             except etree.XMLSchemaParseError as err:
                 # It has been observed that this function can fail validating,
                 # for example against the Library of Congress' (LoC) XSD for
@@ -1567,6 +1868,7 @@ class Package(models.Model):
             except CallbackError as e:
                 LOGGER.error("Error in %s callback: %s", callback.event, str(e))
 
+    @_instrument("extract_file", size=_extracted_size)
     def extract_file(self, relative_path="", extract_path=None):
         """Attempts to extract this package.
 
@@ -1616,8 +1918,10 @@ class Package(models.Model):
             # differently than 7z/tar do: the resulting .-prefixed files have
             # different sizes than those created via unar. This makes
             # ``bag.validate`` choke.
-            if self.full_pointer_file_path:
-                compression = utils.get_compression(self.full_pointer_file_path)
+            if self.compression_algorithm:
+                compression = self.compression_algorithm
+            elif self.full_pointer_file_path:
+                compression = pointer_files.get(self.full_pointer_file_path).compression
             else:
                 compression = None  # no pointer file :. command will be unar
             command = _get_decompr_cmd(compression, extract_path, full_path)
@@ -1645,6 +1949,7 @@ class Package(models.Model):
             self.local_path = output_path
         return (output_path, extract_path)
 
+    @_instrument("compress_package")
     def compress_package(self, algorithm, extract_path=None, detailed_output=False):
         """
         Produces a compressed copy of the package.
@@ -1902,6 +2207,7 @@ class Package(models.Model):
         self.status = Package.UPLOADED
         self.save()
 
+    @_instrument("check_fixity")
     def check_fixity(self, force_local=False, delete_after=True):
         """Scans the package to verify its checksums.
 
@@ -1925,7 +2231,9 @@ class Package(models.Model):
         this will be provided by that system. If not or on error, it will be None.
 
         Note that if the package is not compressed, the fixity scan will occur
-        in-place. If fixity scans will happen periodically, if packages are very
+        in-place. Compressed packages are validated while their archive is
+        read, see ``common.bag_validation``, or extracted first if their format
+        doesn't allow it. If fixity scans will happen periodically, if packages are very
         large, or if scans are otherwise expected to contribute to heavy disk load,
         it is recommended to store packages uncompressed.
 
@@ -1954,33 +2262,35 @@ class Package(models.Model):
             else:
                 return (success, failures, message, timestamp)
 
+        temp_dir = None
+        result = None
         if self.is_compressed:
-            # bagit can't deal with compressed files, so extract before
-            # starting the fixity check.
-            try:
-                path, temp_dir = self.extract_file()
-            except StorageException:
-                return (None, [], _("Error extracting file"), None)
-        else:
+            # Validate the bag while reading the archive, without extracting
+            # it, if its format allows
             path = self.fetch_local_path()
-            temp_dir = None
-
-        bag = bagit.Bag(path)
-        try:
-            success = bag.validate(processes=settings.BAG_VALIDATION_NO_PROCESSES)
-            failures = []
-            message = ""
-        except bagit.BagValidationError as failure:
-            LOGGER.error("bagit.BagValidationError on %s:\n%s", path, failure.message)
-            try:
-                LOGGER.debug(
-                    subprocess.check_output(["tree", "-a", "--du", path]).decode("utf8")
-                )
-            except (OSError, ValueError, subprocess.CalledProcessError):
-                pass
-            success = False
-            failures = failure.details
-            message = failure.message
+            result = self._validate_bag(
+                path,
+                lambda: bag_validation.validate_archive(
+                    path, processes=settings.BAG_VALIDATION_NO_PROCESSES
+                ),
+            )
+        if result is None:
+            if self.is_compressed:
+                # bagit can't deal with compressed files, so extract before
+                # starting the fixity check.
+                try:
+                    path, temp_dir = self.extract_file()
+                except StorageException:
+                    return (None, [], _("Error extracting file"), None)
+            else:
+                path = self.fetch_local_path()
+            result = self._validate_bag(
+                path,
+                lambda: bagit.Bag(path).validate(
+                    processes=settings.BAG_VALIDATION_NO_PROCESSES
+                ),
+            )
+        success, failures, message = result
 
         if (
             temp_dir
@@ -1994,17 +2304,36 @@ class Package(models.Model):
 
         return (success, failures, message, None)
 
-    def get_fixity_check_report_send_signals(
-        self, force_local=False, delete_after=True
-    ):
-        """Perform a fixity check on this package by calling ``check_fixity``,
-        then also send Django signals so the check is recorded in the database,
-        and return a JSON report of the fixity check attempt.
+    def _validate_bag(self, path, validate):
+        """Run ``validate``, a bag validation of ``path``, for ``check_fixity``.
+
+        Returns a tuple containing (success, [errors], message), or None if
+        ``validate`` returned None because it couldn't validate the bag.
+        """
+        try:
+            success = validate()
+        except bagit.BagValidationError as failure:
+            LOGGER.error("bagit.BagValidationError on %s:\n%s", path, failure.message)
+            try:
+                LOGGER.debug(
+                    subprocess.check_output(["tree", "-a", "--du", path]).decode("utf8")
+                )
+            except (OSError, ValueError, subprocess.CalledProcessError):
+                pass
+            return (False, failure.details, failure.message)
+        if success is None:
+            return None
+        return (success, [], "")
+
+    def get_fixity_check_report(self, force_local=False, delete_after=True):
+        """Perform a fixity check on this package by calling ``check_fixity``
+        and return a JSON report of the fixity check attempt, both serialized
+        and as a dict.
         """
 
         # Do the fixity check
         success, failures, message, timestamp = self.check_fixity(
-            force_local=force_local
+            force_local=force_local, delete_after=delete_after
         )
 
         # Build the response (to be a JSON object)
@@ -2030,12 +2359,22 @@ class Package(models.Model):
             if isinstance(failure, bagit.UnexpectedFile):
                 info = {"path": failure.path, "message": str(failure)}
                 response["failures"]["files"]["untracked"].append(info)
-        report = json.dumps(response)
+        return json.dumps(response), response
 
-        # Trigger the signals (so ``FixityLog`` instances are created)
+    def send_fixity_check_signals(self, success, report, notify=True):
+        """Send the Django signal matching the outcome ``success`` of a fixity
+        check, so the check is recorded in the database.
+
+        :param bool notify: If False, administrators are not emailed about a
+            failed check, the caller is expected to report it.
+        """
         if success is False:
             signals.failed_fixity_check.send(
-                sender=self, uuid=self.uuid, location=self.full_path, report=report
+                sender=self,
+                uuid=self.uuid,
+                location=self.full_path,
+                report=report,
+                notify=notify,
             )
         elif success is None:
             signals.fixity_check_not_run.send(
@@ -2045,6 +2384,19 @@ class Package(models.Model):
             signals.successful_fixity_check.send(
                 sender=self, uuid=self.uuid, location=self.full_path, report=report
             )
+
+    def get_fixity_check_report_send_signals(
+        self, force_local=False, delete_after=True, notify=True
+    ):
+        """Perform a fixity check on this package by calling ``check_fixity``,
+        then also send Django signals so the check is recorded in the database,
+        and return a JSON report of the fixity check attempt.
+        """
+        report, response = self.get_fixity_check_report(
+            force_local=force_local, delete_after=delete_after
+        )
+        # Trigger the signals (so ``FixityLog`` instances are created)
+        self.send_fixity_check_signals(response["success"], report, notify=notify)
         return report, response
 
     @staticmethod
@@ -2078,20 +2430,21 @@ class Package(models.Model):
                 uuid,
                 exc_info=True,
             )
-        utils.removedirs(
+        utils.removedirs_in_background(
             os.path.dirname(pointer_file_path), base=pointer_file_location.full_path
         )
 
     @staticmethod
     def _update_storage_size(space, location, size):
-        """Remove size from location and space used values. Like the
-        initial checks and updates, this is not considering race
-        conditions.
+        """Remove size from location and space used values. The values are
+        updated in the database so that packages deleted at the same time are
+        all accounted for.
         """
-        space.used -= size
-        space.save()
-        location.used -= size
-        location.save()
+        for instance in (space, location):
+            type(instance).objects.filter(pk=instance.pk).update(
+                used=models.F("used") - (size or 0)
+            )
+            instance.refresh_from_db(fields=["used"])
 
     def _find_replicas(self, status=UPLOADED):
         """Find replicas associated with a given package.
@@ -2107,50 +2460,135 @@ class Package(models.Model):
         """Finalize the deletion of a package by deleting its replicas
         as well.
         """
-        for replica in self._find_replicas():
-            _, replica_error = replica.delete_from_storage()
+        self._delete_replicas_of([self.uuid])
+
+    @classmethod
+    def _delete_replicas_of(cls, uuids):
+        """Delete the replicas of the packages ``uuids``, concurrently."""
+        replicas = cls.objects.filter(replicated_package__in=uuids, status=cls.UPLOADED)
+        results = cls.bulk_delete_from_storage(replicas)
+        for replica_uuid, (__, replica_error) in results.items():
             if replica_error:
                 LOGGER.error(
                     "Could not delete replica: '%s' with error: '%s' please delete it manually",
-                    replica.uuid,
+                    replica_uuid,
                     replica_error,
                 )
 
+    @staticmethod
+    def _delete_from_space_in_thread(space, child_space, full_path):
+        try:
+            space.delete_path(full_path, child_space=child_space)
+        finally:
+            # Worker threads have their own database connection
+            connection.close()
+
     def delete_from_storage(self):
         """Deletes the package from filesystem and updates metadata.
         Returns (True, None) on success, and (False, error_msg) on failure.
         """
-        LOGGER.debug(
-            "Deleting Package: '%s' from the storage service, replica: '%s'",
-            self.uuid,
-            True if self.replicated_package else False,
-        )
-
-        error = None
-        location = self.current_location
-        space = location.space
+        return self.bulk_delete_from_storage([self])[self.uuid]
 
-        error = self._if_lockss_notify(space, self.uuid, self.misc_attributes)
+    @classmethod
+    def bulk_delete_from_storage(cls, packages, max_workers=None):
+        """Deletes ``packages`` like ``delete_from_storage``, then their
+        replicas.
 
-        try:
-            space.delete_path(self.full_path)
-        except (StorageException, NotImplementedError, ValueError) as err:
-            return False, err
+        Up to ``max_workers`` packages, ``settings.DELETION_CONCURRENCY`` by
+        default, are deleted from their spaces at the same time by a pool of
+        threads, the database is only updated by this thread. The replicas of
+        the packages deleted are then deleted the same way.
 
-        self._delete_pointer_file(
-            self.uuid,
-            self.full_pointer_file_path,
-            self.pointer_file_path,
-            self.pointer_file_location,
-        )
-
-        self.status = self.DELETED
-        self.save()
+        Returns a dict of the (success, error) tuple of each package UUID.
+        """
+        if max_workers is None:
+            max_workers = settings.DELETION_CONCURRENCY
+        packages = list(packages)
+        results = {}
+        if not packages:
+            return results
+        # (package, success, lockss error or exception) of each deletion
+        outcomes = []
+
+        def failed(package, err):
+            # Any error fails the deletion of its package only, whichever
+            # thread ran it; the unexpected ones are logged
+            if not isinstance(err, DELETE_ERRORS):
+                LOGGER.exception("Unable to delete package %s", package.uuid)
+            outcomes.append((package, False, err))
+
+        # LOCKSS-o-matic is notified and the child spaces are looked up by
+        # this thread, as the workers' database connections don't see its
+        # transaction: they are only handed the child spaces and the paths
+        targets = {}
+        lockss_errors = {}
+        for package in packages:
+            LOGGER.debug(
+                "Deleting Package: '%s' from the storage service, replica: '%s'",
+                package.uuid,
+                True if package.replicated_package else False,
+            )
+            space = package.current_location.space
+            try:
+                lockss_errors[package.uuid] = cls._if_lockss_notify(
+                    space, package.uuid, package.misc_attributes
+                )
+                child_space = space.get_child_space()
+            except Exception as err:
+                failed(package, err)
+                continue
+            child_space.space = space
+            targets[package.uuid] = (space, child_space, package.full_path)
+        to_delete = [package for package in packages if package.uuid in targets]
+
+        max_workers = max(1, min(max_workers, len(to_delete)))
+        if max_workers == 1:
+            for package in to_delete:
+                space, child_space, full_path = targets[package.uuid]
+                try:
+                    space.delete_path(full_path, child_space=child_space)
+                except Exception as err:
+                    failed(package, err)
+                else:
+                    outcomes.append((package, True, lockss_errors[package.uuid]))
+        else:
+            with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                pending = {
+                    executor.submit(
+                        cls._delete_from_space_in_thread, *targets[package.uuid]
+                    ): package
+                    for package in to_delete
+                }
+                for future in futures.as_completed(pending):
+                    package = pending[future]
+                    try:
+                        future.result()
+                    except Exception as err:
+                        failed(package, err)
+                    else:
+                        outcomes.append((package, True, lockss_errors[package.uuid]))
+
+        deleted = []
+        for package, success, error in outcomes:
+            results[package.uuid] = (success, error)
+            if not success:
+                continue
+            package._delete_pointer_file(
+                package.uuid,
+                package.full_pointer_file_path,
+                package.pointer_file_path,
+                package.pointer_file_location,
+            )
+            package.status = cls.DELETED
+            package.save()
+            space = targets[package.uuid][0]
+            cls._update_storage_size(space, package.current_location, package.size)
+            deleted.append(package.uuid)
 
-        self._update_storage_size(space, location, self.size)
-        self._delete_replicas()
+        if deleted:
+            cls._delete_replicas_of(deleted)
 
-        return True, error
+        return results
 
     # REINGEST
 
@@ -2488,7 +2926,7 @@ class Package(models.Model):
         compression = None
         if to_be_compressed:
             if os.path.isfile(rein_pointer_dst_full_path):
-                compression = utils.get_compression(rein_pointer_dst_full_path)
+                compression = pointer_files.get(rein_pointer_dst_full_path).compression
                 # If updating, rather than creating a new pointer file, delete
                 # this pointer file. TODO: this is maybe not a good idea and
                 # might be what is messing with encrypted re-ingest...
@@ -2544,6 +2982,7 @@ class Package(models.Model):
             extract_path_to_delete,
         )
         self.size = utils.recalculate_size(updated_aip_path)
+        self.record_format(updated_aip_path, compression)
 
         # 7. Create a pointer file if AM has not done so.
         if (
@@ -2919,6 +3358,36 @@ class Package(models.Model):
         return clone
 
 
+def _list_archive(path):
+    """Return the name of the members of the archive at ``path`` and whether
+    they are directories, as listed by lsar."""
+    # NOTE: lsar's JSON output is broken in certain circumstances in all
+    #       released versions; make sure to use a patched version for this
+    #       to work.
+    output = subprocess.check_output(["lsar", "-ja", path]).decode("utf8")
+    return [
+        (entry["XADFileName"], entry.get("XADIsDirectory", False))
+        for entry in json.loads(output)["lsarContents"]
+    ]
+
+
+def _payload_checksum_algorithm(files, base_directory):
+    """Return the algorithm of the payload manifest of the bag in
+    ``base_directory``, the strongest if there are several, given the paths
+    of its ``files``."""
+    algorithms = set()
+    for path in files:
+        directory, filename = os.path.split(path.rstrip("/"))
+        match = bag_validation.MANIFEST_RE.match(filename)
+        if directory.strip("/") == base_directory.strip("/") and match:
+            if not match.group(1):
+                algorithms.add(match.group(2))
+    for algorithm in PAYLOAD_CHECKSUM_ALGORITHMS:
+        if algorithm in algorithms:
+            return algorithm
+    return min(algorithms) if algorithms else None
+
+
 def _get_decompr_cmd(compression, extract_path, full_path):
     """Returns a decompression command (as a list), given ``compression``
     (one of ``COMPRESSION_ALGORITHMS``), the destination path
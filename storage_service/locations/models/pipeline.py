@@ -168,7 +168,7 @@ class Pipeline(URLMixin, models.Model):
             },
         ]
         for p in purposes:
-            defaults = utils.get_setting(p["default"], [])
+            defaults = utils.get_list_setting(p["default"])
             for uuid in defaults:
                 if uuid == "new":
                     # Create new location
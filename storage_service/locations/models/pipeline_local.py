@@ -8,6 +8,7 @@ import subprocess
 import tempfile
 
 # Core Django, alphabetical
+from django.conf import settings
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
@@ -59,6 +60,9 @@ class PipelineLocalFS(models.Model):
         verbose_name = _("Pipeline Local FS")
         app_label = "locations"
 
+    # browse accepts cursor and limit, see Space.browse
+    BROWSE_PAGING = True
+
     ALLOWED_LOCATION_PURPOSE = [
         Location.AIP_RECOVERY,
         Location.AIP_STORAGE,
@@ -87,13 +91,37 @@ class PipelineLocalFS(models.Model):
 
         return return_str.format(user, host, utils.coerce_str(path))
 
-    def browse(self, path):
+    @property
+    def ssh_options(self):
+        """Options of the ssh commands run by rsync, sharing one master
+        connection to the remote host for all the commands of this space."""
+        persist = settings.PIPELINE_LOCAL_SSH_CONTROL_PERSIST
+        if self.assume_rsync_daemon or not persist:
+            return []
+        # ssh replaces %C by a hash of the host, port and user. Keep the path
+        # short, sockets paths are limited to about 100 characters.
+        control_path = os.path.join(
+            tempfile.gettempdir(), "ss-{}-%C".format(str(self.space_id)[:8])
+        )
+        return [
+            "-o",
+            "ControlMaster=auto",
+            "-o",
+            "ControlPath={}".format(control_path),
+            "-o",
+            "ControlPersist={}".format(persist),
+        ]
+
+    def browse(self, path, cursor=None, limit=None):
         path = os.path.join(path, "")
         ssh_path = self._format_host_path(path)
         return self.space.browse_rsync(
             ssh_path,
             assume_rsync_daemon=self.assume_rsync_daemon,
             rsync_password=self.rsync_password,
+            ssh_options=self.ssh_options,
+            cursor=cursor,
+            limit=limit,
         )
 
     def delete_path(self, delete_path):
@@ -110,9 +138,10 @@ class PipelineLocalFS(models.Model):
             "--protect-args",
             "--delete",
             "--dirs",
-            os.path.join(temp_dir, ""),
-            dest_path,
         ]
+        if self.ssh_options:
+            command += ["--rsh", " ".join(["ssh"] + self.ssh_options)]
+        command += [os.path.join(temp_dir, ""), dest_path]
         LOGGER.info("rsync delete command: %s", command)
         try:
             subprocess.check_call(command)
@@ -149,6 +178,7 @@ class PipelineLocalFS(models.Model):
             dest_path,
             assume_rsync_daemon=self.assume_rsync_daemon,
             rsync_password=self.rsync_password,
+            ssh_options=self.ssh_options,
         )
 
     def post_move_to_storage_service(self, *args, **kwargs):
@@ -159,7 +189,10 @@ class PipelineLocalFS(models.Model):
         """ Moves self.staging_path/src_path to dest_path. """
 
         self.space.create_rsync_directory(
-            destination_path, self.remote_user, self.remote_name
+            destination_path,
+            self.remote_user,
+            self.remote_name,
+            ssh_options=self.ssh_options,
         )
 
         # Prepend user and host to destination
@@ -171,6 +204,7 @@ class PipelineLocalFS(models.Model):
             destination_path,
             assume_rsync_daemon=self.assume_rsync_daemon,
             rsync_password=self.rsync_password,
+            ssh_options=self.ssh_options,
         )
 
     def isfile(self, path):
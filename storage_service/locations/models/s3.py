@@ -2,6 +2,7 @@
 from __future__ import absolute_import
 
 # stdlib, alphabetical
+import hashlib
 import logging
 import os
 import pprint
@@ -23,11 +24,21 @@ from common import utils
 
 # This module, alphabetical
 from . import StorageException
+from .async_manager import get_task_progress
 from .location import Location
 
 
 LOGGER = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Maximum number of keys of a DeleteObjects request
+DELETE_BATCH_SIZE = 1000
+
+# Size of the parts of the multipart uploads resumed from a checkpoint, the
+# files up to that size are uploaded again instead
+MULTIPART_CHUNK_SIZE = 64 * 1024 * 1024
+
 
 def boto_exception(fn):
     @wraps(fn)
@@ -183,9 +194,10 @@ class S3(models.Model):
         }
 
     def delete_path(self, delete_path):
-        """Delete an object from an S3 bucket. We assume an object exists, if
-        it doesn't then the generator returned by the S3 library (Boto3) cannot
-        be iterated, and we raise a StorageException.
+        """Delete an object, or all the objects under a prefix, from an S3
+        bucket. The objects are deleted in batches of ``DELETE_BATCH_SIZE``
+        with DeleteObjects requests. We assume an object exists, if it doesn't
+        then we raise a StorageException.
         """
         if delete_path.startswith(os.sep):
             LOGGER.info(
@@ -194,17 +206,36 @@ class S3(models.Model):
                 )
             )
             delete_path = delete_path.lstrip(os.sep)
-        obj = self.resource.Bucket(self.bucket_name).objects.filter(Prefix=delete_path)
-        items = False
-        for object_summary in obj:
-            items = True
-            resp = object_summary.delete()
-            LOGGER.debug("S3 response when attempting to delete:")
-            LOGGER.debug(pprint.pformat(resp))
-        if not items:
+        bucket = self.resource.Bucket(self.bucket_name)
+        keys = [
+            object_summary.key
+            for object_summary in bucket.objects.filter(Prefix=delete_path)
+        ]
+        if not keys:
             err_str = "No packages found in S3 at: {}".format(delete_path)
             LOGGER.warning(err_str)
             raise StorageException(err_str)
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            resp = bucket.delete_objects(
+                Delete={
+                    "Objects": [
+                        {"Key": key} for key in keys[start : start + DELETE_BATCH_SIZE]
+                    ],
+                    "Quiet": True,
+                }
+            )
+            LOGGER.debug("S3 response when attempting to delete:")
+            LOGGER.debug(pprint.pformat(resp))
+            errors = resp.get("Errors")
+            if errors:
+                raise StorageException(
+                    "Unable to delete {} objects in S3 at {}, e.g. {}: {}".format(
+                        len(errors),
+                        delete_path,
+                        errors[0].get("Key"),
+                        errors[0].get("Message"),
+                    )
+                )
 
     def move_to_storage_service(self, src_path, dest_path, dest_space):
         self._ensure_bucket_exists()
@@ -230,6 +261,7 @@ class S3(models.Model):
     def move_from_storage_service(self, src_path, dest_path, package=None):
         self._ensure_bucket_exists()
         bucket = self.resource.Bucket(self.bucket_name)
+        checkpoint = getattr(package, "transfer_checkpoint", None)
 
         if os.path.isdir(src_path):
             # ensure trailing slash on both paths
@@ -243,19 +275,129 @@ class S3(models.Model):
                 for basename in files:
                     entry = os.path.join(path, basename)
                     dest = entry.replace(src_path, dest_path, 1)
-
-                    with open(entry, "rb") as data:
-                        bucket.upload_fileobj(data, dest)
+                    self._upload_file(bucket, entry, dest, checkpoint)
 
         elif os.path.isfile(src_path):
             # strip leading slash on dest_path
             dest_path = dest_path.lstrip("/")
-
-            with open(src_path, "rb") as data:
-                bucket.upload_fileobj(data, dest_path)
+            self._upload_file(bucket, src_path, dest_path, checkpoint)
 
         else:
             raise StorageException(
                 _("%(path)s is neither a file nor a directory, may not exist")
                 % {"path": src_path}
             )
+
+    def _upload_file(self, bucket, path, key, checkpoint=None):
+        """Upload the file ``path`` to the object ``key``, recording it in the
+        ``TransferCheckpoint`` of the package uploaded if given: the objects
+        it recorded are not uploaded again and the multipart upload it
+        recorded is resumed."""
+        progress = get_task_progress()
+        size = os.path.getsize(path)
+        if checkpoint is None:
+            with open(path, "rb") as data:
+                bucket.upload_fileobj(data, key)
+            progress.advance(size, 1)
+            return
+        if checkpoint.is_completed(key):
+            LOGGER.debug("Skipping %s, uploaded before being interrupted", key)
+            progress.advance(size, 1, transferred=False)
+            return
+        if size <= MULTIPART_CHUNK_SIZE:
+            with open(path, "rb") as data:
+                bucket.upload_fileobj(data, key)
+            checkpoint.record_bytes(size)
+            progress.advance(size)
+        else:
+            self._upload_multipart(
+                bucket.meta.client, path, key, size, checkpoint, progress
+            )
+        checkpoint.record_file(key)
+        progress.advance(files_count=1)
+
+    def _upload_multipart(self, client, path, key, size, checkpoint, progress):
+        """Upload the file ``path`` to the object ``key`` in parts of
+        ``MULTIPART_CHUNK_SIZE`` bytes, reusing the parts of the multipart
+        upload recorded in ``checkpoint`` whose MD5 checksum matches, and
+        reporting every part to the ``TaskProgress`` ``progress``."""
+        parts = {}
+        upload_id = checkpoint.upload_id if checkpoint.upload_path == key else None
+        if upload_id:
+            try:
+                paginator = client.get_paginator("list_parts")
+                for page in paginator.paginate(
+                    Bucket=self.bucket_name, Key=key, UploadId=upload_id
+                ):
+                    for part in page.get("Parts", []):
+                        parts[part["PartNumber"]] = part
+            except botocore.exceptions.ClientError:
+                LOGGER.info(
+                    "Multipart upload %s of %s can't be resumed", upload_id, key
+                )
+                upload_id = None
+        if not upload_id:
+            upload_id = client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=key
+            )["UploadId"]
+            checkpoint.record_upload(key, upload_id)
+        completed = []
+        with open(path, "rb") as data:
+            for number in range(1, (size - 1) // MULTIPART_CHUNK_SIZE + 2):
+                body = data.read(MULTIPART_CHUNK_SIZE)
+                etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+                uploaded = parts.get(number, {}).get("ETag") == etag
+                if not uploaded:
+                    etag = client.upload_part(
+                        Bucket=self.bucket_name,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=number,
+                        Body=body,
+                    )["ETag"]
+                    checkpoint.record_bytes(len(body))
+                progress.advance(len(body), transferred=not uploaded)
+                completed.append({"PartNumber": number, "ETag": etag})
+        client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": completed},
+        )
+        checkpoint.record_upload(None, None)
+
+    def read_stream(self, path):
+        """Generates the objects under ``path``, or the object ``path``, for
+        ``Space.stream_move``."""
+        path = path.lstrip("/").rstrip("/")
+        prefix = path + "/"
+        objects = self.resource.Bucket(self.bucket_name).objects.filter(Prefix=path)
+        for object_summary in objects:
+            key = object_summary.key
+            if key == path:
+                relative_path = ""
+            elif key.startswith(prefix) and not key.endswith("/"):
+                relative_path = key[len(prefix) :]
+            else:
+                # Another object with the same prefix or a directory marker
+                continue
+            response = object_summary.get()
+            # The ETag is the MD5 checksum of the object, unless it was
+            # uploaded in parts or encrypted with KMS
+            md5 = response["ETag"].strip('"')
+            if "-" in md5 or response.get("ServerSideEncryption") == "aws:kms":
+                md5 = None
+            yield (
+                relative_path,
+                response["ContentLength"],
+                response["Body"].iter_chunks(STREAM_CHUNK_SIZE),
+                md5,
+            )
+
+    @boto_exception
+    def write_stream(self, path, size, chunks, package=None):
+        """Uploads the byte strings of ``chunks`` to the object ``path`` for
+        ``Space.stream_move``."""
+        self._ensure_bucket_exists()
+        bucket = self.resource.Bucket(self.bucket_name)
+        bucket.upload_fileobj(utils.ChunksReader(chunks), path.lstrip("/"))
@@ -1,7 +1,9 @@
 # stdlib, alphabetical
 from __future__ import absolute_import
-import datetime
+import contextlib
 import errno
+import hashlib
+import json
 import logging
 import os
 import re
@@ -11,6 +13,8 @@ import subprocess
 import tempfile
 
 # Core Django, alphabetical
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
@@ -21,14 +25,143 @@ import scandir
 from django_extensions.db.fields import UUIDField
 
 # This project, alphabetical
-from common import utils
+from common import local_copy, utils
+from locations import metrics
 
 LOGGER = logging.getLogger(__name__)
 
+# Permissions added to the files moved with os.rename, i.e. ug+rw,o+r
+MOVED_FILES_PERMISSIONS = 0o664
+
+# Chunks read from a space ahead of the other space writing them
+STREAM_BUFFER_CHUNKS = 8
+
+# Lines of ``rsync --list-only``, in format:
+# <type><permissions>  <size>  <date> <time> <path>
+# Eg: drwxrws---          4,096 2015/03/02 17:05:20 tmp
+# Eg: -rw-r--r--            201 2013/05/13 13:26:48 LICENSE.md
+# Eg: lrwxrwxrwx             78 2015/02/19 12:13:40 sharedDirectory
+RSYNC_LIST_RE = re.compile(
+    r"^(?P<type>.)(?P<permissions>.{9}) +(?P<size>[\d,]+)"
+    r" (?P<date>..../../..) (?P<time>..:..:..) (?P<name>.*)$"
+)
+# Summary printed by rsync -v, e.g.
+# sent 1,203 bytes  received 35 bytes  2,476.00 bytes/sec
+RSYNC_SUMMARY_RE = re.compile(
+    r"^sent (?P<sent>[\d,]+) bytes +received (?P<received>[\d,]+) bytes",
+    re.MULTILINE,
+)
+
 # This module, alphabetical
 from . import StorageException  # noqa: E402
+from .async_manager import get_task_progress  # noqa: E402
+
+__all__ = ("Space", "PosixMoveUnsupportedError", "StreamMoveUnsupportedError")
+
+
+def parse_browse_cursor(cursor):
+    """Return the position in a listing of the browse cursor ``cursor``."""
+    if not cursor:
+        return 0
+    try:
+        position = int(cursor)
+    except ValueError:
+        position = -1
+    if position < 0:
+        raise StorageException(
+            _("Invalid browse cursor: %(cursor)s") % {"cursor": cursor}
+        )
+    return position
+
 
-__all__ = ("Space", "PosixMoveUnsupportedError")
+def parse_rsync_list(lines):
+    """Generate the name, whether it is a directory, the size and the
+    timestamp of each entry in the output of ``rsync --list-only``.
+
+    Links count as directories.
+    """
+    for line in lines:
+        match = RSYNC_LIST_RE.match(line)
+        if match is None:
+            continue
+        yield (
+            match.group("name"),
+            match.group("type") != "-",
+            int(match.group("size").replace(",", "")),
+            # ISO 8601, as datetime.isoformat
+            "{}T{}".format(match.group("date").replace("/", "-"), match.group("time")),
+        )
+
+
+def _run_rsync_list(command, env):
+    """Return the entries listed by the rsync ``command``, parsed as its
+    output is read."""
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, env=env)
+    try:
+        lines = (line.decode("utf-8").rstrip("\n") for line in process.stdout)
+        entries = list(parse_rsync_list(lines))
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+    return entries
+
+
+# Thrown when posix_move is handed a non POSIX space
+class PosixMoveUnsupportedError(Exception):
+    pass
+
+
+# Thrown when stream_move is handed spaces that can't stream to one another.
+# Callers falling back to staging when posix_move is unsupported fall back to
+# staging in this case too.
+class StreamMoveUnsupportedError(PosixMoveUnsupportedError):
+    pass
+
+
+def _local_totals(path):
+    """Return the size and the number of files of ``path`` if it is locally
+    accessible, None and None otherwise.
+
+    Directories are only walked if ``ASYNC_PROGRESS_TOTALS`` is set, as the
+    walk reads the metadata of every file before the transfer does.
+    """
+    try:
+        if os.path.isfile(path):
+            return os.path.getsize(path), 1
+        if not (settings.ASYNC_PROGRESS_TOTALS and os.path.isdir(path)):
+            return None, None
+        size = files = 0
+        for dirpath, __, filenames in scandir.walk(path):
+            for filename in filenames:
+                size += os.path.getsize(os.path.join(dirpath, filename))
+                files += 1
+        return size, files
+    except OSError:
+        return None, None
+
+
+def _report_chunks(chunks, progress):
+    """Generate ``chunks``, reporting their size to the ``TaskProgress``
+    ``progress``."""
+    for chunk in chunks:
+        progress.advance(len(chunk))
+        yield chunk
+
+
+@contextlib.contextmanager
+def _progress_phase(phase, source_path):
+    """Report the transfer of ``source_path`` as the phase ``phase`` of the
+    task running it, if any, see ``async_manager.TaskProgress``."""
+    progress = get_task_progress()
+    if progress.async_id is None:
+        # Not worth walking the source
+        yield progress
+        return
+    progress.start_phase(phase, *_local_totals(source_path))
+    yield progress
+    progress.end_phase()
 
 
 def validate_space_path(path):
@@ -269,36 +402,55 @@ class Space(models.Model):
         'verbose name': Verbose name of the object
         See each Space's browse for details.
 
+        Spaces with ``BROWSE_PAGING`` also accept the keyword arguments
+        ``cursor`` and ``limit``. When given, at most ``limit`` entries are
+        returned, starting at ``cursor``, and the result has an additional
+        'next_cursor' key, None after the last page. Other spaces ignore them.
+
         :param str path: Full path to return info for
         :return: Dictionary of object information detailed above.
         """
         LOGGER.info("path: %s", path)
         try:
-            return self.get_child_space().browse(path, *args, **kwargs)
+            child_space = self.get_child_space()
+            if not getattr(child_space, "BROWSE_PAGING", False):
+                # Only some spaces can return their entries in pages
+                kwargs.pop("cursor", None)
+                kwargs.pop("limit", None)
+            return child_space.browse(path, *args, **kwargs)
         except AttributeError as e:
             LOGGER.debug("AttributeError while browsing %s: %r", path, e)
             LOGGER.debug("Falling back to default browse local", exc_info=False)
             return self.browse_local(path)
 
+    @metrics.instrument_storage_operation("delete_path")
     def delete_path(self, delete_path, *args, **kwargs):
         """
         Deletes `delete_path` stored in this space.
 
         `delete_path` is a full path in this space.
 
-        If not implemented in the child space, looks locally.
+        If not implemented in the child space, looks locally. The child space
+        can be given as ``child_space``, e.g. by a thread that can't look it up
+        with its own database connection.
         """
+        child_space = kwargs.pop("child_space", None)
         # Enforce delete_path is in self.path
         if not delete_path.startswith(self.path):
             raise ValueError(
                 _("%(delete_path)s is not within %(path)s"),
                 {"delete_path": delete_path, "path": self.path},
             )
+        if child_space is None:
+            child_space = self.get_child_space()
         try:
-            return self.get_child_space().delete_path(delete_path, *args, **kwargs)
+            return child_space.delete_path(delete_path, *args, **kwargs)
         except AttributeError:
-            return self._delete_path_local(delete_path)
+            return self._delete_path_local(delete_path, background_pruning=True)
 
+    @metrics.instrument_storage_operation(
+        "posix_move", unsupported=(PosixMoveUnsupportedError,)
+    )
     def posix_move(
         self, source_path, destination_path, destination_space, package=None
     ):
@@ -326,10 +478,97 @@ class Space(models.Model):
 
         abs_destination_path = os.path.join(destination_space.path, destination_path)
 
-        return self.get_child_space().posix_move(
-            source_path, abs_destination_path, destination_space, package
+        with _progress_phase("moving", source_path):
+            return self.get_child_space().posix_move(
+                source_path, abs_destination_path, destination_space, package
+            )
+
+    @metrics.instrument_storage_operation(
+        "stream_move", unsupported=(StreamMoveUnsupportedError,)
+    )
+    def stream_move(
+        self,
+        source_path,
+        destination_path,
+        destination_space,
+        package=None,
+        checksum_algorithm="md5",
+    ):
+        """
+        Copy self.path/source_path to destination_space.path/destination_path
+        bypassing staging, by piping the data of each file from this space to
+        destination_space.
+
+        The child space of this space must implement ``read_stream`` and the
+        one of destination_space ``write_stream``, and they must not both be
+        POSIX filesystems. The files are checked against the MD5 checksums
+        the spaces report, if any.
+
+        Returns a dict of the ``checksum_algorithm`` checksums of the files,
+        by path relative to destination_path ("" if source_path is a file).
+        """
+        source_child = self.get_child_space()
+        destination_child = destination_space.get_child_space()
+        # Copies between POSIX filesystems are left to rsync, which preserves
+        # the metadata of the files
+        both_posix = hasattr(source_child, "posix_move") and hasattr(
+            destination_child, "posix_move"
         )
+        if (
+            both_posix
+            or not hasattr(source_child, "read_stream")
+            or not hasattr(destination_child, "write_stream")
+        ):
+            LOGGER.debug(
+                "stream_move: not supported from %s to %s",
+                type(source_child),
+                type(destination_child),
+            )
+            raise StreamMoveUnsupportedError()
 
+        source_path = os.path.join(self.path, source_path)
+        destination_path = os.path.join(destination_space.path, destination_path)
+        LOGGER.debug("stream_move: %s to %s", source_path, destination_path)
+
+        checksums = {}
+        with _progress_phase("streaming", source_path) as progress:
+            streams = source_child.read_stream(source_path)
+            for relative_path, size, chunks, source_md5 in streams:
+                md5 = hashlib.md5()
+                checksum = hashlib.new(checksum_algorithm)
+                chunks = utils.hash_chunks(
+                    utils.buffered_chunks(chunks, STREAM_BUFFER_CHUNKS),
+                    (md5, checksum),
+                )
+                path = destination_path
+                if relative_path:
+                    path = os.path.join(destination_path, relative_path)
+                destination_md5 = destination_child.write_stream(
+                    path, size, _report_chunks(chunks, progress), package=package
+                )
+                for reported_md5 in (source_md5, destination_md5):
+                    if reported_md5 and reported_md5 != md5.hexdigest():
+                        raise StorageException(
+                            _(
+                                "MD5 %(reported)s of %(path)s does not match"
+                                " %(checksum)s, the checksum of the data copied"
+                            )
+                            % {
+                                "reported": reported_md5,
+                                "path": path,
+                                "checksum": md5.hexdigest(),
+                            }
+                        )
+                checksums[relative_path] = checksum.hexdigest()
+                progress.advance(files_count=1)
+        if not checksums:
+            raise StorageException(
+                _("%(path)s is neither a file nor a directory, may not exist")
+                % {"path": source_path}
+            )
+        return checksums
+
+    @metrics.instrument_storage_operation("move_to_storage_service")
     def move_to_storage_service(
         self, source_path, destination_path, destination_space, *args, **kwargs
     ):
@@ -360,9 +599,10 @@ class Space(models.Model):
         )
 
         try:
-            self.get_child_space().move_to_storage_service(
-                source_path, destination_path, destination_space, *args, **kwargs
-            )
+            with _progress_phase("staging", source_path):
+                self.get_child_space().move_to_storage_service(
+                    source_path, destination_path, destination_space, *args, **kwargs
+                )
         except AttributeError:
             raise NotImplementedError(
                 _("%(protocol)s space has not implemented %(method)s")
@@ -408,6 +648,7 @@ class Space(models.Model):
 
         return staging_path, destination_path
 
+    @metrics.instrument_storage_operation("move_from_storage_service")
     def move_from_storage_service(self, source_path, destination_path, *args, **kwargs):
         """Move source_path in this Space's staging area to destination_path in this Space.
 
@@ -428,9 +669,10 @@ class Space(models.Model):
         )
         child_space = self.get_child_space()
         if hasattr(child_space, "move_from_storage_service"):
-            return child_space.move_from_storage_service(
-                source_path, destination_path, *args, **kwargs
-            )
+            with _progress_phase("uploading", source_path):
+                return child_space.move_from_storage_service(
+                    source_path, destination_path, *args, **kwargs
+                )
         else:
             raise NotImplementedError(
                 _("%(protocol)s space has not implemented %(method)s")
@@ -532,10 +774,12 @@ class Space(models.Model):
         try_mv_local=False,
         assume_rsync_daemon=False,
         rsync_password=None,
+        ssh_options=None,
     ):
         """Moves a file from source to destination.
 
-        By default, uses rsync to move files.
+        By default, copies files with ``common.local_copy`` if both paths are
+        local, with rsync otherwise.
         All directories leading to destination must exist; Space.create_local_directory may be useful.
 
         If try_mv_local is True, will attempt to use os.rename, which only works on the same device.
@@ -546,6 +790,7 @@ class Space(models.Model):
         :param bool try_mv_local: If true, try moving/renaming instead of copying.  Should be False if source or destination specify a user@host.  Warning: this will not leave a copy at the source.
         :param bool assume_rsync_daemon: If true, will use rsync daemon-style commands instead of the default rsync with remote shell transport
         :param rsync_password: used if assume_rsync_daemon is true, to specify value of RSYNC_PASSWORD environment variable
+        :param ssh_options: list of options for the ssh command run by rsync, ignored if assume_rsync_daemon is true
         """
         source = utils.coerce_str(source)
         destination = utils.coerce_str(destination)
@@ -555,12 +800,11 @@ class Space(models.Model):
             return
 
         if try_mv_local:
-            # Try using mv, and if that fails, fallback to rsync
-            chmod_command = ["chmod", "--recursive", "ug+rw,o+r", destination]
+            # Try using mv, and if that fails, fallback to copying
             try:
                 os.rename(source, destination)
                 # Set permissions (rsync does with --chmod=ugo+rw)
-                subprocess.call(chmod_command)
+                local_copy.add_permissions(destination, MOVED_FILES_PERMISSIONS)
                 return
             except OSError:
                 LOGGER.debug("os.rename failed, trying with normalized paths")
@@ -569,15 +813,35 @@ class Space(models.Model):
             try:
                 os.rename(source_norm, dest_norm)
                 # Set permissions (rsync does with --chmod=ugo+rw)
-                subprocess.call(chmod_command)
+                local_copy.add_permissions(dest_norm, MOVED_FILES_PERMISSIONS)
                 return
             except OSError:
                 LOGGER.debug(
-                    "os.rename failed, falling back to rsync. Source: %s; Destination: %s",
+                    "os.rename failed, falling back to copying. Source: %s; Destination: %s",
                     source_norm,
                     dest_norm,
                 )
 
+        if not (
+            assume_rsync_daemon
+            or local_copy.is_remote_path(source)
+            or local_copy.is_remote_path(destination)
+        ):
+            # Both paths are local, copy the files without rsync
+            progress = get_task_progress()
+            try:
+                local_copy.copy(
+                    source,
+                    destination,
+                    on_file=lambda size, copied: progress.advance(
+                        size, 1, transferred=copied
+                    ),
+                )
+            except local_copy.CopyError as err:
+                LOGGER.warning("Copy failed: %s", err)
+                raise StorageException(str(err))
+            return
+
         # Rsync file over
         # TODO Do this asyncronously, with restarting failed attempts
         command = [
@@ -588,9 +852,10 @@ class Space(models.Model):
             "-vv",
             "--chmod=Fug+rw,o-rwx,Dug+rwx,o-rwx",
             "-r",
-            source,
-            destination,
         ]
+        if ssh_options and not assume_rsync_daemon:
+            command += ["--rsh", " ".join(["ssh"] + ssh_options)]
+        command += [source, destination]
         LOGGER.info("rsync command: %s", command)
         kwargs = {"stdout": subprocess.PIPE, "stderr": subprocess.STDOUT}
         if assume_rsync_daemon:
@@ -601,6 +866,13 @@ class Space(models.Model):
             s = "Rsync failed with status {}: {}".format(p.returncode, stdout)
             LOGGER.warning(s)
             raise StorageException(s)
+        if isinstance(stdout, six.binary_type):
+            stdout = stdout.decode("utf-8", "replace")
+        summary = RSYNC_SUMMARY_RE.search(stdout)
+        if summary:
+            # Bytes that went over the wire towards destination
+            direction = "received" if local_copy.is_remote_path(source) else "sent"
+            metrics.count_bytes(int(summary.group(direction).replace(",", "")))
 
     def create_local_directory(self, path, mode=None):
         """
@@ -641,50 +913,56 @@ class Space(models.Model):
         except os.error as e:
             LOGGER.warning(e)
 
-    def create_rsync_directory(self, destination_path, user, host):
+    def create_rsync_directory(self, destination_path, user, host, ssh_options=None):
         """
         Creates a remote directory structure for destination_path.
 
+        All the missing directories are created by a single rsync, which
+        sends the same structure, empty, with --relative.
+
         :param path: path to create the directories for.  Should end with a / or
             a filename, or final directory may not be created. If path is empty,
             no directories are created.
         :param user: Username on remote host
         :param host: Hostname of remote host
+        :param ssh_options: list of options for the ssh command run by rsync.
         """
-        # Assemble a set of directories to create on the remote server;
-        # these will be created one at a time
-        directories = []
-        path = destination_path
-        while path != "" and path != "/":
-            directories.insert(0, path)
-            path = os.path.dirname(path)
-
-        # Syncing an empty directory will ensure no files get transferred
-        temp_dir = os.path.join(tempfile.mkdtemp(), "")
-
-        # Creates the destination_path directory without copying any files
-        # Dir must end in a / for rsync to create it
-        for directory in directories:
-            path = os.path.join(os.path.dirname(directory), "")
-            path = "{}@{}:{}".format(user, host, utils.coerce_str(path))
+        directory = os.path.dirname(utils.coerce_str(destination_path))
+        relative_directory = directory.lstrip("/")
+        if not relative_directory:
+            return
+        root = "/" if directory.startswith("/") else ""
+
+        # Syncing empty directories will ensure no files get transferred
+        temp_dir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(temp_dir, relative_directory))
+            # The path after /./ is created under the destination
+            source = os.path.join(temp_dir, ".", relative_directory, "")
             cmd = [
                 "rsync",
                 "-vv",
                 "--protect-args",
                 "--chmod=ug=rwx,o=rx",
                 "--recursive",
-                temp_dir,
-                path,
+                "--relative",
+                # Don't send the permissions of the implied parent directories,
+                # e.g. /a of /a/b, which exist already, nor replace the
+                # symlinks to directories found on the way
+                "--no-implied-dirs",
+                "--keep-dirlinks",
             ]
+            if ssh_options:
+                cmd += ["--rsh", " ".join(["ssh"] + ssh_options)]
+            cmd += [source, "{}@{}:{}".format(user, host, root)]
             LOGGER.info("rsync path creation command: %s", cmd)
             try:
                 subprocess.check_call(cmd)
             except subprocess.CalledProcessError as e:
-                shutil.rmtree(temp_dir)
                 LOGGER.warning("rsync path creation failed: %s", e)
                 raise
-
-        shutil.rmtree(temp_dir)
+        finally:
+            shutil.rmtree(temp_dir)
 
     def browse_local(self, path):
         """
@@ -701,13 +979,59 @@ class Space(models.Model):
             return {"directories": [], "entries": [], "properties": {}}
         return path2browse_dict(path)
 
+    def read_stream_local(self, path):
+        """
+        Returns the files of a locally accessible filesystem for
+        ``stream_move``.
+
+        Generates for each file under ``path``, or ``path`` itself if it is
+        a file, its path relative to ``path``, its size, its content in
+        chunks and its MD5 checksum if known.
+        """
+        if os.path.isfile(path):
+            files = [(path, "")]
+        else:
+            files = [
+                (os.path.join(dirpath, basename), None)
+                for dirpath, __, basenames in scandir.walk(path)
+                for basename in basenames
+            ]
+        for file_path, relative_path in files:
+            if relative_path is None:
+                relative_path = os.path.relpath(file_path, path)
+            yield (
+                relative_path,
+                os.path.getsize(file_path),
+                _read_file_chunks(file_path),
+                None,
+            )
+
+    def write_stream_local(self, path, chunks):
+        """
+        Writes the byte strings of ``chunks`` to ``path`` on a locally
+        accessible filesystem, for ``stream_move``.
+        """
+        self.create_local_directory(path)
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
     def browse_rsync(
-        self, path, ssh_key=None, assume_rsync_daemon=False, rsync_password=None
+        self,
+        path,
+        ssh_key=None,
+        assume_rsync_daemon=False,
+        rsync_password=None,
+        ssh_options=None,
+        cursor=None,
+        limit=None,
     ):
         """
         Returns browse results for a ssh (rsync) accessible space.
 
-        See Space.browse for full documentation.
+        See Space.browse for full documentation. The listing is parsed as
+        rsync outputs it and, for settings.RSYNC_BROWSE_CACHE_TTL seconds,
+        cached until the modification time of the directory changes.
 
         Properties provided:
         'size': Size of the object
@@ -717,6 +1041,9 @@ class Space(models.Model):
         :param ssh_key: Path to the SSH key on disk. If None, will use default.
         :param bool assume_rsync_daemon: If true, will use rsync daemon-style commands instead of the default rsync with remote shell transport
         :param rsync_password: used if assume_rsync_daemon is true, to specify value of RSYNC_PASSWORD environment variable
+        :param ssh_options: list of additional options for the ssh command
+        :param cursor: position of the first entry returned, see Space.browse
+        :param limit: maximum number of entries returned, see Space.browse
         :return: See docstring for Space.browse
         """
         if ssh_key is None:
@@ -732,57 +1059,83 @@ class Space(models.Model):
         ]
         if not assume_rsync_daemon:
             # Specify identity file
-            command += ["--rsh", "ssh -i " + ssh_key]
-        command += [path]
-
-        LOGGER.info("rsync list command: %s", command)
-        LOGGER.debug('"%s"', '" "'.join(command))  # For copying to shell
-        try:
-            env = os.environ.copy()
-            if assume_rsync_daemon:
-                env["RSYNC_PASSWORD"] = rsync_password
-            output = subprocess.check_output(command, env=env)
-        except Exception as error:
-            LOGGER.warning("rsync list failed: %s", error, exc_info=True)
-            entries = []
-            directories = []
-        else:
-            output = output.decode("utf-8").splitlines()
-            # Output is lines in format:
-            # <type><permissions>  <size>  <date> <time> <path>
-            # Eg: drwxrws---          4,096 2015/03/02 17:05:20 tmp
-            # Eg: -rw-r--r--            201 2013/05/13 13:26:48 LICENSE.md
-            # Eg: lrwxrwxrwx             78 2015/02/19 12:13:40 sharedDirectory
-            # Parse out the path and type
-            # Define groups for type, permissions, size, timestamp and name
-            regex = r"^(?P<type>.)(?P<permissions>.{9}) +(?P<size>[\d,]+) (?P<timestamp>..../../.. ..:..:..) (?P<name>.*)$"
-            matches = [re.match(regex, e) for e in output]
-            # Take the last entry. Ignore empty lines and '.'
-            entries = [e.group("name") for e in matches if e and e.group("name") != "."]
-            # Only items whose type is not '-'. Links count as dirs.
-            directories = [
-                e.group("name")
-                for e in matches
-                if e and e.group("name") != "." and e.group("type") != "-"
+            command += [
+                "--rsh",
+                " ".join(["ssh", "-i", ssh_key] + (ssh_options or [])),
             ]
-            # Generate properties for each entry
-            properties = {}
-            for e in matches:
-                name = e.group("name")
-                if name not in entries:
-                    continue
-                properties[name] = {}
-                properties[name]["timestamp"] = datetime.datetime.strptime(
-                    e.group("timestamp"), "%Y/%m/%d %H:%M:%S"
-                ).isoformat()
-                if name not in directories:
-                    properties[name]["size"] = int(e.group("size").replace(",", ""))
-
-        directories = sorted(directories, key=lambda s: s.lower())
-        entries = sorted(entries, key=lambda s: s.lower())
+        env = os.environ.copy()
+        if assume_rsync_daemon:
+            env["RSYNC_PASSWORD"] = rsync_password
+
+        listing = None
+        cache_key = None
+        if settings.RSYNC_BROWSE_CACHE_TTL:
+            timestamp = self._rsync_directory_timestamp(command, path, env)
+            if timestamp is not None:
+                # A listing is reused until the directory is modified
+                cache_key = json.dumps([path, timestamp])
+                cache_key = (
+                    "rsync-browse:" + hashlib.md5(cache_key.encode("utf-8")).hexdigest()
+                )
+                listing = cache.get(cache_key)
+        if listing is None:
+            LOGGER.info("rsync list command: %s", command + [path])
+            LOGGER.debug('"%s"', '" "'.join(command + [path]))  # For copying to shell
+            try:
+                entries = _run_rsync_list(command + [path], env)
+            except Exception as error:
+                LOGGER.warning("rsync list failed: %s", error, exc_info=True)
+                listing = []
+            else:
+                # Ignore '.' and any duplicate
+                seen = {"."}
+                listing = []
+                for entry in entries:
+                    if entry[0] not in seen:
+                        seen.add(entry[0])
+                        listing.append(entry)
+                listing.sort(key=lambda entry: entry[0].lower())
+                if cache_key is not None:
+                    cache.set(cache_key, listing, settings.RSYNC_BROWSE_CACHE_TTL)
+
+        position = parse_browse_cursor(cursor)
+        end = len(listing) if limit is None else position + limit
+        entries = []
+        directories = []
+        properties = {}
+        for name, is_dir, size, timestamp in listing[position:end]:
+            entries.append(name)
+            properties[name] = {"timestamp": timestamp}
+            if is_dir:
+                directories.append(name)
+            else:
+                properties[name]["size"] = size
         LOGGER.debug("entries: %s", entries)
         LOGGER.debug("directories: %s", directories)
-        return {"directories": directories, "entries": entries}
+        result = {
+            "directories": directories,
+            "entries": entries,
+            "properties": properties,
+        }
+        if limit is not None:
+            result["next_cursor"] = str(end) if end < len(listing) else None
+        return result
+
+    def _rsync_directory_timestamp(self, command, path, env):
+        """Return the modification time of the directory ``path`` listed by
+        the rsync ``command``, or None if it can't be listed alone."""
+        directory = path.rstrip("/")
+        if directory.endswith(":"):
+            return None
+        try:
+            # Without the trailing slash, the directory itself is listed
+            entries = _run_rsync_list(command + [directory], env)
+        except Exception as error:
+            LOGGER.debug("rsync list of %s failed: %s", directory, error)
+            return None
+        if len(entries) != 1 or not entries[0][1]:
+            return None
+        return entries[0][3]
 
     @staticmethod
     def _del_package(delete_path):
@@ -821,31 +1174,40 @@ class Space(models.Model):
         quad_dir_structure = absolute_path_to_aip.split(base_dir)[1]
         return quad_dir_structure, base_dir
 
-    def _delete_quad_dir_structure(self, delete_path):
+    def _delete_quad_dir_structure(self, delete_path, background=False):
         """Given an absolute path to a package which is expected to have
         been deleted, split the object to then enable deletion of the
         quad-directory structure that the package used to sit within.
 
         :param delete_path: absolute path to an Archivematica package
             (path-string)
+        :param background: remove the directories in a background thread
+            (bool)
         """
         quad_dir, base_dir = self._retrieve_dirs_to_delete(delete_path)
-        utils.removedirs(quad_dir, base=base_dir)
+        if background:
+            utils.removedirs_in_background(quad_dir, base=base_dir)
+        else:
+            utils.removedirs(quad_dir, base=base_dir)
 
-    def _delete_path_local(self, delete_path):
+    def _delete_path_local(self, delete_path, background_pruning=False):
         """
         Deletes `delete_path` in this space, assuming it is locally accessible.
+
+        With `background_pruning` the quad directories left empty are removed
+        in a background thread.
         """
         if not os.path.exists(delete_path):
             LOGGER.debug("Attempted to delete '%s' but path does not exist")
             return
         self._del_package(delete_path)
-        self._delete_quad_dir_structure(delete_path)
+        self._delete_quad_dir_structure(delete_path, background=background_pruning)
 
 
-# Thrown when posix_move is handed a non POSIX space
-class PosixMoveUnsupportedError(Exception):
-    pass
+def _read_file_chunks(path):
+    with open(path, "rb") as f:
+        for chunk in utils.read_in_chunks(f):
+            yield chunk
 
 
 def _scandir_public(path):
@@ -872,7 +1234,7 @@ def path2browse_dict(path):
     """Given a path on disk, return a dict with keys for directories, entries
     and properties.
     """
-    should_count = not utils.get_setting("object_counting_disabled", False)
+    should_count = not utils.get_bool_setting("object_counting_disabled")
 
     entries = []
     directories = []
@@ -1,11 +1,14 @@
 from __future__ import absolute_import
 
 # stdlib, alphabetical
+import hashlib
+import json
 import logging
 import os
 
 # Core Django, alphabetical
 from django.db import models
+from django.utils import six
 from django.utils.translation import ugettext_lazy as _
 
 # Third party dependencies, alphabetical
@@ -17,10 +20,21 @@ from common import utils
 
 # This module, alphabetical
 from . import StorageException
+from .async_manager import get_task_progress
 from .location import Location
 
 LOGGER = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Objects deleted by a bulk-delete request when the cluster does not say
+BULK_DELETE_LIMIT = 10000
+
+# Size of the segments of the files uploaded as static large objects when
+# resumed from a checkpoint, stored in the container with this suffix
+SEGMENT_SIZE = 1024 * 1024 * 1024
+SEGMENTS_CONTAINER_SUFFIX = "_segments"
+
 
 class Swift(models.Model):
     space = models.OneToOneField("Space", to_field="uuid", on_delete=models.CASCADE)
@@ -78,6 +92,7 @@ class Swift(models.Model):
     def __init__(self, *args, **kwargs):
         super(Swift, self).__init__(*args, **kwargs)
         self._connection = None
+        self._bulk_delete_limit = None
 
     @property
     def connection(self):
@@ -134,6 +149,10 @@ class Swift(models.Model):
             "properties": properties,
         }
 
+    @property
+    def segments_container(self):
+        return self.container + SEGMENTS_CONTAINER_SUFFIX
+
     def delete_path(self, delete_path):
         # Try to delete object
         try:
@@ -143,9 +162,7 @@ class Swift(models.Model):
             # doesn't exist, assume it is supposed to be a folder and fetch all
             # items with that prefix to delete.
             try:
-                _, content = self.connection.get_container(
-                    self.container, prefix=delete_path
-                )
+                to_delete = self._list_objects(delete_path)
             except swiftclient.exceptions.ClientException:
                 LOGGER.warning(
                     "Neither file %s nor container %s exist; unable to delete any content.",
@@ -153,9 +170,98 @@ class Swift(models.Model):
                     self.container,
                 )
                 return
-            to_delete = [x["name"] for x in content if x.get("name")]
-            for d in to_delete:
-                self.connection.delete_object(self.container, d)
+            self._delete_objects(self.container, to_delete)
+            self._delete_segments(os.path.join(delete_path, ""))
+        else:
+            self._delete_segments(delete_path + "/slo/")
+
+    def _delete_objects(self, container, names):
+        max_deletes = self._get_bulk_delete_limit() if len(names) > 1 else 0
+        if not max_deletes:
+            for name in names:
+                self.connection.delete_object(container, name)
+            return
+        for start in range(0, len(names), max_deletes):
+            self._bulk_delete(names[start : start + max_deletes], container)
+
+    def _delete_segments(self, prefix):
+        """Delete the segments of the large objects whose segments start with
+        ``prefix``, see ``_put_segmented_object``."""
+        try:
+            names = self._list_objects(prefix, self.segments_container)
+        except swiftclient.exceptions.ClientException as err:
+            if err.http_status != 404:
+                LOGGER.warning("Unable to list the segments %s: %s", prefix, err)
+            return
+        if names:
+            self._delete_objects(self.segments_container, names)
+
+    def _list_objects(self, prefix, container=None):
+        """Return the names of all the objects with ``prefix`` in
+        ``container``, this space's by default.
+
+        The container listing is paged by the client (``full_listing``), as
+        the cluster may return fewer objects per page than it is asked for.
+        """
+        __, content = self.connection.get_container(
+            container or self.container, prefix=prefix, full_listing=True
+        )
+        return [x["name"] for x in content if x.get("name")]
+
+    def _get_bulk_delete_limit(self):
+        """Return the number of objects deleted by a bulk-delete request, or 0
+        if the cluster does not support them."""
+        if self._bulk_delete_limit is None:
+            try:
+                capabilities = self.connection.get_capabilities()
+            except swiftclient.exceptions.ClientException:
+                LOGGER.debug("Unable to get the capabilities of Swift", exc_info=True)
+                capabilities = {}
+            bulk_delete = capabilities.get("bulk_delete")
+            self._bulk_delete_limit = (
+                bulk_delete.get("max_deletes_per_request", BULK_DELETE_LIMIT)
+                if bulk_delete is not None
+                else 0
+            )
+        return self._bulk_delete_limit
+
+    def _bulk_delete(self, names, container=None):
+        """Delete the objects ``names`` of ``container``, this space's by
+        default, in a single bulk-delete request."""
+        container = container or self.container
+        data = "".join(
+            "{}\n".format(
+                six.moves.urllib.parse.quote(
+                    "/{}/{}".format(container, name).encode("utf-8")
+                )
+            )
+            for name in names
+        )
+        __, body = self.connection.post_account(
+            headers={"Accept": "application/json", "Content-Type": "text/plain"},
+            query_string="bulk-delete",
+            data=data.encode("utf-8"),
+        )
+        result = json.loads(body or "{}")
+        # Objects already gone are not errors
+        errors = [
+            (name, status)
+            for name, status in result.get("Errors", [])
+            if not status.startswith("404")
+        ]
+        if errors or not result.get("Response Status", "200").startswith("2"):
+            raise StorageException(
+                _("Unable to delete %(count)d objects in Swift, e.g. %(error)s")
+                % {
+                    "count": len(errors),
+                    "error": errors[0] if errors else result.get("Response Status"),
+                }
+            )
+        LOGGER.debug(
+            "Deleted %s objects from Swift container %s",
+            result.get("Number Deleted"),
+            container,
+        )
 
     def _download_file(self, remote_path, download_path):
         """
@@ -170,8 +276,9 @@ class Swift(models.Model):
         self.space.create_local_directory(download_path)
         with open(download_path, "wb") as f:
             f.write(content)
-        # Check ETag matches checksum of this file
-        if "etag" in headers:
+        # Check ETag matches checksum of this file, the ETag of large objects
+        # is quoted and is not their MD5 checksum
+        if "etag" in headers and not headers["etag"].startswith('"'):
             checksum = utils.generate_checksum(download_path)
             if checksum.hexdigest() != headers["etag"]:
                 message = _(
@@ -211,6 +318,7 @@ class Swift(models.Model):
 
     def move_from_storage_service(self, source_path, destination_path, package=None):
         """ Moves self.staging_path/src_path to dest_path. """
+        checkpoint = getattr(package, "transfer_checkpoint", None)
         if os.path.isdir(source_path):
             # Both source and destination paths should end with /
             destination_path = os.path.join(destination_path, "")
@@ -219,27 +327,137 @@ class Swift(models.Model):
                 for basename in files:
                     entry = os.path.join(path, basename)
                     dest = entry.replace(source_path, destination_path, 1)
-                    checksum = utils.generate_checksum(entry)
-                    with open(entry, "rb") as f:
-                        self.connection.put_object(
-                            self.container,
-                            obj=dest,
-                            contents=f,
-                            etag=checksum.hexdigest(),
-                            content_length=os.path.getsize(entry),
-                        )
+                    self._upload_file(entry, dest, checkpoint)
         elif os.path.isfile(source_path):
-            checksum = utils.generate_checksum(source_path)
-            with open(source_path, "rb") as f:
+            self._upload_file(source_path, destination_path, checkpoint)
+        else:
+            raise StorageException(
+                _("%(path)s is neither a file nor a directory, may not exist")
+                % {"path": source_path}
+            )
+
+    def _upload_file(self, path, name, checkpoint=None):
+        """Upload the file ``path`` to the object ``name``, recording it in
+        the ``TransferCheckpoint`` of the package uploaded if given: the
+        objects it recorded are not uploaded again and the files larger than
+        ``SEGMENT_SIZE`` are uploaded in segments, those already uploaded
+        being skipped."""
+        progress = get_task_progress()
+        size = os.path.getsize(path)
+        if checkpoint is not None and checkpoint.is_completed(name):
+            LOGGER.debug("Skipping %s, uploaded before being interrupted", name)
+            progress.advance(size, 1, transferred=False)
+            return
+        if checkpoint is not None and size > SEGMENT_SIZE:
+            self._put_segmented_object(path, name, size, checkpoint, progress)
+        else:
+            checksum = utils.generate_checksum(path)
+            with open(path, "rb") as f:
                 self.connection.put_object(
                     self.container,
-                    obj=destination_path,
+                    obj=name,
                     contents=f,
                     etag=checksum.hexdigest(),
-                    content_length=os.path.getsize(source_path),
+                    content_length=size,
                 )
-        else:
-            raise StorageException(
-                _("%(path)s is neither a file nor a directory, may not exist")
-                % {"path": source_path}
+            if checkpoint is not None:
+                checkpoint.record_bytes(size)
+            progress.advance(size)
+        if checkpoint is not None:
+            checkpoint.record_file(name)
+        progress.advance(files_count=1)
+
+    def _put_segmented_object(self, path, name, size, checkpoint, progress):
+        """Upload the file ``path`` as the static large object ``name``, its
+        segments of ``SEGMENT_SIZE`` bytes being uploaded to the segments
+        container unless they are there already, and reported to the
+        ``TaskProgress`` ``progress``."""
+        prefix = "{}/slo/{}/{}/".format(name, size, SEGMENT_SIZE)
+        try:
+            __, content = self.connection.get_container(
+                self.segments_container, prefix=prefix, full_listing=True
             )
+        except swiftclient.exceptions.ClientException as err:
+            if err.http_status != 404:
+                raise
+            self.connection.put_container(self.segments_container)
+            content = []
+        uploaded = {entry["name"]: entry for entry in content if entry.get("name")}
+        manifest = []
+        with open(path, "rb") as f:
+            for index, offset in enumerate(range(0, size, SEGMENT_SIZE)):
+                length = min(SEGMENT_SIZE, size - offset)
+                segment = "{}{:08d}".format(prefix, index)
+                f.seek(offset)
+                md5 = hashlib.md5()
+                remaining = length
+                while remaining:
+                    chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    md5.update(chunk)
+                    remaining -= len(chunk)
+                reused = uploaded.get(segment, {}).get("hash") == md5.hexdigest()
+                if not reused:
+                    f.seek(offset)
+                    self.connection.put_object(
+                        self.segments_container,
+                        obj=segment,
+                        contents=f,
+                        etag=md5.hexdigest(),
+                        content_length=length,
+                    )
+                    checkpoint.record_bytes(length)
+                progress.advance(length, transferred=not reused)
+                manifest.append(
+                    {
+                        "path": "/{}/{}".format(self.segments_container, segment),
+                        "etag": md5.hexdigest(),
+                        "size_bytes": length,
+                    }
+                )
+        self.connection.put_object(
+            self.container,
+            obj=name,
+            contents=json.dumps(manifest),
+            query_string="multipart-manifest=put",
+        )
+
+    def _read_object_stream(self, path):
+        headers, body = self.connection.get_object(
+            self.container, path, resp_chunk_size=STREAM_CHUNK_SIZE
+        )
+        # The ETag of large objects is quoted and is not their MD5 checksum
+        etag = headers.get("etag")
+        if etag and etag.startswith('"'):
+            etag = None
+        return int(headers["content-length"]), body, etag
+
+    def read_stream(self, path):
+        """ Generates the objects under path, or the object path, for Space.stream_move. """
+        try:
+            size, body, etag = self._read_object_stream(path)
+        except swiftclient.exceptions.ClientException:
+            # Swift only stores objects and fakes having folders. If path
+            # doesn't exist, assume it is supposed to be a folder and stream
+            # all items with that prefix.
+            prefix = os.path.join(path, "")
+            __, content = self.connection.get_container(
+                self.container, prefix=prefix, full_listing=True
+            )
+            for entry in content:
+                if not entry.get("name"):
+                    continue
+                size, body, etag = self._read_object_stream(entry["name"])
+                yield entry["name"][len(prefix) :], size, body, etag
+        else:
+            yield "", size, body, etag
+
+    def write_stream(self, path, size, chunks, package=None):
+        """ Uploads the byte strings of chunks to the object path for Space.stream_move. """
+        return self.connection.put_object(
+            self.container,
+            obj=path,
+            contents=utils.ChunksReader(chunks),
+            content_length=size,
+        )
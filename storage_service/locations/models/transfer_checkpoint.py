@@ -0,0 +1,336 @@
+# stdlib, alphabetical
+from __future__ import absolute_import
+import datetime
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+# Core Django, alphabetical
+from django.conf import settings
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import six, timezone
+from django.utils.translation import ugettext_lazy as _
+
+# Third party dependencies, alphabetical
+
+# This project, alphabetical
+
+# This module, alphabetical
+from . import StorageException
+from .location import Location
+
+__all__ = ("TransferCheckpoint", "TransferCheckpointFile")
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds between two saves of the progress of a transfer, the files and
+# bytes transferred since the last save are transferred again when resumed
+SAVE_INTERVAL = 5
+# Completed files inserted per INSERT statement
+FILES_BATCH_SIZE = 500
+# Seconds between two updates of the checkpoint of a running transfer by its
+# heartbeat, must be well below settings.TRANSFER_CHECKPOINT_TIMEOUT
+HEARTBEAT_INTERVAL = 60
+
+
+@six.python_2_unicode_compatible
+class TransferCheckpoint(models.Model):
+    """Progress of the transfer of a package to its destination space.
+
+    A checkpoint is created when a package starts being stored, replicated or
+    moved and deleted once that is complete, see ``Package.store_aip``,
+    ``Package.replicate`` and ``Package.move``. While it runs, the spaces
+    record in it the files and bytes written to the destination and the
+    multipart upload in progress, if any, which they skip or resume when the
+    transfer is restarted. ``arguments`` is what the transfer was started
+    with, used by the ``resume_transfers`` command to restart it. A transfer
+    that failed has an ``error``.
+    """
+
+    STORE = "STORE"
+    REPLICATE = "REPLICATE"
+    MOVE = "MOVE"
+    OPERATION_CHOICES = (
+        (STORE, _("Store")),
+        (REPLICATE, _("Replicate")),
+        (MOVE, _("Move")),
+    )
+
+    package = models.ForeignKey(
+        "Package",
+        to_field="uuid",
+        on_delete=models.CASCADE,
+        related_name="transfer_checkpoints",
+    )
+    operation = models.CharField(max_length=10, choices=OPERATION_CHOICES)
+    arguments = models.TextField(
+        default="{}", help_text=_("JSON arguments the transfer was started with")
+    )
+    bytes_completed = models.BigIntegerField(default=0)
+    upload_path = models.TextField(null=True, blank=True, default=None)
+    upload_id = models.TextField(
+        null=True,
+        blank=True,
+        default=None,
+        help_text=_("Multipart upload in progress to upload_path"),
+    )
+    owner = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True,
+        default=None,
+        help_text=_("Host, process and thread running the transfer"),
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True, default=None)
+    created_time = models.DateTimeField(auto_now_add=True)
+    updated_time = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = _("Transfer checkpoint")
+        app_label = "locations"
+        unique_together = ("package", "operation")
+
+    def __init__(self, *args, **kwargs):
+        super(TransferCheckpoint, self).__init__(*args, **kwargs)
+        self._completed = None
+        self._pending_files = []
+        self._saved = time.time()
+        self._heartbeat_stop = None
+
+    def __str__(self):
+        return _(u"%(operation)s of %(package)s") % {
+            "operation": self.get_operation_display(),
+            "package": self.package_id,
+        }
+
+    @classmethod
+    def begin(cls, package, operation, **arguments):
+        """Return the checkpoint of the ``operation`` on ``package``, created
+        if it is not being resumed, and make it the ``transfer_checkpoint`` of
+        ``package`` for its spaces to record their progress in.
+
+        The checkpoint is owned by the current thread until the transfer
+        fails or completes. Raises ``StorageException`` if it is owned by a
+        transfer still running, i.e. whose heartbeat updated it recently.
+        """
+        with transaction.atomic():
+            checkpoint, __ = cls.objects.select_for_update().get_or_create(
+                package=package, operation=operation
+            )
+            if checkpoint.is_running:
+                raise StorageException(
+                    _("%(transfer)s is already running in %(owner)s")
+                    % {"transfer": checkpoint, "owner": checkpoint.owner}
+                )
+            checkpoint._claim(arguments)
+        package.transfer_checkpoint = checkpoint
+        return checkpoint
+
+    def _claim(self, arguments):
+        try:
+            self.arguments = json.dumps(arguments)
+        except TypeError:
+            # E.g. the PREMIS objects of the AIPs stored by import_aip, which
+            # resumes its imports itself: the transfer isn't restarted by
+            # resume_transfers but its progress is still recorded
+            self.arguments = "{}"
+        self.attempts += 1
+        self.error = None
+        self.owner = "{}:{}:{}".format(
+            socket.gethostname(), os.getpid(), threading.current_thread().ident
+        )
+        self.save()
+
+    @property
+    def is_running(self):
+        """True if a transfer owns this checkpoint and its heartbeat updated
+        it less than ``settings.TRANSFER_CHECKPOINT_TIMEOUT`` seconds ago."""
+        return (
+            self.owner is not None
+            and self.updated_time is not None
+            and self.updated_time
+            > timezone.now()
+            - datetime.timedelta(seconds=settings.TRANSFER_CHECKPOINT_TIMEOUT)
+        )
+
+    def beat(self):
+        """Update the checkpoint to show that its transfer is still running,
+        even if it records no progress. Returns False if it is not the owner
+        anymore."""
+        return bool(
+            TransferCheckpoint.objects.filter(pk=self.pk, owner=self.owner).update(
+                updated_time=timezone.now()
+            )
+        )
+
+    def start_heartbeat(self):
+        """Beat every ``HEARTBEAT_INTERVAL`` seconds in a background thread
+        until ``stop_heartbeat`` is called."""
+        self._heartbeat_stop = threading.Event()
+        thread = threading.Thread(target=self._heartbeat, args=(self._heartbeat_stop,))
+        thread.daemon = True
+        thread.start()
+
+    def stop_heartbeat(self):
+        if self._heartbeat_stop is not None:
+            self._heartbeat_stop.set()
+            self._heartbeat_stop = None
+
+    def _heartbeat(self, stop):
+        try:
+            while not stop.wait(HEARTBEAT_INTERVAL):
+                try:
+                    self.beat()
+                except Exception as err:
+                    LOGGER.warning("Heartbeat of %s failed: %s", self, err)
+        finally:
+            # The connection of this thread
+            connection.close()
+
+    def get_arguments(self):
+        return json.loads(self.arguments)
+
+    @property
+    def is_resumable(self):
+        """True if the transfer can be restarted from this checkpoint."""
+        if self.operation == self.REPLICATE:
+            return self.package.replicated_package_id is not None
+        return bool(self.get_arguments())
+
+    def resume(self):
+        """Restart the transfer from this checkpoint, skipping what it
+        recorded as complete."""
+        arguments = self.get_arguments()
+        package = self.package
+        if self.operation == self.STORE:
+            # The AIP is stored again from the path it was given
+            package.current_path = arguments["current_path"]
+            package.store_aip(
+                Location.objects.get(uuid=arguments["origin_location"]),
+                arguments["origin_path"],
+                related_package_uuid=arguments["related_package_uuid"],
+                premis_events=arguments["premis_events"],
+                premis_agents=arguments["premis_agents"],
+                aip_subtype=arguments["aip_subtype"],
+            )
+        elif self.operation == self.REPLICATE:
+            package.replicated_package.replicate(
+                package.current_location, replica_package=package
+            )
+        else:
+            package.move(Location.objects.get(uuid=arguments["to_location"]))
+
+    def _get_completed(self):
+        # Hashes of the paths completed, loaded once
+        if self._completed is None:
+            self._completed = set(self.files.values_list("path_hash", flat=True))
+        return self._completed
+
+    def is_completed(self, path):
+        """Return True if ``path`` was written completely by a previous
+        attempt."""
+        return TransferCheckpointFile.hash_path(path) in self._get_completed()
+
+    def record_file(self, path):
+        """Record that ``path`` was written completely."""
+        path_hash = TransferCheckpointFile.hash_path(path)
+        completed = self._get_completed()
+        if path_hash not in completed:
+            completed.add(path_hash)
+            self._pending_files.append(
+                TransferCheckpointFile(checkpoint=self, path=path, path_hash=path_hash)
+            )
+        self._save()
+
+    def record_bytes(self, count):
+        """Record that ``count`` more bytes were written."""
+        self.bytes_completed += count
+        self._save()
+
+    def record_upload(self, path, upload_id):
+        """Record the multipart upload ``upload_id`` to ``path``, or that
+        there is none in progress if ``upload_id`` is None."""
+        self.upload_path = path
+        self.upload_id = upload_id
+        self._save(force=True)
+
+    def _save(self, force=False):
+        if not force and time.time() - self._saved < SAVE_INTERVAL:
+            return
+        self._insert_files()
+        self.save(
+            update_fields=[
+                "bytes_completed",
+                "upload_path",
+                "upload_id",
+                "error",
+                "owner",
+                "updated_time",
+            ]
+        )
+        self._saved = time.time()
+
+    def _insert_files(self):
+        """Insert the files completed since the last save."""
+        files, self._pending_files = self._pending_files, []
+        for start in range(0, len(files), FILES_BATCH_SIZE):
+            batch = files[start : start + FILES_BATCH_SIZE]
+            try:
+                with transaction.atomic():
+                    TransferCheckpointFile.objects.bulk_create(batch)
+            except IntegrityError:
+                # Some were recorded meanwhile by another attempt
+                existing = set(
+                    self.files.filter(
+                        path_hash__in=[entry.path_hash for entry in batch]
+                    ).values_list("path_hash", flat=True)
+                )
+                TransferCheckpointFile.objects.bulk_create(
+                    [entry for entry in batch if entry.path_hash not in existing]
+                )
+
+    def fail(self, error):
+        """Record that the transfer failed with ``error``, keeping its progress
+        to resume it."""
+        self.error = six.text_type(error)
+        self.owner = None
+        self._save(force=True)
+
+    def complete(self):
+        """Remove the checkpoint of the transfer completed."""
+        self.delete()
+
+
+@six.python_2_unicode_compatible
+class TransferCheckpointFile(models.Model):
+    """A destination path written completely by a checkpointed transfer.
+
+    The paths are rows rather than a list in the checkpoint so that
+    recording a file only inserts it. They are unique by hash, as long paths
+    can't be in a unique index of every database.
+    """
+
+    checkpoint = models.ForeignKey(
+        TransferCheckpoint, on_delete=models.CASCADE, related_name="files"
+    )
+    path = models.TextField()
+    path_hash = models.CharField(max_length=40)
+
+    class Meta:
+        verbose_name = _("Transfer checkpoint file")
+        app_label = "locations"
+        unique_together = ("checkpoint", "path_hash")
+
+    def __str__(self):
+        return self.path
+
+    @staticmethod
+    def hash_path(path):
+        if isinstance(path, six.text_type):
+            path = path.encode("utf-8")
+        return hashlib.sha1(path).hexdigest()
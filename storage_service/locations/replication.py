@@ -0,0 +1,286 @@
+"""Scheduling of replica creation.
+
+Replicas of the AIPs of a location are created in a pool of worker processes,
+one replicator location of an AIP at a time. The replicas written to each
+Space are limited in number and paced so that, on average, they stay within a
+budget of bytes written per second, see ``ReplicationScheduler``.
+"""
+from __future__ import absolute_import
+
+# stdlib, alphabetical
+from collections import Counter, deque, namedtuple, OrderedDict
+import logging
+import time
+
+# Core Django, alphabetical
+from django.conf import settings
+from django.utils.six.moves import queue
+
+# Third party dependencies, alphabetical
+
+# This project, alphabetical
+from common import utils
+
+# This module, alphabetical
+from . import models
+from .fixity import IOBudget
+
+LOGGER = logging.getLogger(__name__)
+
+# Bytes written per second by a replication when estimating the duration of
+# replications that are not throttled
+ESTIMATED_BYTES_PER_SECOND = 50 * 1024 * 1024
+
+ReplicationJob = namedtuple(
+    "ReplicationJob", ["aip_uuid", "replicator_uuid", "space_uuid", "size"]
+)
+ReplicationResult = namedtuple(
+    "ReplicationResult", ["created", "deleted", "delete_errors"]
+)
+
+
+def get_replication_jobs(
+    aip_store_uuid, aip_uuid=None, replicator_uuid=None, largest_first=True
+):
+    """Return a ``ReplicationJob`` for every AIP of the location
+    ``aip_store_uuid`` and every one of its replicators, ordered by the size
+    of the AIPs.
+
+    :param aip_uuid: only replicate this AIP.
+    :param replicator_uuid: only replicate to this replicator location.
+    :param largest_first: start with the largest AIPs, or the smallest.
+    """
+    replicators = models.Location.objects.get(uuid=aip_store_uuid).replicators.all()
+    if replicator_uuid:
+        replicators = replicators.filter(uuid=replicator_uuid)
+    replicators = list(replicators.values_list("uuid", "space__uuid"))
+    aips = models.Package.objects.filter(
+        current_location=aip_store_uuid,
+        package_type=models.Package.AIP,
+        replicated_package=None,
+        status=models.Package.UPLOADED,
+    )
+    if aip_uuid:
+        aips = aips.filter(uuid=aip_uuid)
+    order = "-size" if largest_first else "size"
+    return [
+        ReplicationJob(
+            aip_uuid=aip_uuid,
+            replicator_uuid=location_uuid,
+            space_uuid=space_uuid,
+            size=size or 0,
+        )
+        for aip_uuid, size in aips.order_by(order, "pk").values_list("uuid", "size")
+        for location_uuid, space_uuid in replicators
+    ]
+
+
+def estimate_duration(jobs, processes=None, per_space=None, bytes_per_second=None):
+    """Estimate the number of seconds ``ReplicationScheduler`` takes to
+    replicate ``jobs``, assuming each replication writes at most
+    ``ESTIMATED_BYTES_PER_SECOND`` bytes per second."""
+    if processes is None:
+        processes = settings.REPLICATION_PROCESSES
+    if per_space is None:
+        per_space = settings.REPLICATION_SPACE_CONCURRENCY
+    if bytes_per_second is None:
+        bytes_per_second = settings.REPLICATION_SPACE_BYTES_PER_SECOND
+    sizes = {}
+    for job in jobs:
+        sizes[job.space_uuid] = sizes.get(job.space_uuid, 0) + job.size
+    # Each Space is limited by its concurrency and budget, all of them by the
+    # number of processes
+    space_rate = max(1, per_space) * ESTIMATED_BYTES_PER_SECOND
+    if bytes_per_second:
+        space_rate = min(space_rate, bytes_per_second)
+    total_rate = max(1, processes) * ESTIMATED_BYTES_PER_SECOND
+    return max(
+        [float(size) / space_rate for size in sizes.values()]
+        + [float(sum(sizes.values())) / total_rate]
+    )
+
+
+def delete_replicas(aip_uuid, replicator_uuid=None):
+    """Delete the replicas of the AIP ``aip_uuid``, those in the location
+    ``replicator_uuid`` if given.
+
+    Returns the number of replicas deleted and the errors of the others.
+    """
+    replicas = models.Package.objects.filter(
+        replicated_package=aip_uuid, status=models.Package.UPLOADED
+    )
+    if replicator_uuid:
+        replicas = replicas.filter(current_location__uuid=replicator_uuid)
+    deleted = 0
+    errors = []
+    results = models.Package.bulk_delete_from_storage(replicas)
+    for replica_uuid, (success, error) in results.items():
+        if success:
+            deleted += 1
+        else:
+            errors.append(
+                "Unable to delete existing replica {} of AIP {}: {}".format(
+                    replica_uuid, aip_uuid, error
+                )
+            )
+    return deleted, errors
+
+
+def _replicate(aip_uuid, replicator_uuid, delete):
+    """Create a replica of an AIP in a replicator location, in a worker
+    process, deleting its existing replicas there first if ``delete``.
+
+    Returns a ``ReplicationResult``.
+    """
+    deleted, delete_errors = 0, []
+    if delete:
+        deleted, delete_errors = delete_replicas(aip_uuid, replicator_uuid)
+    replicas = models.Package.objects.filter(
+        replicated_package=aip_uuid,
+        status=models.Package.UPLOADED,
+        current_location=replicator_uuid,
+    )
+    initial_count = replicas.count()
+    aip = models.Package.objects.get(uuid=aip_uuid)
+    try:
+        aip.create_replicas(replicator_uuid=replicator_uuid, delete_replicas=False)
+    finally:
+        aip.clear_local_tempdirs()
+    return ReplicationResult(
+        created=replicas.count() > initial_count,
+        deleted=deleted,
+        delete_errors=delete_errors,
+    )
+
+
+class ReplicationScheduler(object):
+    """Creates replicas within the concurrency and bandwidth limits of the
+    Spaces they are written to.
+
+    The replications are started in the order given, skipping those whose
+    Space is at its limits or whose AIP is being replicated elsewhere: the
+    pointer file of an AIP is updated by each of its replications.
+
+    :param processes: number of worker processes. With 0 the replications
+        run in the current process, one at a time.
+    :param per_space: number of replications writing to a Space at the same
+        time.
+    :param bytes_per_second: budget of bytes written per second for each
+        Space, 0 is unlimited.
+    :param delete: delete the existing replicas of each AIP in a replicator
+        location before replicating it there.
+    :param on_result: called with the ``ReplicationJob``, its
+        ``ReplicationResult`` and the exception that made it fail or None.
+    """
+
+    def __init__(
+        self,
+        processes=None,
+        per_space=None,
+        bytes_per_second=None,
+        delete=False,
+        on_result=None,
+    ):
+        if processes is None:
+            processes = settings.REPLICATION_PROCESSES
+        if per_space is None:
+            per_space = settings.REPLICATION_SPACE_CONCURRENCY
+        if bytes_per_second is None:
+            bytes_per_second = settings.REPLICATION_SPACE_BYTES_PER_SECOND
+        self.processes = processes
+        self.per_space = max(1, per_space)
+        self.bytes_per_second = bytes_per_second
+        self.delete = delete
+        self.on_result = on_result
+        self.budgets = {}
+        self._pool = None
+        self._results = queue.Queue()
+
+    def get_budget(self, space_uuid):
+        if space_uuid not in self.budgets:
+            self.budgets[space_uuid] = IOBudget(self.bytes_per_second)
+        return self.budgets[space_uuid]
+
+    def run(self, jobs):
+        """Replicate ``jobs``, in order within each Space. Returns the number
+        of replicas created."""
+        queues = OrderedDict()
+        for index, job in enumerate(jobs):
+            queues.setdefault(job.space_uuid, deque()).append((index, job))
+        slots = max(1, self.processes)
+        running_spaces = Counter()
+        running_aips = set()
+        created = 0
+        if self.processes:
+            self._pool = utils.ProcessPool(self.processes)
+        try:
+            while queues or running_aips:
+                now = time.time()
+                while len(running_aips) < slots:
+                    # The first job, in the original order, of the Spaces
+                    # within their limits
+                    ready = [
+                        (jobs_queue[0][0], space_uuid)
+                        for space_uuid, jobs_queue in queues.items()
+                        if running_spaces[space_uuid] < self.per_space
+                        and jobs_queue[0][1].aip_uuid not in running_aips
+                        and not self.get_budget(space_uuid).wait_time(now)
+                    ]
+                    if not ready:
+                        break
+                    __, space_uuid = min(ready)
+                    __, job = queues[space_uuid].popleft()
+                    if not queues[space_uuid]:
+                        del queues[space_uuid]
+                    self.get_budget(space_uuid).spend(now, job.size, 0)
+                    running_aips.add(job.aip_uuid)
+                    running_spaces[space_uuid] += 1
+                    self._start(job)
+                # Wake up when the budget of a Space waiting for it allows
+                waits = [
+                    self.get_budget(space_uuid).wait_time(now)
+                    for space_uuid in queues
+                    if running_spaces[space_uuid] < self.per_space
+                ]
+                wait = min([w for w in waits if w] or [None])
+                if not running_aips:
+                    time.sleep(wait or 0)
+                    continue
+                try:
+                    job, result, error = self._results.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                running_aips.discard(job.aip_uuid)
+                running_spaces[job.space_uuid] -= 1
+                if error is not None:
+                    LOGGER.error(
+                        "Replication of AIP %s to %s failed: %s",
+                        job.aip_uuid,
+                        job.replicator_uuid,
+                        error,
+                    )
+                elif result.created:
+                    created += 1
+                if self.on_result is not None:
+                    self.on_result(job, result, error)
+        finally:
+            if self._pool is not None:
+                # All the replications started have been recorded
+                self._pool.terminate()
+                self._pool = None
+        return created
+
+    def _start(self, job):
+        args = (job.aip_uuid, job.replicator_uuid, self.delete)
+        if self._pool is None:
+            try:
+                self._results.put((job, _replicate(*args), None))
+            except Exception as err:
+                self._results.put((job, None, err))
+            return
+        self._pool.apply_async(
+            _replicate,
+            args,
+            callback=lambda result: self._results.put((job, result, None)),
+            error_callback=lambda err: self._results.put((job, None, err)),
+        )
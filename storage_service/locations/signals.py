@@ -16,7 +16,7 @@ from prometheus_client import Counter
 LOGGER = logging.getLogger(__name__)
 
 deletion_request = Signal(providing_args=["uuid", "location", "url", "pipeline"])
-failed_fixity_check = Signal(providing_args=["uuid", "location", "report"])
+failed_fixity_check = Signal(providing_args=["uuid", "location", "report", "notify"])
 successful_fixity_check = Signal(providing_args=["uuid", "location", "report"])
 fixity_check_not_run = Signal(providing_args=["uuid", "location", "report"])
 
@@ -85,6 +85,35 @@ Full failure report (in JSON format):
         "report": kwargs["report"],
     }
 
+    if kwargs.get("notify", True):
+        _notify_administrators(subject, message)
+
+
+def notify_failed_fixity_checks(failures):
+    """Email administrators a single digest of failed fixity checks.
+
+    :param failures: list of ``(uuid, location, report)`` tuples, as sent
+        with ``failed_fixity_check``.
+    """
+    if not failures:
+        return
+    subject = _("Fixity checks failed for %(count)d packages") % {
+        "count": len(failures)
+    }
+    message = _("Fixity checks failed for the following packages:\n")
+    for uuid, location, report in failures:
+        message += (
+            _(
+                """
+Package UUID: %(uuid)s
+Package location: %(location)s
+Full failure report (in JSON format):
+%(report)s
+"""
+            )
+            % {"uuid": uuid, "location": location, "report": report}
+        )
+
     _notify_administrators(subject, message)
 
 
@@ -6,8 +6,10 @@ import os
 import shutil
 import uuid
 import vcr
+from unittest import mock
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 from django.utils.six.moves.urllib.parse import urlparse
@@ -15,6 +17,7 @@ from django.utils.six.moves.urllib.parse import urlparse
 from administration import roles
 from locations import models
 from locations.api.sword.views import _parse_name_and_content_urls_from_mets_file
+from locations.models import async_manager
 from . import TempDirMixin
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -103,6 +106,28 @@ class TestSpaceAPI(TempDirMixin, TestCase):
             in response.content.decode("utf8")
         )
 
+    def test_browse_rejects_invalid_cursor(self):
+        space_uuid = str(uuid.uuid4())
+        space = models.Space.objects.create(
+            uuid=space_uuid,
+            path=str(self.tmpdir),
+            access_protocol=models.Space.LOCAL_FILESYSTEM,
+        )
+        models.LocalFilesystem.objects.create(space=space)
+        browse_url = reverse(
+            "browse",
+            kwargs={"api_name": "v2", "resource_name": "space", "uuid": space_uuid},
+        )
+
+        for cursor in ("not-a-position", "-1"):
+            response = self.client.get(
+                browse_url, {"path": str(self.tmpdir), "cursor": cursor}
+            )
+            assert response.status_code == 400
+            assert "Invalid browse cursor: {}".format(
+                cursor
+            ) in response.content.decode("utf8")
+
     def test_browse_follow_symlinks(self):
         # Create a directory with two subdirectories and a file
         out_dir = self.tmpdir / "out"
@@ -550,6 +575,8 @@ class TestPackageAPI(TempDirMixin, TestCase):
 
     def setUp(self):
         super(TestPackageAPI, self).setUp()
+        # Answers from Arkivum are cached across tests otherwise
+        cache.clear()
         ss_internal = self.tmpdir / "ss-internal"
         ss_internal.mkdir()
         self.test_location = models.Location.objects.get(
@@ -986,6 +1013,39 @@ class TestPackageAPI(TempDirMixin, TestCase):
             "recover_aip", models.Package.RECOVER_REQ
         )
 
+    def test_delete_aips_request(self):
+        pipeline = models.Pipeline.objects.create()
+        aip_uuids = [self._create_aip(), self._create_aip()]
+        missing_uuid = "00000000-0000-0000-0000-000000000000"
+        response = self.client.post(
+            "/api/v2/file/delete_aips/",
+            data=json.dumps(
+                {
+                    "uuids": aip_uuids + [missing_uuid],
+                    "event_reason": "Some justification",
+                    "pipeline": pipeline.uuid,
+                    "user_email": "test@example.com",
+                    "user_id": User.objects.get(username="test").id,
+                }
+            ),
+            content_type="application/json",
+        )
+        assert response.status_code == 200
+        results = json.loads(response.content.decode("utf8"))
+        assert [results[uuid]["status_code"] for uuid in aip_uuids] == [202, 202]
+        assert results[missing_uuid]["status_code"] == 404
+        assert set(
+            models.Package.objects.filter(uuid__in=aip_uuids).values_list(
+                "status", flat=True
+            )
+        ) == {models.Package.DEL_REQ}
+        assert (
+            models.Event.objects.filter(
+                package__in=aip_uuids, event_type=models.Event.DELETE
+            ).count()
+            == 2
+        )
+
 
 class TestSwordAPI(TestCase):
     def test_removes_forward_slash_parse_fedora_mets(self):
@@ -1074,3 +1134,75 @@ class TestPipelineAPI(TestCase):
         pipeline.parse_and_fix_url(pipeline.remote_name) == urlparse(
             "http://192.168.0.10"
         )
+
+
+class TestAsyncAPI(TestCase):
+
+    fixtures = ["base.json"]
+
+    def setUp(self):
+        self.client.defaults["HTTP_AUTHORIZATION"] = "Basic " + base64.b64encode(
+            b"test:test"
+        ).decode("utf8")
+
+    @mock.patch.object(async_manager.time, "time")
+    def test_progress_is_rate_limited_and_exposed(self, now):
+        async_task = models.Async.objects.create()
+        progress = async_manager.TaskProgress(async_task.id, interval=5)
+        now.return_value = 1000.0
+        progress.start_phase("uploading", bytes_total=1000, files_total=4)
+        now.return_value = 1001.0
+        progress.advance(100, 1)
+        async_task.refresh_from_db()
+        assert async_task.phase == "uploading"
+        assert async_task.bytes_total == 1000
+        assert async_task.bytes_done == 0
+
+        now.return_value = 1010.0
+        progress.advance(100, 1)
+        response = self.client.get("/api/v2/async/{}/".format(async_task.id))
+        assert response.status_code == 200
+        body = json.loads(response.content)
+        assert body["phase"] == "uploading"
+        assert body["bytes_done"] == 200
+        assert body["files_done"] == 2
+        assert body["files_total"] == 4
+        assert body["bytes_per_second"] == 20.0
+        assert body["seconds_remaining"] == 40
+
+        progress.end_phase()
+        async_task.refresh_from_db()
+        assert async_task.bytes_done == 1000
+        assert async_task.files_done == 4
+
+    def test_events_end_once_completed(self):
+        async_task = models.Async(completed=True)
+        async_task.result = "Files moved successfully"
+        async_task.save()
+        response = self.client.get("/api/v2/async/{}/events/".format(async_task.id))
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/event-stream"
+        retry, event = (
+            b"".join(response.streaming_content).decode("utf8").strip().split("\n\n")
+        )
+        assert retry == "retry: 5000"
+        event_id, event, data = event.split("\n")
+        assert event_id == "id: {}".format(async_task.updated_time.isoformat())
+        assert event == "event: completed"
+        assert json.loads(data[len("data: ") :])["result"] == "Files moved successfully"
+
+        response = self.client.get("/api/v2/async/{}/events/".format(async_task.id + 1))
+        assert response.status_code == 404
+
+    def test_events_end_after_max_duration(self):
+        async_task = models.Async.objects.create()
+        with self.settings(ASYNC_EVENTS_MAX_DURATION=0):
+            response = self.client.get("/api/v2/async/{}/events/".format(async_task.id))
+            events = (
+                b"".join(response.streaming_content)
+                .decode("utf8")
+                .strip()
+                .split("\n\n")
+            )
+        assert len(events) == 2
+        assert "event: progress" in events[1].split("\n")
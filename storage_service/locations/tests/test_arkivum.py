@@ -2,11 +2,15 @@ from __future__ import absolute_import
 import os
 import requests
 import shutil
+import time
+from unittest import mock
 import vcr
 
+from django.core.cache import cache
 from django.test import TestCase
 
 from locations import models
+from locations.models import arkivum
 from . import TempDirMixin
 from six.moves import range
 
@@ -25,6 +29,7 @@ class TestArkivum(TempDirMixin, TestCase):
 
     def setUp(self):
         super(TestArkivum, self).setUp()
+        cache.clear()
         self.arkivum_object = models.Arkivum.objects.first()
         self.arkivum_object.space.path = str(self.tmpdir)
         self.arkivum_object.space.staging_path = str(self.tmpdir)
@@ -204,3 +209,72 @@ class TestArkivum(TempDirMixin, TestCase):
         self.arkivum_object.update_package_status(self.uncompressed_package)
         # Verify UPLOADED
         assert self.uncompressed_package.status == models.Package.UPLOADED
+
+    def test_is_file_local_uses_cached_package_info(self):
+        self.package.misc_attributes.update(
+            {"arkivum_identifier": "2e75c8ad-cded-4f7e-8ac7-85627a116e39"}
+        )
+        self.package.save()
+        cache.set(
+            arkivum._cache_key(arkivum.PACKAGE_INFO_CACHE_KEY, self.package),
+            {"time": time.time(), "info": {"fileInformation": {"local": True}}},
+        )
+        with mock.patch.object(models.Package, "save") as save, mock.patch.object(
+            models.Package, "is_compressed", new_callable=mock.PropertyMock
+        ) as is_compressed, mock.patch(
+            "locations.models.arkivum._get_session"
+        ) as get_session:
+            is_compressed.return_value = True
+            assert self.arkivum_object.is_file_local(self.package) is True
+        get_session.assert_not_called()
+        save.assert_not_called()
+
+    @vcr.use_cassette(
+        os.path.join(
+            FIXTURES_DIR, "vcr_cassettes", "arkivum_update_package_status.yaml"
+        )
+    )
+    def test_update_package_status_ignores_cached_package_info(self):
+        self.package.misc_attributes.update(
+            {"arkivum_identifier": "2e75c8ad-cded-4f7e-8ac7-85627a116e39"}
+        )
+        self.package.save()
+        key = arkivum._cache_key(arkivum.PACKAGE_INFO_CACHE_KEY, self.package)
+        cache.set(
+            key,
+            {
+                "time": time.time(),
+                "info": {"fileInformation": {"replicationState": "green"}},
+            },
+        )
+        # The first recorded response is yellow
+        self.arkivum_object.update_package_status(self.package)
+        assert self.package.status == models.Package.STAGING
+        cached = cache.get(key)
+        assert cached["info"]["fileInformation"]["replicationState"] == "yellow"
+
+    def test_check_package_fixity_ignores_cached_package_info(self):
+        cache.set(
+            arkivum._cache_key(
+                arkivum.PACKAGE_INFO_CACHE_KEY, self.uncompressed_package
+            ),
+            {
+                "time": time.time(),
+                "info": {"status": "Completed", "replicationState": "green"},
+            },
+        )
+        with mock.patch.object(
+            arkivum.Arkivum,
+            "_fetch_package_info",
+            return_value={
+                "status": "Failed",
+                "replicationState": "green",
+                "failures": [{"reason": "checksum mismatch", "filepath": "a"}],
+            },
+        ) as fetch:
+            success, errors, message, __ = self.arkivum_object.check_package_fixity(
+                self.uncompressed_package
+            )
+        fetch.assert_called_once_with(self.uncompressed_package)
+        assert success is False
+        assert message == "checksum mismatch"
@@ -482,3 +482,33 @@ class TestFixityLogDataTable(TestCase):
             log.datetime_reported.strftime("%Y-%m-%dT%H:%M:%S")
             for log in datatable.records
         ] == expected_datetimes
+
+    def test_packages_sorted_by_latest_fixity_check(self):
+        datatable = datatable_utils.PackageDataTable(
+            {
+                "iSortingCols": 1,
+                "iSortCol_0": 7,
+                "bSortable_7": "true",
+                "sSortDir_0": "asc",
+                "iDisplayStart": 0,
+                "iDisplayLength": 3,
+                "sEcho": "1",
+            }
+        )
+        # The packages never checked are sorted last, their latest checks are
+        # fetched with them
+        with self.assertNumQueries(1):
+            records = [
+                (
+                    package.uuid,
+                    package.latest_fixity_check_datetime,
+                    package.latest_fixity_check_result,
+                )
+                for package in datatable.records
+            ]
+        assert records[0][0] == "e0a41934-c1d7-45ba-9a95-a7531c063ed1"
+        assert records[0][1].strftime("%Y-%m-%d") == "2017-12-15"
+        assert records[0][2] is False
+        assert records[1][0] == "79245866-ca80-4f84-b904-a02b3e0ab621"
+        assert records[1][2] is True
+        assert records[2][1:] == (None, None)
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+from django.core.cache import cache
 from django.test import TestCase
 import os
 import vcr
@@ -25,6 +26,7 @@ class TestDataverse(TempDirMixin, TestCase):
         self.space = models.Space.objects.get(access_protocol="FS")
         self.space.staging_path = str(self.tmpdir)
         self.dest_path = str(self.tmpdir / "dataverse") + os.sep
+        cache.clear()
 
     def test_has_required_attributes(self):
         assert self.dataverse.host
@@ -50,6 +52,25 @@ class TestDataverse(TempDirMixin, TestCase):
         assert resp["properties"]["25"]["verbose name"] == "Constitive leaf ORAC"
         assert resp["properties"]["14"]["verbose name"] == "testjpg"
 
+    @vcr.use_cassette(
+        os.path.join(FIXTURES_DIR, "vcr_cassettes", "dataverse_browse_all.yaml")
+    )
+    def test_browse_paging(self):
+        """
+        It should return the datasets a page at a time.
+        It should cache the search results.
+        """
+        first = self.dataverse.browse("Query: *", limit=10)
+        assert len(first["entries"]) == 10
+        assert first["next_cursor"] == "10"
+        second = self.dataverse.browse("Query: *", cursor="10", limit=10)
+        assert len(second["entries"]) == 5
+        assert second["next_cursor"] is None
+        # Served from the cache, the cassette only has each page once
+        resp = self.dataverse.browse("Query: *")
+        assert resp["entries"] == first["entries"] + second["entries"]
+        assert "next_cursor" not in resp
+
     @vcr.use_cassette(
         os.path.join(FIXTURES_DIR, "vcr_cassettes", "dataverse_browse_filter.yaml")
     )
@@ -111,6 +132,21 @@ class TestDataverse(TempDirMixin, TestCase):
         assert "metadata" in os.listdir(self.dest_path)
         assert "agents.json" in os.listdir(os.path.join(self.dest_path, "metadata"))
         assert "dataset.json" in os.listdir(os.path.join(self.dest_path, "metadata"))
+        assert not [
+            name for name in os.listdir(self.dest_path) if name.endswith(".part")
+        ]
+
+    def test_get_datafile_checksum(self):
+        """It should prefer the typed checksum over the legacy MD5."""
+        get_checksum = self.dataverse._get_datafile_checksum
+        assert get_checksum(
+            {"checksum": {"type": "SHA-256", "value": "ABC"}, "md5": "def"}
+        ) == ("sha256", "abc")
+        assert get_checksum({"md5": "def"}) == ("md5", "def")
+        assert get_checksum({"checksum": {"type": "UNF", "value": "x"}}) == (
+            None,
+            None,
+        )
 
     def test_get_query_and_subtree(self):
         """Test the function that we're using to construct parts of the
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 import os
 import shutil
+import tarfile
+import zipfile
 
 from django.test import TestCase
 import vcr
@@ -86,6 +88,38 @@ class TestDSpace(TempDirMixin, TestCase):
         assert str(self.tmpdir / "metadata.zip") in split_paths
         assert (self.tmpdir / "metadata.zip").is_file()
 
+    def test_split_package_tar(self):
+        """It should split a tar package into objects and metadata ZIPs."""
+        zipfile.ZipFile(
+            os.path.join(FIXTURES_DIR, "small_compressed_bag.zip")
+        ).extractall(str(self.tmpdir / "extracted"))
+        path = str(self.tmpdir / "small_compressed_bag.tar.gz")
+        with tarfile.open(path, "w:gz") as tar:
+            tar.add(
+                str(self.tmpdir / "extracted" / "small_compressed_bag"),
+                "small_compressed_bag",
+            )
+        # Test
+        split_paths = self.dspace_object._split_package(path)
+        # Verify
+        assert split_paths == [
+            str(self.tmpdir / "objects.zip"),
+            str(self.tmpdir / "metadata.zip"),
+        ]
+        objects = zipfile.ZipFile(split_paths[0]).namelist()
+        assert sorted(objects) == [
+            "objects/",
+            "objects/Landing_zone-23d63923-82f7-412f-b308-389077aeb3a7.tif",
+            "objects/Landing_zone.jpg",
+        ]
+        metadata = zipfile.ZipFile(split_paths[1]).namelist()
+        assert "small_compressed_bag/data/objects/metadata/" in metadata
+        assert "small_compressed_bag/data/objects/Landing_zone.jpg" not in metadata
+        assert (
+            "small_compressed_bag/data/METS.1056123d-8a16-49c2-ac51-8e5fa367d8b5.xml"
+            in metadata
+        )
+
     def test_split_package_7z(self):
         """It should split a package into objects and metadata using 7Z."""
         shutil.copy(
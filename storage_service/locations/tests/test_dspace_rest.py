@@ -379,6 +379,8 @@ def test_move_from_storage_service(
         return FakeDSpaceRESTPOSTResponse()
 
     mocker.patch("requests.post", side_effect=mock_requests_post)
+    # Bitstreams are deposited over a pooled session
+    mocker.patch("requests.Session.post", side_effect=mock_requests_post)
 
     # Patch ``agentarchives.archivesspace.ArchivesSpaceClient``
     if (
@@ -430,18 +432,21 @@ def test_move_from_storage_service(
         package_source_path, AIP_DEST_PATH, package=package
     )
 
-    # Assertions about the 4 requests.post calls:
+    # Assertions about the 3 requests.post calls:
     # 1. login to DSpace,
     # 2. create a DSpace item
-    # 3. deposit a file to DSpace (.7z file for AIP; METS.xml file for DIP,
-    #    which is contrived, but makes the testing easier.)
-    # 4. logout from DSpace.
+    # 3. logout from DSpace.
     (
         actual_login_call,
         (_, actual_create_item_args, actual_create_item_kwargs),
-        (_, actual_bitstream_args, actual_bitstream_kwargs),
         actual_logout_call,
     ) = requests.post.mock_calls
+    # and the requests.Session.post call that deposits a file to DSpace (.7z
+    # file for AIP; METS.xml file for DIP, which is contrived, but makes the
+    # testing easier.)
+    (
+        (_, actual_bitstream_args, actual_bitstream_kwargs),
+    ) = requests.Session.post.mock_calls
     assert actual_login_call == mocker.call(
         DS_REST_LOGIN_URL,
         cookies=None,
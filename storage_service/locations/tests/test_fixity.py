@@ -0,0 +1,108 @@
+from __future__ import absolute_import
+
+import datetime
+import json
+from unittest import mock
+
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+
+from locations import fixity, models
+
+NEVER_CHECKED_AIP = "2f62b030-c3f4-4ac1-950f-fe47d0ddcd14"
+NEVER_CHECKED_AIC = "4781e745-96bc-4b06-995c-ee59fddf856d"
+CHECKED_LONG_AGO = "f0dfdc4c-7ba1-4e3f-a972-f2c55d870d04"
+CHECKED_RECENTLY = "577f74bd-a283-49e0-b4e2-f8abb81d2566"
+
+
+def _report(success, message=""):
+    return json.dumps(
+        {
+            "success": success,
+            "message": message,
+            "failures": {"files": {"missing": [], "changed": [], "untracked": []}},
+            "timestamp": None,
+        }
+    )
+
+
+class TestFixityScheduler(TestCase):
+
+    fixtures = ["base.json", "package.json"]
+
+    def setUp(self):
+        for package_uuid, days_ago in ((CHECKED_RECENTLY, 10), (CHECKED_LONG_AGO, 40)):
+            log = models.FixityLog.objects.create(package_id=package_uuid, success=True)
+            models.FixityLog.objects.filter(pk=log.pk).update(
+                datetime_reported=timezone.now() - datetime.timedelta(days=days_ago)
+            )
+
+    def test_get_packages_due(self):
+        """It should return the packages never checked first, then the oldest."""
+        due = [package.uuid for package in fixity.get_packages_due()]
+        assert due == [
+            NEVER_CHECKED_AIP,
+            NEVER_CHECKED_AIC,
+            CHECKED_LONG_AGO,
+            CHECKED_RECENTLY,
+        ]
+        due = fixity.get_packages_due(min_age=datetime.timedelta(days=30))
+        assert [package.uuid for package in due] == [
+            NEVER_CHECKED_AIP,
+            NEVER_CHECKED_AIC,
+            CHECKED_LONG_AGO,
+        ]
+
+    def test_get_packages_due_counts_files(self):
+        """It should count the files of each package once, whatever the
+        number of its fixity checks."""
+        package = models.Package.objects.get(uuid=CHECKED_RECENTLY)
+        for name in ("a.txt", "b.txt", "c.txt"):
+            models.File.objects.create(package=package, name=name)
+        models.FixityLog.objects.create(package=package, success=True)
+        file_counts = {
+            package.uuid: package.file_count for package in fixity.get_packages_due()
+        }
+        assert file_counts[CHECKED_RECENTLY] == 3
+        assert file_counts[NEVER_CHECKED_AIP] == 0
+
+    def test_io_budget(self):
+        """It should delay the next check by the cost of the previous ones."""
+        budget = fixity.IOBudget(bytes_per_second=100, iops=10)
+        assert budget.wait_time(0) == 0
+        budget.spend(0, 200, 5)
+        assert budget.wait_time(0) == 2
+        assert budget.wait_time(1.5) == 0.5
+        budget.spend(3, 0, 20)
+        assert budget.wait_time(3) == 2
+        assert fixity.IOBudget().wait_time(0) == 0
+
+    @mock.patch("locations.fixity._check_fixity")
+    def test_run(self, check_fixity):
+        """It should record every check and email one digest of the failures."""
+        check_fixity.side_effect = [
+            (False, _report(False, "Checksum mismatch")),
+            (True, _report(True)),
+            ValueError("Boom"),
+        ]
+        packages = list(fixity.get_packages_due())[:3]
+        results = []
+        scheduler = fixity.FixityScheduler(
+            processes=0, on_result=lambda *result: results.append(result[:2])
+        )
+
+        assert scheduler.run(packages) == 3
+
+        assert [(package.uuid, success) for package, success in results] == [
+            (NEVER_CHECKED_AIP, False),
+            (NEVER_CHECKED_AIC, True),
+            (CHECKED_LONG_AGO, None),
+        ]
+        log = models.FixityLog.objects.filter(package_id=CHECKED_LONG_AGO).latest(
+            "datetime_reported"
+        )
+        assert log.success is None
+        assert "Boom" in log.error_details
+        assert len(mail.outbox) == 1
+        assert NEVER_CHECKED_AIP in mail.outbox[0].body
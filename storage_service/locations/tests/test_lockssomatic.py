@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import hashlib
 import os
 
 from django.test import TestCase
 import vcr
 
 from locations import models
+from locations.models import lockssomatic
 
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 FIXTURES_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "fixtures"))
@@ -27,3 +29,35 @@ class TestLockssomatic(TestCase):
         assert self.lom_object.au_size == 0
         assert self.lom_object.collection_iri is None
         assert self.lom_object.checksum_type is None
+
+
+def test_hash_chunks(tmpdir):
+    package = tmpdir.join("package.7z")
+    package.write_binary(b"0123456789" * 5)
+
+    chunks = lockssomatic.hash_chunks(str(package), 20, "sha256")
+
+    assert [(chunk.offset, chunk.size) for chunk in chunks] == [
+        (0, 20),
+        (20, 20),
+        (40, 10),
+    ]
+    content = package.read_binary()
+    for chunk in chunks:
+        assert chunk.checksum.name == "sha256"
+        assert chunk.checksum.hexdigest() == (
+            hashlib.sha256(
+                content[chunk.offset : chunk.offset + chunk.size]
+            ).hexdigest()
+        )
+    # Nothing is written next to the package
+    assert tmpdir.listdir() == [package]
+
+
+def test_hash_chunks_defaults_to_md5(tmpdir):
+    package = tmpdir.join("package.7z")
+    package.write_binary(b"0123456789")
+
+    (chunk,) = lockssomatic.hash_chunks(str(package), 20, None)
+
+    assert chunk.checksum.name == "md5"
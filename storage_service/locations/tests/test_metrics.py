@@ -0,0 +1,59 @@
+from __future__ import absolute_import
+
+import pytest
+from prometheus_client import REGISTRY
+
+from locations import metrics
+from locations.models import Space
+
+
+def _sample(name, operation):
+    return (
+        REGISTRY.get_sample_value(name, {"protocol": "FS", "operation": operation}) or 0
+    )
+
+
+def test_instrument_storage_operation():
+    in_progress = []
+
+    @metrics.instrument_storage_operation("test_move")
+    def move(space, path):
+        in_progress.append(_sample("storage_operations_in_progress", "test_move"))
+        if not path:
+            raise ValueError("No path")
+        metrics.count_bytes(10)
+        return path
+
+    space = Space(access_protocol=Space.LOCAL_FILESYSTEM)
+    assert move(space, "package.txt") == "package.txt"
+    with pytest.raises(ValueError):
+        move(space, "")
+
+    assert in_progress == [1, 1]
+    assert _sample("storage_operations_in_progress", "test_move") == 0
+    assert _sample("storage_operation_duration_seconds_count", "test_move") == 2
+    assert _sample("storage_operation_errors_total", "test_move") == 1
+    assert _sample("storage_operation_bytes_total", "test_move") == 10
+
+
+def test_unsupported_operations_are_not_errors():
+    class Unsupported(Exception):
+        pass
+
+    @metrics.instrument_storage_operation(
+        "test_unsupported_move", unsupported=(Unsupported,)
+    )
+    def move(space):
+        metrics.count_bytes(10)
+        raise Unsupported()
+
+    with pytest.raises(Unsupported):
+        move(Space(access_protocol=Space.LOCAL_FILESYSTEM))
+
+    assert _sample("storage_operations_in_progress", "test_unsupported_move") == 0
+    assert _sample("storage_operation_errors_total", "test_unsupported_move") == 0
+    assert (
+        _sample("storage_operation_duration_seconds_count", "test_unsupported_move")
+        == 0
+    )
+    assert _sample("storage_operation_bytes_total", "test_unsupported_move") == 0
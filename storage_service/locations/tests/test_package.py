@@ -11,6 +11,7 @@ from unittest import mock
 
 import bagit
 from django.contrib.messages import get_messages
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
@@ -45,6 +46,8 @@ class TestPackage(TestCase):
     fixtures = ["base.json", "package.json", "arkivum.json", "callback.json"]
 
     def setUp(self):
+        # Answers from Arkivum are cached across tests otherwise
+        cache.clear()
         packages = models.Package.objects.all()
         assert (
             len(packages) == TOTAL_FIXTURE_PACKAGES
@@ -195,6 +198,20 @@ class TestPackage(TestCase):
         assert replicas[0].status == models.Package.UPLOADED
         assert replicas[1].status == models.Package.UPLOADED
 
+    def test_bulk_delete_reports_unexpected_errors(self):
+        package = models.Package.objects.get(
+            uuid="f0dfdc4c-7ba1-4e3f-a972-f2c55d870d04"
+        )
+        error = OSError("Disk unavailable")
+
+        # A single package is deleted without the pool of threads
+        with mock.patch("locations.models.Space.delete_path", side_effect=error):
+            results = models.Package.bulk_delete_from_storage([package])
+
+        assert results == {package.uuid: (False, error)}
+        package.refresh_from_db()
+        assert package.status == models.Package.UPLOADED
+
     def test_view_package_delete(self):
         self.client.login(username="test", password="test")
         url = reverse(
@@ -259,6 +276,61 @@ class TestPackage(TestCase):
                 " administrator or see logs for details.",
             )
 
+    def test_view_package_delete_request_approve_selected(self):
+        self.client.login(username="test", password="test")
+        pipeline = models.Pipeline.objects.create()
+        packages = list(
+            models.Package.objects.filter(
+                package_type=models.Package.AIP, status=models.Package.UPLOADED
+            )[:3]
+        )
+        events = [
+            models.Event.objects.create(
+                package=package,
+                event_type=models.Event.DELETE,
+                event_reason="Duplicate",
+                pipeline=pipeline,
+                user_id=1,
+                user_email="test@example.com",
+                status=models.Event.SUBMITTED,
+                store_data=package.status,
+            )
+            for package in packages
+        ]
+        results = {
+            packages[0].uuid: (True, None),
+            packages[1].uuid: (False, "Something went wrong"),
+        }
+
+        with mock.patch(
+            "locations.models.Package.bulk_delete_from_storage", return_value=results
+        ) as bulk_delete:
+            response = self.client.post(
+                reverse("locations:package_delete_request"),
+                {
+                    "events": [events[0].id, events[1].id],
+                    "status_reason": "Approved",
+                    "approve_selected": "Approve",
+                },
+                follow=True,
+            )
+
+        assert response.status_code == 200
+        assert {package.uuid for package in bulk_delete.call_args[0][0]} == set(results)
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        assert "Request approved: Package deleted successfully." in messages
+        assert any("Something went wrong" in message for message in messages)
+        assert [
+            (event.status, event.status_reason, event.package.status)
+            for event in models.Event.objects.filter(
+                id__in=[event.id for event in events]
+            ).order_by("id")
+        ] == [
+            (models.Event.APPROVED, "Approved", models.Package.DELETED),
+            (models.Event.APPROVED, "Approved", models.Package.UPLOADED),
+            (models.Event.SUBMITTED, None, models.Package.UPLOADED),
+        ]
+
     def test_parsing_mets_data(self):
         mets_data = self.package._parse_mets(prefix=self.mets_path)
         assert mets_data["transfer_uuid"] == "de1b31fa-97dd-48e0-8417-03be78359531"
@@ -494,6 +566,31 @@ class TestPackage(TestCase):
         assert output_path == os.path.join(self.tmp_dir, basedir)
         assert os.path.join(output_path, "manifest-md5.txt")
 
+    def test_record_format(self):
+        """It should record the format so that it is known without fetching
+        the package."""
+        uuid = "0d4e739b-bf60-4b87-bc20-67a379b28cea"
+        package = models.Package.objects.get(uuid=uuid)
+        assert package.compressed is None
+        package.record_format(package.get_local_path())
+        package.save()
+
+        package = models.Package.objects.get(uuid=uuid)
+        assert package.compressed is False
+        assert package.compression_algorithm is None
+        assert package.base_directory == "working_bag"
+        assert package.member_count == recursive_file_count(package.full_path)
+        assert package.payload_checksum_algorithm == "md5"
+        with mock.patch.object(
+            models.Package, "get_local_path"
+        ) as get_local_path, mock.patch.object(
+            models.Package, "fetch_local_path"
+        ) as fetch_local_path:
+            assert package.is_compressed is False
+            assert package.get_base_directory() == "working_bag"
+        assert not get_local_path.called
+        assert not fetch_local_path.called
+
     def test_run_post_store_callbacks_aip(self):
         uuid = "473a9398-0024-4804-81da-38946040c8af"
         aip = models.Package.objects.get(uuid=uuid)
@@ -622,6 +719,26 @@ class TestPackage(TestCase):
         assert replica.replicas.count() == 0
         self._test_bagit_structure(aip.replicas.first(), replication_dir)
 
+    @mock.patch("locations.models.Space.stream_move")
+    def test_replicate_aip_uncompressed_is_staged(self, mock_stream_move):
+        """Ensure that an uncompressed AIP is replicated through staging, so
+        that the checksum of the whole replica can be computed.
+        """
+        space_dir = tempfile.mkdtemp(dir=self.tmp_dir, prefix="space")
+        replication_dir = tempfile.mkdtemp(dir=self.tmp_dir, prefix="replication")
+        aip = models.Package.objects.get(uuid="0d4e739b-bf60-4b87-bc20-67a379b28cea")
+        aip.current_location.space.staging_path = space_dir
+        aip.current_location.space.save()
+        aip.current_location.replicators.create(
+            space=aip.current_location.space,
+            relative_path=replication_dir,
+            purpose=models.Location.REPLICATOR,
+        )
+        aip.create_replicas()
+        assert aip.replicas.count() == 1
+        mock_stream_move.assert_not_called()
+        self._test_bagit_structure(aip.replicas.first(), replication_dir)
+
     def test_replicate_aic(self):
         """Ensure that replication works for AICs as well as AIPs."""
         space_dir = tempfile.mkdtemp(dir=self.tmp_dir, prefix="space")
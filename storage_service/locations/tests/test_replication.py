@@ -0,0 +1,99 @@
+from __future__ import absolute_import
+
+from unittest import mock
+
+from django.test import TestCase
+
+from locations import models, replication
+
+AIP_UUID = "f0dfdc4c-7ba1-4e3f-a972-f2c55d870d04"
+
+
+class TestReplicationScheduler(TestCase):
+
+    fixtures = ["base.json", "package.json"]
+
+    def setUp(self):
+        self.aip = models.Package.objects.get(uuid=AIP_UUID)
+        self.replicators = [
+            self.aip.current_location.replicators.create(
+                space=self.aip.current_location.space,
+                relative_path="replication{}".format(index),
+                purpose=models.Location.REPLICATOR,
+            )
+            for index in range(2)
+        ]
+
+    def test_get_replication_jobs(self):
+        """It should return a job per AIP and replicator, largest AIPs first."""
+        location_uuid = self.aip.current_location.uuid
+        jobs = replication.get_replication_jobs(location_uuid)
+
+        aips = models.Package.objects.filter(
+            current_location=location_uuid,
+            package_type=models.Package.AIP,
+            replicated_package=None,
+            status=models.Package.UPLOADED,
+        )
+        assert self.aip in aips
+        assert len(jobs) == 2 * aips.count()
+        assert [job.size for job in jobs] == sorted(
+            (job.size for job in jobs), reverse=True
+        )
+        assert {job.replicator_uuid for job in jobs} == {
+            replicator.uuid for replicator in self.replicators
+        }
+        jobs = replication.get_replication_jobs(
+            location_uuid,
+            aip_uuid=AIP_UUID,
+            replicator_uuid=self.replicators[1].uuid,
+        )
+        assert jobs == [
+            replication.ReplicationJob(
+                AIP_UUID,
+                self.replicators[1].uuid,
+                self.aip.current_location.space.uuid,
+                299703,
+            )
+        ]
+
+    @mock.patch("locations.replication._replicate")
+    def test_run(self, replicate):
+        """It should run every job in order and report their results."""
+        replicate.side_effect = [
+            replication.ReplicationResult(True, 1, []),
+            ValueError("Boom"),
+            replication.ReplicationResult(False, 0, ["Unable to delete"]),
+        ]
+        jobs = [
+            replication.ReplicationJob("a", "r1", "s1", 30),
+            replication.ReplicationJob("a", "r2", "s2", 30),
+            replication.ReplicationJob("b", "r1", "s1", 20),
+        ]
+        results = []
+        scheduler = replication.ReplicationScheduler(
+            processes=0,
+            delete=True,
+            on_result=lambda *result: results.append(result),
+        )
+
+        assert scheduler.run(jobs) == 1
+
+        assert [call[0] for call in replicate.call_args_list] == [
+            ("a", "r1", True),
+            ("a", "r2", True),
+            ("b", "r1", True),
+        ]
+        assert [job for job, __, __ in results] == jobs
+        assert str(results[1][2]) == "Boom"
+
+    def test_estimate_duration(self):
+        jobs = [
+            replication.ReplicationJob("a", "r1", "s1", 300),
+            replication.ReplicationJob("b", "r1", "s1", 100),
+            replication.ReplicationJob("a", "r2", "s2", 300),
+        ]
+        with mock.patch.object(replication, "ESTIMATED_BYTES_PER_SECOND", 10):
+            assert replication.estimate_duration(jobs, 4, 1, 0) == 40
+            assert replication.estimate_duration(jobs, 1, 1, 0) == 70
+            assert replication.estimate_duration(jobs, 4, 2, 5) == 80
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 
+import hashlib
 import os
+import tempfile
 from unittest import mock
 
 import botocore
@@ -17,6 +19,10 @@ THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 FIXTURES_DIR = os.path.abspath(os.path.join(THIS_DIR, "..", "fixtures"))
 
 
+def md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
 class TestS3Storage(TestCase):
 
     fixtures = ["base.json", "s3.json"]
@@ -90,3 +96,82 @@ class TestS3Storage(TestCase):
         assert "timestamp" in properties
         assert properties["e_tag"] == '"e917f867114dedf9bdb430e838da647d"'
         assert properties["size"] == 1564
+
+    def test_delete_path_in_batches(self):
+        bucket = mock.Mock()
+        bucket.objects.filter.return_value = [
+            mock.Mock(key="aips/aip/{}".format(index)) for index in range(2500)
+        ]
+        bucket.delete_objects.return_value = {}
+        self.s3_object._resource = mock.Mock(**{"Bucket.return_value": bucket})
+
+        self.s3_object.delete_path("/aips/aip")
+
+        bucket.objects.filter.assert_called_once_with(Prefix="aips/aip")
+        batches = [
+            call[1]["Delete"]["Objects"]
+            for call in bucket.delete_objects.call_args_list
+        ]
+        assert [len(batch) for batch in batches] == [1000, 1000, 500]
+        assert batches[2][-1] == {"Key": "aips/aip/2499"}
+
+        bucket.delete_objects.return_value = {
+            "Errors": [{"Key": "aips/aip/0", "Message": "Access Denied"}]
+        }
+        with pytest.raises(models.StorageException):
+            self.s3_object.delete_path("aips/aip")
+        bucket.objects.filter.return_value = []
+        with pytest.raises(models.StorageException):
+            self.s3_object.delete_path("aips/aip")
+
+    def test_move_from_ss_resumes_multipart_upload(self):
+        client = mock.Mock()
+        client.get_paginator.return_value.paginate.return_value = [
+            {
+                "Parts": [
+                    {"PartNumber": 1, "ETag": '"{}"'.format(md5(b"0123"))},
+                    {"PartNumber": 2, "ETag": '"{}"'.format(md5(b"4567"))},
+                    {"PartNumber": 3, "ETag": '"{}"'.format(md5(b"..."))},
+                ]
+            }
+        ]
+        client.upload_part.return_value = {"ETag": '"new"'}
+        bucket = mock.Mock(**{"meta.client": client})
+        self.s3_object._resource = mock.Mock(**{"Bucket.return_value": bucket})
+        checkpoint = mock.Mock(
+            upload_path="aips/aip.7z",
+            upload_id="upload",
+            **{"is_completed.return_value": False}
+        )
+
+        with tempfile.NamedTemporaryFile() as aip, mock.patch(
+            "locations.models.s3.MULTIPART_CHUNK_SIZE", 4
+        ):
+            aip.write(b"0123456789")
+            aip.flush()
+            self.s3_object.move_from_storage_service(
+                aip.name,
+                "/aips/aip.7z",
+                package=mock.Mock(transfer_checkpoint=checkpoint),
+            )
+
+        client.create_multipart_upload.assert_not_called()
+        assert [
+            call[1]["PartNumber"] for call in client.upload_part.call_args_list
+        ] == [3]
+        client.complete_multipart_upload.assert_called_once_with(
+            Bucket="test-bucket",
+            Key="aips/aip.7z",
+            UploadId="upload",
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": 1, "ETag": '"{}"'.format(md5(b"0123"))},
+                    {"PartNumber": 2, "ETag": '"{}"'.format(md5(b"4567"))},
+                    {"PartNumber": 3, "ETag": '"new"'},
+                ]
+            },
+        )
+        checkpoint.record_bytes.assert_called_once_with(2)
+        checkpoint.record_file.assert_called_once_with("aips/aip.7z")
+        checkpoint.record_upload.assert_called_once_with(None, None)
+        bucket.upload_fileobj.assert_not_called()
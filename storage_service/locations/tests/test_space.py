@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+import hashlib
+import io
 import os
 import subprocess
 
@@ -9,8 +11,14 @@ from scandir import scandir
 import shutil
 
 import six
+from django.core.cache import cache
 
-from locations.models import Space
+from locations.models import (
+    PipelineLocalFS,
+    Space,
+    StorageException,
+    StreamMoveUnsupportedError,
+)
 from locations.models.space import path2browse_dict
 
 
@@ -528,6 +536,26 @@ def test_delete_non_existant_path_local(tmpdir, aipstore_uncompressed):
         assert os.path.exists(remaining_aip)
 
 
+def test_move_rsync_counts_bytes_sent(mocker):
+    mocker.patch(
+        "subprocess.Popen",
+        return_value=mocker.Mock(
+            **{
+                "communicate.return_value": (
+                    b"sent 1,203 bytes  received 35 bytes  2,476.00 bytes/sec\n",
+                    None,
+                ),
+                "returncode": 0,
+            }
+        ),
+    )
+    count_bytes = mocker.patch("locations.metrics.count_bytes")
+
+    Space().move_rsync("source_dir", "user@host:destination_dir")
+
+    count_bytes.assert_called_once_with(1203)
+
+
 def test_move_rsync_command_decodes_paths(mocker):
     popen = mocker.patch(
         "subprocess.Popen",
@@ -536,7 +564,7 @@ def test_move_rsync_command_decodes_paths(mocker):
         ),
     )
     space = Space()
-    space.move_rsync("source_dir", "destination_dir")
+    space.move_rsync("source_dir", "user@host:destination_dir")
 
     popen.assert_called_once_with(
         [
@@ -548,69 +576,195 @@ def test_move_rsync_command_decodes_paths(mocker):
             "--chmod=Fug+rw,o-rwx,Dug+rwx,o-rwx",
             "-r",
             "source_dir",
-            "destination_dir",
+            "user@host:destination_dir",
         ],
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
     )
 
 
+def test_move_rsync_copies_local_paths_natively(tmp_path, mocker):
+    popen = mocker.patch("subprocess.Popen")
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "file.txt").write_text(u"data")
+    destination = tmp_path / "destination"
+
+    Space().move_rsync(os.path.join(str(source), ""), str(destination))
+
+    assert not popen.called
+    assert (destination / "file.txt").read_text() == u"data"
+
+
 def test_create_rsync_directory_commands_decode_paths(tmp_path, mocker):
     temp_dir = tmp_path / "tmp"
     temp_dir.mkdir()
     dest_dir = "/a/mock/path/"
+    created = []
 
-    check_call = mocker.patch("subprocess.check_call")
+    check_call = mocker.patch(
+        "subprocess.check_call",
+        side_effect=lambda cmd: created.append(
+            (temp_dir / "a" / "mock" / "path").is_dir()
+        ),
+    )
     mocker.patch("tempfile.mkdtemp", return_value=str(temp_dir))
 
     space = Space()
     space.create_rsync_directory(dest_dir, "user", "host")
 
-    check_call.assert_has_calls(
+    # A single rsync creates all the directories
+    check_call.assert_called_once_with(
         [
-            mocker.call(
-                [
-                    "rsync",
-                    "-vv",
-                    "--protect-args",
-                    "--chmod=ug=rwx,o=rx",
-                    "--recursive",
-                    os.path.join(str(temp_dir), ""),
-                    "user@host:/",
-                ]
-            ),
-            mocker.call(
-                [
-                    "rsync",
-                    "-vv",
-                    "--protect-args",
-                    "--chmod=ug=rwx,o=rx",
-                    "--recursive",
-                    os.path.join(str(temp_dir), ""),
-                    "user@host:/a/",
-                ]
-            ),
-            mocker.call(
-                [
-                    "rsync",
-                    "-vv",
-                    "--protect-args",
-                    "--chmod=ug=rwx,o=rx",
-                    "--recursive",
-                    os.path.join(str(temp_dir), ""),
-                    "user@host:/a/mock/",
-                ]
-            ),
-            mocker.call(
-                [
-                    "rsync",
-                    "-vv",
-                    "--protect-args",
-                    "--chmod=ug=rwx,o=rx",
-                    "--recursive",
-                    os.path.join(str(temp_dir), ""),
-                    "user@host:/a/mock/path/",
-                ]
-            ),
+            "rsync",
+            "-vv",
+            "--protect-args",
+            "--chmod=ug=rwx,o=rx",
+            "--recursive",
+            "--relative",
+            "--no-implied-dirs",
+            "--keep-dirlinks",
+            os.path.join(str(temp_dir), ".", "a/mock/path", ""),
+            "user@host:/",
         ]
     )
+    assert created == [True]
+    assert not temp_dir.exists()
+
+    check_call.reset_mock()
+    space.create_rsync_directory("file.txt", "user", "host")
+    assert not check_call.called
+
+
+def test_create_rsync_directory_shares_ssh_connection(tmp_path, mocker):
+    mocker.patch("tempfile.mkdtemp", return_value=str(tmp_path / "tmp"))
+    check_call = mocker.patch("subprocess.check_call")
+    pipeline_local = PipelineLocalFS(
+        space=Space(uuid="6ba7b810-9dad-11d1-80b4-00c04fd430c8", path="/"),
+        remote_user="user",
+        remote_name="host",
+    )
+
+    pipeline_local.space.create_rsync_directory(
+        "a/file.txt", "user", "host", ssh_options=pipeline_local.ssh_options
+    )
+
+    command = check_call.call_args[0][0]
+    assert command[-1] == "user@host:"
+    rsh = command[command.index("--rsh") + 1].split()
+    assert rsh[0] == "ssh"
+    assert "ControlMaster=auto" in rsh
+    assert any(
+        option.startswith("ControlPath=") and "ss-6ba7b810-%C" in option
+        for option in rsh
+    )
+
+    pipeline_local.assume_rsync_daemon = True
+    assert pipeline_local.ssh_options == []
+
+
+def test_browse_rsync(mocker, settings):
+    settings.RSYNC_BROWSE_CACHE_TTL = 60
+    cache.clear()
+    directory = [b"drwxrws---          4,096 2015/03/02 17:05:20 path\n"]
+    listing = [
+        b"drwxrws---          4,096 2015/03/02 17:05:20 .\n",
+        b"-rw-r--r--            201 2013/05/13 13:26:48 LICENSE.md\n",
+        b"lrwxrwxrwx             78 2015/02/19 12:13:40 sharedDirectory\n",
+        b"drwxrws---          4,096 2015/03/02 17:05:20 Tmp\n",
+    ]
+    outputs = []
+
+    def popen(command, **kwargs):
+        process = mocker.Mock()
+        process.stdout = io.BytesIO(b"".join(outputs.pop(0)))
+        process.wait.return_value = 0
+        return process
+
+    mocker.patch("subprocess.Popen", side_effect=popen)
+    space = Space()
+
+    outputs.extend([directory, listing])
+    result = space.browse_rsync("user@host:/path/", limit=2)
+    assert result == {
+        "directories": ["sharedDirectory"],
+        "entries": ["LICENSE.md", "sharedDirectory"],
+        "properties": {
+            "LICENSE.md": {"timestamp": "2013-05-13T13:26:48", "size": 201},
+            "sharedDirectory": {"timestamp": "2015-02-19T12:13:40"},
+        },
+        "next_cursor": "2",
+    }
+
+    # The listing is cached until the directory is modified
+    outputs.append(directory)
+    result = space.browse_rsync("user@host:/path/", cursor="2", limit=2)
+    assert result["entries"] == ["Tmp"]
+    assert result["next_cursor"] is None
+    assert not outputs
+
+    outputs.extend([[directory[0].replace(b"17:05:20", b"17:06:00")], listing[:2]])
+    assert space.browse_rsync("user@host:/path/")["entries"] == ["LICENSE.md"]
+    assert not outputs
+
+
+def test_stream_move(tmp_path, mocker):
+    source_dir = tmp_path / "source"
+    (source_dir / "sub").mkdir(parents=True)
+    (source_dir / "a.txt").write_bytes(b"a")
+    (source_dir / "sub" / "b.txt").write_bytes(b"b" * 10)
+    source = Space(path=str(tmp_path))
+    destination = Space(path="/bucket")
+    written = {}
+
+    def write_stream(path, size, chunks, package=None):
+        written[path] = b"".join(chunks)
+        assert size == len(written[path])
+
+    mocker.patch.object(
+        source,
+        "get_child_space",
+        return_value=mocker.Mock(
+            spec=["read_stream"], read_stream=source.read_stream_local
+        ),
+    )
+    destination_child = mocker.Mock(spec=["write_stream"])
+    destination_child.write_stream.side_effect = write_stream
+    mocker.patch.object(destination, "get_child_space", return_value=destination_child)
+
+    checksums = source.stream_move("source", "aips/source", destination)
+
+    assert checksums == {
+        "a.txt": hashlib.md5(b"a").hexdigest(),
+        os.path.join("sub", "b.txt"): hashlib.md5(b"b" * 10).hexdigest(),
+    }
+    assert written == {
+        "/bucket/aips/source/a.txt": b"a",
+        "/bucket/aips/source/sub/b.txt": b"b" * 10,
+    }
+
+    checksums = source.stream_move(
+        "source/a.txt", "a.txt", destination, checksum_algorithm="sha256"
+    )
+    assert checksums == {"": hashlib.sha256(b"a").hexdigest()}
+
+    # The destination reports the MD5 checksum of what it stored
+    destination_child.write_stream.side_effect = None
+    destination_child.write_stream.return_value = "bad"
+    with pytest.raises(StorageException):
+        source.stream_move("source/a.txt", "a.txt", destination)
+
+
+def test_stream_move_unsupported(mocker):
+    source = Space()
+    destination = Space()
+    posix_child = mocker.Mock(spec=["posix_move", "read_stream", "write_stream"])
+    mocker.patch.object(source, "get_child_space", return_value=posix_child)
+    mocker.patch.object(destination, "get_child_space", return_value=posix_child)
+
+    with pytest.raises(StreamMoveUnsupportedError):
+        source.stream_move("source", "destination", destination)
+
+    destination.get_child_space.return_value = mocker.Mock(spec=["browse"])
+    with pytest.raises(StreamMoveUnsupportedError):
+        source.stream_move("source", "destination", destination)
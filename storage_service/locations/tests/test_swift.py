@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
+import hashlib
+import json
 import os
+from unittest import mock
 
 from django.test import TestCase
 import pytest
+import swiftclient
 import vcr
 
 from locations import models
@@ -169,3 +173,81 @@ class TestSwift(TempDirMixin, TestCase):
         # Verify deleted
         resp = self.swift_object.browse("transfers/SampleTransfers/")
         assert "test" not in resp["directories"]
+
+    def test_delete_folder_in_bulk(self):
+        connection = mock.Mock()
+        connection.delete_object.side_effect = swiftclient.exceptions.ClientException(
+            "Not Found"
+        )
+        connection.get_container.side_effect = [
+            ({}, [{"name": "aips/aip/{}".format(index)} for index in range(3)]),
+            swiftclient.exceptions.ClientException("Not Found", http_status=404),
+        ]
+        connection.get_capabilities.return_value = {
+            "bulk_delete": {"max_deletes_per_request": 2}
+        }
+        connection.post_account.return_value = (
+            {},
+            b'{"Number Deleted": 2, "Response Status": "200 OK", "Errors": []}',
+        )
+        self.swift_object._connection = connection
+
+        self.swift_object.delete_path("aips/aip")
+
+        assert [
+            call[1]["data"].splitlines()
+            for call in connection.post_account.call_args_list
+        ] == [
+            [b"/artefactual/aips/aip/0", b"/artefactual/aips/aip/1"],
+            [b"/artefactual/aips/aip/2"],
+        ]
+        connection.delete_object.assert_called_once_with("artefactual", "aips/aip")
+
+        connection.get_container.side_effect = [
+            ({}, [{"name": "aips/aip/{}".format(index)} for index in range(3)]),
+        ]
+        connection.post_account.return_value = (
+            {},
+            b'{"Response Status": "400 Bad Request",'
+            b' "Errors": [["/artefactual/aips/aip/0", "403 Forbidden"]]}',
+        )
+        with pytest.raises(models.StorageException):
+            self.swift_object.delete_path("aips/aip")
+
+    def test_move_from_ss_resumes_segments(self):
+        connection = mock.Mock()
+        connection.get_container.return_value = (
+            {},
+            [
+                {
+                    "name": "aips/aip.7z/slo/10/4/00000000",
+                    "hash": hashlib.md5(b"0123").hexdigest(),
+                }
+            ],
+        )
+        self.swift_object._connection = connection
+        aip = self.tmpdir / "aip.7z"
+        aip.write_bytes(b"0123456789")
+        checkpoint = mock.Mock(**{"is_completed.return_value": False})
+
+        with mock.patch("locations.models.swift.SEGMENT_SIZE", 4):
+            self.swift_object.move_from_storage_service(
+                str(aip),
+                "aips/aip.7z",
+                package=mock.Mock(transfer_checkpoint=checkpoint),
+            )
+
+        segments = connection.put_object.call_args_list[:-1]
+        assert [call[1]["obj"] for call in segments] == [
+            "aips/aip.7z/slo/10/4/00000001",
+            "aips/aip.7z/slo/10/4/00000002",
+        ]
+        assert [call[1]["content_length"] for call in segments] == [4, 2]
+        manifest = connection.put_object.call_args_list[-1]
+        assert manifest[0] == ("artefactual",)
+        assert manifest[1]["query_string"] == "multipart-manifest=put"
+        assert [
+            segment["size_bytes"] for segment in json.loads(manifest[1]["contents"])
+        ] == [4, 4, 2]
+        checkpoint.record_bytes.assert_has_calls([mock.call(4), mock.call(2)])
+        checkpoint.record_file.assert_called_once_with("aips/aip.7z")
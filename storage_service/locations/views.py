@@ -159,6 +159,10 @@ class PackageRequestHandlerConfig(object):
     def execution_logic(package):  # Logic performed on package if approved
         pass
 
+    # Logic performed on several packages approved at once, returning the
+    # result of execution_logic for each package UUID. Optional.
+    bulk_execution_logic = None
+
 
 @permission_required("locations.change_package", raise_exception=True)
 def aip_recover_request(request):
@@ -249,6 +253,7 @@ def package_delete_request(request):
     config.execution_success_message = _("Package deleted successfully.")
     config.execution_fail_message = _("Package was not deleted from disk correctly")
     config.execution_logic = execution_logic
+    config.bulk_execution_logic = Package.bulk_delete_from_storage
 
     return _handle_package_request(request, config, "locations:package_delete_request")
 
@@ -257,8 +262,37 @@ def _handle_package_request(request, config, view_name):
     request_events = Event.objects.filter(status=Event.SUBMITTED).filter(
         event_type=config.event_type
     )
-
-    if request.method == "POST":
+    bulk_form = None
+
+    if request.method == "POST" and (
+        "approve_selected" in request.POST or "reject_selected" in request.POST
+    ):
+        bulk_form = forms.BulkConfirmEventForm(request.POST, events=request_events)
+        if bulk_form.is_valid():
+            events = list(bulk_form.cleaned_data["events"])
+            for event in events:
+                event.status_reason = bulk_form.cleaned_data["status_reason"]
+                event.admin_id = auth.get_user(request)
+            if "reject_selected" in request.POST:
+                for event in events:
+                    _reject_package_request(request, config, event)
+            else:
+                packages = [event.package for event in events]
+                if config.bulk_execution_logic is not None:
+                    results = config.bulk_execution_logic(packages)
+                else:
+                    results = {
+                        package.uuid: config.execution_logic(package)
+                        for package in packages
+                    }
+                for event in events:
+                    success, err_msg = results[event.package.uuid]
+                    _approve_package_request(request, config, event, success, err_msg)
+            for event in events:
+                event.save()
+                event.package.save()
+            return redirect(view_name)
+    elif request.method == "POST":
         # FIXME won't scale with many pending deletes, since does linear search
         # on all the forms
         for req in request_events:
@@ -271,60 +305,19 @@ def _handle_package_request(request, config, view_name):
                 event.admin_id = auth.get_user(request)
                 # Handle administrator decision and optionally notify remote REST endpoint
                 if "reject" in request.POST:
-                    event.status = Event.REJECTED
-                    # Request is rejected so the package status set back to
-                    # what it was stored as previously.
-                    event.package.status = event.store_data
-                    notification_message = (
-                        _handle_package_request_remote_result_notification(
-                            config, event, False
-                        )
-                    )
-                    if notification_message:
-                        config.reject_message += " " + notification_message
-                    messages.success(request, config.reject_message)
+                    _reject_package_request(request, config, event)
                 elif "approve" in request.POST:
-                    event.status = Event.APPROVED
                     success, err_msg = config.execution_logic(event.package)
-                    if not success:
-                        error_message = "{}: {}. {}".format(
-                            config.execution_fail_message,
-                            err_msg,
-                            _(
-                                "Please contact an administrator or see logs for details."
-                            ),
-                        )
-                        notification_message = (
-                            _handle_package_request_remote_result_notification(
-                                config, event, False
-                            )
-                        )
-                        if notification_message:
-                            error_message += " " + notification_message
-                        messages.error(request, error_message)
-                    else:
-                        # Package deletion was a success so update the package
-                        # status per the event.
-                        event.package.status = config.approved_status
-                        approval_message = _("Request approved: %(message)s") % {
-                            "message": config.execution_success_message
-                        }
-                        notification_message = (
-                            _handle_package_request_remote_result_notification(
-                                config, event, True
-                            )
-                        )
-                        if notification_message:
-                            approval_message += " " + notification_message
-                        messages.success(request, approval_message)
-                        if err_msg:
-                            messages.info(request, err_msg)
+                    _approve_package_request(request, config, event, success, err_msg)
                 event.save()
                 event.package.save()
                 return redirect(view_name)
-    else:
-        for req in request_events:
+
+    for req in request_events:
+        if not hasattr(req, "form"):
             req.form = forms.ConfirmEventForm(prefix=str(req.id), instance=req)
+    if bulk_form is None:
+        bulk_form = forms.BulkConfirmEventForm(events=request_events)
 
     closed_requests = Event.objects.filter(
         Q(status=Event.APPROVED) | Q(status=Event.REJECTED)
@@ -333,12 +326,59 @@ def _handle_package_request(request, config, view_name):
     return render(request, "locations/package_request.html", locals())
 
 
+def _reject_package_request(request, config, event):
+    event.status = Event.REJECTED
+    # Request is rejected so the package status set back to
+    # what it was stored as previously.
+    event.package.status = event.store_data
+    reject_message = config.reject_message
+    notification_message = _handle_package_request_remote_result_notification(
+        config, event, False
+    )
+    if notification_message:
+        reject_message += " " + notification_message
+    messages.success(request, reject_message)
+
+
+def _approve_package_request(request, config, event, success, err_msg):
+    """Record the approval of ``event`` and the ``success`` of its execution
+    and notify the remote REST endpoint."""
+    event.status = Event.APPROVED
+    if not success:
+        error_message = "{}: {}. {}".format(
+            config.execution_fail_message,
+            err_msg,
+            _("Please contact an administrator or see logs for details."),
+        )
+        notification_message = _handle_package_request_remote_result_notification(
+            config, event, False
+        )
+        if notification_message:
+            error_message += " " + notification_message
+        messages.error(request, error_message)
+    else:
+        # Package deletion was a success so update the package
+        # status per the event.
+        event.package.status = config.approved_status
+        approval_message = _("Request approved: %(message)s") % {
+            "message": config.execution_success_message
+        }
+        notification_message = _handle_package_request_remote_result_notification(
+            config, event, True
+        )
+        if notification_message:
+            approval_message += " " + notification_message
+        messages.success(request, approval_message)
+        if err_msg:
+            messages.info(request, err_msg)
+
+
 def _handle_package_request_remote_result_notification(config, event, success):
     response_message = None
 
     # Setting name is determined using event type
     setting_prefix = "{}_request_notification".format(config.event_type.lower())
-    request_notification_url = utils.get_setting("{}_url".format(setting_prefix))
+    request_notification_url = utils.get_str_setting("{}_url".format(setting_prefix))
 
     # If notification is configured, attempt
     if request_notification_url is not None:
@@ -359,10 +399,10 @@ def _handle_package_request_remote_result_notification(config, event, success):
         )
 
         # Specify basic authentication, if configured
-        request_notification_auth_username = utils.get_setting(
+        request_notification_auth_username = utils.get_str_setting(
             "{}_auth_username".format(setting_prefix)
         )
-        request_notification_auth_password = utils.get_setting(
+        request_notification_auth_password = utils.get_str_setting(
             "{}_auth_password".format(setting_prefix)
         )
 
@@ -553,7 +593,7 @@ def pipeline_edit(request, uuid=None):
         pipeline = None
         initial = {
             "create_default_locations": True,
-            "enabled": not utils.get_setting("pipelines_disabled"),
+            "enabled": not utils.get_bool_setting("pipelines_disabled"),
         }
 
     if request.method == "POST":
@@ -615,6 +615,192 @@ except ValueError:
 
 GNUPG_HOME_PATH = environ.get("SS_GNUPG_HOME_PATH", None)
 
+# Number of GnuPG processes encrypting or decrypting packages at the same time
+# in each Storage Service process.
+try:
+    GNUPG_PROCESSES = int(environ.get("SS_GNUPG_PROCESSES", 4))
+except ValueError:
+    GNUPG_PROCESSES = 4
+
+# Number of files of a SWORD batch deposit that are downloaded concurrently.
+try:
+    SWORD_DOWNLOAD_CONCURRENCY = int(environ.get("SS_SWORD_DOWNLOAD_CONCURRENCY", 4))
+except ValueError:
+    SWORD_DOWNLOAD_CONCURRENCY = 4
+
+# Dataverse search results and dataset file lists used to browse a Dataverse
+# space are cached for these many seconds.
+try:
+    DATAVERSE_BROWSE_CACHE_TTL = int(environ.get("SS_DATAVERSE_BROWSE_CACHE_TTL", 60))
+except ValueError:
+    DATAVERSE_BROWSE_CACHE_TTL = 60
+
+# Number of files of a Dataverse dataset that are downloaded concurrently.
+try:
+    DATAVERSE_DOWNLOAD_CONCURRENCY = int(
+        environ.get("SS_DATAVERSE_DOWNLOAD_CONCURRENCY", 4)
+    )
+except ValueError:
+    DATAVERSE_DOWNLOAD_CONCURRENCY = 4
+
+# Number of files of a DIP that are deposited concurrently to DSpace via its
+# REST API.
+try:
+    DSPACE_DEPOSIT_CONCURRENCY = int(environ.get("SS_DSPACE_DEPOSIT_CONCURRENCY", 4))
+except ValueError:
+    DSPACE_DEPOSIT_CONCURRENCY = 4
+
+# Arkivum answers about the status and locality of packages are cached for
+# these many seconds, see locations.models.arkivum.
+try:
+    ARKIVUM_STATUS_CACHE_TTL = int(environ.get("SS_ARKIVUM_STATUS_CACHE_TTL", 300))
+except ValueError:
+    ARKIVUM_STATUS_CACHE_TTL = 300
+try:
+    ARKIVUM_LOCALITY_CACHE_TTL = int(environ.get("SS_ARKIVUM_LOCALITY_CACHE_TTL", 60))
+except ValueError:
+    ARKIVUM_LOCALITY_CACHE_TTL = 60
+try:
+    ARKIVUM_REQUEST_TIMEOUT = int(environ.get("SS_ARKIVUM_REQUEST_TIMEOUT", 30))
+except ValueError:
+    ARKIVUM_REQUEST_TIMEOUT = 30
+try:
+    ARKIVUM_STATUS_CONCURRENCY = int(environ.get("SS_ARKIVUM_STATUS_CONCURRENCY", 4))
+except ValueError:
+    ARKIVUM_STATUS_CONCURRENCY = 4
+
+# Scheduled fixity checks, see locations.fixity and the run_fixity_checks
+# command: number of worker processes, per Space budget of bytes read and
+# operations per second (0 is unlimited), minimum number of days between the
+# checks of a package and maximum number of seconds between the digests of
+# failed checks emailed to the administrators.
+try:
+    FIXITY_PROCESSES = int(environ.get("SS_FIXITY_PROCESSES", 2))
+except ValueError:
+    FIXITY_PROCESSES = 2
+try:
+    FIXITY_SPACE_BYTES_PER_SECOND = int(
+        environ.get("SS_FIXITY_SPACE_BYTES_PER_SECOND", 0)
+    )
+except ValueError:
+    FIXITY_SPACE_BYTES_PER_SECOND = 0
+try:
+    FIXITY_SPACE_IOPS = int(environ.get("SS_FIXITY_SPACE_IOPS", 0))
+except ValueError:
+    FIXITY_SPACE_IOPS = 0
+try:
+    FIXITY_MIN_AGE_DAYS = float(environ.get("SS_FIXITY_MIN_AGE_DAYS", 30))
+except ValueError:
+    FIXITY_MIN_AGE_DAYS = 30
+try:
+    FIXITY_DIGEST_INTERVAL = int(environ.get("SS_FIXITY_DIGEST_INTERVAL", 3600))
+except ValueError:
+    FIXITY_DIGEST_INTERVAL = 3600
+
+# Replica creation by the create_aip_replicas command, see
+# locations.replication: number of worker processes, number of replicas
+# written at the same time to each Space and per Space budget of bytes written
+# per second (0 is unlimited).
+try:
+    REPLICATION_PROCESSES = int(environ.get("SS_REPLICATION_PROCESSES", 2))
+except ValueError:
+    REPLICATION_PROCESSES = 2
+try:
+    REPLICATION_SPACE_CONCURRENCY = int(
+        environ.get("SS_REPLICATION_SPACE_CONCURRENCY", 1)
+    )
+except ValueError:
+    REPLICATION_SPACE_CONCURRENCY = 1
+try:
+    REPLICATION_SPACE_BYTES_PER_SECOND = int(
+        environ.get("SS_REPLICATION_SPACE_BYTES_PER_SECOND", 0)
+    )
+except ValueError:
+    REPLICATION_SPACE_BYTES_PER_SECOND = 0
+
+# Number of packages deleted from their spaces at the same time when deleting
+# packages in bulk or the replicas of a package.
+try:
+    DELETION_CONCURRENCY = int(environ.get("SS_DELETION_CONCURRENCY", 4))
+except ValueError:
+    DELETION_CONCURRENCY = 4
+
+# Seconds after which the transfer of a package whose checkpoint was not
+# updated is considered interrupted and restarted by the resume_transfers
+# command, see locations.models.TransferCheckpoint. Running transfers update
+# their checkpoint every minute.
+try:
+    TRANSFER_CHECKPOINT_TIMEOUT = int(
+        environ.get("SS_TRANSFER_CHECKPOINT_TIMEOUT", 600)
+    )
+except ValueError:
+    TRANSFER_CHECKPOINT_TIMEOUT = 600
+
+# Seconds between two writes of the progress of an asynchronous task to the
+# database, also the interval of the events streamed by
+# api/v2/async/<id>/events/, see locations.models.async_manager.TaskProgress.
+try:
+    ASYNC_PROGRESS_INTERVAL = int(environ.get("SS_ASYNC_PROGRESS_INTERVAL", 5))
+except ValueError:
+    ASYNC_PROGRESS_INTERVAL = 5
+
+# Seconds after which api/v2/async/<id>/events/ ends its stream, for the
+# client to reconnect or to poll api/v2/async/<id>/, so that a stream doesn't
+# hold a worker indefinitely. The stream needs asynchronous (e.g. gevent)
+# Gunicorn workers, as it holds a synchronous one for its whole duration.
+try:
+    ASYNC_EVENTS_MAX_DURATION = int(environ.get("SS_ASYNC_EVENTS_MAX_DURATION", 300))
+except ValueError:
+    ASYNC_EVENTS_MAX_DURATION = 300
+
+# Whether the directories copied by asynchronous tasks are walked beforehand
+# to report the bytes and files they will process. Without it, only the
+# bytes and files processed so far are reported for directories.
+ASYNC_PROGRESS_TOTALS = is_true(environ.get("SS_ASYNC_PROGRESS_TOTALS", ""))
+
+# Copies between local filesystems, see common.local_copy: number of files
+# copied concurrently and whether every file copied is flushed to disk.
+try:
+    LOCAL_COPY_THREADS = int(environ.get("SS_LOCAL_COPY_THREADS", 4))
+except ValueError:
+    LOCAL_COPY_THREADS = 4
+LOCAL_COPY_FSYNC = is_true(environ.get("SS_LOCAL_COPY_FSYNC", ""))
+
+# Seconds an idle SSH master connection to the host of a Pipeline Local
+# Filesystem space is kept open for the following rsync commands to reuse it.
+# Zero disables the connection sharing.
+try:
+    PIPELINE_LOCAL_SSH_CONTROL_PERSIST = int(
+        environ.get("SS_PIPELINE_LOCAL_SSH_CONTROL_PERSIST", 300)
+    )
+except ValueError:
+    PIPELINE_LOCAL_SSH_CONTROL_PERSIST = 300
+
+# Directory listings of the spaces browsed with rsync are cached for these
+# many seconds, or until the directory is modified. Zero disables the cache.
+try:
+    RSYNC_BROWSE_CACHE_TTL = int(environ.get("SS_RSYNC_BROWSE_CACHE_TTL", 60))
+except ValueError:
+    RSYNC_BROWSE_CACHE_TTL = 60
+
+# Directory of local copies of the XML schemas referenced by the pointer files,
+# e.g. premis.xsd, used instead of downloading them. The schemas in
+# common/schemas are used when it has no copy of its own. See
+# common.pointer_validation.
+POINTER_FILE_SCHEMAS_DIR = environ.get(
+    "SS_POINTER_FILE_SCHEMAS_DIR", normpath(join(SITE_ROOT, "common", "schemas"))
+)
+
+# Values of the administration Settings table are cached in each process. This
+# is the maximum number of seconds a process can use its copy before checking
+# whether another process has changed the table.
+try:
+    SETTINGS_CACHE_CHECK_INTERVAL = float(
+        environ.get("SS_SETTINGS_CACHE_CHECK_INTERVAL", 5)
+    )
+except ValueError:
+    SETTINGS_CACHE_CHECK_INTERVAL = 5
+
 # SS uses a Python HTTP library called requests. If this setting is set to True,
 # we will skip the SSL certificate verification process. Read more here:
 # http://docs.python-requests.org/en/master/user/advanced/#ssl-cert-verification
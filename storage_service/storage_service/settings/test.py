@@ -20,6 +20,10 @@ DATABASES = {
     }
 }
 
+# Always check the settings version, the test database is rolled back between
+# tests without sending any signal.
+SETTINGS_CACHE_CHECK_INTERVAL = 0
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,